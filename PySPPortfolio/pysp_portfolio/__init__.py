@@ -2,42 +2,34 @@
 """
 Authors: Hung-Hsin Chen <chenhh@par.cse.nsysu.edu.tw>
 License: GPL v2
+
+the package only imports the standard library, the directories are
+resolved by config.PortfolioConfig from the environment variables or the
+config file, and they are created by the modules writing to them.
 """
 
 import os
-import platform
 from datetime import date
+from PySPPortfolio.pysp_portfolio.config import (PortfolioConfig, ensure_dir)
+
+CONFIG = PortfolioConfig.load()
 
-PROJECT_DIR = os.path.abspath(os.path.curdir)
+PROJECT_DIR = CONFIG.project_dir
 
 # directory of storing stock data
-DATA_DIR = os.path.join(PROJECT_DIR, 'data')
+DATA_DIR = CONFIG.data_dir
 SYMBOLS_CSV_DIR =os.path.join(DATA_DIR, 'tej')
 SYMBOLS_PKL_DIR = os.path.join(DATA_DIR, 'pkl')
+DATA_STORE_DIR = os.path.join(DATA_DIR, 'store')
 
-# operating system
-os_type = platform.system()
-if os_type == 'Linux':
-    DROPBOX_DIR = r'/home/chenhh/Dropbox'
-    SEAFILE_DIR = r'/home/chenhh/Seafile'
-    EXP_DATA_DIR = r'/home/chenhh/workspace_pycharm/experiment_data'
-    TMP_DIR = r'/tmp'
-
-elif os_type == 'Windows':
-    DROPBOX_DIR = r'C:\Users\chen1\Dropbox'
-    SEAFILE_DIR = r'C:\Users\chen1\Seafile'
-    EXP_DATA_DIR = r'C:\Users\chen1\Documents\experiment_data'
-    TMP_DIR = 'E:\\'
-else:
-    raise ValueError('unknown os platform:{}'.format(os_type))
+DROPBOX_DIR = CONFIG.dropbox_dir
+SEAFILE_DIR = CONFIG.seafile_dir
+EXP_DATA_DIR = CONFIG.exp_data_dir
+TMP_DIR = CONFIG.tmp_dir
 
 EXP_SP_PORTFOLIO_DIR = os.path.join(EXP_DATA_DIR, 'pysp_portfolio')
 EXP_SCENARIO_DIR = os.path.join(EXP_SP_PORTFOLIO_DIR,  'scenarios')
-EXP_SP_PORTFOLIO_REPORT_DIR = os.path.join(DROPBOX_DIR, 'financial_experiment',
-                                           'pysp_portfolio', 'reports')
-
-if not os.path.exists(EXP_SP_PORTFOLIO_DIR):
-    os.makedirs(EXP_SP_PORTFOLIO_DIR)
+EXP_SP_PORTFOLIO_REPORT_DIR = CONFIG.report_dir
 
 # experiment global setting
 DEFAULT_SOLVER = 'cplex'
@@ -64,9 +56,9 @@ EXP_SYMBOLS = [
 ]
 
 __all__ = ['PROJECT_DIR','DATA_DIR', 'DROPBOX_DIR', 'SYMBOLS_CSV_DIR',
-           'SYMBOLS_PKL_DIR',
+           'SYMBOLS_PKL_DIR', 'DATA_STORE_DIR',
            'EXP_SP_PORTFOLIO_DIR', 'EXP_SP_PORTFOLIO_REPORT_DIR',
            'TMP_DIR', 'EXP_SCENARIO_DIR', 'DEFAULT_SOLVER', 'BUY_TRANS_FEE',
            'SELL_TRANS_FEE', 'START_DATE', 'END_DATE', "N_SCENARIO",
            'WINDOW_LENGTH', 'BIAS_ESTIMATOR', 'EXP_SYMBOLS',
-           'MAX_SCENARIO_FILE_CNT']
+           'MAX_SCENARIO_FILE_CNT', 'CONFIG', 'ensure_dir']
@@ -5,17 +5,22 @@ License: GPL v2
 """
 from datetime import (date, )
 from time import time
+import os
 import platform
 import numpy as np
 import pandas as pd
 
-from arch.bootstrap.multiple_comparrison import (SPA, )
 from utils import (sharpe, sortino_full, sortino_partial, maximum_drawdown)
+from stage_timer import (NULL_TIMER,)
+from data_store import (atomic_save,)
+from log_utils import (get_logger, ProgressLogger)
 
 cimport numpy as cnp
 ctypedef cnp.float64_t FLOAT_t
 ctypedef cnp.intp_t INTP_t
 
+logger = get_logger('base_model')
+
 
 class PortfolioReportMixin(object):
     @staticmethod
@@ -87,6 +92,7 @@ class PortfolioReportMixin(object):
 
         # statistics test
         # SPA test, benchmark is no action
+        from arch.bootstrap.multiple_comparrison import (SPA, )
         spa = SPA(wealth_daily_rois, np.zeros(wealth_arr.size), reps=1000)
         spa.seed(np.random.randint(0, 2 ** 31 - 1))
         spa.compute()
@@ -134,6 +140,11 @@ class ValidPortfolioParameterMixin(object):
 
 class SPTradingPortfolio(ValidPortfolioParameterMixin,
                          PortfolioReportMixin):
+
+    # names of the model-specific data (pandas.Series or DataFrame, the
+    # first axis is the experiment periods) stored in the checkpoints
+    checkpoint_attrs = ()
+
     def __init__(self, symbols,
                  risk_rois, risk_free_rois,
                  initial_risk_wealth,
@@ -143,7 +154,8 @@ class SPTradingPortfolio(ValidPortfolioParameterMixin,
                  start_date=date(2005, 1, 3),
                  end_date=date(2014, 12, 31),
                  int window_length=200,
-                 int n_scenario=200, bias=False, verbose=False):
+                 int n_scenario=200, bias=False, verbose=False,
+                 solver_io=None):
         """
         stepwise stochastic programming trading portfolio
 
@@ -163,6 +175,8 @@ class SPTradingPortfolio(ValidPortfolioParameterMixin,
         n_scenario: integer, number of scenarios to generated
         bias: boolean, biased moment estimators or not
         verbose: boolean
+        solver_io: string or None, the interface of the solver, None for the
+            in-process interface with the fallback to the file interface
 
         Data
         --------------
@@ -195,6 +209,7 @@ class SPTradingPortfolio(ValidPortfolioParameterMixin,
         self.sell_trans_fee = sell_trans_fee
 
         self.verbose = verbose
+        self.solver_io = solver_io
 
         # .loc() will contain the end_date element
         self.valid_trans_date(start_date, end_date)
@@ -256,6 +271,9 @@ class SPTradingPortfolio(ValidPortfolioParameterMixin,
         # cumulative loss in transaction fee in the simulation
         self.trans_fee_loss = 0
 
+        # timing the stages of the periods, set by run
+        self.timer = NULL_TIMER
+
     def valid_specific_parameters(self, *args, **kwargs):
         """
         implemented by user
@@ -314,10 +332,273 @@ class SPTradingPortfolio(ValidPortfolioParameterMixin,
         """ add Additional results to reports after a simulation """
         return reports
 
-    def run(self):
+    def prepare_period(self, int tdx, allocated_risk_wealth,
+                       double allocated_risk_free_wealth,
+                       estimated_risk_rois=None):
+        """
+        the scenarios of a period, the first part of run_period
+
+        Parameters:
+        ----------------
+        the same as run_period
+
+        Returns:
+        ----------------
+        dict, the keyword arguments of get_current_buy_sell_amounts, None
+            if generating the scenarios failed
+        """
+        trans_date = self.exp_risk_rois.index[tdx]
+        timer = self.timer
+        timer.begin_period(trans_date)
+
+        # estimating next period rois, shape: (n_stock, n_scenario)
+        if estimated_risk_rois is None:
+            try:
+                estimated_risk_rois = self.get_estimated_risk_rois(
+                    tdx=tdx,
+                    trans_date=trans_date,
+                    n_stock=self.n_stock,
+                    window_length=self.window_length,
+                    n_scenario=self.n_scenario,
+                    bias=self.bias_estimator)
+
+            except ValueError as e:
+                logger.warning("generating scenario error: {}, {}".format(
+                    trans_date, e))
+                self.estimated_risk_roi_error[tdx] = True
+
+        estimated_risk_free_rois = self.get_estimated_risk_free_rois(
+            tdx=tdx,
+            trans_date=trans_date,
+            n_stock=self.n_stock,
+            window_length=self.window_length,
+            n_scenario=self.n_scenario,
+            bias=self.bias_estimator)
+        timer.lap('scenario')
+
+        # generating scenarios failed
+        if self.estimated_risk_roi_error[tdx]:
+            return None
+
+        return {
+            'tdx': tdx,
+            'trans_date': trans_date,
+            'estimated_risk_rois': estimated_risk_rois,
+            'estimated_risk_free_roi': estimated_risk_free_rois,
+            'allocated_risk_wealth': allocated_risk_wealth,
+            'allocated_risk_free_wealth': allocated_risk_free_wealth,
+        }
+
+    def finish_period(self, int tdx, allocated_risk_wealth,
+                      double allocated_risk_free_wealth, results=None):
+        """
+        recording the results and the capital allocation of a period, the
+        last part of run_period
+
+        Parameters:
+        ----------------
+        tdx, allocated_risk_wealth, allocated_risk_free_wealth: the same
+            as run_period
+        results: dict, the results of get_current_buy_sell_amounts, None
+            if generating the scenarios failed
+
+        Returns:
+        ----------------
+        allocated_risk_wealth: pandas.Series, shape: (n_stock,)
+        allocated_risk_free_wealth: float
+        """
+        timer = self.timer
+
+        # generating scenarios success
+        if results is not None:
+            # record results
+            self.set_specific_period_action(tdx=tdx, results=results)
+
+            # buy and sell according results, shape: (n_stock, )
+            buy_amounts = results["buy_amounts"]
+            sell_amounts = results["sell_amounts"]
+
+        # generating scenarios failed
+        else:
+            # buy and sell nothing, shape:(n_stock, )
+            buy_amounts = pd.Series(np.zeros(self.n_stock),
+                                    index=self.symbols)
+            sell_amounts = pd.Series(np.zeros(self.n_stock),
+                                     index=self.symbols)
+
+        # record buy and sell amounts
+        self.buy_amounts_df.iloc[tdx] = buy_amounts
+        self.sell_amounts_df.iloc[tdx] = sell_amounts
+
+        # record the transaction loss
+        buy_amounts_sum = buy_amounts.sum()
+        sell_amounts_sum = sell_amounts.sum()
+        self.trans_fee_loss += (
+            buy_amounts_sum * self.buy_trans_fee +
+            sell_amounts_sum * self.sell_trans_fee
+        )
+
+        # buy and sell amounts consider the transaction cost
+        total_buy = (buy_amounts_sum * (1 + self.buy_trans_fee))
+        total_sell = (sell_amounts_sum * (1 - self.sell_trans_fee))
+
+        # capital allocation
+        self.risk_wealth_df.iloc[tdx] = (
+            (1 + self.exp_risk_rois.iloc[tdx]) *
+            allocated_risk_wealth +
+            self.buy_amounts_df.iloc[tdx] - self.sell_amounts_df.iloc[tdx]
+        )
+        self.risk_free_wealth.iloc[tdx] = (
+            (1 + self.exp_risk_free_rois.iloc[tdx]) *
+            allocated_risk_free_wealth -
+            total_buy + total_sell
+        )
+        timer.lap('bookkeeping')
+        timer.end_period()
+
+        # update wealth
+        return self.risk_wealth_df.iloc[tdx], self.risk_free_wealth.iloc[tdx]
+
+    def run_period(self, int tdx, allocated_risk_wealth,
+                   double allocated_risk_free_wealth,
+                   estimated_risk_rois=None):
+        """
+        the buy and sell amounts and the capital allocation of a period,
+        the results are recorded in the tdx-th row of the data.
+
+        Parameters:
+        ----------------
+        tdx: integer, index of the period in the experiment periods
+        allocated_risk_wealth: pandas.Series, shape: (n_stock,), risky
+            wealth at the end of the previous period
+        allocated_risk_free_wealth: float, risk-free wealth at the end of
+            the previous period
+        estimated_risk_rois: pandas.DataFrame, shape: (n_stock, n_scenario),
+            the scenarios of the period, if None, they are estimated by
+            get_estimated_risk_rois
+
+        Returns:
+        ----------------
+        allocated_risk_wealth: pandas.Series, shape: (n_stock,)
+        allocated_risk_free_wealth: float
+        """
+        period_kwargs = self.prepare_period(tdx, allocated_risk_wealth,
+                                            allocated_risk_free_wealth,
+                                            estimated_risk_rois)
+        results = None
+        if period_kwargs is not None:
+            # determining the buy and sell amounts, the model may time
+            # its stages by self.timer
+            t_optimize = time()
+            results = self.get_current_buy_sell_amounts(**period_kwargs)
+            self.timer.add('optimize', time() - t_optimize)
+            self.timer.mark()
+
+        return self.finish_period(tdx, allocated_risk_wealth,
+                                  allocated_risk_free_wealth, results)
+
+    def save_checkpoint(self, checkpoint_path, int tdx,
+                        allocated_risk_wealth,
+                        double allocated_risk_free_wealth,
+                        double elapsed_time=0):
+        """
+        storing the simulation state after the tdx-th period to a npz file,
+        only the finished periods of the data are written. the file is
+        written by data_store.atomic_save, so neither a crash during
+        writing nor another run of the same checkpoint path corrupts the
+        previous checkpoint.
+
+        Parameters:
+        ----------------
+        checkpoint_path: string, path of the checkpoint, *.npz
+        tdx: integer, index of the last finished period
+        allocated_risk_wealth: pandas.Series, shape: (n_stock,)
+        allocated_risk_free_wealth: float
+        elapsed_time: float, simulation seconds until the checkpoint
+        """
+        cdef int n_done = tdx + 1
+        arrays = {
+            'tdx': np.array(tdx),
+            'func_name': np.array(self.get_trading_func_name()),
+            'exp_dates': self.exp_risk_rois.index.values,
+            'allocated_risk_wealth': np.asarray(allocated_risk_wealth,
+                                                dtype=np.float64),
+            'allocated_risk_free_wealth': np.array(
+                allocated_risk_free_wealth),
+            'trans_fee_loss': np.array(self.trans_fee_loss),
+            'elapsed_time': np.array(elapsed_time),
+            'risk_wealth': self.risk_wealth_df.values[:n_done],
+            'risk_free_wealth': self.risk_free_wealth.values[:n_done],
+            'buy_amounts': self.buy_amounts_df.values[:n_done],
+            'sell_amounts': self.sell_amounts_df.values[:n_done],
+            'estimated_risk_roi_error':
+                self.estimated_risk_roi_error.values[:n_done],
+        }
+        for name in self.checkpoint_attrs:
+            arrays["attr_{}".format(name)] = getattr(self, name).values[
+                                             :n_done]
+
+        if not checkpoint_path.endswith('.npz'):
+            raise ValueError("the checkpoint must be a npz file: {}".format(
+                checkpoint_path))
+        atomic_save(checkpoint_path,
+                    lambda path, arrays: np.savez(path, **arrays), arrays)
+
+    def load_checkpoint(self, checkpoint_path):
+        """
+        restoring the data of the finished periods from a checkpoint
+
+        Returns:
+        ----------------
+        start_tdx: integer, index of the first unfinished period
+        allocated_risk_wealth: pandas.Series, shape: (n_stock,)
+        allocated_risk_free_wealth: float
+        elapsed_time: float, simulation seconds until the checkpoint
+        """
+        with np.load(checkpoint_path) as ckpt:
+            func_name = str(ckpt['func_name'])
+            if func_name != self.get_trading_func_name():
+                raise ValueError("checkpoint {} is of {}, not {}.".format(
+                    checkpoint_path, func_name,
+                    self.get_trading_func_name()))
+            if not np.array_equal(ckpt['exp_dates'],
+                                  self.exp_risk_rois.index.values):
+                raise ValueError("checkpoint {} has different experiment "
+                                 "periods.".format(checkpoint_path))
+
+            n_done = int(ckpt['tdx']) + 1
+            self.risk_wealth_df.iloc[:n_done] = ckpt['risk_wealth']
+            self.risk_free_wealth.iloc[:n_done] = ckpt['risk_free_wealth']
+            self.buy_amounts_df.iloc[:n_done] = ckpt['buy_amounts']
+            self.sell_amounts_df.iloc[:n_done] = ckpt['sell_amounts']
+            self.estimated_risk_roi_error.iloc[:n_done] = ckpt[
+                'estimated_risk_roi_error']
+            for name in self.checkpoint_attrs:
+                getattr(self, name).iloc[:n_done] = ckpt[
+                    "attr_{}".format(name)]
+            self.trans_fee_loss = float(ckpt['trans_fee_loss'])
+
+            allocated_risk_wealth = pd.Series(ckpt['allocated_risk_wealth'],
+                                              index=self.symbols)
+            return (n_done, allocated_risk_wealth,
+                    float(ckpt['allocated_risk_free_wealth']),
+                    float(ckpt['elapsed_time']))
+
+    def run(self, checkpoint_path=None, int checkpoint_interval=20,
+            stage_timer=None):
         """
         run recourse programming simulation
 
+        Parameters:
+        ----------------
+        checkpoint_path: string or None, path of the checkpoint (*.npz),
+            if the file exists, the simulation resumes from it, and it is
+            removed after the simulation finished.
+        checkpoint_interval: integer, number of periods between checkpoints
+        stage_timer: stage_timer.StageTimer or None, accumulating the
+            seconds of the stages of each period to the reports,
+            None for no timing
+
         Returns:
         ----------------
         standard report
@@ -326,110 +607,82 @@ class SPTradingPortfolio(ValidPortfolioParameterMixin,
 
         # get function name
         func_name = self.get_trading_func_name()
+        self.timer = NULL_TIMER if stage_timer is None else stage_timer
 
         # current wealth of each stock in the portfolio
         allocated_risk_wealth = self.initial_risk_wealth
         allocated_risk_free_wealth = self.initial_risk_free_wealth
+        start_tdx, elapsed_time = 0, 0.
+
+        if checkpoint_path is not None and os.path.exists(checkpoint_path):
+            (start_tdx, allocated_risk_wealth, allocated_risk_free_wealth,
+             elapsed_time) = self.load_checkpoint(checkpoint_path)
+            logger.info("{} resumes from {}, [{}/{}]".format(
+                func_name, checkpoint_path, start_tdx, self.n_exp_period))
+        t0 -= elapsed_time
 
         # count of generating scenario error
-        estimated_risk_roi_error_count = 0
+        estimated_risk_roi_error_count = int(
+            self.estimated_risk_roi_error.iloc[:start_tdx].sum())
 
-        for tdx in xrange(self.n_exp_period):
+        progress = ProgressLogger(logger, self.n_exp_period)
+        for tdx in xrange(start_tdx, self.n_exp_period):
             t1 = time()
-            # estimating next period rois, shape: (n_stock, n_scenario)
-            try:
-                estimated_risk_rois = self.get_estimated_risk_rois(
-                    tdx=tdx,
-                    trans_date=self.exp_risk_rois.index[tdx],
-                    n_stock=self.n_stock,
-                    window_length=self.window_length,
-                    n_scenario=self.n_scenario,
-                    bias=self.bias_estimator)
-
-            except ValueError as e:
-                print ("generating scenario error: {}, {}".format(
-                    self.exp_risk_rois.index[tdx], e))
-                self.estimated_risk_roi_error[tdx] = True
+            allocated_risk_wealth, allocated_risk_free_wealth = \
+                self.run_period(tdx, allocated_risk_wealth,
+                                allocated_risk_free_wealth)
+            if self.estimated_risk_roi_error[tdx]:
+                estimated_risk_roi_error_count += 1
 
-            estimated_risk_free_rois = self.get_estimated_risk_free_rois(
-                tdx=tdx,
+            if (checkpoint_path is not None and
+                    (tdx + 1) % checkpoint_interval == 0):
+                self.save_checkpoint(checkpoint_path, tdx,
+                                     allocated_risk_wealth,
+                                     allocated_risk_free_wealth,
+                                     time() - t0)
+
+            wealth = (allocated_risk_wealth.sum() +
+                      allocated_risk_free_wealth)
+            progress.update(
+                tdx + 1, "{} {} OK, scenario err cnt:{} cur_wealth:{:.2f}, "
+                "{:.3f} secs", self.exp_risk_rois.index[tdx].strftime(
+                    "%Y%m%d"), func_name, estimated_risk_roi_error_count,
+                wealth, time() - t1, func_name=func_name,
                 trans_date=self.exp_risk_rois.index[tdx],
-                n_stock=self.n_stock,
-                window_length=self.window_length,
-                n_scenario=self.n_scenario,
-                bias=self.bias_estimator)
+                scenario_error_count=estimated_risk_roi_error_count,
+                wealth=wealth)
 
-            # generating scenarios success
-            if self.estimated_risk_roi_error[tdx] == False:
+        reports = self.get_simulation_reports(func_name, t0)
 
-                # determining the buy and sell amounts
-                results = self.get_current_buy_sell_amounts(
-                    tdx=tdx,
-                    trans_date=self.exp_risk_rois.index[tdx],
-                    estimated_risk_rois=estimated_risk_rois,
-                    estimated_risk_free_roi=estimated_risk_free_rois,
-                    allocated_risk_wealth=allocated_risk_wealth,
-                    allocated_risk_free_wealth=allocated_risk_free_wealth
-                )
-                # record results
-                self.set_specific_period_action(tdx=tdx, results=results)
-
-                # buy and sell according results, shape: (n_stock, )
-                buy_amounts = results["buy_amounts"]
-                sell_amounts = results["sell_amounts"]
-
-            # generating scenarios failed
-            else:
-                # buy and sell nothing, shape:(n_stock, )
-                buy_amounts = pd.Series(np.zeros(self.n_stock),
-                                        index=self.symbols)
-                sell_amounts = pd.Series(np.zeros(self.n_stock),
-                                         index=self.symbols)
-                estimated_risk_roi_error_count += 1
+        # the simulation is finished
+        if checkpoint_path is not None and os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+
+        logger.info("{} OK n_stock:{}, [{}-{}], {:.4f}.secs".format(
+            func_name, self.n_stock,
+            self.exp_risk_rois.index[0],
+            self.exp_risk_rois.index[self.n_exp_period - 1],
+            time() - t0), extra={'data': {
+                'func_name': func_name,
+                'final_wealth': reports['final_wealth'],
+                'simulation_time': reports['simulation_time']}})
+
+        return reports
+
+    def get_simulation_reports(self, func_name, double t0):
+        """
+        the reports after all periods are finished
+
+        Parameters:
+        ----------------
+        func_name: string, name of the trading function
+        t0: float, start time of the simulation
 
-            # record buy and sell amounts
-            self.buy_amounts_df.iloc[tdx] = buy_amounts
-            self.sell_amounts_df.iloc[tdx] = sell_amounts
-
-            # record the transaction loss
-            buy_amounts_sum = buy_amounts.sum()
-            sell_amounts_sum = sell_amounts.sum()
-            self.trans_fee_loss += (
-                buy_amounts_sum * self.buy_trans_fee +
-                sell_amounts_sum * self.sell_trans_fee
-            )
-
-            # buy and sell amounts consider the transaction cost
-            total_buy = (buy_amounts_sum * (1 + self.buy_trans_fee))
-            total_sell = (sell_amounts_sum * (1 - self.sell_trans_fee))
-
-            # capital allocation
-            self.risk_wealth_df.iloc[tdx] = (
-                (1 + self.exp_risk_rois.iloc[tdx]) *
-                allocated_risk_wealth +
-                self.buy_amounts_df.iloc[tdx] - self.sell_amounts_df.iloc[tdx]
-            )
-            self.risk_free_wealth.iloc[tdx] = (
-                (1 + self.exp_risk_free_rois.iloc[tdx]) *
-                allocated_risk_free_wealth -
-                total_buy + total_sell
-            )
-
-            # update wealth
-            allocated_risk_wealth = self.risk_wealth_df.iloc[tdx]
-            allocated_risk_free_wealth = self.risk_free_wealth.iloc[tdx]
-
-            print ("[{}/{}] {} {} OK, scenario err cnt:{} "
-                   "cur_wealth:{:.2f}, {:.3f} secs".format(
-                tdx + 1, self.n_exp_period,
-                self.exp_risk_rois.index[tdx].strftime("%Y%m%d"),
-                func_name,
-                estimated_risk_roi_error_count,
-                (self.risk_wealth_df.iloc[tdx].sum() +
-                 self.risk_free_wealth.iloc[tdx]),
-                time() - t1))
-
-        # end of iterations, computing statistics
+        Returns:
+        ----------------
+        standard report
+        """
+        # computing statistics
         edx = self.n_exp_period - 1
         final_wealth = (self.risk_wealth_df.iloc[edx].sum() +
                         self.risk_free_wealth[edx])
@@ -461,14 +714,18 @@ class SPTradingPortfolio(ValidPortfolioParameterMixin,
 
         # add simulation time
         reports['simulation_time'] = time() - t0
+        if self.timer.enabled:
+            # {stage: (total secs, count)}
+            reports['stage_timing'] = dict(self.timer.summary())
+            if self.timer.record_periods:
+                # shape: (n_period, n_stage), the resumed periods of a
+                # checkpoint are not recorded
+                reports['stage_timing_df'] = self.timer.period_frame()
+            logger.info("{} {}".format(func_name, self.timer),
+                        extra={'data': {'func_name': func_name,
+                                        'stage_timing':
+                                            reports['stage_timing']}})
 
         # user specified  additional elements to reports
         reports = self.add_results_to_reports(reports)
-
-        print ("{} OK n_stock:{}, [{}-{}], {:.4f}.secs".format(
-            func_name, self.n_stock,
-            self.exp_risk_rois.index[0],
-            self.exp_risk_rois.index[edx],
-            time() - t0))
-
-        return reports
\ No newline at end of file
+        return reports
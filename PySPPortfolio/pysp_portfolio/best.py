@@ -13,6 +13,10 @@ from pyomo.environ import *
 
 from PySPPortfolio.pysp_portfolio import *
 from base_model import (PortfolioReportMixin, ValidPortfolioParameterMixin)
+from log_utils import (get_logger, ProgressLogger)
+from solvers import (create_solver, SHELL_SOLVER_IO)
+
+logger = get_logger('best')
 
 
 def best_portfolio(symbols, trans_dates, risk_rois,
@@ -20,7 +24,7 @@ def best_portfolio(symbols, trans_dates, risk_rois,
                    allocated_risk_free_wealth, buy_trans_fee,
                    sell_trans_fee,
                    predicted_risk_rois, predicted_risk_free_roi,
-                   solver=DEFAULT_SOLVER, verbose=False):
+                   solver=DEFAULT_SOLVER, verbose=False, solver_io=None):
     """
     stage-wise portfolio
 
@@ -33,6 +37,8 @@ def best_portfolio(symbols, trans_dates, risk_rois,
     sell_trans_fee: float
     param solver: string
     param verbose: boolean
+    param solver_io: string or None, see solvers.create_solver, the
+        cplex solver uses SHELL_SOLVER_IO for its options
     """
     t0 = time()
 
@@ -107,7 +113,10 @@ def best_portfolio(symbols, trans_dates, risk_rois,
     param = "best_{}_{}_m{}".format(
         START_DATE.strftime("%Y%m%d"), END_DATE.strftime("%Y%m%d"), n_stock)
 
-    opt = SolverFactory(solver)
+    if solver == "cplex":
+        # the options are of the CPLEX shell
+        solver_io = SHELL_SOLVER_IO
+    opt, _ = create_solver(solver, solver_io)
     if solver == "cplex":
         # Barrier algorithm and its upper bound
         opt.options['lpmethod'] = 4
@@ -116,12 +125,12 @@ def best_portfolio(symbols, trans_dates, risk_rois,
     instance.solutions.load_from(results)
     if verbose:
         display(instance)
-        print ("solve best_portfolio {} OK {:.2f} secs".format(
+        logger.info("solve best_portfolio {} OK {:.2f} secs".format(
             param, time() - t1))
-        print ("solver status: {}".format(results.solver.status))
-        print ("solver termination cond: {}".format(
+        logger.debug("solver status: {}".format(results.solver.status))
+        logger.debug("solver termination cond: {}".format(
             results.solver.termination_condition))
-        print (results.solver)
+        logger.debug(results.solver)
 
     # extract results
     buy_arr = np.zeros(n_stock)
@@ -163,7 +172,7 @@ class BestPortfolio(PortfolioReportMixin, ValidPortfolioParameterMixin):
                  buy_trans_fee=BUY_TRANS_FEE,
                  sell_trans_fee=SELL_TRANS_FEE,
                  start_date=START_DATE, end_date=END_DATE,
-                 verbose=False):
+                 verbose=False, solver_io=None):
 
         self.symbols = symbols
         self.risk_rois = risk_rois
@@ -182,6 +191,7 @@ class BestPortfolio(PortfolioReportMixin, ValidPortfolioParameterMixin):
         self.sell_trans_fee = sell_trans_fee
 
         self.verbose = verbose
+        self.solver_io = solver_io
 
         # .loc() will contain the end_date element
         self.valid_trans_date(start_date, end_date)
@@ -241,6 +251,7 @@ class BestPortfolio(PortfolioReportMixin, ValidPortfolioParameterMixin):
             self.sell_trans_fee,
             self.exp_risk_rois.iloc[tdx+1].as_matrix(),
             self.exp_risk_free_rois.iloc[tdx+1],
+            solver_io=self.solver_io,
         )
         return results
 
@@ -249,11 +260,12 @@ class BestPortfolio(PortfolioReportMixin, ValidPortfolioParameterMixin):
         t0 = time()
 
         func_name = self.get_trading_func_name()
-        print (func_name)
+        logger.debug(func_name)
 
         allocated_risk_wealth = self.initial_risk_wealth
         allocated_risk_free_wealth = self.initial_risk_free_wealth
 
+        progress = ProgressLogger(logger, self.n_exp_period - 1)
         for tdx in xrange(self.n_exp_period -1):
             # determining the buy and sell amounts
             results = self.get_current_buy_sell_amounts(
@@ -268,8 +280,8 @@ class BestPortfolio(PortfolioReportMixin, ValidPortfolioParameterMixin):
             self.risk_wealth_df.iloc[tdx] = results["risk_wealth"]
             self.risk_free_wealth.iloc[tdx] = results["risk_free_wealth"]
 
-            print ("[{}/{}], current_wealth: {}".format(
-                tdx+1, self.n_exp_period - 1, results['current_wealth']))
+            progress.update(tdx + 1, "current_wealth: {}",
+                            results['current_wealth'])
 
             # update allocated
             allocated_risk_wealth = self.risk_wealth_df.iloc[tdx]
@@ -315,7 +327,7 @@ class BestPortfolio(PortfolioReportMixin, ValidPortfolioParameterMixin):
         # add simulation time
         reports['simulation_time'] = time() - t0
 
-        print ("{} OK [{}-{}], final_wealth:{}, {:.4f}.secs".format(
+        logger.info("{} OK [{}-{}], final_wealth:{}, {:.4f}.secs".format(
                 func_name, self.exp_risk_rois.index[0],
                 self.exp_risk_rois.index[Tdx],
               final_wealth, time() - t0))
@@ -324,7 +336,8 @@ class BestPortfolio(PortfolioReportMixin, ValidPortfolioParameterMixin):
 def best_ms_portfolio(symbols, trans_dates, risk_rois,
                      risk_free_rois, allocated_risk_wealth,
                      allocated_risk_free_wealth, buy_trans_fee,
-                     sell_trans_fee, solver=DEFAULT_SOLVER, verbose=False):
+                     sell_trans_fee, solver=DEFAULT_SOLVER, verbose=False,
+                     solver_io=None):
     """
     multi-stage portfolio
 
@@ -336,6 +349,9 @@ def best_ms_portfolio(symbols, trans_dates, risk_rois,
     buy_trans_fee: float
     sell_trans_fee: float
     solver: str, supported by Pyomo
+    solver_io: string or None, the interface of the solver, see
+        solvers.create_solver, the cplex solver uses SHELL_SOLVER_IO for
+        its options
 
     """
     t0 = time()
@@ -418,7 +434,7 @@ def best_ms_portfolio(symbols, trans_dates, risk_rois,
         instance.exp_periods, rule=risk_free_wealth_constraint_rule)
 
 
-    print ("best_ms_constraints and objective rules OK, "
+    logger.info("best_ms_constraints and objective rules OK, "
                "{:.3f} secs".format(time() - t0))
 
      # objective
@@ -435,7 +451,10 @@ def best_ms_portfolio(symbols, trans_dates, risk_rois,
         START_DATE.strftime("%Y%m%d"), END_DATE.strftime("%Y%m%d"),
         n_stock)
     # solve
-    opt = SolverFactory(solver)
+    if solver == "cplex":
+        # the options are of the CPLEX shell
+        solver_io = SHELL_SOLVER_IO
+    opt, _ = create_solver(solver, solver_io)
     if solver == "cplex":
         opt.options["workmem"] = 4096
         # turnoff presolve
@@ -448,12 +467,12 @@ def best_ms_portfolio(symbols, trans_dates, risk_rois,
     if verbose:
         display(instance)
 
-    print ("solve best_ms_portfolio {} OK {:.2f} secs".format(
+    logger.info("solve best_ms_portfolio {} OK {:.2f} secs".format(
         param, time() - t1))
-    print ("solver status: {}".format(results.solver.status))
-    print ("solver termination cond: {}".format(
+    logger.debug("solver status: {}".format(results.solver.status))
+    logger.debug("solver termination cond: {}".format(
         results.solver.termination_condition))
-    print (results.solver)
+    logger.debug(results.solver)
 
     # extract results
     Tdx = n_exp_period - 1
@@ -483,7 +502,7 @@ def best_ms_portfolio(symbols, trans_dates, risk_rois,
     # shape: (n_exp_period, )
     risk_free_wealth_arr = pd.Series(risk_free_arr, index=trans_dates)
 
-    print ("{} final_total_wealth: {:.2f}".format(
+    logger.info("{} final_total_wealth: {:.2f}".format(
         param, risk_df[Tdx].sum() + risk_free_arr[Tdx]))
 
     return  {
@@ -504,7 +523,7 @@ class BestMSPortfolio(PortfolioReportMixin, ValidPortfolioParameterMixin):
                  buy_trans_fee=BUY_TRANS_FEE,
                  sell_trans_fee=SELL_TRANS_FEE,
                  start_date=START_DATE, end_date=END_DATE,
-                 verbose=False):
+                 verbose=False, solver_io=None):
         """
         """
 
@@ -525,6 +544,7 @@ class BestMSPortfolio(PortfolioReportMixin, ValidPortfolioParameterMixin):
         self.sell_trans_fee = sell_trans_fee
 
         self.verbose = verbose
+        self.solver_io = solver_io
 
         # .loc() will contain the end_date element
         self.valid_trans_date(start_date, end_date)
@@ -587,6 +607,7 @@ class BestMSPortfolio(PortfolioReportMixin, ValidPortfolioParameterMixin):
             kwargs['allocated_risk_free_wealth'],
             self.buy_trans_fee,
             self.sell_trans_fee,
+            solver_io=self.solver_io,
         )
         return results_dict
 
@@ -595,7 +616,7 @@ class BestMSPortfolio(PortfolioReportMixin, ValidPortfolioParameterMixin):
         t0 = time()
 
         func_name = self.get_trading_func_name()
-        print (func_name)
+        logger.debug(func_name)
 
         # determining the buy and sell amounts
         results = self.get_current_buy_sell_amounts(
@@ -643,7 +664,7 @@ class BestMSPortfolio(PortfolioReportMixin, ValidPortfolioParameterMixin):
         # add simulation time
         reports['simulation_time'] = time() - t1
 
-        print ("{} OK [{}-{}], {} {:.4f}.secs".format(
+        logger.info("{} OK [{}-{}], {} {:.4f}.secs".format(
                 func_name, self.exp_risk_rois.index[0],
                 self.exp_risk_rois.index[Tdx],
               final_wealth, time() - t0))
@@ -10,6 +10,9 @@ from datetime import date
 import numpy as np
 import pandas as pd
 from base_model import (PortfolioReportMixin, ValidPortfolioParameterMixin)
+from log_utils import (get_logger, ProgressLogger)
+
+logger = get_logger('buy_and_hold')
 
 
 class BAHPortfolio(PortfolioReportMixin, ValidPortfolioParameterMixin):
@@ -124,6 +127,7 @@ class BAHPortfolio(PortfolioReportMixin, ValidPortfolioParameterMixin):
         allocated_risk_wealth = self.initial_risk_wealth
         allocated_risk_free_wealth = self.initial_risk_free_wealth
 
+        progress = ProgressLogger(logger, self.n_exp_period)
         for tdx in xrange(self.n_exp_period):
             t1 = time()
             if tdx == 0:
@@ -180,14 +184,13 @@ class BAHPortfolio(PortfolioReportMixin, ValidPortfolioParameterMixin):
             allocated_risk_wealth = self.risk_wealth_df.iloc[tdx]
             allocated_risk_free_wealth = self.risk_free_wealth.iloc[tdx]
 
-            print ("[{}/{}] {} {} OK, "
-                  "current_wealth:{:.2f}, {:.3f} secs".format(
-                    tdx + 1, self.n_exp_period,
-                    self.exp_risk_rois.index[tdx].strftime("%Y%m%d"),
-                    func_name,
-                    (self.risk_wealth_df.iloc[tdx].sum() +
-                     self.risk_free_wealth.iloc[tdx]),
-                    time() - t1))
+            wealth = (allocated_risk_wealth.sum() +
+                      allocated_risk_free_wealth)
+            progress.update(
+                tdx + 1, "{} {} OK, current_wealth:{:.2f}, {:.3f} secs",
+                self.exp_risk_rois.index[tdx].strftime("%Y%m%d"), func_name,
+                wealth, time() - t1, func_name=func_name,
+                trans_date=self.exp_risk_rois.index[tdx], wealth=wealth)
 
         # end of iterations, computing statistics
         final_wealth = (self.risk_wealth_df.iloc[-1].sum() +
@@ -216,7 +219,7 @@ class BAHPortfolio(PortfolioReportMixin, ValidPortfolioParameterMixin):
         reports['simulation_time'] = time() - t0
 
 
-        print ("{} OK n_stock:{}, [{}-{}], {:.4f}.secs".format(
+        logger.info("{} OK n_stock:{}, [{}-{}], {:.4f}.secs".format(
             func_name, self.n_stock,
             self.exp_risk_rois.index[0],
             self.exp_risk_rois.index[-1],
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+Authors: Hung-Hsin Chen <chenhh@par.cse.nsysu.edu.tw>
+License: GPL v2
+
+directories of the experiments.
+
+the value of a directory is resolved in the order:
+    1. environment variable, e.g. PYSP_EXP_DATA_DIR
+    2. the [pysp_portfolio] section of the config file, the path of the
+       file is the environment variable PYSP_CONFIG, default is
+       ~/.pysp_portfolio.cfg, e.g.
+
+        [pysp_portfolio]
+        exp_data_dir = /home/chenhh/workspace_pycharm/experiment_data
+        dropbox_dir = /home/chenhh/Dropbox
+
+    3. the default value under the current or the home directory
+
+this module only uses the standard library, and it does not create any
+directory, see ensure_dir.
+"""
+
+import os
+import tempfile
+
+try:
+    from ConfigParser import SafeConfigParser as ConfigParser
+except ImportError:
+    from configparser import ConfigParser
+
+CONFIG_ENV = 'PYSP_CONFIG'
+CONFIG_SECTION = 'pysp_portfolio'
+DEFAULT_CONFIG_FILE = os.path.join(os.path.expanduser('~'),
+                                   '.pysp_portfolio.cfg')
+
+
+class PortfolioConfig(object):
+    """
+    directories of the experiments, the attributes are the option names
+    in lower case.
+    """
+
+    # (option, default), the default may refer to the former options
+    OPTIONS = (
+        ('project_dir', lambda cfg: os.path.abspath(os.path.curdir)),
+        ('data_dir', lambda cfg: os.path.join(cfg.project_dir, 'data')),
+        ('dropbox_dir', lambda cfg: os.path.join(os.path.expanduser('~'),
+                                                 'Dropbox')),
+        ('seafile_dir', lambda cfg: os.path.join(os.path.expanduser('~'),
+                                                 'Seafile')),
+        ('exp_data_dir', lambda cfg: os.path.join(os.path.expanduser('~'),
+                                                  'experiment_data')),
+        ('tmp_dir', lambda cfg: tempfile.gettempdir()),
+        ('report_dir', lambda cfg: os.path.join(
+            cfg.dropbox_dir, 'financial_experiment', 'pysp_portfolio',
+            'reports')),
+    )
+
+    def __init__(self, values=None):
+        """
+        Parameters:
+        ------------------
+        values: dict, {option: directory}, the options not in values are
+            the default values
+        """
+        if values is None:
+            values = {}
+        unknown = set(values) - set(option for option, _ in self.OPTIONS)
+        if unknown:
+            raise ValueError("unknown config options: {}".format(
+                sorted(unknown)))
+
+        for option, default in self.OPTIONS:
+            value = values.get(option)
+            if value is None:
+                value = default(self)
+            setattr(self, option, os.path.abspath(
+                os.path.expanduser(value)))
+
+    @classmethod
+    def load(cls, config_file=None, environ=None):
+        """
+        Parameters:
+        ------------------
+        config_file: string, path of the config file, default is the
+            environment variable PYSP_CONFIG or ~/.pysp_portfolio.cfg
+        environ: dict, default is os.environ
+        """
+        if environ is None:
+            environ = os.environ
+        if config_file is None:
+            config_file = environ.get(CONFIG_ENV, DEFAULT_CONFIG_FILE)
+
+        values = {}
+        if os.path.exists(config_file):
+            parser = ConfigParser()
+            parser.read(config_file)
+            if parser.has_section(CONFIG_SECTION):
+                values.update(parser.items(CONFIG_SECTION))
+
+        for option, _ in cls.OPTIONS:
+            env_value = environ.get("PYSP_{}".format(option.upper()))
+            if env_value:
+                values[option] = env_value
+        return cls(values)
+
+    def __repr__(self):
+        return "PortfolioConfig({})".format(", ".join(
+            "{}={!r}".format(option, getattr(self, option))
+            for option, _ in self.OPTIONS))
+
+
+def ensure_dir(dir_path):
+    """ creating the directory if it does not exist, return dir_path """
+    if not os.path.exists(dir_path):
+        try:
+            os.makedirs(dir_path)
+        except OSError:
+            # created by another process
+            if not os.path.isdir(dir_path):
+                raise
+    return dir_path
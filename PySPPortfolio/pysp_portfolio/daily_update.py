@@ -0,0 +1,301 @@
+# -*- coding: utf-8 -*-
+"""
+Authors: Hung-Hsin Chen <chenhh@par.cse.nsysu.edu.tw>
+License: GPL v2
+
+incremental daily update of the production portfolio.
+
+for each new transaction date:
+    1. appending the rois of the date from the csv files to the data store
+    2. updating the rolling moments of the window by the new rois
+    3. generating the scenarios of the date only
+    4. determining the buy and sell amounts from the persisted state
+       (allocated risk wealth, risk-free wealth, cumulative fee loss),
+       and persisting the new state
+
+the state is initialized from the reports of a batch simulation
+(daily_state_from_reports) or from a given wealth (init_daily_state).
+"""
+
+from __future__ import division
+import os
+from time import time
+import numpy as np
+import pandas as pd
+from PySPPortfolio.pysp_portfolio import *
+from data_store import (update_data_store, store_dates, store_values,
+                        load_roi_df)
+from scenario.rolling_moments import (RollingMoments,)
+from scenario.generators import (relaxing_moment_matching,)
+from log_utils import (get_logger,)
+
+logger = get_logger('daily_update')
+
+
+def daily_state_path(n_stock, win_length, n_scenario=200, bias=False,
+                     alpha=0.95):
+    """ default path of the persisted state """
+    return os.path.join(EXP_SP_PORTFOLIO_DIR, 'daily',
+                        "m{}_w{}_s{}_{}_a{:.2f}_state.pkl".format(
+                            n_stock, win_length, n_scenario,
+                            "biased" if bias else "unbiased", alpha))
+
+
+def daily_decision_path(state_path):
+    """ the csv of the daily decisions, alongside the state file """
+    root, _ = os.path.splitext(state_path)
+    return "{}_decisions.csv".format(root)
+
+
+def save_daily_state(state, state_path):
+    """ writing the state to a temporary file and renaming it """
+    ensure_dir(os.path.dirname(state_path))
+    tmp_path = "{}.tmp".format(state_path)
+    pd.to_pickle(state, tmp_path)
+    if os.name == 'nt' and os.path.exists(state_path):
+        os.remove(state_path)
+    os.rename(tmp_path, state_path)
+
+
+def load_daily_state(state_path):
+    if not os.path.exists(state_path):
+        raise ValueError("{} daily state does not exist.".format(state_path))
+    return pd.read_pickle(state_path)
+
+
+def init_daily_state(symbols, trans_date, risk_wealth, risk_free_wealth,
+                     trans_fee_loss=0., window_length=WINDOW_LENGTH,
+                     n_scenario=N_SCENARIO, bias=BIAS_ESTIMATOR, alpha=0.95):
+    """
+    the state at the end of trans_date
+
+    Parameters:
+    ------------------
+    symbols: list of string, the first n_stock symbols of the data store
+    trans_date: datetime, the last processed transaction date
+    risk_wealth: pandas.Series, shape: (n_stock,), risky wealth at the end
+        of trans_date
+    risk_free_wealth: float
+    trans_fee_loss: float, cumulative loss of the transaction fee
+    window_length: integer, number of historical periods
+    n_scenario: integer, number of scenarios to generating
+    bias: boolean, biased or unbiased estimator of moments
+    alpha: float, the confidence level of the CVaR
+
+    Returns:
+    ------------------
+    dict
+    """
+    n_stock = len(symbols)
+    if list(symbols) != EXP_SYMBOLS[:n_stock]:
+        raise ValueError("the symbols must be the first {} symbols of "
+                         "EXP_SYMBOLS.".format(n_stock))
+
+    dates = store_dates(end_date=trans_date)
+    if len(dates) < window_length or dates[-1] != pd.Timestamp(trans_date):
+        raise ValueError("{}: not in the data store or insufficient "
+                         "historical data.".format(trans_date))
+    # the window ends at trans_date, shape: (window_length, n_stock)
+    hist_data = store_values(n_stock, dates[-window_length],
+                             dates[-1])
+
+    return {
+        'symbols': list(symbols),
+        'trans_date': dates[-1],
+        'risk_wealth': pd.Series(np.asarray(risk_wealth, dtype=np.float64),
+                                 index=symbols),
+        'risk_free_wealth': float(risk_free_wealth),
+        'trans_fee_loss': float(trans_fee_loss),
+        'n_update': 0,
+        'window_length': int(window_length),
+        'n_scenario': int(n_scenario),
+        'bias': bias,
+        'alpha': float(alpha),
+        'rolling_moments': RollingMoments(hist_data, bias),
+    }
+
+
+def daily_state_from_reports(reports, bias=BIAS_ESTIMATOR):
+    """
+    the state at the end of a batch simulation of MinCVaRSPPortfolio
+
+    Parameters:
+    ------------------
+    reports: dict, reports of SPTradingPortfolio.run
+    bias: boolean, the reports do not record the estimator
+    """
+    return init_daily_state(
+        reports['symbols'], reports['end_date'],
+        reports['wealth_df'].iloc[-1],
+        reports['risk_free_wealth'].iloc[-1],
+        reports['trans_fee_loss'], reports['window_length'],
+        reports['n_scenario'], bias, reports['alpha'])
+
+
+def daily_scenarios(rolling_moments, symbols, n_scenario, bias=False):
+    """
+    scenarios of the current window by the Cython HMM
+
+    Returns:
+    ------------------
+    pandas.DataFrame, shape: (n_stock, n_scenario)
+    """
+    from PySPPortfolio.pysp_portfolio.scenario.c_moment_matching import (
+        heuristic_moment_matching,)
+    tgt_moments, tgt_corrs = rolling_moments.moments()
+    scenarios = relaxing_moment_matching(heuristic_moment_matching,
+                                         tgt_moments, tgt_corrs, n_scenario,
+                                         bias)
+    return pd.DataFrame(scenarios, index=symbols)
+
+
+def daily_decision(state, trans_date, scenario_df, portfolio_cls=None):
+    """
+    the buy and sell amounts of trans_date, the state is updated in place
+
+    Parameters:
+    ------------------
+    state: dict, the state at the end of the previous transaction date
+    trans_date: datetime, the next transaction date of the state
+    scenario_df: pandas.DataFrame, shape: (n_stock, n_scenario)
+    portfolio_cls: subclass of MinCVaRSPPortfolio, default is
+        MinCVaRSPPortfolio
+
+    Returns:
+    ------------------
+    dict, buy_amounts, sell_amounts, risk_wealth, risk_free_wealth,
+        trans_fee_loss
+    """
+    if portfolio_cls is None:
+        from min_cvar_sp import (MinCVaRSPPortfolio,)
+        portfolio_cls = MinCVaRSPPortfolio
+
+    symbols = state['symbols']
+    risk_rois = load_roi_df(symbols)
+    risk_free_rois = pd.Series(np.zeros(1), index=[trans_date])
+
+    # a portfolio of the single period, the scenarios are given, so the
+    # scenario source is not used
+    portfolio = portfolio_cls(
+        symbols, risk_rois, risk_free_rois, state['risk_wealth'],
+        state['risk_free_wealth'], start_date=trans_date,
+        end_date=trans_date, window_length=state['window_length'],
+        n_scenario=state['n_scenario'], bias=state['bias'],
+        alpha=state['alpha'], scenario_generator='hmm',
+        scenario_mode='online')
+    risk_wealth, risk_free_wealth = portfolio.run_period(
+        0, state['risk_wealth'], state['risk_free_wealth'], scenario_df)
+
+    state['trans_date'] = pd.Timestamp(trans_date)
+    state['risk_wealth'] = risk_wealth.copy()
+    state['risk_free_wealth'] = float(risk_free_wealth)
+    state['trans_fee_loss'] += portfolio.trans_fee_loss
+    state['n_update'] += 1
+
+    return {
+        'buy_amounts': portfolio.buy_amounts_df.iloc[0],
+        'sell_amounts': portfolio.sell_amounts_df.iloc[0],
+        'risk_wealth': state['risk_wealth'],
+        'risk_free_wealth': state['risk_free_wealth'],
+        'trans_fee_loss': state['trans_fee_loss'],
+    }
+
+
+def _append_decision(decision_path, trans_date, decision):
+    """
+    appending a row of the decision to the csv, the rows of trans_date and
+    the later dates are written by an update whose state was not saved, so
+    they are replaced.
+    """
+    if os.path.exists(decision_path):
+        decisions = pd.read_csv(decision_path, index_col=0, parse_dates=True)
+        stale = decisions.index >= pd.Timestamp(trans_date)
+        if stale.any():
+            decisions.loc[~stale].to_csv(decision_path)
+
+    row = {'risk_free_wealth': decision['risk_free_wealth'],
+           'wealth': (decision['risk_wealth'].sum() +
+                      decision['risk_free_wealth']),
+           'trans_fee_loss': decision['trans_fee_loss']}
+    for symbol, value in decision['buy_amounts'].iteritems():
+        row['buy_{}'.format(symbol)] = value
+    for symbol, value in decision['sell_amounts'].iteritems():
+        row['sell_{}'.format(symbol)] = value
+    df = pd.DataFrame([row], index=pd.DatetimeIndex([trans_date],
+                                                    name='trans_date'))
+    df.to_csv(decision_path, mode='a',
+              header=not os.path.exists(decision_path))
+
+
+def run_daily_update(state_path, end_date=None, update_store=True,
+                     portfolio_cls=None, save_scenarios=True):
+    """
+    processing the transaction dates after the state, the state is
+    persisted after each date, so a failed update resumes from the last
+    processed date.
+
+    Parameters:
+    ------------------
+    state_path: string, path of the persisted state
+    end_date: datetime, the last date to process, default is the last
+        date of the data store
+    update_store: boolean, appending the new dates in the csv files to
+        the data store first
+    portfolio_cls: subclass of MinCVaRSPPortfolio
+    save_scenarios: boolean, storing the scenarios of each date
+
+    Returns:
+    ------------------
+    dict, {trans_date: decision}
+    """
+    t0 = time()
+    state = load_daily_state(state_path)
+    if update_store:
+        update_data_store()
+
+    symbols = state['symbols']
+    n_stock = len(symbols)
+    parameters = "m{}_w{}_s{}_{}".format(
+        n_stock, state['window_length'], state['n_scenario'],
+        "biased" if state['bias'] else "unbiased")
+    scenario_dir = os.path.join(EXP_SCENARIO_DIR, 'daily', parameters)
+
+    dates = store_dates(end_date=end_date)
+    new_dates = dates[dates > state['trans_date']]
+
+    decisions = {}
+    for trans_date in new_dates:
+        t1 = time()
+        # the window contains the current date
+        rois = store_values(n_stock, trans_date, trans_date)[0]
+        state['rolling_moments'].update(rois)
+
+        scenario_df = daily_scenarios(state['rolling_moments'], symbols,
+                                      state['n_scenario'], state['bias'])
+        if save_scenarios:
+            scenario_df.to_pickle(os.path.join(
+                ensure_dir(scenario_dir),
+                "{}.pkl".format(trans_date.strftime("%Y%m%d"))))
+
+        decision = daily_decision(state, trans_date, scenario_df,
+                                  portfolio_cls)
+        # the row is written before the state, so a crash between them
+        # processes the date again instead of losing its row
+        _append_decision(daily_decision_path(state_path), trans_date,
+                         decision)
+        save_daily_state(state, state_path)
+        decisions[trans_date] = decision
+
+        wealth = decision['risk_wealth'].sum() + decision['risk_free_wealth']
+        logger.info("daily {} {}: wealth:{:.2f}, buy:{:.2f}, sell:{:.2f}, "
+                    "{:.3f} secs".format(
+                     parameters, trans_date.strftime("%Y%m%d"), wealth,
+                     decision['buy_amounts'].sum(),
+                     decision['sell_amounts'].sum(), time() - t1),
+                    extra={'data': {'parameters': parameters,
+                                    'trans_date': trans_date,
+                                    'wealth': wealth}})
+
+    logger.info("daily update {} dates OK, {:.3f} secs".format(
+        len(new_dates), time() - t0))
+    return decisions
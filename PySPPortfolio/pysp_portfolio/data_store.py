@@ -0,0 +1,399 @@
+# -*- coding: utf-8 -*-
+"""
+Authors: Hung-Hsin Chen <chenhh@par.cse.nsysu.edu.tw>
+License: GPL v2
+
+consolidated columnar store of the TEJ price data.
+
+each field is a (n_period, n_symbol) array in its own .npy file, and
+index.npz keeps the transaction dates and the symbols of the rows and
+columns. the arrays are opened with mmap, so loading a field does not
+read the whole file, and a store is opened once per process. the pool
+workers forked after preload_data_store share the read-only pages.
+
+    store_dir/
+        index.npz
+        simple_roi.npy
+        close_price.npy
+        volume.npy
+"""
+
+from __future__ import division
+from datetime import date
+from time import time
+from io import BytesIO
+from multiprocessing import Pool
+import multiprocessing as mp
+import os
+import platform
+import numpy as np
+import pandas as pd
+from PySPPortfolio.pysp_portfolio import *
+from log_utils import (get_logger,)
+
+logger = get_logger('data_store')
+
+# field name in the store: column name in the TEJ csv
+STORE_FIELDS = (
+    ('simple_roi', 'simple_roi_%'),
+    ('close_price', 'close_price'),
+    ('volume', 'volume_1000_shares'),
+)
+
+INDEX_FILE = 'index.npz'
+
+# the opened stores of the process,
+# {store_dir: (trans_dates, symbols, {field: mmap array})}
+_STORE_CACHE = {}
+
+
+def parse_symbol_csv(csv_path):
+    """
+    parsing a TEJ csv file, the file is decoded from cp950 once
+
+    Parameters:
+    ------------------
+    csv_path: string, path of the csv file
+
+    Returns:
+    ------------------
+    pandas.DataFrame, index: trans_dates, columns: the store fields, the
+        simple roi is in decimal, not percentage.
+    """
+    with open(csv_path, 'rb') as fin:
+        text = fin.read().decode('cp950').encode('utf-8')
+
+    columns = [column for _, column in STORE_FIELDS]
+    df = pd.read_csv(BytesIO(text), encoding='utf-8',
+                     usecols=['year_month_day'] + columns,
+                     index_col='year_month_day',
+                     dtype=dict((column, np.float64) for column in columns))
+    df.index = pd.to_datetime(df.index.astype(str), format='%Y%m%d')
+    df.index.name = 'trans_dates'
+    df.rename(columns=dict((column, field) for field, column in STORE_FIELDS),
+              inplace=True)
+    df['simple_roi'] /= 100.
+    return df
+
+
+def build_data_store(symbols=EXP_SYMBOLS, csv_dir=SYMBOLS_CSV_DIR,
+                     store_dir=DATA_STORE_DIR, start_date=date(2004, 1, 1),
+                     end_date=END_DATE, dtype=np.float64, n_process=None):
+    """
+    parsing the csv files of the symbols in parallel and writing the store
+
+    Parameters:
+    ------------------
+    symbols: list of string, the columns of the store
+    csv_dir: string, directory of the TEJ csv files
+    store_dir: string, output directory
+    start_date, end_date: datetime, the period of the store
+    dtype: numpy.float32 or numpy.float64, type of the stored arrays
+    n_process: integer, number of worker processes, default is the
+        number of cpus
+
+    the transaction dates are those of the first symbol, the same as
+    etl.dataframe_to_panel, and the missing data of other symbols are nan.
+    """
+    t0 = time()
+    if n_process is None:
+        n_process = mp.cpu_count()
+
+    pool = Pool(n_process)
+    try:
+        results = [pool.apply_async(parse_symbol_csv,
+                                    (os.path.join(csv_dir,
+                                                  "{}.csv".format(symbol)),))
+                   for symbol in symbols]
+        dfs = [result.get() for result in results]
+    except BaseException:
+        pool.terminate()
+        raise
+    else:
+        pool.close()
+    finally:
+        pool.join()
+    logger.info("parsing {} csv files OK, {:.3f} secs".format(
+        len(symbols), time() - t0))
+
+    trans_dates = dfs[0].loc[start_date:end_date].index
+    if not os.path.exists(store_dir):
+        os.makedirs(store_dir)
+
+    for field, _ in STORE_FIELDS:
+        data = np.empty((len(trans_dates), len(symbols)), dtype=dtype)
+        for sdx, df in enumerate(dfs):
+            data[:, sdx] = df[field].reindex(trans_dates).values
+        # the opened mmap arrays of a rebuilt store are still valid
+        atomic_save(os.path.join(store_dir, "{}.npy".format(field)),
+                    np.save, data)
+
+    # the index is written last, a store without index is incomplete
+    atomic_save(os.path.join(store_dir, INDEX_FILE),
+                lambda path, dates: np.savez(
+                    path, trans_dates=dates, symbols=np.array(symbols)),
+                trans_dates.values.astype('datetime64[D]'))
+
+    _STORE_CACHE.pop(store_dir, None)
+    logger.info("build data store of {} symbols, {} periods OK, {:.3f} "
+                "secs".format(len(symbols), len(trans_dates), time() - t0))
+
+
+def load_store_index(store_dir=DATA_STORE_DIR):
+    """
+    Returns:
+    ------------------
+    trans_dates: pandas.DatetimeIndex, the rows of the store
+    symbols: list of string, the columns of the store
+    """
+    index_path = os.path.join(store_dir, INDEX_FILE)
+    if not os.path.exists(index_path):
+        raise ValueError("{} data store does not exist, please run "
+                         "build_data_store first.".format(store_dir))
+    with np.load(index_path) as index:
+        trans_dates = pd.DatetimeIndex(index['trans_dates'],
+                                       name='trans_dates')
+        symbols = [str(symbol) for symbol in index['symbols']]
+    return trans_dates, symbols
+
+
+def _cached_store(store_dir):
+    """ the index and the opened fields of a store, opened once """
+    store = _STORE_CACHE.get(store_dir)
+    if store is None:
+        trans_dates, symbols = load_store_index(store_dir)
+        store = (trans_dates, symbols, {})
+        _STORE_CACHE[store_dir] = store
+    return store
+
+
+def _cached_field(field, store_dir):
+    """ the read-only mmap array of a field, opened once """
+    if field not in dict(STORE_FIELDS):
+        raise ValueError("unknown field of the data store: {}".format(field))
+    trans_dates, symbols, arrays = _cached_store(store_dir)
+    if field not in arrays:
+        arrays[field] = np.load(os.path.join(store_dir,
+                                             "{}.npy".format(field)),
+                                mmap_mode='r')
+    return trans_dates, symbols, arrays[field]
+
+
+def preload_data_store(fields=None, store_dir=DATA_STORE_DIR):
+    """
+    opening the fields of the store in the current process, calling it
+    before creating a Pool, the forked workers do not open it again.
+
+    Parameters:
+    ------------------
+    fields: list of string, default is all fields
+    store_dir: string, directory of the store
+    """
+    if fields is None:
+        fields = [field for field, _ in STORE_FIELDS]
+    for field in fields:
+        _cached_field(field, store_dir)
+
+
+def clear_data_store_cache():
+    """ closing the opened stores, e.g. after rebuilding a store """
+    _STORE_CACHE.clear()
+
+
+def _period_slice(trans_dates, start_date=None, end_date=None):
+    """ the slice of the trans_dates in [start_date, end_date] """
+    start_idx = (0 if start_date is None else
+                 trans_dates.searchsorted(pd.Timestamp(start_date)))
+    end_idx = (len(trans_dates) if end_date is None else
+               trans_dates.searchsorted(pd.Timestamp(end_date),
+                                        side='right'))
+    return slice(start_idx, end_idx)
+
+
+def store_dates(start_date=None, end_date=None, store_dir=DATA_STORE_DIR):
+    """
+    Returns:
+    ------------------
+    pandas.DatetimeIndex, the trans_dates of the store in the period
+    """
+    trans_dates, _, _ = _cached_store(store_dir)
+    return trans_dates[_period_slice(trans_dates, start_date, end_date)]
+
+
+def store_values(n_stock=None, start_date=None, end_date=None,
+                 field='simple_roi', store_dir=DATA_STORE_DIR):
+    """
+    the data of the first n_stock symbols in the period, a view of the
+    mmap array without copy
+
+    Parameters:
+    ------------------
+    n_stock: integer, number of the first symbols, default is all symbols
+    start_date, end_date: datetime, default is the period of the store
+    field: string, {'simple_roi', 'close_price', 'volume'}
+    store_dir: string, directory of the store
+
+    Returns:
+    ------------------
+    numpy.array, read-only, shape: (n_period, n_stock)
+    """
+    trans_dates, symbols, data = _cached_field(field, store_dir)
+    if n_stock is None:
+        n_stock = len(symbols)
+    elif n_stock > len(symbols):
+        raise ValueError("n_stock {} exceeds the {} symbols of the data "
+                         "store.".format(n_stock, len(symbols)))
+    return data[_period_slice(trans_dates, start_date, end_date), :n_stock]
+
+
+def open_data_store(field='simple_roi', symbols=None, start_date=None,
+                    end_date=None, store_dir=DATA_STORE_DIR):
+    """
+    the data of a field in the store
+
+    Parameters:
+    ------------------
+    field: string, {'simple_roi', 'close_price', 'volume'}
+    symbols: list of string, default is all symbols of the store
+    start_date, end_date: datetime, default is the period of the store
+    store_dir: string, directory of the store
+
+    Returns:
+    ------------------
+    pandas.DataFrame, read-only, shape: (n_period, n_symbol). the periods
+        are sliced from the mmap array without copy, and so are the
+        symbols if they are consecutive columns of the store.
+    """
+    trans_dates, store_symbols, data = _cached_field(field, store_dir)
+    period = _period_slice(trans_dates, start_date, end_date)
+    data = data[period]
+
+    if symbols is None:
+        symbols = store_symbols
+    else:
+        symbols = list(symbols)
+        try:
+            col_indices = [store_symbols.index(symbol) for symbol in symbols]
+        except ValueError as e:
+            raise ValueError("symbol not in the data store: {}".format(e))
+        col_start = col_indices[0] if col_indices else 0
+        if col_indices == list(range(col_start,
+                                      col_start + len(col_indices))):
+            data = data[:, col_start:col_start + len(col_indices)]
+        else:
+            data = data[:, col_indices]
+
+    return pd.DataFrame(data, index=trans_dates[period],
+                        columns=symbols, copy=False)
+
+
+def atomic_save(file_path, save_func, data):
+    """
+    writing to a temporary file of the process and renaming it to
+    file_path, so the concurrent readers never see a partial file.
+
+    Parameters:
+    ------------------
+    file_path: string
+    save_func: function, save_func(path, data), e.g. np.save
+    data: the object to save
+    """
+    root, ext = os.path.splitext(file_path)
+    tmp_path = "{}.{}_{}.tmp{}".format(root, platform.node(), os.getpid(),
+                                       ext)
+    save_func(tmp_path, data)
+    if os.name == 'nt' and os.path.exists(file_path):
+        os.remove(file_path)
+    os.rename(tmp_path, file_path)
+
+
+def append_data_store(trans_dates, values, store_dir=DATA_STORE_DIR):
+    """
+    appending the data of new transaction dates to the store
+
+    Parameters:
+    ------------------
+    trans_dates: list of datetime, the new dates, later than the last
+        date of the store
+    values: dict, {field: numpy.array, shape: (n_new_period, n_symbol)},
+        the columns are the symbols of the store, the data of the missing
+        fields are nan
+
+    the arrays of the store are rewritten with the new rows (each file is
+    replaced by renaming, so the opened mmap arrays are still valid), and
+    the index is written last.
+    """
+    trans_dates = pd.DatetimeIndex(trans_dates)
+    old_dates, symbols = load_store_index(store_dir)
+    if len(trans_dates) == 0:
+        return
+    if trans_dates[0] <= old_dates[-1] or not trans_dates.is_monotonic:
+        raise ValueError("the appended dates must be increasing and later "
+                         "than {}: {}".format(old_dates[-1], trans_dates))
+
+    unknown = set(values) - set(field for field, _ in STORE_FIELDS)
+    if unknown:
+        raise ValueError("unknown fields of the data store: {}".format(
+            sorted(unknown)))
+
+    for field, _ in STORE_FIELDS:
+        file_path = os.path.join(store_dir, "{}.npy".format(field))
+        data = np.load(file_path, mmap_mode='r')
+        rows = np.empty((len(trans_dates), len(symbols)), dtype=data.dtype)
+        if field in values:
+            rows[:] = np.asarray(values[field]).reshape(rows.shape)
+        else:
+            rows.fill(np.nan)
+        atomic_save(file_path, np.save, np.concatenate((data, rows)))
+
+    all_dates = old_dates.append(trans_dates)
+    atomic_save(os.path.join(store_dir, INDEX_FILE),
+                lambda path, dates: np.savez(
+                    path, trans_dates=dates, symbols=np.array(symbols)),
+                all_dates.values.astype('datetime64[D]'))
+    _STORE_CACHE.pop(store_dir, None)
+
+
+def update_data_store(csv_dir=SYMBOLS_CSV_DIR, store_dir=DATA_STORE_DIR):
+    """
+    appending the dates in the csv files later than the store, the new
+    dates are those of the first symbol, the same as build_data_store
+
+    Returns:
+    ------------------
+    pandas.DatetimeIndex, the appended dates
+    """
+    t0 = time()
+    trans_dates, symbols = load_store_index(store_dir)
+    new_dates, values = None, {}
+    for sdx, symbol in enumerate(symbols):
+        df = parse_symbol_csv(os.path.join(csv_dir, "{}.csv".format(symbol)))
+        if new_dates is None:
+            new_dates = df.index[df.index > trans_dates[-1]]
+            if len(new_dates) == 0:
+                break
+            for field, _ in STORE_FIELDS:
+                values[field] = np.empty((len(new_dates), len(symbols)))
+        df = df.reindex(new_dates)
+        for field, _ in STORE_FIELDS:
+            values[field][:, sdx] = df[field].values
+
+    if len(new_dates):
+        append_data_store(new_dates, values, store_dir)
+    logger.info("update data store: {} new dates, {:.3f} secs".format(
+        len(new_dates), time() - t0))
+    return new_dates
+
+
+def load_roi_df(symbols=EXP_SYMBOLS, start_date=None, end_date=None,
+                store_dir=DATA_STORE_DIR):
+    """
+    the simple rois of the symbols, shape: (n_period, n_symbol), it
+    replaces roi_panel.loc[start_date:end_date, symbols, 'simple_roi'].T
+    """
+    return open_data_store('simple_roi', symbols, start_date, end_date,
+                           store_dir)
+
+
+if __name__ == '__main__':
+    build_data_store()
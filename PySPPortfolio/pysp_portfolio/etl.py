@@ -12,15 +12,16 @@ import csv
 import os
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
+import scipy.stats as spstats
 from PySPPortfolio.pysp_portfolio import *
-from statsmodels.stats.stattools import (jarque_bera, )
-from statsmodels.tsa.stattools import (adfuller, )
 from utils import (sharpe, sortino_full, sortino_partial, maximum_drawdown)
-from arch.bootstrap.multiple_comparrison import (SPA, )
-from arch.unitroot.unitroot import (DFGLS, PhillipsPerron, KPSS)
 from PySPPortfolio.pysp_portfolio.scenario.c_moment_matching import (
     heuristic_moment_matching as c_HMM,)
+from data_store import (load_roi_df,)
+from log_utils import (get_logger, ProgressLogger)
+
+logger = get_logger('etl')
+
 
 def cp950_to_utf8(data):
     ''' utility function in parsing csv '''
@@ -72,10 +73,10 @@ def csv_to_pkl(symbols=EXP_SYMBOLS):
         fout_path = os.path.join(SYMBOLS_PKL_DIR, '{}_df.pkl'.format(symbol))
         df.to_pickle(fout_path)
 
-        print ("[{}/{}]{}.csv to dataframe OK, {:.3f} secs".format(
+        logger.info("[{}/{}]{}.csv to dataframe OK, {:.3f} secs".format(
             rdx + 1, len(csvs), symbol, time() - t0))
 
-    print ("csv_to_pkl OK, {:.3f} secs".format(time() - t0))
+    logger.info("csv_to_pkl OK, {:.3f} secs".format(time() - t0))
 
 
 def verify_symbol_csv():
@@ -133,7 +134,7 @@ def dataframe_to_panel(symbols=EXP_SYMBOLS):
         pnl.loc[:, symbol, :] = trimmed_df.ix[:, ('close_price',
                                                   'simple_roi')].T
 
-        print ("[{}/{}] {} load to panel OK, {:.3f} secs".format(
+        logger.info("[{}/{}] {} load to panel OK, {:.3f} secs".format(
             sdx, len(symbols), symbol, time() - t1))
 
     # # fill na with 0
@@ -144,7 +145,8 @@ def dataframe_to_panel(symbols=EXP_SYMBOLS):
                              'TAIEX_2005_largest50cap_panel.pkl')
     pnl.to_pickle(fout_path)
 
-    print ("all exp_symbols load to panel OK, {:.3f} secs".format(time() - t0))
+    logger.info("all exp_symbols load to panel OK, {:.3f} secs".format(
+        time() - t0))
 
 
 def plot_exp_symbol_roi(n_row=5, n_col=5, plot_kind='line'):
@@ -165,6 +167,7 @@ def plot_exp_symbol_roi(n_row=5, n_col=5, plot_kind='line'):
         'upper center' : 9,
         'center'       : 10,
     """
+    import matplotlib.pyplot as plt
     fin_path = os.path.join(SYMBOLS_PKL_DIR,
                             'TAIEX_2005_largest50cap_panel.pkl')
     panel = pd.read_pickle(fin_path)
@@ -225,6 +228,10 @@ def exp_symbols_statistics(fout_path=os.path.join(
     statistics of experiment symbols
     output the results to xlsx
     """
+    from statsmodels.stats.stattools import (jarque_bera, )
+    from statsmodels.tsa.stattools import (adfuller, )
+    from arch.bootstrap.multiple_comparrison import (SPA, )
+    from arch.unitroot.unitroot import (DFGLS, PhillipsPerron, KPSS)
     t0 = time()
     fin_path = os.path.join(SYMBOLS_PKL_DIR,
                             'TAIEX_2005_largest50cap_panel.pkl')
@@ -384,7 +391,7 @@ def exp_symbols_statistics(fout_path=os.path.join(
         stat_df.loc['SPA_c_pvalue', symbol] = spa.pvalues[1]
         stat_df.loc['SPA_u_pvalue', symbol] = spa.pvalues[2]
 
-        print ("[{}/{}] {} roi statistics OK, {:.3f} secs".format(
+        logger.info("[{}/{}] {} roi statistics OK, {:.3f} secs".format(
             rdx + 1, len(EXP_SYMBOLS), symbol, time() - t1
         ))
 
@@ -430,11 +437,84 @@ def exp_symbols_statistics(fout_path=os.path.join(
 
     writer.save()
 
-    print ("all roi statistics OK, {:.3f} secs".format(time() - t0))
+    logger.info("all roi statistics OK, {:.3f} secs".format(time() - t0))
+
+
+def scenario_errors(scenarios, tgt_moments, tgt_corrs, bias=False):
+    """
+    root of sum squared errors of the 1-4 moments and correlations of
+    the scenarios to the targets
+
+    Parameters:
+    ------------------
+    scenarios: numpy.array, shape: (n_stock, n_scenario)
+    tgt_moments: numpy.array, shape: (n_stock, 4)
+    tgt_corrs: numpy.array, shape: (n_stock, n_stock)
+    """
+    moments = np.zeros_like(tgt_moments)
+    moments[:, 0] = scenarios.mean(axis=1)
+    moments[:, 1] = scenarios.std(axis=1, ddof=0 if bias else 1)
+    moments[:, 2] = spstats.skew(scenarios, axis=1, bias=bias)
+    moments[:, 3] = spstats.kurtosis(scenarios, axis=1, bias=bias)
+    moment_err = np.sqrt(((moments - tgt_moments) ** 2).sum())
+    corr_err = np.sqrt(((np.corrcoef(scenarios) - tgt_corrs) ** 2).sum())
+    return moment_err, corr_err
+
+
+def scenario_telemetry_path(scenario_file_path):
+    """ path of the telemetry sidecar of a scenario file """
+    root, _ = os.path.splitext(scenario_file_path)
+    return "{}_telemetry.csv".format(root)
+
+
+def load_scenario_telemetry(exp_start_date, exp_end_date, parameters,
+                            scenario_path=None):
+    """
+    telemetry of all generated scenario files of the parameters
+
+    Parameters:
+    ------------------
+    parameters: string, e.g. "m10_w60_s200_unbiased"
+
+    Returns:
+    ------------------
+    pandas.DataFrame, index: trans_date, the files are in the order of
+        generation, or None if no telemetry exists
+    """
+    if scenario_path is None:
+        scenario_path = os.path.join(EXP_SP_PORTFOLIO_DIR, 'scenarios')
+    pattern = os.path.join(scenario_path, "{}_{}_{}_*_telemetry.csv".format(
+        exp_start_date.strftime('%Y%m%d'), exp_end_date.strftime('%Y%m%d'),
+        parameters))
+    files = sorted(glob(pattern), key=os.path.getmtime)
+    if not files:
+        return None
+    return pd.concat([pd.read_csv(f, index_col=0, parse_dates=True)
+                      for f in files])
+
+
+def adaptive_start_exponents(history, min_exponent=-3):
+    """
+    the starting tolerance exponent of each date is the exponent of the most
+    recent run, and it is tightened by one step if that run did not relax,
+    so a date steps back down to min_exponent after a bad run.
+
+    Parameters:
+    ------------------
+    history: pandas.DataFrame, from load_scenario_telemetry
+    min_exponent: integer, the tightest exponent
+
+    Returns:
+    ------------------
+    dict, {trans_date: exponent}
+    """
+    last = history.groupby(level=0)[['error_exponent', 'n_relax']].last()
+    exponents = last['error_exponent'] - (last['n_relax'] == 0)
+    return exponents.clip(lower=min_exponent).astype(int).to_dict()
 
 
 def generating_scenarios(n_stock, win_length, n_scenario=200, bias=False,
-                         scenario_error_retry=3):
+                         scenario_error_retry=3, adaptive_tolerance=True):
     """
     generating scenarios at once
 
@@ -447,19 +527,23 @@ def generating_scenarios(n_stock, win_length, n_scenario=200, bias=False,
         - False: unbiased estimator of moments
         - True: biased estimator of moments
     scenario_error_retry: integer, maximum retry of scenarios
+    adaptive_tolerance: boolean, if True, each date starts at the
+        tolerance exponent of adaptive_start_exponents from the previous
+        scenario files of the same parameters
+
+    the per-date telemetry (tolerance, retries, cubic fits, moment and
+    correlation errors, wall time) is stored in a csv sidecar alongside
+    the scenario file.
     """
     t0 = time()
-    fin_path = os.path.join(SYMBOLS_PKL_DIR,
-                            'TAIEX_2005_largest50cap_panel.pkl')
-
-    # shape: (n_period, n_stock, ('simple_roi', 'close_price'))
-    panel = pd.read_pickle(fin_path)
-
     # symbols
     symbols = EXP_SYMBOLS[:n_stock]
 
+    # shape: (n_period, n_stock), opened from the data store with mmap
+    roi_df = load_roi_df(symbols)
+
     # all trans_date
-    trans_dates = panel.items
+    trans_dates = roi_df.index
 
     # experiment trans_dates
     exp_start_date, exp_end_date = START_DATE, END_DATE
@@ -479,6 +563,23 @@ def generating_scenarios(n_stock, win_length, n_scenario=200, bias=False,
                               items= exp_trans_dates,
                               major_axis=symbols)
 
+    # per-date telemetry
+    telemetry_columns = ['start_exponent', 'error_exponent', 'n_relax',
+                         'n_retry', 'n_fit', 'nfev', 'moment_err',
+                         'corr_err', 'secs']
+    telemetry = pd.DataFrame(np.zeros((n_exp_period,
+                                       len(telemetry_columns))),
+                             index=exp_trans_dates, columns=telemetry_columns)
+
+    # the tolerance exponents the dates needed in the previous files
+    start_exponents = {}
+    if adaptive_tolerance:
+        history = load_scenario_telemetry(exp_start_date, exp_end_date,
+                                          parameters)
+        if history is not None:
+            start_exponents = adaptive_start_exponents(history)
+
+    progress = ProgressLogger(logger, n_exp_period)
     for tdx, exp_date in enumerate(exp_trans_dates):
         t1 = time()
 
@@ -491,7 +592,7 @@ def generating_scenarios(n_stock, win_length, n_scenario=200, bias=False,
         assert hist_interval[-1] == exp_date
 
         # hist_data, shape: (n_stock, win_length)
-        hist_data = panel.loc[hist_interval, symbols, 'simple_roi']
+        hist_data = roi_df.iloc[est_start_idx:est_end_idx].T
         # est moments and corrs
         est_moments.iloc[:, 0] = hist_data.mean(axis=1)
         if bias:
@@ -505,9 +606,13 @@ def generating_scenarios(n_stock, win_length, n_scenario=200, bias=False,
         est_corrs = (hist_data.T).corr("pearson")
 
         # generating unbiased scenario
+        start_exponent = int(start_exponents.get(exp_date, -3))
+        fit_stats = {}
+        scenario_df = None
+        n_relax = 0
         for error_count in xrange(scenario_error_retry):
             try:
-                for error_exponent in xrange(-3, 0):
+                for error_exponent in xrange(start_exponent, 0):
                     try:
                         # default moment and corr errors (1e-3, 1e-3)
                         # df shape: (n_stock, n_scenario)
@@ -517,11 +622,14 @@ def generating_scenarios(n_stock, win_length, n_scenario=200, bias=False,
                                             est_corrs.as_matrix(),
                                             n_scenario, bias,
                                             max_moment_err,
-                                            max_corr_err)
+                                            max_corr_err,
+                                            fit_stats=fit_stats)
                     except ValueError as e:
-                        print ("relaxing max err: {}_{}_max_mom_err:{}, "
-                               "max_corr_err{}".format( exp_date, parameters,
-                                max_moment_err, max_corr_err))
+                        n_relax += 1
+                        logger.debug("relaxing max err: {}_{}_max_mom_err:{}, "
+                                     "max_corr_err{}".format(
+                            exp_date, parameters, max_moment_err,
+                            max_corr_err))
                     else:
                         # generating scenarios success
                         break
@@ -531,19 +639,35 @@ def generating_scenarios(n_stock, win_length, n_scenario=200, bias=False,
                 if error_count == scenario_error_retry - 1:
                     raise Exception(e)
             else:
-                # generating scenarios success
-                break
+                if scenario_df is not None:
+                    # generating scenarios success
+                    break
+
+        if scenario_df is None:
+            raise ValueError("{}_{}: scenarios not converge after {} "
+                             "retries.".format(exp_date, parameters,
+                                               scenario_error_retry))
 
         # store scenarios
         scenario_panel.loc[exp_date, :, :] = scenario_df
 
+        # errors of the scenarios to the target statistics
+        moment_err, corr_err = scenario_errors(scenario_df,
+                                               est_moments.as_matrix(),
+                                               est_corrs.as_matrix(), bias)
+        telemetry.loc[exp_date] = (start_exponent, error_exponent, n_relax,
+                                   error_count, fit_stats.get('n_fit', 0),
+                                   fit_stats.get('nfev', 0), moment_err,
+                                   corr_err, time() - t1)
+
         # clear est data
-        print ("[{}/{}][{}_{}] {}: {} scenarios OK, {:.3f} secs".format(
-            tdx+1, n_exp_period,
-            exp_start_date.strftime("%y%m%d"),
-            exp_end_date.strftime("%y%m%d"),
-            exp_date.strftime("%Y-%m-%d"),
-            parameters, time() - t1))
+        progress.update(tdx + 1, "[{}_{}] {}: {} scenarios OK, {:.3f} secs",
+                        exp_start_date.strftime("%y%m%d"),
+                        exp_end_date.strftime("%y%m%d"),
+                        exp_date.strftime("%Y-%m-%d"), parameters,
+                        time() - t1, parameters=parameters,
+                        trans_date=exp_date, n_relax=n_relax,
+                        moment_err=moment_err, corr_err=corr_err)
 
     # scenario dir
     scenario_path = os.path.join(EXP_SP_PORTFOLIO_DIR, 'scenarios')
@@ -563,9 +687,10 @@ def generating_scenarios(n_stock, win_length, n_scenario=200, bias=False,
         else:
             # store file
             scenario_panel.to_pickle(file_path)
+            telemetry.to_csv(scenario_telemetry_path(file_path))
             break
 
-    print ("generating scenarios {}-{}, {} OK, {:.3f} secs \n {}".format(
+    logger.info("generating scenarios {}-{}, {} OK, {:.3f} secs \n {}".format(
         exp_start_date.strftime('%Y%m%d'),
         exp_end_date.strftime('%Y%m%d'),
         parameters, time() - t0, file_path))
@@ -16,17 +16,18 @@ from arch.bootstrap.multiple_comparrison import (SPA, )
 
 import utils
 from PySPPortfolio.pysp_portfolio import *
+from data_store import (load_roi_df,)
 from gen_results import (all_experiment_parameters, )
 from gen_results_year import (all_experiment_parameters as
                               all_experiment_parameters_yearly, )
 
 
-def load_rois(symbol=None):
-    if symbol is None:
-        symbol = "TAIEX_2005_largest50cap_panel"
-
-    return pd.read_pickle(
-        os.path.join(SYMBOLS_PKL_DIR, "{}.pkl".format(symbol)))
+def load_rois(symbols=EXP_SYMBOLS, start_date=None, end_date=None):
+    """
+    the simple rois of the symbols from the data store,
+    shape: (n_period, n_stock)
+    """
+    return load_roi_df(symbols, start_date, end_date)
 
 
 def load_yearly_pairs():
@@ -89,6 +90,89 @@ def load_results(prob_type, n_stock, win_length=0, n_scenario=200,
     return results
 
 
+def out_of_sample_cvar(prob_type, n_stock, win_length, n_scenario=200,
+                       bias=False, scenario_cnts=(1, 2, 3),
+                       alphas=(0.5, 0.55, 0.6, 0.65, 0.7, 0.75, 0.8, 0.85,
+                               0.9, 0.95),
+                       eval_scenario_cnt=MAX_SCENARIO_FILE_CNT,
+                       eval_alphas=None, start_date=START_DATE,
+                       end_date=END_DATE):
+    """
+    scoring the daily risk wealth of all runs of a (n_stock, win_length)
+    by the out-of-sample scenarios without re-solving the problems.
+
+    Parameters:
+    -----------------------------------------------------
+    prob_type: str
+    n_stock: integer
+    win_length: integer
+    n_scenario: integer
+    bias: boolean
+    scenario_cnts: list of integer, the scenarios used by the runs
+    alphas: list of float, the alphas of the runs
+    eval_scenario_cnt: integer, the scenarios for evaluation, it should not
+        be in scenario_cnts
+    eval_alphas: list of float, the alphas of evaluation, None for alphas
+
+    Returns:
+    -----------------------------------------------------
+    var_panel, cvar_panel: pandas.Panel,
+        shape: (n_runs, n_exp_period, n_eval_alpha)
+    """
+    t0 = time()
+    if eval_alphas is None:
+        eval_alphas = alphas
+
+    # shape: (n_runs, n_exp_period, n_stock)
+    run_names, wealth_dfs = [], []
+    for scenario_cnt in scenario_cnts:
+        for alpha in alphas:
+            results = load_results(prob_type, n_stock, win_length,
+                                   n_scenario, bias, scenario_cnt, alpha,
+                                   start_date, end_date)
+            if results is None:
+                continue
+            run_names.append("s{}_a{:.2f}".format(scenario_cnt, alpha))
+            wealth_dfs.append(results['wealth_df'])
+
+    if not wealth_dfs:
+        raise ValueError("no results of {} m{} w{}.".format(
+            prob_type, n_stock, win_length))
+
+    trans_dates = wealth_dfs[0].index
+    symbols = wealth_dfs[0].columns.tolist()
+    holdings = np.array([df.as_matrix() for df in wealth_dfs])
+
+    scenario_name = "{}_{}_m{}_w{}_s{}_{}_{}.pkl".format(
+        START_DATE.strftime("%Y%m%d"), END_DATE.strftime("%Y%m%d"),
+        len(symbols), win_length, n_scenario,
+        "biased" if bias else "unbiased", eval_scenario_cnt)
+    scenario_path = os.path.join(EXP_SP_PORTFOLIO_DIR, 'scenarios',
+                                 scenario_name)
+    if not os.path.exists(scenario_path):
+        raise ValueError("{} not exists.".format(scenario_name))
+
+    # shape: (n_exp_period, n_stock, n_scenario)
+    eval_scenarios = pd.read_pickle(scenario_path).loc[
+        trans_dates, symbols].as_matrix()
+
+    n_runs, n_exp_period = holdings.shape[0], holdings.shape[1]
+    var_arr = np.zeros((n_runs, n_exp_period, len(eval_alphas)))
+    cvar_arr = np.zeros((n_runs, n_exp_period, len(eval_alphas)))
+    for tdx in xrange(n_exp_period):
+        var_arr[:, tdx, :], cvar_arr[:, tdx, :] = utils.evaluate_cvars(
+            holdings[:, tdx, :], eval_scenarios[tdx], eval_alphas)
+
+    alpha_strs = ["{:.2f}".format(alpha) for alpha in eval_alphas]
+    var_panel = pd.Panel(var_arr, items=run_names, major_axis=trans_dates,
+                         minor_axis=alpha_strs)
+    cvar_panel = pd.Panel(cvar_arr, items=run_names, major_axis=trans_dates,
+                          minor_axis=alpha_strs)
+    print ("out_of_sample_cvar {} m{} w{}, {} runs OK, {:.3f} secs".format(
+        prob_type, n_stock, win_length, n_runs, time() - t0))
+    return var_panel, cvar_panel
+
+
 def all_results_to_multi_sheet_xlsx(prob_type="min_cvar_sip", sheet="alpha",
                                     max_scenario_cnts=MAX_SCENARIO_FILE_CNT):
     """
@@ -1327,7 +1411,8 @@ def stock_statistics(latex=True):
     """
     import csv
     symbols = EXP_SYMBOLS
-    panel = load_rois()
+    # shape: (n_exp_period, n_stock)
+    roi_df = load_rois(symbols, START_DATE, END_DATE)
 
     with open(os.path.join(TMP_DIR, 'stat.csv'), 'wb') as csvfile, \
             open(os.path.join(TMP_DIR, 'stat_txt.txt'), 'wb') as texfile:
@@ -1342,7 +1427,8 @@ def stock_statistics(latex=True):
         texfile.write("{} \\ \hline \n".format(" & ".join(texnames)))
 
         for sdx, symbol in enumerate(symbols):
-            rois = panel[START_DATE:END_DATE, symbol, 'simple_roi']
+            # copy, the data store is opened read-only
+            rois = roi_df[symbol].copy()
             rois[0] = 0
             R_c = (1 + rois).prod() - 1
             R_a = np.power(R_c + 1, 1. / 10) - 1
@@ -9,20 +9,29 @@ from time import time
 import numpy as np
 import pandas as pd
 from PySPPortfolio.pysp_portfolio import *
-from min_cvar_sp import (MinCVaRSPPortfolio, MinCVaRSPPortfolio2 )
+from min_cvar_sp import (MinCVaRSPPortfolio, MinCVaRSPPortfolio2,
+                         run_min_cvar_sp_batch)
 from min_cvar_sip import (MinCVaRSIPPortfolio,MinCVaRSIPPortfolio2)
 from min_ms_cvar_sp import (MinMSCVaRSPPortfolio,)
 from min_ms_cvar_eventsp import (MinMSCVaREventSPPortfolio,)
 from min_ms_cvar_avgsp import (MinMSCVaRAvgSPPortfolio,)
 from min_cvar_eev import (MinCVaREEVPortfolio,)
 from min_cvar_eevip import (MinCVaREEVIPPortfolio,)
+from min_wcvar_sp import (MinWCVaRSPPortfolio, load_scenario_mmap)
 from buy_and_hold import (BAHPortfolio,)
 from best import (BestMSPortfolio, BestPortfolio)
 from datetime import date
+from data_store import (load_roi_df,)
+from scenario.generators import (DEFAULT_SCENARIO_MODE,)
+from log_utils import (get_logger,)
+
+logger = get_logger('exp_cvar')
 
 def run_min_cvar_sp_simulation(n_stock, win_length, n_scenario=200,
                                bias=False, scenario_cnt=1, alpha=0.95,
-                               verbose=False):
+                               verbose=False, scenario_generator=None,
+                               scenario_mode=DEFAULT_SCENARIO_MODE,
+                               checkpoint_interval=None):
     """
     2nd stage SP simulation
 
@@ -34,6 +43,11 @@ def run_min_cvar_sp_simulation(n_stock, win_length, n_scenario=200,
     bias: bool, biased moment estimators or not
     scenario_cnt: count of generated scenarios, default = 1
     alpha: float, for conditional risk
+    scenario_generator: string or None, name of the registered scenario
+        generator, e.g. 'bootstrap', None for the stored HMM scenarios
+    scenario_mode: string, {'precompute', 'online'}
+    checkpoint_interval: integer or None, number of periods between the
+        checkpoints of the simulation, None for no checkpoint
 
     Returns:
     --------------------
@@ -50,19 +64,9 @@ def run_min_cvar_sp_simulation(n_stock, win_length, n_scenario=200,
         n_stock, win_length, n_scenario, "biased" if bias else "unbiased",
         scenario_cnt, alpha)
 
-    # read rois panel
-    roi_path = os.path.join(SYMBOLS_PKL_DIR,
-                            'TAIEX_2005_largest50cap_panel.pkl')
-    if not os.path.exists(roi_path):
-        raise ValueError("{} roi panel does not exist.".format(roi_path))
-
-    # shape: (n_period, n_stock, {'simple_roi', 'close_price'})
-    roi_panel = pd.read_pickle(roi_path)
-
-    # shape: (n_period, n_stock)
-    risk_rois =roi_panel.loc[:, symbols, 'simple_roi'].T
-    exp_risk_rois = roi_panel.loc[START_DATE:END_DATE, symbols,
-                    'simple_roi'].T
+    # read rois from the data store, shape: (n_period, n_stock)
+    risk_rois = load_roi_df(symbols)
+    exp_risk_rois = risk_rois.loc[START_DATE:END_DATE]
     n_period = exp_risk_rois.shape[0]
     risk_free_rois = pd.Series(np.zeros(n_period), index=exp_risk_rois.index)
     initial_risk_wealth = pd.Series(np.zeros(n_stock), index=symbols)
@@ -72,21 +76,107 @@ def run_min_cvar_sp_simulation(n_stock, win_length, n_scenario=200,
                            initial_risk_wealth, initial_risk_free_wealth,
                            window_length=win_length, n_scenario=n_scenario,
                            bias=bias, alpha=alpha, scenario_cnt=scenario_cnt,
-                           verbose=verbose)
-    reports = instance.run()
+                           verbose=verbose,
+                           scenario_generator=scenario_generator,
+                           scenario_mode=scenario_mode)
 
-    file_name = 'min_cvar_sp_{}.pkl'.format(param)
+    prob_name = 'min_cvar_sp'
+    if scenario_generator is not None:
+        prob_name = "{}_{}".format(prob_name, scenario_generator)
+    file_name = '{}_{}.pkl'.format(prob_name, param)
 
-    file_dir = os.path.join(EXP_SP_PORTFOLIO_DIR, 'min_cvar_sp')
+    file_dir = os.path.join(EXP_SP_PORTFOLIO_DIR, prob_name)
     if not os.path.exists(file_dir):
         os.makedirs(file_dir)
 
+    if checkpoint_interval is None:
+        reports = instance.run()
+    else:
+        reports = instance.run(os.path.join(
+            file_dir, '{}_{}.ckpt.npz'.format(prob_name, param)),
+            int(checkpoint_interval))
+
     pd.to_pickle(reports, os.path.join(file_dir, file_name))
-    print ("min cvar sp {} OK, {:.3f} secs".format(param, time()-t0))
+    logger.info("min cvar sp {} OK, {:.3f} secs".format(param, time()-t0))
 
     return reports
 
 
+def run_min_cvar_sp_batch_simulation(n_stock, win_length, n_scenario=200,
+                                     bias=False, scenario_cnt=1,
+                                     alphas=(0.5, 0.55, 0.6, 0.65, 0.7, 0.75,
+                                             0.8, 0.85, 0.9, 0.95),
+                                     verbose=False, scenario_generator=None,
+                                     scenario_mode=DEFAULT_SCENARIO_MODE,
+                                     batch_size=None):
+    """
+    2nd stage SP simulations of the alphas, the LPs of the alphas in a
+    period are solved as a block-diagonal LP, the reports are the same
+    files as run_min_cvar_sp_simulation.
+
+    Parameters:
+    -------------------
+    alphas: list of float, for conditional risk
+    batch_size: integer or None, maximum number of LPs of a batch LP
+    the others are the same as run_min_cvar_sp_simulation
+
+    Returns:
+    --------------------
+    list of reports
+    """
+    t0 = time()
+    n_stock, win_length,  = int(n_stock), int(win_length)
+    n_scenario = int(n_scenario)
+
+    # getting experiment symbols
+    symbols = EXP_SYMBOLS[:n_stock]
+    risk_rois = load_roi_df(symbols)
+    exp_risk_rois = risk_rois.loc[START_DATE:END_DATE]
+    n_period = exp_risk_rois.shape[0]
+    risk_free_rois = pd.Series(np.zeros(n_period), index=exp_risk_rois.index)
+    initial_risk_wealth = pd.Series(np.zeros(n_stock), index=symbols)
+    initial_risk_free_wealth = 1e6
+
+    # the stored HMM scenarios are loaded once and shared by the alphas
+    scenarios = None
+    if scenario_generator is None:
+        scenarios = load_scenario_mmap(n_stock, win_length, n_scenario,
+                                       bias, scenario_cnt)
+
+    instances = [MinCVaRSPPortfolio(symbols, risk_rois, risk_free_rois,
+                           initial_risk_wealth, initial_risk_free_wealth,
+                           window_length=win_length, n_scenario=n_scenario,
+                           bias=bias, alpha=alpha, scenario_cnt=scenario_cnt,
+                           verbose=verbose,
+                           scenario_generator=scenario_generator,
+                           scenario_mode=scenario_mode,
+                           scenarios=scenarios)
+                 for alpha in alphas]
+
+    prob_name = 'min_cvar_sp'
+    if scenario_generator is not None:
+        prob_name = "{}_{}".format(prob_name, scenario_generator)
+    file_dir = os.path.join(EXP_SP_PORTFOLIO_DIR, prob_name)
+    if not os.path.exists(file_dir):
+        os.makedirs(file_dir)
+
+    reports_list = run_min_cvar_sp_batch(instances, batch_size)
+    for alpha, reports in zip(alphas, reports_list):
+        param = "{}_{}_m{}_w{}_s{}_{}_{}_a{:.2f}".format(
+            START_DATE.strftime("%Y%m%d"), END_DATE.strftime("%Y%m%d"),
+            n_stock, win_length, n_scenario,
+            "biased" if bias else "unbiased", scenario_cnt, alpha)
+        file_name = '{}_{}.pkl'.format(prob_name, param)
+        pd.to_pickle(reports, os.path.join(file_dir, file_name))
+
+    logger.info("min cvar sp batch m{}_w{}_s{}_{}_{} of {} alphas OK, "
+                "{:.3f} secs".format(n_stock, win_length, n_scenario,
+                                     "biased" if bias else "unbiased",
+                                     scenario_cnt, len(alphas),
+                                     time() - t0))
+    return reports_list
+
+
 def run_min_cvar_sp2_simulation(n_stock, win_length, n_scenario=200,
                                bias=False, scenario_cnt=1, alpha=0.95,
                                verbose=False):
@@ -117,19 +207,9 @@ def run_min_cvar_sp2_simulation(n_stock, win_length, n_scenario=200,
         n_stock, win_length, n_scenario, "biased" if bias else "unbiased",
         scenario_cnt, alpha)
 
-    # read rois panel
-    roi_path = os.path.join(SYMBOLS_PKL_DIR,
-                            'TAIEX_2005_largest50cap_panel.pkl')
-    if not os.path.exists(roi_path):
-        raise ValueError("{} roi panel does not exist.".format(roi_path))
-
-    # shape: (n_period, n_stock, {'simple_roi', 'close_price'})
-    roi_panel = pd.read_pickle(roi_path)
-
-    # shape: (n_period, n_stock)
-    risk_rois =roi_panel.loc[:, symbols, 'simple_roi'].T
-    exp_risk_rois = roi_panel.loc[START_DATE:END_DATE, symbols,
-                    'simple_roi'].T
+    # read rois from the data store, shape: (n_period, n_stock)
+    risk_rois = load_roi_df(symbols)
+    exp_risk_rois = risk_rois.loc[START_DATE:END_DATE]
     n_period = exp_risk_rois.shape[0]
     risk_free_rois = pd.Series(np.zeros(n_period), index=exp_risk_rois.index)
     initial_risk_wealth = pd.Series(np.zeros(n_stock), index=symbols)
@@ -149,7 +229,7 @@ def run_min_cvar_sp2_simulation(n_stock, win_length, n_scenario=200,
         os.makedirs(file_dir)
 
     pd.to_pickle(reports, os.path.join(file_dir, file_name))
-    print ("min cvar sp2 {} OK, {:.3f} secs".format(param, time()-t0))
+    logger.info("min cvar sp2 {} OK, {:.3f} secs".format(param, time()-t0))
 
     return reports
 
@@ -157,7 +237,7 @@ def run_min_cvar_sp2_simulation(n_stock, win_length, n_scenario=200,
 def run_min_cvar_sp2_yearly_simulation(n_stock, win_length, n_scenario=200,
                                bias=False, scenario_cnt=1, alpha=0.95,
                                verbose=False, start_date=START_DATE,
-                                    end_date=END_DATE):
+                                    end_date=END_DATE, scenarios=None):
     """
     2nd stage SP simulation
 
@@ -169,6 +249,8 @@ def run_min_cvar_sp2_yearly_simulation(n_stock, win_length, n_scenario=200,
     bias: bool, biased moment estimators or not
     scenario_cnt: count of generated scenarios, default = 1
     alpha: float, for conditional risk
+    scenarios: tuple or None, the memory-mapped scenarios of
+        min_wcvar_sp.load_scenario_mmap, None for reading the scenario panel
 
     Returns:
     --------------------
@@ -185,19 +267,9 @@ def run_min_cvar_sp2_yearly_simulation(n_stock, win_length, n_scenario=200,
         n_stock, win_length, n_scenario, "biased" if bias else "unbiased",
         scenario_cnt, alpha)
 
-    # read rois panel
-    roi_path = os.path.join(SYMBOLS_PKL_DIR,
-                            'TAIEX_2005_largest50cap_panel.pkl')
-    if not os.path.exists(roi_path):
-        raise ValueError("{} roi panel does not exist.".format(roi_path))
-
-    # shape: (n_period, n_stock, {'simple_roi', 'close_price'})
-    roi_panel = pd.read_pickle(roi_path)
-
-    # shape: (n_period, n_stock)
-    risk_rois =roi_panel.loc[:, symbols, 'simple_roi'].T
-    exp_risk_rois = roi_panel.loc[start_date:end_date, symbols,
-                    'simple_roi'].T
+    # read rois from the data store, shape: (n_period, n_stock)
+    risk_rois = load_roi_df(symbols)
+    exp_risk_rois = risk_rois.loc[start_date:end_date]
     n_period = exp_risk_rois.shape[0]
     risk_free_rois = pd.Series(np.zeros(n_period), index=exp_risk_rois.index)
     initial_risk_wealth = pd.Series(np.zeros(n_stock), index=symbols)
@@ -208,7 +280,7 @@ def run_min_cvar_sp2_yearly_simulation(n_stock, win_length, n_scenario=200,
                            window_length=win_length, n_scenario=n_scenario,
                            bias=bias, alpha=alpha, scenario_cnt=scenario_cnt,
                            verbose=verbose, start_date=start_date,
-                                   end_date=end_date)
+                                   end_date=end_date, scenarios=scenarios)
     reports = instance.run()
 
     file_name = 'min_cvar_sp2_yearly_{}.pkl'.format(param)
@@ -218,7 +290,8 @@ def run_min_cvar_sp2_yearly_simulation(n_stock, win_length, n_scenario=200,
         os.makedirs(file_dir)
 
     pd.to_pickle(reports, os.path.join(file_dir, file_name))
-    print ("min cvar sp2 yearly {} OK, {:.3f} secs".format(param, time()-t0))
+    logger.info("min cvar sp2 yearly {} OK, {:.3f} secs".format(
+        param, time()-t0))
 
     return reports
 
@@ -226,7 +299,8 @@ def run_min_cvar_sp2_yearly_simulation(n_stock, win_length, n_scenario=200,
 
 def run_min_cvar_sip_simulation(max_portfolio_size, window_length,
                                 n_scenario=200, bias=False, scenario_cnt=1,
-                                alpha=0.95, verbose=False):
+                                alpha=0.95, verbose=False,
+                                checkpoint_interval=None):
     """
     2nd stage SIP simulation
     in the model, all stocks are used as candidate symbols.
@@ -239,6 +313,8 @@ def run_min_cvar_sip_simulation(max_portfolio_size, window_length,
     bias: bool, biased moment estimators or not
     scenario_cnt: count of generated scenarios, default = 1
     alpha: float, for conditional risk
+    checkpoint_interval: integer or None, number of periods between the
+        checkpoints of the simulation, None for no checkpoint
 
     Returns:
     --------------------
@@ -257,19 +333,9 @@ def run_min_cvar_sip_simulation(max_portfolio_size, window_length,
         len(symbols), max_portfolio_size, window_length, n_scenario,
         "biased" if bias else "unbiased", scenario_cnt, alpha)
 
-    # read rois panel
-    roi_path = os.path.join(SYMBOLS_PKL_DIR,
-                            'TAIEX_2005_largest50cap_panel.pkl')
-    if not os.path.exists(roi_path):
-        raise ValueError("{} roi panel does not exist.".format(roi_path))
-
-
-    # shape: (n_period, n_stock, {'simple_roi', 'close_price'})
-    roi_panel = pd.read_pickle(roi_path)
-
-    # shape: (n_period, n_stock)
-    risk_rois =roi_panel.loc[:, symbols, 'simple_roi'].T
-    exp_risk_rois = roi_panel.loc[START_DATE:END_DATE, symbols, 'simple_roi'].T
+    # read rois from the data store, shape: (n_period, n_stock)
+    risk_rois = load_roi_df(symbols)
+    exp_risk_rois = risk_rois.loc[START_DATE:END_DATE]
     n_period = exp_risk_rois.shape[0]
     risk_free_rois = pd.Series(np.zeros(n_period), index=exp_risk_rois.index)
     initial_risk_wealth = pd.Series(np.zeros(n_stock), index=symbols)
@@ -286,15 +352,20 @@ def run_min_cvar_sip_simulation(max_portfolio_size, window_length,
                             scenario_cnt=scenario_cnt,
                             verbose=verbose)
 
-    reports = instance.run()
-
     file_name = 'min_cvar_sip_{}.pkl'.format(param)
     file_dir = os.path.join(EXP_SP_PORTFOLIO_DIR, 'min_cvar_sip')
     if not os.path.exists(file_dir):
         os.makedirs(file_dir)
 
+    if checkpoint_interval is None:
+        reports = instance.run()
+    else:
+        reports = instance.run(os.path.join(
+            file_dir, 'min_cvar_sip_{}.ckpt.npz'.format(param)),
+            int(checkpoint_interval))
+
     pd.to_pickle(reports, os.path.join(file_dir, file_name))
-    print ("min cvar sip {} OK, {:.3f} secs".format(param, time()-t0))
+    logger.info("min cvar sip {} OK, {:.3f} secs".format(param, time()-t0))
 
     return reports
 
@@ -332,19 +403,9 @@ def run_min_cvar_sip2_simulation(max_portfolio_size, window_length,
         len(symbols), max_portfolio_size, window_length, n_scenario,
         "biased" if bias else "unbiased", scenario_cnt, alpha)
 
-    # read rois panel
-    roi_path = os.path.join(SYMBOLS_PKL_DIR,
-                            'TAIEX_2005_largest50cap_panel.pkl')
-    if not os.path.exists(roi_path):
-        raise ValueError("{} roi panel does not exist.".format(roi_path))
-
-
-    # shape: (n_period, n_stock, {'simple_roi', 'close_price'})
-    roi_panel = pd.read_pickle(roi_path)
-
-    # shape: (n_period, n_stock)
-    risk_rois =roi_panel.loc[:, symbols, 'simple_roi'].T
-    exp_risk_rois = roi_panel.loc[START_DATE:END_DATE, symbols, 'simple_roi'].T
+    # read rois from the data store, shape: (n_period, n_stock)
+    risk_rois = load_roi_df(symbols)
+    exp_risk_rois = risk_rois.loc[START_DATE:END_DATE]
     n_period = exp_risk_rois.shape[0]
     risk_free_rois = pd.Series(np.zeros(n_period), index=exp_risk_rois.index)
     initial_risk_wealth = pd.Series(np.zeros(n_stock), index=symbols)
@@ -369,7 +430,7 @@ def run_min_cvar_sip2_simulation(max_portfolio_size, window_length,
         os.makedirs(file_dir)
 
     pd.to_pickle(reports, os.path.join(file_dir, file_name))
-    print ("min cvar sip2 {} OK, {:.3f} secs".format(param, time()-t0))
+    logger.info("min cvar sip2 {} OK, {:.3f} secs".format(param, time()-t0))
 
     return reports
 
@@ -408,19 +469,9 @@ def run_min_cvar_sip2_yearly_simulation(max_portfolio_size, window_length,
         len(symbols), max_portfolio_size, window_length, n_scenario,
         "biased" if bias else "unbiased", scenario_cnt, alpha)
 
-    # read rois panel
-    roi_path = os.path.join(SYMBOLS_PKL_DIR,
-                            'TAIEX_2005_largest50cap_panel.pkl')
-    if not os.path.exists(roi_path):
-        raise ValueError("{} roi panel does not exist.".format(roi_path))
-
-
-    # shape: (n_period, n_stock, {'simple_roi', 'close_price'})
-    roi_panel = pd.read_pickle(roi_path)
-
-    # shape: (n_period, n_stock)
-    risk_rois =roi_panel.loc[:, symbols, 'simple_roi'].T
-    exp_risk_rois = roi_panel.loc[start_date:end_date, symbols, 'simple_roi'].T
+    # read rois from the data store, shape: (n_period, n_stock)
+    risk_rois = load_roi_df(symbols)
+    exp_risk_rois = risk_rois.loc[start_date:end_date]
     n_period = exp_risk_rois.shape[0]
     risk_free_rois = pd.Series(np.zeros(n_period), index=exp_risk_rois.index)
     initial_risk_wealth = pd.Series(np.zeros(n_stock), index=symbols)
@@ -446,17 +497,79 @@ def run_min_cvar_sip2_yearly_simulation(max_portfolio_size, window_length,
         os.makedirs(file_dir)
 
     pd.to_pickle(reports, os.path.join(file_dir, file_name))
-    print ("min cvar sip2 yearly {} OK, {:.3f} secs".format(param, time()-t0))
+    logger.info("min cvar sip2 yearly {} OK, {:.3f} secs".format(
+        param, time()-t0))
 
     return reports
 
 
 
+def run_min_wcvar_sp_simulation(n_stock, win_lengths, n_scenario=200,
+                                bias=False, scenario_cnt=1, alpha=0.95,
+                                verbose=False):
+    """
+    2nd stage worst-case CVaR SP simulation
+
+    Parameters:
+    -------------------
+    n_stock: integer, number of stocks of the EXP_SYMBOLS to the portfolios
+    win_lengths: list of integer, the window lengths of the distributions
+    n_scenario, int, number of scenarios
+    bias: bool, biased moment estimators or not
+    scenario_cnt: count of generated scenarios, default = 1
+    alpha: float, for conditional risk
+
+    Returns:
+    --------------------
+    reports
+    """
+    t0 = time()
+    n_stock = int(n_stock)
+    win_lengths = sorted(int(w) for w in win_lengths)
+    n_scenario, alpha = int(n_scenario), float(alpha)
+
+    # getting experiment symbols
+    symbols = EXP_SYMBOLS[:n_stock]
+    param = "{}_{}_m{}_w{}_s{}_{}_{}_a{:.2f}".format(
+        START_DATE.strftime("%Y%m%d"), END_DATE.strftime("%Y%m%d"),
+        n_stock, "_".join(str(w) for w in win_lengths), n_scenario,
+        "biased" if bias else "unbiased", scenario_cnt, alpha)
+
+    # read rois from the data store, shape: (n_period, n_stock)
+    risk_rois = load_roi_df(symbols)
+    exp_risk_rois = risk_rois.loc[START_DATE:END_DATE]
+    n_period = exp_risk_rois.shape[0]
+    risk_free_rois = pd.Series(np.zeros(n_period), index=exp_risk_rois.index)
+    initial_risk_wealth = pd.Series(np.zeros(n_stock), index=symbols)
+    initial_risk_free_wealth = 1e6
+
+    instance = MinWCVaRSPPortfolio(symbols, risk_rois, risk_free_rois,
+                                   initial_risk_wealth,
+                                   initial_risk_free_wealth,
+                                   win_lengths=win_lengths,
+                                   n_scenario=n_scenario, bias=bias,
+                                   alpha=alpha, scenario_cnt=scenario_cnt,
+                                   verbose=verbose)
+    reports = instance.run()
+
+    prob_name = "min_wcvar_sp"
+    file_name = '{}_{}.pkl'.format(prob_name, param)
+    file_dir = os.path.join(EXP_SP_PORTFOLIO_DIR, prob_name)
+    if not os.path.exists(file_dir):
+        os.makedirs(file_dir)
+
+    pd.to_pickle(reports, os.path.join(file_dir, file_name))
+    logger.info("{} {} OK, {:.3f} secs".format(prob_name, param, time()-t0))
+
+    return reports
+
+
 def run_min_ms_cvar_sp_simulation(n_stock, win_length, n_scenario=200,
                                bias=False, scenario_cnt=1,
                                alphas=[0.5, 0.55, 0.6, 0.65, 0.7, 0.75,
                                        0.8, 0.85, 0.9, 0.95],
-                                  verbose=False):
+                                  verbose=False, rolling_horizon=None,
+                                  rolling_step=1):
     """
     multi-stage SP simulation
 
@@ -468,6 +581,9 @@ def run_min_ms_cvar_sp_simulation(n_stock, win_length, n_scenario=200,
     bias: bool, biased moment estimators or not
     scenario_cnt: count of generated scenarios, default = 1
     alpha: float, for conditional risk
+    rolling_horizon: integer or None, periods of the rolling sub-problems,
+        None for solving the full multi-stage model
+    rolling_step: integer, periods fixed in each rolling sub-problem
 
     Returns:
     --------------------
@@ -484,44 +600,41 @@ def run_min_ms_cvar_sp_simulation(n_stock, win_length, n_scenario=200,
         n_stock, win_length, n_scenario, "biased" if bias else "unbiased",
         scenario_cnt)
 
-    # read rois panel
-    roi_path = os.path.join(SYMBOLS_PKL_DIR,
-                            'TAIEX_2005_largest50cap_panel.pkl')
-    if not os.path.exists(roi_path):
-        raise ValueError("{} roi panel does not exist.".format(roi_path))
-
-    # shape: (n_period, n_stock, {'simple_roi', 'close_price'})
-    roi_panel = pd.read_pickle(roi_path)
-
-    # shape: (n_period, n_stock)
-    risk_rois =roi_panel.loc[:, symbols, 'simple_roi'].T
-    exp_risk_rois = roi_panel.loc[START_DATE:END_DATE, symbols,
-                    'simple_roi'].T
+    # read rois from the data store, shape: (n_period, n_stock)
+    risk_rois = load_roi_df(symbols)
+    exp_risk_rois = risk_rois.loc[START_DATE:END_DATE]
     n_period = exp_risk_rois.shape[0]
     risk_free_rois = pd.Series(np.zeros(n_period), index=exp_risk_rois.index)
     initial_risk_wealth = pd.Series(np.zeros(n_stock), index=symbols)
     initial_risk_free_wealth = 1e6
 
-    print ("min ms cvar sp {} start.".format(param))
+    logger.info("min ms cvar sp {} start.".format(param))
     t1 = time()
     instance = MinMSCVaRSPPortfolio(symbols, risk_rois, risk_free_rois,
                            initial_risk_wealth, initial_risk_free_wealth,
                            window_length=win_length, n_scenario=n_scenario,
                            bias=bias, alphas=alphas, scenario_cnt=scenario_cnt,
-                           verbose=verbose)
-    print ("min ms cvar sp {} ready to run: {:.3f} secs".format(
+                           verbose=verbose, rolling_horizon=rolling_horizon,
+                           rolling_step=rolling_step)
+    logger.info("min ms cvar sp {} ready to run: {:.3f} secs".format(
             param, time() - t1))
     reports_dict = instance.run()
 
-    file_dir = os.path.join(EXP_SP_PORTFOLIO_DIR, 'min_ms_cvar_sp')
+    prob_name = "min_ms_cvar_sp"
+    if rolling_horizon is not None:
+        prob_name = "min_ms_cvar_sp_rolling"
+    file_dir = os.path.join(EXP_SP_PORTFOLIO_DIR, prob_name)
     if not os.path.exists(file_dir):
         os.makedirs(file_dir)
 
     for alpha_str, reports in reports_dict.items():
         alpha = reports['alpha']
-        file_name = 'min_ms_cvar_sp_{}_a{:.2f}.pkl'.format(param, alpha)
+        file_name = '{}_{}_a{:.2f}.pkl'.format(prob_name, param, alpha)
+        if rolling_horizon is not None:
+            file_name = '{}_{}_a{:.2f}_rh{}_{}.pkl'.format(
+                prob_name, param, alpha, rolling_horizon, rolling_step)
         pd.to_pickle(reports, os.path.join(file_dir, file_name))
-        print ("ms min cvar sp {}_a{:.2f} OK, {:.3f} secs".format(
+        logger.info("ms min cvar sp {}_a{:.2f} OK, {:.3f} secs".format(
             param, alpha, time() - t0))
 
     return reports_dict
@@ -530,7 +643,7 @@ def run_min_ms_cvar_sp_simulation(n_stock, win_length, n_scenario=200,
 def run_min_ms_cvar_eventsp_simulation(n_stock, win_length, n_scenario=200,
                                bias=False, scenario_cnt=1, alpha = 0.95,
                                verbose=False, start_date=date(2005,1,3),
-                               end_date=date(2014,12,31), solver_io="lp",
+                               end_date=date(2014,12,31), solver_io=None,
                                        keepfiles=False):
     """
     multi-stage event scenario SP simulation
@@ -554,19 +667,9 @@ def run_min_ms_cvar_eventsp_simulation(n_stock, win_length, n_scenario=200,
     # getting experiment symbols
     symbols = EXP_SYMBOLS[:n_stock]
 
-    # read rois panel
-    roi_path = os.path.join(SYMBOLS_PKL_DIR,
-                            'TAIEX_2005_largest50cap_panel.pkl')
-    if not os.path.exists(roi_path):
-        raise ValueError("{} roi panel does not exist.".format(roi_path))
-
-    # shape: (n_period, n_stock, {'simple_roi', 'close_price'})
-    roi_panel = pd.read_pickle(roi_path)
-
-    # shape: (n_period, n_stock)
-    risk_rois = roi_panel.loc[:, symbols, 'simple_roi'].T
-    exp_risk_rois = roi_panel.loc[start_date:end_date, symbols,
-                    'simple_roi'].T
+    # read rois from the data store, shape: (n_period, n_stock)
+    risk_rois = load_roi_df(symbols)
+    exp_risk_rois = risk_rois.loc[start_date:end_date]
     n_period = exp_risk_rois.shape[0]
     risk_free_rois = pd.Series(np.zeros(n_period), index=exp_risk_rois.index)
     initial_risk_wealth = pd.Series(np.zeros(n_stock), index=symbols)
@@ -592,7 +695,7 @@ def run_min_ms_cvar_eventsp_simulation(n_stock, win_length, n_scenario=200,
                                          keepfiles=keepfiles
                                          )
     reports = instance.run()
-    print reports
+    logger.debug(reports)
     prob_name = "min_ms_cvar_eventsp"
     file_name = '{}_{}.pkl'.format(prob_name, param)
     file_dir = os.path.join(EXP_SP_PORTFOLIO_DIR, prob_name)
@@ -600,14 +703,15 @@ def run_min_ms_cvar_eventsp_simulation(n_stock, win_length, n_scenario=200,
         os.makedirs(file_dir)
 
     pd.to_pickle(reports, os.path.join(file_dir, file_name))
-    print ("{} {} OK, {:.3f} secs".format(prob_name, param, time() - t0))
+    logger.info("{} {} OK, {:.3f} secs".format(prob_name, param, time() - t0))
 
     return reports
 
 
 def run_min_ms_cvar_avgsp_simulation(n_stock, win_length, n_scenario=200,
                                bias=False, scenario_cnt=1, alpha = 0.95,
-                               verbose=False):
+                               verbose=False, rolling_horizon=None,
+                                    rolling_step=1):
     """
     multi-stage average scenario SP simulation
     the results are independent to the alphas
@@ -620,6 +724,9 @@ def run_min_ms_cvar_avgsp_simulation(n_stock, win_length, n_scenario=200,
     bias: bool, biased moment estimators or not
     scenario_cnt: count of generated scenarios, default = 1
     alpha: float, for conditional risk
+    rolling_horizon: integer or None, periods of the rolling sub-problems,
+        None for solving the full multi-stage model
+    rolling_step: integer, periods fixed in each rolling sub-problem
     Returns:
     --------------------
     reports
@@ -635,19 +742,9 @@ def run_min_ms_cvar_avgsp_simulation(n_stock, win_length, n_scenario=200,
         n_stock, win_length, n_scenario, "biased" if bias else "unbiased",
         scenario_cnt, alpha)
 
-    # read rois panel
-    roi_path = os.path.join(SYMBOLS_PKL_DIR,
-                            'TAIEX_2005_largest50cap_panel.pkl')
-    if not os.path.exists(roi_path):
-        raise ValueError("{} roi panel does not exist.".format(roi_path))
-
-    # shape: (n_period, n_stock, {'simple_roi', 'close_price'})
-    roi_panel = pd.read_pickle(roi_path)
-
-    # shape: (n_period, n_stock)
-    risk_rois = roi_panel.loc[:, symbols, 'simple_roi'].T
-    exp_risk_rois = roi_panel.loc[START_DATE:END_DATE, symbols,
-                    'simple_roi'].T
+    # read rois from the data store, shape: (n_period, n_stock)
+    risk_rois = load_roi_df(symbols)
+    exp_risk_rois = risk_rois.loc[START_DATE:END_DATE]
     n_period = exp_risk_rois.shape[0]
     risk_free_rois = pd.Series(np.zeros(n_period), index=exp_risk_rois.index)
     initial_risk_wealth = pd.Series(np.zeros(n_stock), index=symbols)
@@ -659,20 +756,25 @@ def run_min_ms_cvar_avgsp_simulation(n_stock, win_length, n_scenario=200,
                                    n_scenario=n_scenario,
                                    bias=bias, alpha=alpha,
                                    scenario_cnt=scenario_cnt,
-                                   verbose=verbose)
+                                   verbose=verbose,
+                                   rolling_horizon=rolling_horizon,
+                                   rolling_step=rolling_step)
     reports = instance.run()
     # the reports is the scenario simulation results, it still need to compute
     # truly wealth process by using the wealth process
     # print reports.keys()
 
     prob_name = "min_ms_cvar_avgsp"
+    if rolling_horizon is not None:
+        prob_name = "min_ms_cvar_avgsp_rolling"
+        param = "{}_rh{}_{}".format(param, rolling_horizon, rolling_step)
     file_name = '{}_{}.pkl'.format(prob_name, param)
     file_dir = os.path.join(EXP_SP_PORTFOLIO_DIR, prob_name)
     if not os.path.exists(file_dir):
         os.makedirs(file_dir)
 
     pd.to_pickle(reports, os.path.join(file_dir, file_name))
-    print ("{} {} OK, {:.3f} secs".format(prob_name, param, time() - t0))
+    logger.info("{} {} OK, {:.3f} secs".format(prob_name, param, time() - t0))
 
     return reports
 
@@ -706,19 +808,9 @@ def run_min_cvar_eev_simulation(n_stock, win_length, n_scenario=200,
         n_stock, win_length, n_scenario, "biased" if bias else "unbiased",
         scenario_cnt, alpha)
 
-    # read rois panel
-    roi_path = os.path.join(SYMBOLS_PKL_DIR,
-                            'TAIEX_2005_largest50cap_panel.pkl')
-    if not os.path.exists(roi_path):
-        raise ValueError("{} roi panel does not exist.".format(roi_path))
-
-    # shape: (n_period, n_stock, {'simple_roi', 'close_price'})
-    roi_panel = pd.read_pickle(roi_path)
-
-    # shape: (n_period, n_stock)
-    risk_rois =roi_panel.loc[:, symbols, 'simple_roi'].T
-    exp_risk_rois = roi_panel.loc[START_DATE:END_DATE, symbols,
-                    'simple_roi'].T
+    # read rois from the data store, shape: (n_period, n_stock)
+    risk_rois = load_roi_df(symbols)
+    exp_risk_rois = risk_rois.loc[START_DATE:END_DATE]
     n_period = exp_risk_rois.shape[0]
     risk_free_rois = pd.Series(np.zeros(n_period), index=exp_risk_rois.index)
     initial_risk_wealth = pd.Series(np.zeros(n_stock), index=symbols)
@@ -738,7 +830,7 @@ def run_min_cvar_eev_simulation(n_stock, win_length, n_scenario=200,
         os.makedirs(file_dir)
 
     pd.to_pickle(reports, os.path.join(file_dir, file_name))
-    print ("{} {} OK, {:.3f} secs".format(prob_name, param, time()-t0))
+    logger.info("{} {} OK, {:.3f} secs".format(prob_name, param, time()-t0))
 
     return reports
 
@@ -776,19 +868,9 @@ def run_min_cvar_eevip_simulation(max_portfolio_size, window_length,
         len(symbols), max_portfolio_size, window_length, n_scenario,
         "biased" if bias else "unbiased", scenario_cnt, alpha)
 
-    # read rois panel
-    roi_path = os.path.join(SYMBOLS_PKL_DIR,
-                            'TAIEX_2005_largest50cap_panel.pkl')
-    if not os.path.exists(roi_path):
-        raise ValueError("{} roi panel does not exist.".format(roi_path))
-
-
-    # shape: (n_period, n_stock, {'simple_roi', 'close_price'})
-    roi_panel = pd.read_pickle(roi_path)
-
-    # shape: (n_period, n_stock)
-    risk_rois =roi_panel.loc[:, symbols, 'simple_roi'].T
-    exp_risk_rois = roi_panel.loc[START_DATE:END_DATE, symbols, 'simple_roi'].T
+    # read rois from the data store, shape: (n_period, n_stock)
+    risk_rois = load_roi_df(symbols)
+    exp_risk_rois = risk_rois.loc[START_DATE:END_DATE]
     n_period = exp_risk_rois.shape[0]
     risk_free_rois = pd.Series(np.zeros(n_period), index=exp_risk_rois.index)
     initial_risk_wealth = pd.Series(np.zeros(n_stock), index=symbols)
@@ -815,7 +897,7 @@ def run_min_cvar_eevip_simulation(max_portfolio_size, window_length,
         os.makedirs(file_dir)
 
     pd.to_pickle(reports, os.path.join(file_dir, file_name))
-    print ("{} {} OK, {:.3f} secs".format(prob_name, param, time()-t0))
+    logger.info("{} {} OK, {:.3f} secs".format(prob_name, param, time()-t0))
 
     return reports
 
@@ -825,24 +907,15 @@ def run_bah_simulation(n_stock ,verbose=False):
     The Buy-And-Hold (BAH) strategy,
     """
     t0 = time()
-    # read rois panel
-    roi_path = os.path.join(SYMBOLS_PKL_DIR,
-                            'TAIEX_2005_largest50cap_panel.pkl')
-    if not os.path.exists(roi_path):
-        raise ValueError("{} roi panel does not exist.".format(roi_path))
-
     param = "{}_{}_m{}".format(
         START_DATE.strftime("%Y%m%d"), END_DATE.strftime("%Y%m%d"),
         n_stock)
 
     symbols = EXP_SYMBOLS[:n_stock]
     n_stock = len(symbols)
-    # shape: (n_period, n_stock, {'simple_roi', 'close_price'})
-    roi_panel = pd.read_pickle(roi_path)
 
-    # shape: (n_period, n_stock)
-    exp_risk_rois = roi_panel.loc[START_DATE:END_DATE, symbols,
-                    'simple_roi'].T
+    # read rois from the data store, shape: (n_period, n_stock)
+    exp_risk_rois = load_roi_df(symbols, START_DATE, END_DATE)
     n_exp_period = exp_risk_rois.shape[0]
     exp_risk_free_rois = pd.Series(np.zeros(n_exp_period),
                                    index=exp_risk_rois.index)
@@ -863,7 +936,7 @@ def run_bah_simulation(n_stock ,verbose=False):
         os.makedirs(file_dir)
 
     pd.to_pickle(reports, os.path.join(file_dir, file_name))
-    print ("BAH {} OK, {:.3f} secs".format(param, time()-t0))
+    logger.info("BAH {} OK, {:.3f} secs".format(param, time()-t0))
 
 
 
@@ -872,24 +945,15 @@ def run_best_simulation(n_stock ,verbose=False):
     The best stage-wise strategy,
     """
     t0 = time()
-    # read rois panel
-    roi_path = os.path.join(SYMBOLS_PKL_DIR,
-                            'TAIEX_2005_largest50cap_panel.pkl')
-    if not os.path.exists(roi_path):
-        raise ValueError("{} roi panel does not exist.".format(roi_path))
-
     param = "{}_{}_m{}".format(
         START_DATE.strftime("%Y%m%d"), END_DATE.strftime("%Y%m%d"),
         n_stock)
 
     symbols = EXP_SYMBOLS[:n_stock]
     n_stock = len(symbols)
-    # shape: (n_period, n_stock, {'simple_roi', 'close_price'})
-    roi_panel = pd.read_pickle(roi_path)
 
-    # shape: (n_exp_period, n_stock)
-    exp_risk_rois = roi_panel.loc[START_DATE:END_DATE, symbols,
-                    'simple_roi'].T
+    # read rois from the data store, shape: (n_period, n_stock)
+    exp_risk_rois = load_roi_df(symbols, START_DATE, END_DATE)
     n_exp_period = exp_risk_rois.shape[0]
     # shape: (n_exp_period, )
     exp_risk_free_rois = pd.Series(np.zeros(n_exp_period),
@@ -910,7 +974,7 @@ def run_best_simulation(n_stock ,verbose=False):
         os.makedirs(file_dir)
 
     pd.to_pickle(reports, os.path.join(file_dir, file_name))
-    print ("best {} OK, {:.3f} secs".format(param, time()-t0))
+    logger.info("best {} OK, {:.3f} secs".format(param, time()-t0))
 
 
 
@@ -919,24 +983,15 @@ def run_best_ms_simulation(n_stock ,verbose=False):
     The best multi-stage strategy,
     """
     t0 = time()
-    # read rois panel
-    roi_path = os.path.join(SYMBOLS_PKL_DIR,
-                            'TAIEX_2005_largest50cap_panel.pkl')
-    if not os.path.exists(roi_path):
-        raise ValueError("{} roi panel does not exist.".format(roi_path))
-
     param = "{}_{}_m{}".format(
         START_DATE.strftime("%Y%m%d"), END_DATE.strftime("%Y%m%d"),
         n_stock)
 
     symbols = EXP_SYMBOLS[:n_stock]
     n_stock = len(symbols)
-    # shape: (n_period, n_stock, {'simple_roi', 'close_price'})
-    roi_panel = pd.read_pickle(roi_path)
 
-    # shape: (n_period, n_stock)
-    exp_risk_rois = roi_panel.loc[START_DATE:END_DATE, symbols,
-                    'simple_roi'].T
+    # read rois from the data store, shape: (n_period, n_stock)
+    exp_risk_rois = load_roi_df(symbols, START_DATE, END_DATE)
     n_exp_period = exp_risk_rois.shape[0]
     exp_risk_free_rois = pd.Series(np.zeros(n_exp_period),
                                    index=exp_risk_rois.index)
@@ -957,7 +1012,7 @@ def run_best_ms_simulation(n_stock ,verbose=False):
         os.makedirs(file_dir)
 
     pd.to_pickle(reports, os.path.join(file_dir, file_name))
-    print ("best_ms {} OK, {:.3f} secs".format(param, time()-t0))
+    logger.info("best_ms {} OK, {:.3f} secs".format(param, time()-t0))
 
 
 if __name__ == '__main__':
@@ -991,7 +1046,7 @@ if __name__ == '__main__':
                                        alpha=0.65,
                                        start_date=date(2005, 1, 3),
                                        end_date=date(2005, 1, 31),
-                                       solver_io="lp",
+                                       solver_io=None,
                                        keepfiles=False)
 
     # analysis_results("min_cvar_sp", 5, 50, n_scenario=200,
@@ -18,6 +18,10 @@ from exp_cvar import (run_min_cvar_sip_simulation, run_min_cvar_sp_simulation,
                   run_min_cvar_eevip_simulation,
                   run_min_ms_cvar_avgsp_simulation,
                   run_min_ms_cvar_eventsp_simulation,)
+from log_utils import (get_logger, add_logging_arguments,
+                       configure_logging_from_args)
+
+logger = get_logger('gen_results')
 
 def get_results_dir(prob_type):
     """
@@ -56,13 +60,8 @@ def all_experiment_parameters(prob_type, max_scenario_cnts):
 
     for n_stock in xrange(5, 50 + 5, 5):
         for win_length in xrange(50, 240 + 10, 10):
-            if prob_type in ( "min_cvar_sp", "min_cvar_sp2", 'min_cvar_eev',
-                              "min_ms_cvar_sp", "min_ms_cvar_avgsp"):
-                if n_stock == 50 and win_length == 50:
-                    # preclude m50_w50
-                    continue
-            elif prob_type in ("min_cvar_sip", "min_cvar_sip2",
-                               "min_cvar_eevip", "min_ms_cvar_sip"):
+            if prob_type in ("min_cvar_sip", "min_cvar_sip2",
+                             "min_cvar_eevip", "min_ms_cvar_sip"):
                 # because the candidate set is 50, therefore all
                 # experiments of windows length = 50 is excluded.
                 if win_length == 50:
@@ -184,7 +183,7 @@ def checking_working_parameters(prob_type, max_scenario_cnts):
     file_path = os.path.join(dir_path, log_file)
     if not os.path.exists(file_path):
         # no working parameters
-        print ("{} no working log file.".format(prob_type))
+        logger.info("{} no working log file.".format(prob_type))
         return all_params
 
     data = retry_read_pickle(file_path)
@@ -197,9 +196,9 @@ def checking_working_parameters(prob_type, max_scenario_cnts):
 
         if param in all_params:
             all_params.remove(param)
-            print ("working {}: {} is running on {}.".format(
+            logger.debug("working {}: {} is running on {}.".format(
                 prob_type, param, node))
-    print ("{} running parameters.".format(len(data)))
+    logger.info("{} running parameters.".format(len(data)))
 
     # unfinished params
     return all_params
@@ -214,7 +213,7 @@ def retry_read_pickle(file_path, retry_cnt=10):
             if retry == retry_cnt -1:
                 raise Exception(e)
             else:
-                print ("dispatch: reading retry: {}, {}".format(
+                logger.warning("dispatch: reading retry: {}, {}".format(
                     retry+1, e))
                 time.sleep(np.random.rand() * 10)
 
@@ -227,7 +226,7 @@ def retry_write_pickle(data, file_path, retry_cnt=10):
             if retry == retry_cnt -1:
                 raise Exception(e)
             else:
-                print ("dispatch:writing retry: {}, {}".format(
+                logger.warning("dispatch:writing retry: {}, {}".format(
                     retry+1, e))
                 time.sleep(np.random.rand() * 10)
 
@@ -235,6 +234,8 @@ def dispatch_experiment_parameters(prob_type, max_scenario_cnts):
 
     dir_path = get_results_dir(prob_type)
 
+    ensure_dir(dir_path)
+
     # storing a dict, {key: param, value: platform_name}
     log_file = '{}_working.pkl'.format(prob_type)
 
@@ -245,7 +246,7 @@ def dispatch_experiment_parameters(prob_type, max_scenario_cnts):
     params2 = checking_working_parameters(prob_type, max_scenario_cnts)
     unfinished_params = params1.intersection(params2)
 
-    print ("dispatch: {}, #. unfinished parameters: {}".format(
+    logger.info("dispatch: {}, #. unfinished parameters: {}".format(
         prob_type, len(unfinished_params)))
 
     while len(unfinished_params) > 0:
@@ -254,12 +255,13 @@ def dispatch_experiment_parameters(prob_type, max_scenario_cnts):
         params2 = checking_working_parameters(prob_type, max_scenario_cnts)
         unfinished_params = params1.intersection(params2)
 
-        print ("dispatch: {},  current #. of unfinished parameters: {}".format(
+        logger.info("dispatch: {},  current #. of unfinished parameters: "
+                    "{}".format(
             prob_type, len(unfinished_params)))
 
         if len(unfinished_params) <= 100:
             for u_param in unfinished_params:
-                print ("unfinished: {}".format(u_param))
+                logger.debug("unfinished: {}".format(u_param))
 
         param = unfinished_params.pop()
         n_stock, win_length, n_scenario, bias, cnt, alpha = param
@@ -321,16 +323,16 @@ def dispatch_experiment_parameters(prob_type, max_scenario_cnts):
                                 n_scenario, bias, cnt, alpha)
             elif prob_type == "min_ms_cvar_eventsp":
                 run_min_ms_cvar_eventsp_simulation(n_stock, win_length,
-                                      n_scenario, bias, cnt, alpha,
-                                                   solver_io="lp")
+                                      n_scenario, bias, cnt, alpha)
         except Exception as e:
-            print ("dispatch: run experiment:", param, e)
+            logger.error("dispatch: run experiment: {}, {}".format(param, e))
         finally:
             working_dict = retry_read_pickle(log_path)
             if param_key in working_dict.keys():
                 del working_dict[param_key]
             else:
-                print ("dispatch: can't find {} in working dict.".format(
+                logger.warning("dispatch: can't find {} in working "
+                               "dict.".format(
                     param_key))
             retry_write_pickle(working_dict, log_path)
 
@@ -339,5 +341,7 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument("-t", "--prob_type", required=True, type=str)
     parser.add_argument("-c", "--max_scenario_cnt", required=True, type=int)
+    add_logging_arguments(parser)
     args = parser.parse_args()
+    configure_logging_from_args(args)
     dispatch_experiment_parameters(args.prob_type, args.max_scenario_cnt)
\ No newline at end of file
@@ -10,11 +10,23 @@ from datetime import date
 import time
 import glob
 import os
+from collections import defaultdict
+import multiprocessing as mp
+from multiprocessing import Pool
 from PySPPortfolio.pysp_portfolio import *
 from exp_cvar import (run_min_ms_cvar_eventsp_simulation,
                       run_min_cvar_sp2_yearly_simulation,
                       run_min_cvar_sip2_yearly_simulation)
 from gen_results import (retry_read_pickle, retry_write_pickle)
+from min_wcvar_sp import (load_scenario_mmap,)
+from log_utils import (get_logger, add_logging_arguments,
+                       configure_logging_from_args, ProgressLogger)
+
+logger = get_logger('gen_results_year')
+
+# the scenario store shared by the yearly simulations in a worker process,
+# set by _init_yearly_worker
+_YEARLY_DATA = {}
 
 
 def get_results_dir(prob_type):
@@ -161,7 +173,7 @@ def checking_working_parameters(prob_type, max_scenario_cnts, retry_cnt=5):
     file_path = os.path.join(dir_path, log_file)
     if not os.path.exists(file_path):
         # no working parameters
-        print ("{} no working log file.".format(prob_type))
+        logger.info("{} no working log file.".format(prob_type))
         return all_params
 
     data = retry_read_pickle(file_path)
@@ -176,9 +188,9 @@ def checking_working_parameters(prob_type, max_scenario_cnts, retry_cnt=5):
                  date(*map(lambda x: int(x), keys[7].split('-'))))
         if param in all_params:
             all_params.remove(param)
-            print ("working {}: {} is running on {}.".format(
+            logger.debug("working {}: {} is running on {}.".format(
                 prob_type, param, node))
-    print ("#. of running parameters: {}".format(len(data)))
+    logger.info("#. of running parameters: {}".format(len(data)))
 
     # unfinished params
     return all_params
@@ -187,6 +199,8 @@ def checking_working_parameters(prob_type, max_scenario_cnts, retry_cnt=5):
 def dispatch_experiment_parameters(prob_type, max_scenario_cnts):
     dir_path = get_results_dir(prob_type)
 
+    ensure_dir(dir_path)
+
     # storing a dict, {key: param, value: platform_name}
     log_file = '{}_working.pkl'.format(prob_type)
 
@@ -196,7 +210,7 @@ def dispatch_experiment_parameters(prob_type, max_scenario_cnts):
     params2 = checking_working_parameters(prob_type, max_scenario_cnts)
     unfinished_params = params1.intersection(params2)
 
-    print ("dispatch: {}, #. unfinished parameters: {}".format(
+    logger.info("dispatch: {}, #. unfinished parameters: {}".format(
         prob_type, len(unfinished_params)))
 
     while len(unfinished_params) > 0:
@@ -205,7 +219,8 @@ def dispatch_experiment_parameters(prob_type, max_scenario_cnts):
         params2 = checking_working_parameters(prob_type, max_scenario_cnts)
         unfinished_params = params1.intersection(params2)
 
-        print ("dispatch: {}, current #. of unfinished parameters: {}".format(
+        logger.info("dispatch: {}, current #. of unfinished parameters: "
+                    "{}".format(
             prob_type, len(unfinished_params)))
 
         # if len(unfinished_params) <= 100:
@@ -233,8 +248,7 @@ def dispatch_experiment_parameters(prob_type, max_scenario_cnts):
             if prob_type == "min_ms_cvar_eventsp":
                 run_min_ms_cvar_eventsp_simulation(
                     n_stock, win_length, n_scenario, bias, cnt, alpha,
-                    start_date=start_date, end_date=end_date,
-                    solver_io='lp')
+                    start_date=start_date, end_date=end_date)
             elif prob_type == "min_cvar_sp2_yearly":
                 run_min_cvar_sp2_yearly_simulation(
                     n_stock, win_length, n_scenario, bias, cnt, alpha,
@@ -246,17 +260,224 @@ def dispatch_experiment_parameters(prob_type, max_scenario_cnts):
                     start_date=start_date, end_date=end_date,
                 )
         except Exception as e:
-            print ("dispatch: run experiment:", param, e)
+            logger.error("dispatch: run experiment: {}, {}".format(param, e))
         finally:
             working_dict = retry_read_pickle(log_path)
             if param_key in working_dict.keys():
                 del working_dict[param_key]
             else:
-                print ("dispatch: can't find {} in working dict.".format(
+                logger.warning("dispatch: can't find {} in working "
+                               "dict.".format(
                     param_key))
             retry_write_pickle(working_dict, log_path)
 
 
+def _init_yearly_worker(data):
+    """
+    initializer of the worker processes, the memory-mapped scenarios are
+    inherited by the forked processes, and the pages are shared by the
+    page cache of the OS.
+    """
+    _YEARLY_DATA.clear()
+    _YEARLY_DATA.update(data)
+
+
+def _run_sp2_yearly_task(task):
+    """ a yearly simulation of (alpha, start_date, end_date) """
+    alpha, start_date, end_date = task
+    data = _YEARLY_DATA
+    try:
+        run_min_cvar_sp2_yearly_simulation(
+            data['n_stock'], data['win_length'], data['n_scenario'],
+            data['bias'], data['scenario_cnt'], alpha,
+            start_date=start_date, end_date=end_date,
+            scenarios=data['scenarios'])
+    except Exception as e:
+        logger.error("yearly: run experiment: {}, {}".format(task, e))
+        return task, False
+    return task, True
+
+
+def _run_sp2_yearly_tasks(n_stock, win_length, n_scenario, bias,
+                          scenario_cnt, tasks, n_process=None):
+    """
+    the yearly simulations of a scenario store
+
+    Parameters:
+    ------------------
+    tasks: list of tuple, (alpha, start_date, end_date)
+    n_process: integer or None, size of process pool, None for cpu_count
+
+    Returns:
+    ------------------
+    list of tuple, the failed tasks
+    """
+    t0 = time.time()
+    if n_process is None:
+        n_process = mp.cpu_count()
+    n_process = max(1, min(int(n_process), len(tasks)))
+
+    # the store is opened once, the scenarios of each year are a view
+    data = {
+        'n_stock': n_stock,
+        'win_length': win_length,
+        'n_scenario': n_scenario,
+        'bias': bias,
+        'scenario_cnt': scenario_cnt,
+        'scenarios': load_scenario_mmap(n_stock, win_length, n_scenario,
+                                        bias, scenario_cnt),
+    }
+    param = "m{}_w{}_s{}_{}_{}".format(
+        n_stock, win_length, n_scenario, "biased" if bias else "unbiased",
+        scenario_cnt)
+
+    failed = []
+    progress = ProgressLogger(logger, len(tasks))
+    if n_process == 1:
+        _init_yearly_worker(data)
+        results = (_run_sp2_yearly_task(task) for task in tasks)
+        pool = None
+    else:
+        pool = Pool(n_process, initializer=_init_yearly_worker,
+                    initargs=(data,))
+        results = pool.imap_unordered(_run_sp2_yearly_task, tasks)
+
+    try:
+        for done, (task, success) in enumerate(results, 1):
+            if not success:
+                failed.append(task)
+            progress.update(done, "yearly {}: a{:.2f} {}-{} {}", param,
+                            task[0], task[1].strftime("%Y%m%d"),
+                            task[2].strftime("%Y%m%d"),
+                            "OK" if success else "failed")
+    except BaseException:
+        # terminating the workers of an interrupted dispatch
+        if pool is not None:
+            pool.terminate()
+        raise
+    else:
+        if pool is not None:
+            pool.close()
+    finally:
+        if pool is not None:
+            pool.join()
+
+    logger.info("yearly {}: {} simulations, {} failed, {} processes, "
+                "{:.3f} secs".format(param, len(tasks), len(failed),
+                                     n_process, time.time() - t0))
+    return failed
+
+
+def run_min_cvar_sp2_yearly_simulations(n_stock, win_length, n_scenario=200,
+                                        bias=False, scenario_cnt=1,
+                                        alphas=(0.95,), year_pairs=None,
+                                        n_process=None):
+    """
+    the yearly 2nd stage SP simulations of the alphas, the reports are the
+    same as those of run_min_cvar_sp2_yearly_simulation.
+
+    the scenario store of the parameters is opened once as a memory-mapped
+    array, the scenarios of each year are a view of it instead of reading
+    the 10-year scenario panel in each simulation, and the simulations are
+    run concurrently by a process pool.
+
+    Parameters:
+    ------------------
+    n_stock: integer, number of stocks of the EXP_SYMBOLS to the portfolios
+    win_length: integer, number of periods for estimating scenarios
+    n_scenario, int, number of scenarios
+    bias: bool, biased moment estimators or not
+    scenario_cnt: count of generated scenarios
+    alphas: list of float, for conditional risk
+    year_pairs: list of (start_date, end_date), None for get_year_pairs
+    n_process: integer or None, size of process pool, None for cpu_count
+
+    Returns:
+    ------------------
+    list of tuple, (alpha, start_date, end_date) of the failed simulations
+    """
+    if year_pairs is None:
+        year_pairs = get_year_pairs()
+    tasks = [(float(alpha), start_date, end_date)
+             for alpha in alphas
+             for start_date, end_date in year_pairs]
+    return _run_sp2_yearly_tasks(int(n_stock), int(win_length),
+                                 int(n_scenario), bias, int(scenario_cnt),
+                                 tasks, n_process)
+
+
+def dispatch_yearly_experiment_parameters(max_scenario_cnts, n_process=None):
+    """
+    dispatching the unfinished min_cvar_sp2_yearly parameters, the
+    parameters of a scenario store are run together by
+    _run_sp2_yearly_tasks. a scenario store with failed simulations is not
+    dispatched again in this run.
+    """
+    prob_type = "min_cvar_sp2_yearly"
+    dir_path = get_results_dir(prob_type)
+    ensure_dir(dir_path)
+    log_path = os.path.join(dir_path, '{}_working.pkl'.format(prob_type))
+    # the scenario stores of the failed simulations in this run
+    failed_keys = set()
+
+    while True:
+        params1 = checking_finished_parameters(prob_type, max_scenario_cnts)
+        params2 = checking_working_parameters(prob_type, max_scenario_cnts)
+        unfinished_params = params1.intersection(params2)
+        logger.info("dispatch: {}, current #. of unfinished parameters: "
+                    "{}".format(prob_type, len(unfinished_params)))
+        if len(unfinished_params) == 0:
+            break
+
+        # {(n_stock, win_length, n_scenario, bias, cnt): parameters}
+        groups = defaultdict(list)
+        for param in unfinished_params:
+            if param[:5] not in failed_keys:
+                groups[param[:5]].append(param)
+        if len(groups) == 0:
+            logger.error("dispatch: {}, only the failed scenario stores "
+                         "remain: {}".format(prob_type, sorted(failed_keys)))
+            break
+        store_key = sorted(groups.keys())[0]
+        params = sorted(groups[store_key])
+
+        # log parameters to file
+        if not os.path.exists(log_path):
+            working_dict = {}
+        else:
+            working_dict = retry_read_pickle(log_path)
+        param_keys = ["|".join(str(v) for v in param) for param in params]
+        for param_key in param_keys:
+            working_dict[param_key] = platform.node()
+        retry_write_pickle(working_dict, log_path)
+
+        n_stock, win_length, n_scenario, bias, cnt = store_key
+        tasks = [(float(alpha), start_date, end_date)
+                 for _, _, _, _, _, alpha, start_date, end_date in params]
+        try:
+            failed = _run_sp2_yearly_tasks(n_stock, win_length, n_scenario,
+                                           bias == "biased", cnt, tasks,
+                                           n_process)
+        except Exception as e:
+            logger.error("dispatch: run experiment: {}, {}".format(
+                store_key, e))
+            failed_keys.add(store_key)
+        else:
+            if len(failed) > 0:
+                logger.error("dispatch: {} failed simulations of {}".format(
+                    len(failed), store_key))
+                failed_keys.add(store_key)
+        finally:
+            working_dict = retry_read_pickle(log_path)
+            for param_key in param_keys:
+                if param_key in working_dict.keys():
+                    del working_dict[param_key]
+                else:
+                    logger.warning("dispatch: can't find {} in working "
+                                   "dict.".format(param_key))
+            retry_write_pickle(working_dict, log_path)
+
+
 if __name__ == '__main__':
     # print get_year_pairs()
     # print len(all_experiment_parameters("min_ms_cvar_eventsp", 1))
@@ -266,5 +487,14 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument("-t", "--prob_type", required=True, type=str)
     parser.add_argument("-c", "--max_scenario_cnt", required=True, type=int)
+    parser.add_argument("-p", "--n_process", default=None, type=int,
+                        help="running the yearly simulations of a scenario "
+                             "store concurrently by the process pool")
+    add_logging_arguments(parser)
     args = parser.parse_args()
-    dispatch_experiment_parameters(args.prob_type, args.max_scenario_cnt)
+    configure_logging_from_args(args)
+    if args.n_process is not None and args.prob_type == "min_cvar_sp2_yearly":
+        dispatch_yearly_experiment_parameters(args.max_scenario_cnt,
+                                              args.n_process)
+    else:
+        dispatch_experiment_parameters(args.prob_type, args.max_scenario_cnt)
@@ -12,6 +12,10 @@ import glob
 import os
 from PySPPortfolio.pysp_portfolio import *
 from PySPPortfolio.pysp_portfolio.etl import generating_scenarios
+from log_utils import (get_logger, add_logging_arguments,
+                       configure_logging_from_args)
+
+logger = get_logger('gen_scenarios')
 
 
 def all_parameters_combination_name(bias_estimator=False):
@@ -39,10 +43,6 @@ def all_parameters_combination_name(bias_estimator=False):
                   for win_length in xrange(50, 240 + 10, 10)
                   for n_stock in xrange(5, 50 + 5, 5)
                   ]
-    # preclude m50_w50
-    for cnt in xrange(1, MAX_SCENARIO_FILE_CNT+1):
-        all_params.remove('20050103_20141231_m50_w50_s200_{}_{}'.format(
-            bias, cnt))
     return set(all_params)
 
 def checking_generated_scenarios(scenario_path=None, bias_estimator=False):
@@ -96,15 +96,16 @@ def checking_working_parameters(scenario_path=None, log_file=None,
             if retry == retry_count-1:
                 raise Exception(e)
             else:
-                print ("check working retry: {}, {}".format(retry+1, e))
+                logger.warning("check working retry: {}, {}".format(
+                    retry+1, e))
                 time.sleep(np.random.rand()*5)
 
     for param, node in data.items():
         if param in all_params:
             all_params.remove(param)
-            print ("{} under processing on {}.".format(param, node))
+            logger.debug("{} under processing on {}.".format(param, node))
         else:
-            print ("{} not in exp parameters.".format(param))
+            logger.info("{} not in exp parameters.".format(param))
 
     # unfinished params
     return all_params
@@ -115,6 +116,7 @@ def dispatch_scenario_parameters(scenario_path=None, log_file=None,
 
     if scenario_path is None:
         scenario_path = EXP_SCENARIO_DIR
+    ensure_dir(scenario_path)
 
     # storing a dict, {key: param, value: platform_name}
     if log_file is None:
@@ -128,7 +130,7 @@ def dispatch_scenario_parameters(scenario_path=None, log_file=None,
     unfinished_params = params1.intersection(params2)
 
     retry_count = 5
-    print ("initial unfinished params: {}".format(len(unfinished_params)))
+    logger.info("initial unfinished params: {}".format(len(unfinished_params)))
 
     while len(unfinished_params) > 0:
         # each loop we have to
@@ -137,10 +139,11 @@ def dispatch_scenario_parameters(scenario_path=None, log_file=None,
                                               bias_estimator)
         unfinished_params = params1.intersection(params2)
 
-        print ("current unfinished params: {}".format(len(unfinished_params)))
+        logger.info("current unfinished params: {}".format(
+            len(unfinished_params)))
         if len(unfinished_params) <= 100:
             for u_param in unfinished_params:
-                print ("unfinished: {}".format(u_param))
+                logger.debug("unfinished: {}".format(u_param))
 
         param = unfinished_params.pop()
         _, _, stock, win, scenario, biased, _ = param.split('_')
@@ -161,7 +164,8 @@ def dispatch_scenario_parameters(scenario_path=None, log_file=None,
                     if retry == retry_count-1:
                         raise Exception(e)
                     else:
-                        print ("working retry: {}, {}".format(retry+1, e))
+                        logger.warning("working retry: {}, {}".format(
+                            retry+1, e))
                         time.sleep(np.random.rand()*5)
 
         working_dict[param] = platform.node()
@@ -173,15 +177,16 @@ def dispatch_scenario_parameters(scenario_path=None, log_file=None,
                 if retry == retry_count-1:
                     raise Exception(e)
                 else:
-                    print ("working retry: {}, {}".format(retry+1, e))
+                    logger.warning("working retry: {}, {}".format(
+                        retry+1, e))
                     time.sleep(np.random.rand()*5)
 
         # generating scenarios
         try:
-            print ("gen scenario: {}".format(param))
+            logger.info("gen scenario: {}".format(param))
             generating_scenarios(n_stock, win_length, n_scenario, bias)
         except Exception as e:
-            print param, e
+            logger.error("{}, {}".format(param, e))
         finally:
             for retry in xrange(retry_count):
                 try:
@@ -191,13 +196,14 @@ def dispatch_scenario_parameters(scenario_path=None, log_file=None,
                     if retry == retry_count-1:
                         raise Exception(e)
                     else:
-                        print ("working retry: {}, {}".format(retry+1, e))
+                        logger.warning("working retry: {}, {}".format(
+                            retry+1, e))
                         time.sleep(np.random.rand()*5)
 
             if param in working_dict.keys():
                 del working_dict[param]
             else:
-                print ("can't find {} in working dict.".format(param))
+                logger.warning("can't find {} in working dict.".format(param))
             for retry in xrange(retry_count):
                 try:
                     # preventing multi-process write file at the same time
@@ -206,7 +212,8 @@ def dispatch_scenario_parameters(scenario_path=None, log_file=None,
                     if retry == retry_count-1:
                         raise Exception(e)
                     else:
-                        print ("finally retry: {}, {}".format(retry+1, e))
+                        logger.warning("finally retry: {}, {}".format(
+                            retry+1, e))
                         time.sleep(2)
 
 
@@ -216,11 +223,11 @@ def read_working_parameters():
     file_path = os.path.join(scenario_path, log_file)
 
     if not os.path.exists(file_path):
-        print ("{} not exists.".format(file_path))
+        logger.warning("{} not exists.".format(file_path))
     else:
         working_dict = pd.read_pickle(file_path)
         for param, node in working_dict.items():
-            print param, node
+            logger.info("{} {}".format(param, node))
 
 if __name__ == '__main__':
     import argparse
@@ -229,7 +236,9 @@ if __name__ == '__main__':
     group = parser.add_mutually_exclusive_group()
     group.add_argument("-b", "--bias", action='store_true')
     group.add_argument("-u", "--unbias", action='store_true')
+    add_logging_arguments(parser)
     args = parser.parse_args()
+    configure_logging_from_args(args)
     if args.bias:
         dispatch_scenario_parameters(bias_estimator=True)
     elif args.unbias:
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+Authors: Hung-Hsin Chen <chenhh@par.cse.nsysu.edu.tw>
+License: GPL v2
+
+logging of the package.
+
+the modules log to the children of the 'pysp_portfolio' logger, which
+only has a NullHandler until configure_logging is called, e.g.
+
+    configure_logging('INFO', json_path='run.jsonl', quiet=True)
+
+    - the stream handler writes the text records to stdout, quiet mode
+      only writes the warnings and errors
+    - the json handler appends a JSON object per record, the structured
+      data of a record is passed by extra={'data': {...}}
+
+the per-period messages of the simulations are logged by ProgressLogger,
+which emits at most a record per progress interval (the first and the
+last periods are always emitted), the other records are in DEBUG level.
+"""
+
+from __future__ import division
+import json
+import logging
+import sys
+from time import time
+
+LOGGER_NAME = 'pysp_portfolio'
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+# seconds between two progress records
+DEFAULT_PROGRESS_INTERVAL = 10.
+_progress_interval = DEFAULT_PROGRESS_INTERVAL
+
+logging.getLogger(LOGGER_NAME).addHandler(logging.NullHandler())
+
+
+def get_logger(name=None):
+    """ the package logger, or its child of the name """
+    if name is None:
+        return logging.getLogger(LOGGER_NAME)
+    return logging.getLogger("{}.{}".format(LOGGER_NAME, name))
+
+
+class JSONLinesFormatter(logging.Formatter):
+    """ a JSON object per record """
+
+    def format(self, record):
+        entry = {
+            'time': record.created,
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        data = getattr(record, 'data', None)
+        if data:
+            entry['data'] = data
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, sort_keys=True)
+
+
+def configure_logging(level='INFO', json_path=None, quiet=False,
+                      stream=None, progress_interval=None):
+    """
+    setting the handlers of the package logger, the handlers set by the
+    former call are removed.
+
+    Parameters:
+    ------------------
+    level: string or integer, level of the records
+    json_path: string or None, path of the JSON-lines file, the records
+        are appended to the file
+    quiet: boolean, the stream handler only writes the warnings and errors
+    stream: file object, default is sys.stdout
+    progress_interval: float or None, seconds between two progress
+        records, None for the current interval
+
+    Returns:
+    ------------------
+    logging.Logger, the package logger
+    """
+    global _progress_interval
+    if isinstance(level, basestring):
+        level = getattr(logging, level.upper())
+    if progress_interval is not None:
+        _progress_interval = float(progress_interval)
+
+    logger = get_logger()
+    for handler in list(logger.handlers):
+        if getattr(handler, '_pysp_handler', False):
+            logger.removeHandler(handler)
+            handler.close()
+
+    handler = logging.StreamHandler(sys.stdout if stream is None else stream)
+    handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+    handler.setLevel(max(level, logging.WARNING) if quiet else level)
+    handler._pysp_handler = True
+    logger.addHandler(handler)
+
+    if json_path is not None:
+        handler = logging.FileHandler(json_path, mode='a')
+        handler.setFormatter(JSONLinesFormatter())
+        handler.setLevel(level)
+        handler._pysp_handler = True
+        logger.addHandler(handler)
+
+    logger.setLevel(level)
+    # the records are not written again by the handlers of the root logger
+    logger.propagate = False
+    return logger
+
+
+def add_logging_arguments(parser):
+    """ the logging arguments of the command line scripts """
+    parser.add_argument("--log_level", default='INFO', type=str)
+    parser.add_argument("--log_json", default=None, type=str,
+                        help="path of the JSON-lines log file")
+    parser.add_argument("-q", "--quiet", action='store_true')
+    parser.add_argument("--progress_interval", default=None, type=float,
+                        help="seconds between two progress records")
+    return parser
+
+
+def configure_logging_from_args(args):
+    return configure_logging(args.log_level, args.log_json, args.quiet,
+                             progress_interval=args.progress_interval)
+
+
+class ProgressLogger(object):
+    """
+    rate-limited progress records of a loop of total steps
+    """
+
+    def __init__(self, logger, total, interval=None, level=logging.INFO):
+        """
+        Parameters:
+        ------------------
+        logger: logging.Logger
+        total: integer, number of steps
+        interval: float or None, seconds between two records, None for the
+            interval of configure_logging
+        level: integer, level of the emitted records
+        """
+        self.logger = logger
+        self.total = total
+        self.interval = interval
+        self.level = level
+        self._last = None
+
+    def update(self, done, message, *args, **data):
+        """
+        Parameters:
+        ------------------
+        done: integer, number of finished steps
+        message: string, formatted by str.format(*args) only if the record
+            is emitted
+        data: the structured data of the record
+        """
+        now = time()
+        interval = (_progress_interval if self.interval is None
+                    else self.interval)
+        if (self._last is None or done >= self.total or
+                now - self._last >= interval):
+            level = self.level
+            self._last = now
+        elif self.logger.isEnabledFor(logging.DEBUG):
+            level = logging.DEBUG
+        else:
+            return
+        if self.logger.isEnabledFor(level):
+            data.update(done=done, total=self.total)
+            self.logger.log(level, "[{}/{}] {}".format(
+                done, self.total, message.format(*args)),
+                extra={'data': data})
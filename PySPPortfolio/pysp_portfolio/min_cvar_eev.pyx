@@ -21,11 +21,16 @@ from pyomo.environ import *
 from PySPPortfolio.pysp_portfolio import *
 from scenario.c_moment_matching import heuristic_moment_matching
 from min_cvar_sp import (MinCVaRSPPortfolio, )
+from stage_timer import (NULL_TIMER,)
+from solvers import (solve_model,)
+from log_utils import (get_logger,)
 
 cimport numpy as cnp
 ctypedef cnp.float64_t FLOAT_t
 ctypedef cnp.intp_t INTP_t
 
+logger = get_logger('min_cvar_eev')
+
 def min_cvar_eev_portfolio(symbols,
                           cnp.ndarray[FLOAT_t, ndim=1] risk_rois,
                           double risk_free_roi,
@@ -39,6 +44,8 @@ def min_cvar_eev_portfolio(symbols,
                           int n_scenario,
                           str solver=DEFAULT_SOLVER,
                           int verbose=False,
+                          timer=None,
+                          solver_io=None,
                           ):
     """
     given mean scenario vector, solve the first-stage buy and sell amounts
@@ -57,9 +64,16 @@ def min_cvar_eev_portfolio(symbols,
     predict_risk_free_roi: float
     n_scenario: 1
     solver: str, supported by Pyomo
+    timer: stage_timer.StageTimer or None, timing the stages of the model
+    solver_io: string or None, the interface of the solver, None for the
+        in-process interface with the fallback to the file interface
     """
     t0 = time()
 
+    if timer is None:
+        timer = NULL_TIMER
+    timer.mark()
+
     # Model
     instance = ConcreteModel()
 
@@ -147,9 +161,8 @@ def min_cvar_eev_portfolio(symbols,
                                         sense=maximize)
 
     # 1st-stage solve
-    opt = SolverFactory(solver)
-    results = opt.solve(instance)
-    instance.solutions.load_from(results)
+    timer.lap('build')
+    results = solve_model(instance, solver, timer, solver_io)
 
     if verbose:
         display(instance)
@@ -212,7 +225,8 @@ def min_cvar_eev_portfolio(symbols,
         # estimated_eev_cvar_arr[sdx] = instance.cvar_objective()
 
     if verbose:
-        print "min_cvar_eev_portfolio OK, {:.3f} secs".format(time() - t0)
+        logger.info("min_cvar_eev_portfolio OK, {:.3f} secs".format(
+            time() - t0))
 
     return {
         "buy_amounts": buy_amounts,
@@ -226,6 +240,8 @@ class MinCVaREEVPortfolio(MinCVaRSPPortfolio):
     """
     expected of expected value (EEV) model
     """
+    checkpoint_attrs = ('var_arr', 'cvar_arr', 'eev_cvar_arr')
+
     def __init__(self, symbols, risk_rois, risk_free_rois,
                  initial_risk_wealth,
                  double initial_risk_free_wealth,
@@ -237,13 +253,14 @@ class MinCVaREEVPortfolio(MinCVaRSPPortfolio):
                  bias=BIAS_ESTIMATOR,
                  double alpha=0.95,
                  int scenario_cnt=1,
-                 verbose=False):
+                 verbose=False,
+                 solver_io=None):
 
         super(MinCVaREEVPortfolio, self).__init__(
             symbols, risk_rois, risk_free_rois, initial_risk_wealth,
             initial_risk_free_wealth, buy_trans_fee, sell_trans_fee,
             start_date, end_date, window_length, n_scenario, bias,
-            alpha, scenario_cnt, verbose)
+            alpha, scenario_cnt, verbose, solver_io=solver_io)
 
         self.eev_cvar_arr = pd.Series(np.zeros(self.n_exp_period),
                                   index = self.exp_risk_rois.index)
@@ -294,5 +311,7 @@ class MinCVaREEVPortfolio(MinCVaRSPPortfolio):
             kwargs['estimated_risk_rois'].as_matrix(),
             kwargs['estimated_risk_free_roi'],
             self.n_scenario,
+            timer=self.timer,
+            solver_io=self.solver_io,
         )
         return results
@@ -21,11 +21,16 @@ from pyomo.environ import *
 from PySPPortfolio.pysp_portfolio import *
 from scenario.c_moment_matching import heuristic_moment_matching
 from min_cvar_sp import (MinCVaRSPPortfolio, )
+from stage_timer import (NULL_TIMER,)
+from solvers import (solve_model,)
+from log_utils import (get_logger,)
 
 cimport numpy as cnp
 ctypedef cnp.float64_t FLOAT_t
 ctypedef cnp.intp_t INTP_t
 
+logger = get_logger('min_cvar_eevip')
+
 def min_cvar_eevip_portfolio(symbols,
                           cnp.ndarray[FLOAT_t, ndim=1] risk_rois,
                           double risk_free_roi,
@@ -40,6 +45,8 @@ def min_cvar_eevip_portfolio(symbols,
                           int max_portfolio_size,
                           str solver=DEFAULT_SOLVER,
                           int verbose=False,
+                          timer=None,
+                          solver_io=None,
                           ):
     """
     given mean scenario vector, solve the first-stage buy and sell amounts
@@ -58,9 +65,16 @@ def min_cvar_eevip_portfolio(symbols,
     predict_risk_free_roi: float
     n_scenario: 1
     solver: str, supported by Pyomo
+    timer: stage_timer.StageTimer or None, timing the stages of the model
+    solver_io: string or None, the interface of the solver, None for the
+        in-process interface with the fallback to the file interface
     """
     t0 = time()
 
+    if timer is None:
+        timer = NULL_TIMER
+    timer.mark()
+
     # Model
     instance = ConcreteModel()
 
@@ -169,9 +183,8 @@ def min_cvar_eevip_portfolio(symbols,
                                         sense=maximize)
 
     # 1st-stage solve
-    opt = SolverFactory(solver)
-    results = opt.solve(instance)
-    instance.solutions.load_from(results)
+    timer.lap('build')
+    results = solve_model(instance, solver, timer, solver_io)
 
     if verbose:
         display(instance)
@@ -237,7 +250,8 @@ def min_cvar_eevip_portfolio(symbols,
         # estimated_eev_cvar_arr[sdx] = instance.cvar_objective()
 
     if verbose:
-        print "min_cvar_eevip_portfolio OK, {:.3f} secs".format(time() - t0)
+        logger.info("min_cvar_eevip_portfolio OK, {:.3f} secs".format(
+            time() - t0))
 
     return {
         "buy_amounts": buy_amounts,
@@ -252,6 +266,9 @@ class MinCVaREEVIPPortfolio(MinCVaRSPPortfolio):
     """
     expected of expected value (EEV) model
     """
+    checkpoint_attrs = ('var_arr', 'cvar_arr', 'eev_cvar_arr',
+                        'chosen_symbols_df')
+
     def __init__(self,  candidate_symbols,
                  int max_portfolio_size,
                  risk_rois, risk_free_rois,
@@ -266,6 +283,7 @@ class MinCVaREEVIPPortfolio(MinCVaRSPPortfolio):
                  double alpha=0.95,
                  int scenario_cnt=1,
                  verbose=False,
+                 solver_io=None,
                  ):
 
         self.max_portfolio_size = int(max_portfolio_size)
@@ -274,7 +292,7 @@ class MinCVaREEVIPPortfolio(MinCVaRSPPortfolio):
             candidate_symbols, risk_rois, risk_free_rois, initial_risk_wealth,
             initial_risk_free_wealth, buy_trans_fee, sell_trans_fee,
             start_date, end_date, window_length, n_scenario, bias,
-            alpha, scenario_cnt, verbose)
+            alpha, scenario_cnt, verbose, solver_io=solver_io)
 
         self.eev_cvar_arr = pd.Series(np.zeros(self.n_exp_period),
                                   index = self.exp_risk_rois.index)
@@ -333,5 +351,7 @@ class MinCVaREEVIPPortfolio(MinCVaRSPPortfolio):
             kwargs['estimated_risk_free_roi'],
             self.n_scenario,
             self.max_portfolio_size,
+            timer=self.timer,
+            solver_io=self.solver_io,
         )
         return results
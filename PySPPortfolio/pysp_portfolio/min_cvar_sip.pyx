@@ -19,12 +19,17 @@ import numpy as np
 import pandas as pd
 from pyomo.environ import *
 from min_cvar_sp import MinCVaRSPPortfolio
+from stage_timer import (NULL_TIMER,)
+from solvers import (solve_model,)
+from log_utils import (get_logger,)
 
 cimport numpy as cnp
 
 ctypedef cnp.float64_t FLOAT_t
 ctypedef cnp.intp_t INTP_t
 
+logger = get_logger('min_cvar_sip')
+
 def min_cvar_sip_portfolio(symbols,
                            cnp.ndarray[FLOAT_t, ndim=1] risk_rois,
                            double risk_free_roi,
@@ -39,7 +44,9 @@ def min_cvar_sip_portfolio(symbols,
                            int max_portfolio_size,
                            scenario_probs=None,
                            str solver=DEFAULT_SOLVER,
-                           int verbose=False):
+                           int verbose=False,
+                           timer=None,
+                           solver_io=None):
     """
     two stage minimize conditional value at risk stochastic programming
     portfolio
@@ -57,12 +64,19 @@ def min_cvar_sip_portfolio(symbols,
     n_scenario: integer
     scenario_probs: numpy.array, shape: (n_scenario,)
     solver: str, supported by Pyomo
+    timer: stage_timer.StageTimer or None, timing the stages of the model
+    solver_io: string or None, the interface of the solver, None for the
+        in-process interface with the fallback to the file interface
     :return:
     """
     t0 = time()
     if scenario_probs is None:
         scenario_probs = np.ones(n_scenario, dtype=np.float) / n_scenario
 
+    if timer is None:
+        timer = NULL_TIMER
+    timer.mark()
+
     # concrete model
     instance = ConcreteModel()
 
@@ -170,11 +184,8 @@ def min_cvar_sip_portfolio(symbols,
                                         sense=maximize)
 
     # solve
-    opt = SolverFactory(solver)
-    # if solver == "cplex":
-    #     opt.options["threads"] = 4
-    results = opt.solve(instance)
-    instance.solutions.load_from(results)
+    timer.lap('build')
+    results = solve_model(instance, solver, timer, solver_io)
     if verbose:
         display(instance)
 
@@ -192,7 +203,8 @@ def min_cvar_sip_portfolio(symbols,
     estimated_var = instance.Z.value
 
     if verbose:
-        print "min_cvar_sp_portfolio OK, {:.3f} secs".format(time() - t0)
+        logger.info("min_cvar_sp_portfolio OK, {:.3f} secs".format(
+            time() - t0))
 
     return {
         "buy_amounts": buy_amounts,
@@ -204,6 +216,8 @@ def min_cvar_sip_portfolio(symbols,
 
 
 class MinCVaRSIPPortfolio(MinCVaRSPPortfolio):
+    checkpoint_attrs = ('var_arr', 'cvar_arr', 'chosen_symbols_df')
+
     def __init__(self, candidate_symbols,
                  int max_portfolio_size, risk_rois,
                  risk_free_rois, initial_risk_wealth,
@@ -214,7 +228,7 @@ class MinCVaRSIPPortfolio(MinCVaRSPPortfolio):
                  int window_length=WINDOW_LENGTH,
                  int n_scenario=N_SCENARIO, bias=BIAS_ESTIMATOR,
                  float alpha=0.05,
-                 int scenario_cnt=1, verbose=False):
+                 int scenario_cnt=1, verbose=False, solver_io=None):
         """
         the n_stock in SIP model represents the size of candidate stocks,
         not the portfolio size.
@@ -237,7 +251,7 @@ class MinCVaRSIPPortfolio(MinCVaRSPPortfolio):
             candidate_symbols, risk_rois, risk_free_rois, initial_risk_wealth,
             initial_risk_free_wealth, buy_trans_fee, sell_trans_fee,
             start_date, end_date, window_length, n_scenario, bias,
-            alpha, scenario_cnt, verbose)
+            alpha, scenario_cnt, verbose, solver_io=solver_io)
 
         assert self.n_stock == 50
 
@@ -310,6 +324,8 @@ class MinCVaRSIPPortfolio(MinCVaRSPPortfolio):
             kwargs['estimated_risk_free_roi'],
             self.n_scenario,
             self.max_portfolio_size,
+            timer=self.timer,
+            solver_io=self.solver_io,
         )
         return results
 
@@ -328,7 +344,9 @@ def min_cvar_sip_portfolio2(symbols,
                            int max_portfolio_size,
                            scenario_probs=None,
                            str solver=DEFAULT_SOLVER,
-                           int verbose=False):
+                           int verbose=False,
+                           timer=None,
+                           solver_io=None):
     """
     two stage minimize conditional value at risk stochastic programming
     portfolio
@@ -346,12 +364,19 @@ def min_cvar_sip_portfolio2(symbols,
     n_scenario: integer
     scenario_probs: numpy.array, shape: (n_scenario,)
     solver: str, supported by Pyomo
+    timer: stage_timer.StageTimer or None, timing the stages of the model
+    solver_io: string or None, the interface of the solver, None for the
+        in-process interface with the fallback to the file interface
     :return:
     """
     t0 = time()
     if scenario_probs is None:
         scenario_probs = np.ones(n_scenario, dtype=np.float) / n_scenario
 
+    if timer is None:
+        timer = NULL_TIMER
+    timer.mark()
+
     # concrete model
     instance = ConcreteModel()
 
@@ -461,11 +486,8 @@ def min_cvar_sip_portfolio2(symbols,
                                         sense=maximize)
 
     # solve
-    opt = SolverFactory(solver)
-    # if solver == "cplex":
-    #     opt.options["threads"] = 4
-    results = opt.solve(instance)
-    instance.solutions.load_from(results)
+    timer.lap('build')
+    results = solve_model(instance, solver, timer, solver_io)
     if verbose:
         display(instance)
 
@@ -512,9 +534,8 @@ def min_cvar_sip_portfolio2(symbols,
                                         sense=maximize)
 
     # solve eev 1st stage
-    opt = SolverFactory(solver)
-    results = opt.solve(instance)
-    instance.solutions.load_from(results)
+    timer.lap('build')
+    results = solve_model(instance, solver, timer, solver_io)
 
     # value at risk (estimated)
     cdef double estimated_ev_var = instance.Z.value
@@ -549,7 +570,8 @@ def min_cvar_sip_portfolio2(symbols,
     vss = estimated_cvar - estimated_eev_cvar
 
     if verbose:
-        print "min_cvar_sip_portfolio OK, {:.3f} secs".format(time() - t0)
+        logger.info("min_cvar_sip_portfolio OK, {:.3f} secs".format(
+            time() - t0))
 
 
 
@@ -567,6 +589,10 @@ def min_cvar_sip_portfolio2(symbols,
 
 
 class MinCVaRSIPPortfolio2(MinCVaRSPPortfolio):
+    checkpoint_attrs = ('var_arr', 'cvar_arr', 'chosen_symbols_df',
+                        'ev_var_arr', 'ev_cvar_arr', 'eev_cvar_arr',
+                        'vss_arr')
+
     def __init__(self, candidate_symbols,
                  int max_portfolio_size, risk_rois,
                  risk_free_rois, initial_risk_wealth,
@@ -578,7 +604,7 @@ class MinCVaRSIPPortfolio2(MinCVaRSPPortfolio):
                  int window_length=WINDOW_LENGTH,
                  int n_scenario=N_SCENARIO, bias=BIAS_ESTIMATOR,
                  float alpha=0.05,
-                 int scenario_cnt=1, verbose=False):
+                 int scenario_cnt=1, verbose=False, solver_io=None):
         """
         the n_stock in SIP model represents the size of candidate stocks,
         not the portfolio size.
@@ -600,7 +626,7 @@ class MinCVaRSIPPortfolio2(MinCVaRSPPortfolio):
             candidate_symbols, risk_rois, risk_free_rois, initial_risk_wealth,
             initial_risk_free_wealth, buy_trans_fee, sell_trans_fee,
             start_date, end_date, window_length, n_scenario, bias,
-            alpha, scenario_cnt, verbose)
+            alpha, scenario_cnt, verbose, solver_io=solver_io)
         assert self.n_stock == 50
 
         # overwrite scenario panel, load 50 stocks
@@ -621,7 +647,7 @@ class MinCVaRSIPPortfolio2(MinCVaRSPPortfolio):
             if start_date != START_DATE or end_date != END_DATE:
                 self.scenario_panel = self.scenario_panel.loc[
                                       start_date:end_date]
-                print ("scenario panel dates:{}-{}".format(
+                logger.info("scenario panel dates:{}-{}".format(
                     self.scenario_panel.items[0],
                     self.scenario_panel.items[-1]))
             self.scenario_cnt = scenario_cnt
@@ -699,5 +725,7 @@ class MinCVaRSIPPortfolio2(MinCVaRSPPortfolio):
             kwargs['estimated_risk_free_roi'],
             self.n_scenario,
             self.max_portfolio_size,
+            timer=self.timer,
+            solver_io=self.solver_io,
         )
         return results
\ No newline at end of file
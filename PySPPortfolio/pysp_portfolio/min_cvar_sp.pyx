@@ -13,6 +13,7 @@ License: GPL v2
 from __future__ import division
 from time import time
 import os
+import logging
 import numpy as np
 import pandas as pd
 import scipy.stats as spstats
@@ -20,52 +21,31 @@ from pyomo.environ import *
 
 from PySPPortfolio.pysp_portfolio import *
 from scenario.c_moment_matching import heuristic_moment_matching
+from scenario.generators import (ScenarioSource, DEFAULT_SCENARIO_MODE)
 from base_model import (SPTradingPortfolio, )
+from utils import (evaluate_cvar, evaluate_cvars)
+from stage_timer import (NULL_TIMER,)
+from solvers import (solve_model,)
+from log_utils import (get_logger, ProgressLogger)
 
 cimport numpy as cnp
 ctypedef cnp.float64_t FLOAT_t
 ctypedef cnp.intp_t INTP_t
 
-def min_cvar_sp_portfolio(symbols,
-                          cnp.ndarray[FLOAT_t, ndim=1] risk_rois,
-                          double risk_free_roi,
-                          cnp.ndarray[FLOAT_t, ndim=1] allocated_risk_wealth,
-                          double allocated_risk_free_wealth,
-                          double buy_trans_fee,
-                          double sell_trans_fee,
-                          double alpha,
-                          cnp.ndarray[FLOAT_t, ndim=2] predict_risk_rois,
-                          double predict_risk_free_roi,
-                          int n_scenario,
-                          scenario_probs=None,
-                          str solver=DEFAULT_SOLVER,
-                          int verbose=False):
-    """
-    2nd-stage minimize conditional value at risk stochastic programming
-    portfolio.
-    It will be called in get_current_buy_sell_amounts function
+logger = get_logger('min_cvar_sp')
 
-    symbols: list of string
-    risk_rois: numpy.array, shape: (n_stock, )
-    risk_free_roi: float,
-    allocated_risk_wealth: numpy.array, shape: (n_stock,)
-    allocated_risk_free_wealth: float
-    buy_trans_fee: float
-    sell_trans_fee: float
-    alpha: float, 1-alpha is the significant level
-    predict_risk_ret: numpy.array, shape: (n_stock, n_scenario)
-    predict_risk_free_roi: float
-    n_scenario: integer
-    scenario_probs: numpy.array, shape: (n_scenario,)
-    solver: str, supported by Pyomo
+def build_min_cvar_sp_model(instance, risk_rois, double risk_free_roi,
+                            allocated_risk_wealth,
+                            double allocated_risk_free_wealth,
+                            double buy_trans_fee, double sell_trans_fee,
+                            double alpha, predict_risk_rois,
+                            double predict_risk_free_roi, int n_scenario,
+                            scenario_probs):
+    """
+    adding the variables, constraints and objective of the 2nd-stage min
+    CVaR SP to the model or a block of a model, the parameters are the same
+    as min_cvar_sp_portfolio.
     """
-    t0 = time()
-    if scenario_probs is None:
-        scenario_probs = np.ones(n_scenario, dtype=np.float) / n_scenario
-
-    # Model
-    instance = ConcreteModel()
-
     instance.scenario_probs = scenario_probs
     instance.risk_rois = risk_rois
     instance.risk_free_roi = risk_free_roi
@@ -77,7 +57,7 @@ def min_cvar_sp_portfolio(symbols,
     instance.predict_risk_rois = predict_risk_rois
     instance.predict_risk_free_roi = predict_risk_free_roi
 
-    cdef Py_ssize_t n_stock = len(symbols)
+    cdef Py_ssize_t n_stock = len(risk_rois)
     # Set
     instance.symbols = np.arange(n_stock)
     instance.scenarios = np.arange(n_scenario)
@@ -146,18 +126,85 @@ def min_cvar_sp_portfolio(symbols,
     instance.cvar_objective = Objective(rule=cvar_objective_rule,
                                         sense=maximize)
 
+
+def min_cvar_sp_portfolio(symbols,
+                          cnp.ndarray[FLOAT_t, ndim=1] risk_rois,
+                          double risk_free_roi,
+                          cnp.ndarray[FLOAT_t, ndim=1] allocated_risk_wealth,
+                          double allocated_risk_free_wealth,
+                          double buy_trans_fee,
+                          double sell_trans_fee,
+                          double alpha,
+                          cnp.ndarray[FLOAT_t, ndim=2] predict_risk_rois,
+                          double predict_risk_free_roi,
+                          int n_scenario,
+                          scenario_probs=None,
+                          str solver=DEFAULT_SOLVER,
+                          int verbose=False,
+                          timer=None,
+                          solver_io=None):
+    """
+    2nd-stage minimize conditional value at risk stochastic programming
+    portfolio.
+    It will be called in get_current_buy_sell_amounts function
+
+    symbols: list of string
+    risk_rois: numpy.array, shape: (n_stock, )
+    risk_free_roi: float,
+    allocated_risk_wealth: numpy.array, shape: (n_stock,)
+    allocated_risk_free_wealth: float
+    buy_trans_fee: float
+    sell_trans_fee: float
+    alpha: float, 1-alpha is the significant level
+    predict_risk_ret: numpy.array, shape: (n_stock, n_scenario)
+    predict_risk_free_roi: float
+    n_scenario: integer
+    scenario_probs: numpy.array, shape: (n_scenario,)
+    solver: str, supported by Pyomo
+    timer: stage_timer.StageTimer or None, timing the stages of the model
+    solver_io: string or None, the interface of the solver, None for the
+        in-process interface with the fallback to the file interface
+    """
+    t0 = time()
+    if scenario_probs is None:
+        scenario_probs = np.ones(n_scenario, dtype=np.float) / n_scenario
+
+    if timer is None:
+        timer = NULL_TIMER
+    timer.mark()
+
+    cdef Py_ssize_t n_stock = len(symbols)
+
+    # Model
+    instance = ConcreteModel()
+    build_min_cvar_sp_model(instance, risk_rois, risk_free_roi,
+                            allocated_risk_wealth,
+                            allocated_risk_free_wealth, buy_trans_fee,
+                            sell_trans_fee, alpha, predict_risk_rois,
+                            predict_risk_free_roi, n_scenario,
+                            scenario_probs)
+
     # solve
-    opt = SolverFactory(solver)
-    results = opt.solve(instance)
-    instance.solutions.load_from(results)
-    print ("Y:{}, VaR:{}, CVaR{}".format(
-        [instance.Ys[sdx].value for sdx in xrange(n_scenario)],
-        instance.Z.value,
-        instance.cvar_objective,
-    ))
+    timer.lap('build')
+    results = solve_model(instance, solver, timer, solver_io)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Y:{}, VaR:{}, CVaR{}".format(
+            [instance.Ys[sdx].value for sdx in xrange(n_scenario)],
+            instance.Z.value,
+            instance.cvar_objective(),
+        ))
 
     if verbose:
         display(instance)
+        logger.info("min_cvar_sp_portfolio OK, {:.3f} secs".format(
+            time() - t0))
+
+    return min_cvar_sp_results(instance, symbols)
+
+
+def min_cvar_sp_results(instance, symbols):
+    """ the results of the solved model or block of min_cvar_sp """
+    cdef Py_ssize_t n_stock = len(symbols)
 
     # buy and sell amounts
     buy_amounts = pd.Series([instance.buy_amounts[mdx].value
@@ -168,9 +215,6 @@ def min_cvar_sp_portfolio(symbols,
     # value at risk (estimated)
     cdef double estimated_var = instance.Z.value
 
-    if verbose:
-        print "min_cvar_sp_portfolio OK, {:.3f} secs".format(time() - t0)
-
     return {
         "buy_amounts": buy_amounts,
         "sell_amounts": sell_amounts,
@@ -179,8 +223,76 @@ def min_cvar_sp_portfolio(symbols,
     }
 
 
+def min_cvar_sp_batch_portfolio(problems, str solver=DEFAULT_SOLVER,
+                                timer=None, solver_io=None):
+    """
+    solving the independent problems of min_cvar_sp_portfolio as a
+    block-diagonal LP, so the solver is started and the model is passed to
+    it once for all problems.
+
+    the blocks share no variables and constraints, and the objective is
+    the sum of the CVaRs of the blocks, so the optimal solution of the LP
+    contains an optimal solution of each problem.
+
+    Parameters:
+    ------------------
+    problems: list of dict, the arguments of min_cvar_sp_portfolio, symbols,
+        risk_rois, risk_free_roi, allocated_risk_wealth,
+        allocated_risk_free_wealth, buy_trans_fee, sell_trans_fee, alpha,
+        predict_risk_rois, predict_risk_free_roi, n_scenario and the
+        optional scenario_probs
+    solver: str, supported by Pyomo
+    timer: stage_timer.StageTimer or None, timing the stages of the model
+    solver_io: string or None, the interface of the solver
+
+    Returns:
+    ------------------
+    list of dict, the results of min_cvar_sp_portfolio of each problem
+    """
+    cdef Py_ssize_t n_problem = len(problems)
+    if n_problem == 0:
+        return []
+    if timer is None:
+        timer = NULL_TIMER
+    timer.mark()
+
+    def block_rule(block, int pdx):
+        problem = problems[pdx]
+        n_scenario = problem['n_scenario']
+        scenario_probs = problem.get('scenario_probs')
+        if scenario_probs is None:
+            scenario_probs = np.ones(n_scenario,
+                                     dtype=np.float) / n_scenario
+        build_min_cvar_sp_model(
+            block, problem['risk_rois'], problem['risk_free_roi'],
+            problem['allocated_risk_wealth'],
+            problem['allocated_risk_free_wealth'],
+            problem['buy_trans_fee'], problem['sell_trans_fee'],
+            problem['alpha'], problem['predict_risk_rois'],
+            problem['predict_risk_free_roi'], n_scenario, scenario_probs)
+        # the objective of the block is a term of the batch objective
+        block.cvar_objective.deactivate()
+
+    instance = ConcreteModel()
+    instance.problems = np.arange(n_problem)
+    instance.blocks = Block(instance.problems, rule=block_rule)
+    instance.batch_objective = Objective(
+        expr=sum(instance.blocks[pdx].cvar_objective.expr
+                 for pdx in xrange(n_problem)),
+        sense=maximize)
+
+    timer.lap('build')
+    solve_model(instance, solver, timer, solver_io)
+
+    return [min_cvar_sp_results(instance.blocks[pdx],
+                                problems[pdx]['symbols'])
+            for pdx in xrange(n_problem)]
+
+
 
 class MinCVaRSPPortfolio(SPTradingPortfolio):
+    checkpoint_attrs = ('var_arr', 'cvar_arr')
+
     def __init__(self, symbols, risk_rois, risk_free_rois,
                  initial_risk_wealth,
                  double initial_risk_free_wealth,
@@ -192,13 +304,34 @@ class MinCVaRSPPortfolio(SPTradingPortfolio):
                  bias=BIAS_ESTIMATOR,
                  double alpha=0.05,
                  int scenario_cnt=1,
-                 verbose=False):
+                 verbose=False,
+                 eval_scenario_cnt=None,
+                 scenario_generator=None,
+                 scenario_mode=DEFAULT_SCENARIO_MODE,
+                 solver_io=None,
+                 scenario_dir=None,
+                 scenarios=None):
         """
         2nd-stage SP
 
         Parameters:
          -----------------------
         alpha: float, 0<=value<0.5, 1-alpha is the confidence level of risk
+        eval_scenario_cnt: integer or None, the count of scenarios for
+            the out-of-sample evaluation of the decisions, it should be
+            different to scenario_cnt
+        scenario_generator: string or None, name of the registered scenario
+            generator, if None, the stored HMM scenarios are used
+        scenario_mode: string, {'precompute', 'online'}, generating and
+            storing all scenarios before the simulation or generating the
+            scenarios of each period on the fly
+        scenario_dir: string or None, directory of the precomputed
+            scenario files of the generator, None for
+            EXP_SCENARIO_DIR/scenario_generator
+        scenarios: tuple or None, (trans_dates, symbols, scenarios) of
+            min_wcvar_sp.load_scenario_mmap, the stored HMM scenarios of
+            the experiment period are a view of the memory-mapped array,
+            which is shared by the portfolios of different alphas
 
         Data:
         -------------
@@ -209,7 +342,8 @@ class MinCVaRSPPortfolio(SPTradingPortfolio):
         super(MinCVaRSPPortfolio, self).__init__(
            symbols, risk_rois, risk_free_rois, initial_risk_wealth,
            initial_risk_free_wealth, buy_trans_fee, sell_trans_fee,
-            start_date, end_date, window_length, n_scenario, bias, verbose)
+            start_date, end_date, window_length, n_scenario, bias, verbose,
+            solver_io=solver_io)
 
         self.alpha = float(alpha)
 
@@ -222,7 +356,30 @@ class MinCVaRSPPortfolio(SPTradingPortfolio):
         scenario_path = os.path.join(EXP_SP_PORTFOLIO_DIR, 'scenarios',
                                  scenario_name)
 
-        if not os.path.exists(scenario_path):
+        self.scenario_generator = scenario_generator
+        self.scenario_source = None
+        self.scenario_mmap = None
+        if scenarios is not None:
+            scenario_dates, scenario_symbols, scenario_arr = scenarios
+            if scenario_symbols != list(symbols):
+                raise ValueError("the symbols of scenarios are different.")
+            sdx = scenario_dates.get_loc(self.exp_start_date)
+            edx = sdx + self.n_exp_period
+            if not scenario_dates[sdx:edx].equals(self.exp_risk_rois.index):
+                raise ValueError("the dates of scenarios are different.")
+            # shape: (n_exp_period, n_stock, n_scenario)
+            self.scenario_mmap = scenario_arr[sdx:edx]
+            self.scenario_panel = None
+            self.scenario_cnt = scenario_cnt
+        elif scenario_generator is not None:
+            self.scenario_source = ScenarioSource(
+                scenario_generator, risk_rois, start_date, end_date,
+                window_length, n_scenario, bias, scenario_mode, scenario_cnt,
+                scenario_dir)
+            # None in the online mode
+            self.scenario_panel = self.scenario_source.scenario_panel
+            self.scenario_cnt = scenario_cnt
+        elif not os.path.exists(scenario_path):
             raise ValueError("{} not exists.".format(scenario_name))
             self.scenario_panel = None
             self.scenario_cnt = 0
@@ -230,6 +387,19 @@ class MinCVaRSPPortfolio(SPTradingPortfolio):
             self.scenario_panel = pd.read_pickle(scenario_path)
             self.scenario_cnt = scenario_cnt
 
+        # out-of-sample scenario panel
+        self.eval_scenario_cnt = eval_scenario_cnt
+        if eval_scenario_cnt is not None:
+            eval_scenario_name = "{}_{}_m{}_w{}_s{}_{}_{}.pkl".format(
+                START_DATE.strftime("%Y%m%d"), END_DATE.strftime("%Y%m%d"),
+                len(symbols), window_length, n_scenario,
+                "biased" if bias else "unbiased", eval_scenario_cnt)
+            eval_scenario_path = os.path.join(EXP_SP_PORTFOLIO_DIR,
+                                              'scenarios', eval_scenario_name)
+            if not os.path.exists(eval_scenario_path):
+                raise ValueError("{} not exists.".format(eval_scenario_name))
+            self.eval_scenario_panel = pd.read_pickle(eval_scenario_path)
+
         # additional results
         self.var_arr = pd.Series(np.zeros(self.n_exp_period),
                                 index=self.exp_risk_rois.index)
@@ -238,17 +408,40 @@ class MinCVaRSPPortfolio(SPTradingPortfolio):
 
 
     def get_trading_func_name(self, *args, **kwargs):
-        return "MinCVaRSP_m{}_w{}_s{}_{}_{}_a{:.2f}".format(
+        name = "MinCVaRSP_m{}_w{}_s{}_{}_{}_a{:.2f}".format(
             self.n_stock, self.window_length, self.n_scenario,
              "biased" if self.bias_estimator else "unbiased",
              self.scenario_cnt, self.alpha)
+        if self.scenario_generator is not None:
+            name = "{}_{}".format(name, self.scenario_generator)
+        return name
 
     def add_results_to_reports(self, reports, *args, **kwargs):
         """ add additional items to reports """
         reports['alpha'] = self.alpha
         reports['scenario_cnt'] = self.scenario_cnt
+        reports['scenario_generator'] = self.scenario_generator
         reports['var_arr'] = self.var_arr
         reports['cvar_arr'] = self.cvar_arr
+
+        if self.eval_scenario_cnt is not None:
+            # scoring the decisions by the out-of-sample scenarios
+            # shape: (n_exp_period, n_stock, n_scenario)
+            eval_scenarios = self.eval_scenario_panel.loc[
+                self.exp_risk_rois.index, self.symbols].as_matrix()
+            oos_vars = np.zeros(self.n_exp_period)
+            oos_cvars = np.zeros(self.n_exp_period)
+            for tdx in xrange(self.n_exp_period):
+                VaRs, CVaRs = evaluate_cvars(
+                    self.risk_wealth_df.iloc[tdx].as_matrix(),
+                    eval_scenarios[tdx], [self.alpha, ])
+                oos_vars[tdx], oos_cvars[tdx] = VaRs[0, 0], CVaRs[0, 0]
+
+            reports['eval_scenario_cnt'] = self.eval_scenario_cnt
+            reports['oos_var_arr'] = pd.Series(oos_vars,
+                                               index=self.exp_risk_rois.index)
+            reports['oos_cvar_arr'] = pd.Series(oos_cvars,
+                                                index=self.exp_risk_rois.index)
         return reports
 
     def get_estimated_risk_free_rois(self, *arg, **kwargs):
@@ -264,10 +457,16 @@ class MinCVaRSPPortfolio(SPTradingPortfolio):
         """
         # current index in the exp_period
         tdx, trans_date = kwargs['tdx'], kwargs['trans_date']
-        if self.scenario_panel is not None:
+        if self.scenario_mmap is not None:
+            return pd.DataFrame(np.array(self.scenario_mmap[tdx]),
+                                index=self.symbols)
+        elif self.scenario_panel is not None:
             df = self.scenario_panel.loc[trans_date]
             assert self.symbols == df.index.tolist()
             return df
+        elif self.scenario_source is not None:
+            # generating the scenarios on the fly
+            return self.scenario_source.get(trans_date)
         else:
             # because we trade stock on the after-hour market, we known today
             # market information, therefore the historical interval contain
@@ -278,7 +477,7 @@ class MinCVaRSPPortfolio(SPTradingPortfolio):
             # shape: (window_length, n_stock)
             hist_data = self.risk_rois.iloc[hist_start_idx:hist_end_idx]
             if self.verbose:
-                print ("HMM current: {} hist_data:[{}-{}]".format(
+                logger.info("HMM current: {} hist_data:[{}-{}]".format(
                                     self.exp_risk_rois.index[tdx],
                                     self.risk_rois.index[hist_start_idx],
                                     self.risk_rois.index[hist_end_idx]))
@@ -312,7 +511,7 @@ class MinCVaRSPPortfolio(SPTradingPortfolio):
                                     max_moment_err, max_corr_err)
                     break
                 except ValueError as e:
-                    print e
+                    logger.warning(e)
                     if idx >= 2:
                         raise ValueError('{}: {} HMM not converge.'.format(
                             self.get_trading_func_name(),
@@ -332,25 +531,170 @@ class MinCVaRSPPortfolio(SPTradingPortfolio):
 
 
 
+    def get_batch_problem(self, *args, **kwargs):
+        """
+        the arguments of min_cvar_sp_portfolio of the period, the keyword
+        arguments are the same as get_current_buy_sell_amounts
+        """
+        # current exp_period index
+        tdx = kwargs['tdx']
+        return {
+            'symbols': self.symbols,
+            'risk_rois': self.exp_risk_rois.iloc[tdx, :].as_matrix(),
+            'risk_free_roi': self.risk_free_rois.iloc[tdx],
+            'allocated_risk_wealth':
+                kwargs['allocated_risk_wealth'].as_matrix(),
+            'allocated_risk_free_wealth':
+                kwargs['allocated_risk_free_wealth'],
+            'buy_trans_fee': self.buy_trans_fee,
+            'sell_trans_fee': self.sell_trans_fee,
+            'alpha': self.alpha,
+            'predict_risk_rois': kwargs['estimated_risk_rois'].as_matrix(),
+            'predict_risk_free_roi': kwargs['estimated_risk_free_roi'],
+            'n_scenario': self.n_scenario,
+        }
+
     def get_current_buy_sell_amounts(self, *args, **kwargs):
         """ min_cvar function """
+        return min_cvar_sp_portfolio(timer=self.timer,
+                                     solver_io=self.solver_io,
+                                     **self.get_batch_problem(**kwargs))
 
-        # current exp_period index
-        tdx = kwargs['tdx']
-        results = min_cvar_sp_portfolio(
-            self.symbols,
-            self.exp_risk_rois.iloc[tdx, :].as_matrix(),
-            self.risk_free_rois.iloc[tdx],
-            kwargs['allocated_risk_wealth'].as_matrix(),
-            kwargs['allocated_risk_free_wealth'],
-            self.buy_trans_fee,
-            self.sell_trans_fee,
-            self.alpha,
-            kwargs['estimated_risk_rois'].as_matrix(),
-            kwargs['estimated_risk_free_roi'],
-            self.n_scenario,
-        )
-        return results
+
+def _is_batch_portfolio(portfolio):
+    """ the model of the portfolio is min_cvar_sp_portfolio """
+    if not isinstance(portfolio, MinCVaRSPPortfolio):
+        return False
+    # the subclasses may have different models
+    for cls in type(portfolio).__mro__:
+        if 'get_current_buy_sell_amounts' in vars(cls):
+            return cls is MinCVaRSPPortfolio
+    return False
+
+
+def run_min_cvar_sp_batch(portfolios, batch_size=None,
+                          str solver=DEFAULT_SOLVER, solver_io=None):
+    """
+    running the simulations of MinCVaRSPPortfolio in lockstep, the problems
+    of all portfolios in a period are solved by min_cvar_sp_batch_portfolio.
+    the problems are independent given the allocated wealth of each
+    portfolio, so the results are the same as the separate simulations,
+    e.g. the portfolios of the alphas of the same parameters.
+
+    Parameters:
+    ------------------
+    portfolios: list of MinCVaRSPPortfolio, the experiment periods of the
+        portfolios must be the same
+    batch_size: integer or None, maximum number of problems of a batch LP,
+        None for all portfolios
+    solver: str, supported by Pyomo
+    solver_io: string or None, the interface of the solver
+
+    Returns:
+    ------------------
+    list of reports of the portfolios
+    """
+    t0 = time()
+    cdef Py_ssize_t n_portfolio = len(portfolios)
+    if n_portfolio == 0:
+        return []
+    for portfolio in portfolios:
+        if not _is_batch_portfolio(portfolio):
+            raise ValueError("{} is not supported.".format(
+                type(portfolio).__name__))
+    exp_dates = portfolios[0].exp_risk_rois.index
+    for portfolio in portfolios[1:]:
+        if not portfolio.exp_risk_rois.index.equals(exp_dates):
+            raise ValueError("the experiment periods are different.")
+    if batch_size is None:
+        batch_size = n_portfolio
+    batch_size = int(batch_size)
+    if batch_size < 1:
+        raise ValueError("wrong batch_size: {}".format(batch_size))
+
+    cdef Py_ssize_t n_exp_period = len(exp_dates), tdx, pdx, bdx
+    # allocated risk wealth and risk free wealth of each portfolio
+    wealths = [(portfolio.initial_risk_wealth,
+                portfolio.initial_risk_free_wealth)
+               for portfolio in portfolios]
+
+    progress = ProgressLogger(logger, n_exp_period)
+    for tdx in xrange(n_exp_period):
+        # [(index of portfolio, arguments of min_cvar_sp_portfolio)]
+        problems = []
+        for pdx in xrange(n_portfolio):
+            period_kwargs = portfolios[pdx].prepare_period(tdx,
+                                                           *wealths[pdx])
+            if period_kwargs is not None:
+                problems.append((pdx, portfolios[pdx].get_batch_problem(
+                    **period_kwargs)))
+
+        # None if generating the scenarios failed
+        results = [None] * n_portfolio
+        for bdx in xrange(0, len(problems), batch_size):
+            batch = problems[bdx:bdx + batch_size]
+            batch_results = min_cvar_sp_batch_portfolio(
+                [problem for _, problem in batch], solver,
+                solver_io=solver_io)
+            for (pdx, _), period_results in zip(batch, batch_results):
+                results[pdx] = period_results
+
+        for pdx in xrange(n_portfolio):
+            wealths[pdx] = portfolios[pdx].finish_period(
+                tdx, wealths[pdx][0], wealths[pdx][1], results[pdx])
+
+        progress.update(tdx + 1, "{} batch of {} portfolios OK",
+                        exp_dates[tdx].strftime("%Y%m%d"), n_portfolio,
+                        trans_date=exp_dates[tdx])
+
+    # the simulation time of each report is of the whole batch
+    return [portfolio.get_simulation_reports(
+        portfolio.get_trading_func_name(), t0) for portfolio in portfolios]
+
+
+def ev_portfolio(cnp.ndarray[FLOAT_t, ndim=1] risk_rois,
+                 double risk_free_roi,
+                 cnp.ndarray[FLOAT_t, ndim=1] allocated_risk_wealth,
+                 double allocated_risk_free_wealth,
+                 double buy_trans_fee,
+                 double sell_trans_fee,
+                 cnp.ndarray[FLOAT_t, ndim=1] mean_predict_risk_rois):
+    """
+    the expected value (EV) problem of the min CVaR portfolio, i.e.
+    maximizing the wealth of the mean scenario. The LP is solved
+    analytically: all cash buys the symbol with the maximum mean roi, and a
+    holding is switched to the symbol if it is still better after paying the
+    transaction fees.
+
+    risk_rois: numpy.array, shape: (n_stock, )
+    risk_free_roi: float,
+    allocated_risk_wealth: numpy.array, shape: (n_stock,)
+    allocated_risk_free_wealth: float
+    buy_trans_fee: float
+    sell_trans_fee: float
+    mean_predict_risk_rois: numpy.array, shape: (n_stock, )
+
+    Returns:
+    ---------
+    risk_wealth: numpy.array, shape: (n_stock,)
+    """
+    # current risk wealth
+    risk_wealth = (1. + risk_rois) * allocated_risk_wealth
+    cdef Py_ssize_t best = np.argmax(mean_predict_risk_rois)
+    cdef double best_growth = 1. + mean_predict_risk_rois[best]
+
+    # the growth of a unit sold and bought to the best symbol
+    switch_growth = (1. - sell_trans_fee) / (1. + buy_trans_fee) * best_growth
+    switched = (1. + mean_predict_risk_rois) < switch_growth
+    cdef double sell_total = risk_wealth[switched].sum()
+
+    ev_risk_wealth = risk_wealth.copy()
+    ev_risk_wealth[switched] = 0
+    cdef double cash = ((1. + risk_free_roi) * allocated_risk_free_wealth +
+                        (1. - sell_trans_fee) * sell_total)
+    if best_growth > 0:
+        ev_risk_wealth[best] += cash / (1. + buy_trans_fee)
+    return ev_risk_wealth
 
 
 def min_cvar_sp_portfolio2(symbols,
@@ -366,7 +710,9 @@ def min_cvar_sp_portfolio2(symbols,
                           int n_scenario,
                           scenario_probs=None,
                           str solver=DEFAULT_SOLVER,
-                          int verbose=False):
+                          int verbose=False,
+                          timer=None,
+                          solver_io=None):
     """
     2nd-stage minimize conditional value at risk stochastic programming
     portfolio.
@@ -383,12 +729,23 @@ def min_cvar_sp_portfolio2(symbols,
     predict_risk_ret: numpy.array, shape: (n_stock, n_scenario)
     predict_risk_free_roi: float
     n_scenario: integer
-    scenario_probs: numpy.array, shape: (n_scenario,)
+    scenario_probs: numpy.array, shape: (n_scenario,), the EV and EEV
+        assume equally likely scenarios, other probabilities are rejected
     solver: str, supported by Pyomo
+    timer: stage_timer.StageTimer or None, timing the stages of the model
+    solver_io: string or None, the interface of the solver, None for the
+        in-process interface with the fallback to the file interface
     """
     t0 = time()
     if scenario_probs is None:
         scenario_probs = np.ones(n_scenario, dtype=np.float) / n_scenario
+    elif not np.allclose(scenario_probs, 1. / n_scenario):
+        raise ValueError("the EEV of min_cvar_sp_portfolio2 requires "
+                         "equally likely scenarios.")
+
+    if timer is None:
+        timer = NULL_TIMER
+    timer.mark()
 
     # Model
     instance = ConcreteModel()
@@ -475,9 +832,8 @@ def min_cvar_sp_portfolio2(symbols,
                                         sense=maximize)
 
     # solve
-    opt = SolverFactory(solver)
-    results = opt.solve(instance)
-    instance.solutions.load_from(results)
+    timer.lap('build')
+    results = solve_model(instance, solver, timer, solver_io)
 
     if verbose:
         display(instance)
@@ -493,72 +849,26 @@ def min_cvar_sp_portfolio2(symbols,
     cdef double estimated_cvar = instance.cvar_objective()
 
     # EEV part
-    # delete old CVaR constraint
-    instance.del_component("cvar_constraint")
-    instance.del_component("cvar_objective")
-    instance.del_component("Ys")
-    instance.del_component("Ys_index")
-
-    # new variable
-    instance.Y = Var(within=NonNegativeReals)
-
-    # update CVaR constraint
-    def cvar_constraint_rule(model):
-        """ auxiliary variable Y depends on scenario. CVaR <= VaR """
-        wealth = sum((1. + model.mean_predict_risk_rois[mdx]) *
-                     model.risk_wealth[mdx]
-                     for mdx in model.symbols)
-
-        return model.Y >= (model.Z - wealth)
-
-    instance.cvar_constraint = Constraint(rule=cvar_constraint_rule)
-
-    # update objective
-    def cvar_objective_rule(model):
-        return model.Z - 1. / (1. - model.alpha) * model.Y
-
-    instance.cvar_objective = Objective(rule=cvar_objective_rule,
-                                        sense=maximize)
-
-    # solve eev 1st stage
-    opt = SolverFactory(solver)
-    results = opt.solve(instance)
-    instance.solutions.load_from(results)
+    # the EV problem has only the mean scenario, and the CVaR of a single
+    # scenario is the portfolio wealth, therefore it is solved analytically.
+    ev_risk_wealth = ev_portfolio(risk_rois, risk_free_roi,
+                                  allocated_risk_wealth,
+                                  allocated_risk_free_wealth,
+                                  buy_trans_fee, sell_trans_fee,
+                                  instance.mean_predict_risk_rois)
 
     # value at risk (estimated)
-    cdef double estimated_ev_var = instance.Z.value
-    cdef double estimated_ev_cvar = instance.cvar_objective()
-
-    # fixed the first-stage variables
-    for mdx in instance.symbols:
-        instance.buy_amounts[mdx].fixed = True
-        instance.sell_amounts[mdx].fixed = True
-        instance.risk_wealth[mdx].fixed = True
-    instance.risk_free_wealth.fixed = True
-
-    # Z is viewed as the first-stage variable
-    instance.Z.fixed = True
-
-    estimated_eev_cvar_arr = np.zeros(n_scenario)
-    # EEV
-    for sdx in xrange(n_scenario):
-        scen_roi = predict_risk_rois[:, sdx]
-        portfolio_value = (
-            sum((1+scen_roi[mdx])* instance.risk_wealth[mdx].value
-                for mdx in np.arange(n_stock)) +
-            instance.risk_free_wealth.value)
-
-        if estimated_var <= portfolio_value:
-            estimated_eev_cvar_arr[sdx] = estimated_var
-        else:
-            diff = (estimated_var - portfolio_value)
-            estimated_eev_cvar_arr[sdx] =( estimated_var -
-                                           1/(1-alpha) * diff)
+    cdef double estimated_ev_var = np.dot(
+        ev_risk_wealth, 1. + instance.mean_predict_risk_rois)
+    cdef double estimated_ev_cvar = estimated_ev_var
 
-    estimated_eev_cvar = estimated_eev_cvar_arr.mean()
+    # the CVaR of the EV solution in the scenarios
+    estimated_eev_var, estimated_eev_cvar = evaluate_cvar(
+        ev_risk_wealth, predict_risk_rois, alpha)
     vss = estimated_cvar - estimated_eev_cvar
     if verbose:
-        print "min_cvar_sp_portfolio OK, {:.3f} secs".format(time() - t0)
+        logger.info("min_cvar_sp_portfolio OK, {:.3f} secs".format(
+            time() - t0))
 
     return {
         "buy_amounts": buy_amounts,
@@ -567,6 +877,7 @@ def min_cvar_sp_portfolio2(symbols,
         "estimated_cvar": estimated_cvar,
         "estimated_ev_var": estimated_ev_var,
         "estimated_ev_cvar": estimated_ev_cvar,
+        "estimated_eev_var": estimated_eev_var,
         "estimated_eev_cvar": estimated_eev_cvar,
         "vss": vss,
     }
@@ -574,6 +885,9 @@ def min_cvar_sp_portfolio2(symbols,
 
 
 class MinCVaRSPPortfolio2(SPTradingPortfolio):
+    checkpoint_attrs = ('var_arr', 'cvar_arr', 'ev_var_arr', 'ev_cvar_arr',
+                        'eev_var_arr', 'eev_cvar_arr', 'vss_arr')
+
     def __init__(self, symbols, risk_rois, risk_free_rois,
                  initial_risk_wealth,
                  double initial_risk_free_wealth,
@@ -585,13 +899,19 @@ class MinCVaRSPPortfolio2(SPTradingPortfolio):
                  bias=BIAS_ESTIMATOR,
                  double alpha=0.05,
                  int scenario_cnt=1,
-                 verbose=False):
+                 verbose=False,
+                 solver_io=None,
+                 scenarios=None):
         """
         2nd-stage SP
 
         Parameters:
          -----------------------
         alpha: float, 0<=value<0.5, 1-alpha is the confidence level of risk
+        scenarios: tuple or None, (trans_dates, symbols, scenarios) of
+            min_wcvar_sp.load_scenario_mmap, the scenarios of the experiment
+            period are a view of the memory-mapped array, if None, the
+            scenario panel is read
 
         Data:
         -------------
@@ -602,7 +922,8 @@ class MinCVaRSPPortfolio2(SPTradingPortfolio):
         super(MinCVaRSPPortfolio2, self).__init__(
            symbols, risk_rois, risk_free_rois, initial_risk_wealth,
            initial_risk_free_wealth, buy_trans_fee, sell_trans_fee,
-            start_date, end_date, window_length, n_scenario, bias, verbose)
+            start_date, end_date, window_length, n_scenario, bias, verbose,
+            solver_io=solver_io)
 
         self.alpha = float(alpha)
 
@@ -615,7 +936,20 @@ class MinCVaRSPPortfolio2(SPTradingPortfolio):
         scenario_path = os.path.join(EXP_SP_PORTFOLIO_DIR, 'scenarios',
                                  scenario_name)
 
-        if not os.path.exists(scenario_path):
+        self.scenario_mmap = None
+        if scenarios is not None:
+            scenario_dates, scenario_symbols, scenario_arr = scenarios
+            if scenario_symbols != list(symbols):
+                raise ValueError("the symbols of scenarios are different.")
+            sdx = scenario_dates.get_loc(self.exp_start_date)
+            edx = sdx + self.n_exp_period
+            if not scenario_dates[sdx:edx].equals(self.exp_risk_rois.index):
+                raise ValueError("the dates of scenarios are different.")
+            # shape: (n_exp_period, n_stock, n_scenario)
+            self.scenario_mmap = scenario_arr[sdx:edx]
+            self.scenario_panel = None
+            self.scenario_cnt = scenario_cnt
+        elif not os.path.exists(scenario_path):
             raise ValueError("{} not exists.".format(scenario_name))
             self.scenario_panel = None
             self.scenario_cnt = 0
@@ -624,7 +958,7 @@ class MinCVaRSPPortfolio2(SPTradingPortfolio):
             if start_date != START_DATE or end_date != END_DATE:
                 self.scenario_panel = self.scenario_panel.loc[
                                       start_date:end_date]
-                print ("scenario panel dates:{}-{}".format(
+                logger.info("scenario panel dates:{}-{}".format(
                     self.scenario_panel.items[0],
                     self.scenario_panel.items[-1]))
             self.scenario_cnt = scenario_cnt
@@ -641,6 +975,9 @@ class MinCVaRSPPortfolio2(SPTradingPortfolio):
         self.ev_cvar_arr = pd.Series(np.zeros(self.n_exp_period),
                                   index = self.exp_risk_rois.index)
 
+        self.eev_var_arr = pd.Series(np.zeros(self.n_exp_period),
+                                  index = self.exp_risk_rois.index)
+
         self.eev_cvar_arr = pd.Series(np.zeros(self.n_exp_period),
                                   index = self.exp_risk_rois.index)
         self.vss_arr = pd.Series(np.zeros(self.n_exp_period),
@@ -663,7 +1000,8 @@ class MinCVaRSPPortfolio2(SPTradingPortfolio):
         reports['cvar_arr'] = self.cvar_arr
         reports['ev_var_arr'] = self.ev_var_arr
         reports['ev_cvar_arr'] = self.ev_cvar_arr
-        reports['eev_var_arr'] = self.eev_cvar_arr
+        reports['eev_var_arr'] = self.eev_var_arr
+        reports['eev_cvar_arr'] = self.eev_cvar_arr
         reports['vss_arr'] = self.vss_arr
         return reports
 
@@ -680,7 +1018,10 @@ class MinCVaRSPPortfolio2(SPTradingPortfolio):
         """
         # current index in the exp_period
         tdx, trans_date = kwargs['tdx'], kwargs['trans_date']
-        if self.scenario_panel is not None:
+        if self.scenario_mmap is not None:
+            return pd.DataFrame(np.array(self.scenario_mmap[tdx]),
+                                index=self.symbols)
+        elif self.scenario_panel is not None:
             df = self.scenario_panel.loc[trans_date]
             assert self.symbols == df.index.tolist()
             return df
@@ -694,7 +1035,7 @@ class MinCVaRSPPortfolio2(SPTradingPortfolio):
             # shape: (window_length, n_stock)
             hist_data = self.risk_rois.iloc[hist_start_idx:hist_end_idx]
             if self.verbose:
-                print ("HMM current: {} hist_data:[{}-{}]".format(
+                logger.info("HMM current: {} hist_data:[{}-{}]".format(
                                     self.exp_risk_rois.index[tdx],
                                     self.risk_rois.index[hist_start_idx],
                                     self.risk_rois.index[hist_end_idx]))
@@ -728,7 +1069,7 @@ class MinCVaRSPPortfolio2(SPTradingPortfolio):
                                     max_moment_err, max_corr_err)
                     break
                 except ValueError as e:
-                    print e
+                    logger.warning(e)
                     if idx >= 2:
                         raise ValueError('{}: {} HMM not converge.'.format(
                             self.get_trading_func_name(),
@@ -747,6 +1088,7 @@ class MinCVaRSPPortfolio2(SPTradingPortfolio):
         self.cvar_arr.iloc[tdx] = results['estimated_cvar']
         self.ev_var_arr.iloc[tdx] = results['estimated_ev_var']
         self.ev_cvar_arr.iloc[tdx] = results['estimated_ev_cvar']
+        self.eev_var_arr.iloc[tdx] = results['estimated_eev_var']
         self.eev_cvar_arr.iloc[tdx] = results['estimated_eev_cvar']
         self.vss_arr.iloc[tdx] = results['vss']
 
@@ -767,5 +1109,7 @@ class MinCVaRSPPortfolio2(SPTradingPortfolio):
             kwargs['estimated_risk_rois'].as_matrix(),
             kwargs['estimated_risk_free_roi'],
             self.n_scenario,
+            timer=self.timer,
+            solver_io=self.solver_io,
         )
         return results
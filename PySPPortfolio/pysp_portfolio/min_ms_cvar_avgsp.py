@@ -12,13 +12,19 @@ from pyomo.environ import *
 from pyomo.opt import SolverStatus, TerminationCondition
 from PySPPortfolio.pysp_portfolio import *
 from base_model import (SPTradingPortfolio, )
+from log_utils import (get_logger,)
+from solvers import (solve_model,)
+
+logger = get_logger('min_ms_cvar_avgsp')
+
 
 def min_ms_cvar_avgsp_portfolio(symbols, trans_dates, risk_rois,
                                 risk_free_rois, allocated_risk_wealth,
                                 allocated_risk_free_wealth, buy_trans_fee,
                                 sell_trans_fee, alpha, predict_risk_rois,
                                 predict_risk_free_rois, n_scenario=200,
-                                solver = DEFAULT_SOLVER, verbose=False):
+                                solver = DEFAULT_SOLVER, verbose=False,
+                                solver_io=None):
     """
     in each period, using average scenarios
     the results of avgsp are independent to the alpha,
@@ -35,12 +41,15 @@ def min_ms_cvar_avgsp_portfolio(symbols, trans_dates, risk_rois,
     predict_risk_free_rois: numpy.array, shape: (n_exp_period, n_scenario)
     n_scenario: integer
     solver: str, supported by Pyomo
+    solver_io: string or None, the interface of the solver, see
+        solvers.create_solver
 
     """
     t0 = time()
     n_exp_period = risk_rois.shape[0]
     n_stock = len(symbols)
-    print "transaction dates: {}-{}".format(trans_dates[0], trans_dates[-1])
+    logger.info("transaction dates: {}-{}".format(
+        trans_dates[0], trans_dates[-1]))
     # concrete model
     instance = ConcreteModel(name="ms_min_cvar_avgsp_portfolio")
     param = "{}_{}_m{}_p{}_s{}_a{:.2f}".format(
@@ -153,8 +162,8 @@ def min_ms_cvar_avgsp_portfolio(symbols, trans_dates, risk_rois,
     instance.cvar_constraint = Constraint(
         instance.exp_periods, rule=cvar_constraint_rule)
 
-    print ("min_ms_cvar_avgsp {} constraints OK, "
-           "{:.3f} secs".format(param, time() - t0))
+    logger.info("min_ms_cvar_avgsp {} constraints OK, "
+                "{:.3f} secs".format(param, time() - t0))
 
     # objective
     def cvar_objective_rule(model):
@@ -169,20 +178,18 @@ def min_ms_cvar_avgsp_portfolio(symbols, trans_dates, risk_rois,
     instance.cvar_objective = Objective(rule=cvar_objective_rule,
                                         sense=maximize)
     # solve
-    print "min_ms_cvar_avgsp {} start solving:".format(param)
+    logger.info("min_ms_cvar_avgsp {} start solving:".format(param))
     t1 = time()
-    opt = SolverFactory(solver)
-    results = opt.solve(instance)
-    instance.solutions.load_from(results)
+    results = solve_model(instance, solver, solver_io=solver_io)
     if verbose:
         display(instance)
 
-    print ("solve min_ms_cvar_avgsp {} OK {:.2f} secs".format(
+    logger.info("solve min_ms_cvar_avgsp {} OK {:.2f} secs".format(
         param, time() - t1))
-    print ("solver status: {}".format(results.solver.status))
-    print ("solver termination cond: {}".format(
+    logger.debug("solver status: {}".format(results.solver.status))
+    logger.debug("solver termination cond: {}".format(
         results.solver.termination_condition))
-    print (results.solver)
+    logger.debug(results.solver)
 
     # extract results
     buy_df = np.zeros((n_exp_period, n_stock))
@@ -214,7 +221,7 @@ def min_ms_cvar_avgsp_portfolio(symbols, trans_dates, risk_rois,
     estimated_var_arr = pd.Series(var_arr, index=trans_dates)
 
     Tdx = instance.n_exp_period - 1
-    print ("{} estimated_final_total_wealth: {:.2f}".format(
+    logger.info("{} estimated_final_total_wealth: {:.2f}".format(
         param, risk_df[Tdx].sum() + risk_free_arr[Tdx]))
 
     results= {
@@ -230,6 +237,136 @@ def min_ms_cvar_avgsp_portfolio(symbols, trans_dates, risk_rois,
     }
     return results
 
+
+def min_ms_cvar_avgsp_rolling_portfolio(symbols, trans_dates, risk_rois,
+                                        risk_free_rois, allocated_risk_wealth,
+                                        allocated_risk_free_wealth,
+                                        buy_trans_fee, sell_trans_fee, alpha,
+                                        predict_risk_rois,
+                                        predict_risk_free_rois,
+                                        n_scenario=200, rolling_horizon=5,
+                                        rolling_step=1,
+                                        solver=DEFAULT_SOLVER, verbose=False,
+                                        solver_io=None):
+    """
+    rolling-horizon decomposition of min_ms_cvar_avgsp_portfolio
+
+    the sub-problem of the next rolling_horizon periods is solved, the
+    decisions of its first rolling_step periods are fixed, and the next
+    sub-problem starts from the realized wealth of the last fixed period.
+
+    symbols: list of string
+    risk_rois: numpy.array, shape: (n_exp_period, n_stock)
+    risk_free_rois: numpy.array,, shape: (n_exp_period,)
+    allocated_risk_wealth: numpy.array, shape: (n_stock,)
+    allocated_risk_free_wealth: float
+    buy_trans_fee: float
+    sell_trans_fee: float
+    alpha: float
+    predict_risk_rois: numpy.array, shape: (n_exp_period, n_stock, n_scenario)
+    predict_risk_free_rois: numpy.array, shape: (n_exp_period, n_scenario)
+    n_scenario: integer
+    rolling_horizon: integer, number of periods of each sub-problem
+    rolling_step: integer, 1 <= rolling_step <= rolling_horizon,
+        number of periods fixed after solving each sub-problem
+    solver: str, supported by Pyomo
+    solver_io: string or None, the interface of the solver, see
+        solvers.create_solver
+
+    """
+    t0 = time()
+    n_exp_period = risk_rois.shape[0]
+    n_stock = len(symbols)
+    rolling_horizon, rolling_step = int(rolling_horizon), int(rolling_step)
+
+    if rolling_horizon < 1:
+        raise ValueError("wrong rolling_horizon: {}".format(rolling_horizon))
+    if not 1 <= rolling_step <= rolling_horizon:
+        raise ValueError("wrong rolling_step: {}".format(rolling_step))
+
+    param = "{}_{}_m{}_p{}_s{}_a{:.2f}_rh{}_{}".format(
+        trans_dates[0].strftime("%Y%m%d"), trans_dates[-1].strftime("%Y%m%d"),
+        n_stock, n_exp_period, n_scenario, alpha, rolling_horizon,
+        rolling_step)
+
+    # shape: (n_exp_period, n_stock)
+    avg_predict_risk_rois = predict_risk_rois.mean(axis=2)
+
+    buy_df = np.zeros((n_exp_period, n_stock))
+    sell_df = np.zeros((n_exp_period, n_stock))
+    risk_df = np.zeros((n_exp_period, n_stock))
+    risk_free_arr = np.zeros(n_exp_period)
+    var_arr = np.zeros(n_exp_period)
+    cvar_arr = np.zeros(n_exp_period)
+    n_subproblem = 0
+
+    # wealth at the beginning of the current sub-problem
+    cur_risk_wealth = np.asarray(allocated_risk_wealth, dtype=np.float)
+    cur_risk_free_wealth = float(allocated_risk_free_wealth)
+
+    for sdx in xrange(0, n_exp_period, rolling_step):
+        # sub-problem interval [sdx, edx), fixed interval [sdx, fdx)
+        edx = min(sdx + rolling_horizon, n_exp_period)
+        fdx = min(sdx + rolling_step, n_exp_period)
+        n_fixed = fdx - sdx
+
+        sub_results = min_ms_cvar_avgsp_portfolio(
+            symbols, trans_dates[sdx:edx], risk_rois[sdx:edx],
+            risk_free_rois[sdx:edx], cur_risk_wealth, cur_risk_free_wealth,
+            buy_trans_fee, sell_trans_fee, alpha,
+            predict_risk_rois[sdx:edx], predict_risk_free_rois[sdx:edx],
+            n_scenario, solver, verbose, solver_io)
+
+        # fixing the first decisions
+        buy_df[sdx:fdx] = sub_results['buy_amounts_df'].values[:n_fixed]
+        sell_df[sdx:fdx] = sub_results['sell_amounts_df'].values[:n_fixed]
+        risk_df[sdx:fdx] = sub_results['risk_wealth_df'].values[:n_fixed]
+        risk_free_arr[sdx:fdx] = \
+            sub_results['risk_free_wealth_arr'].values[:n_fixed]
+        var_arr[sdx:fdx] = sub_results['estimated_var_arr'].values[:n_fixed]
+
+        # CVaR term of each fixed period under the average scenario
+        for tdx in xrange(sdx, fdx):
+            avg_wealth = np.dot(risk_df[tdx], 1. + avg_predict_risk_rois[tdx])
+            cvar_arr[tdx] = (var_arr[tdx] - max(var_arr[tdx] - avg_wealth,
+                                                0) / (1. - alpha))
+
+        # rolling forward
+        cur_risk_wealth = risk_df[fdx - 1].copy()
+        cur_risk_free_wealth = risk_free_arr[fdx - 1]
+        n_subproblem += 1
+
+        logger.info("min_ms_cvar_avgsp_rolling {} [{}/{}] OK, {:.3f} "
+                    "secs".format(
+            param, fdx, n_exp_period, time() - t0))
+
+    Tdx = n_exp_period - 1
+    logger.info("{} estimated_final_total_wealth: {:.2f}, {} sub-problems, "
+                "{:.3f} secs".format(param, risk_df[Tdx].sum() +
+                                risk_free_arr[Tdx], n_subproblem,
+                                time() - t0))
+
+    results = {
+        # shape: (n_exp_period, n_stock)
+        "buy_amounts_df": pd.DataFrame(buy_df, index=trans_dates,
+                                       columns=symbols),
+        "sell_amounts_df": pd.DataFrame(sell_df, index=trans_dates,
+                                        columns=symbols),
+        "risk_wealth_df": pd.DataFrame(risk_df, index=trans_dates,
+                                       columns=symbols),
+        # shape: (n_exp_period, )
+        "risk_free_wealth_arr": pd.Series(risk_free_arr, index=trans_dates),
+        "estimated_var_arr": pd.Series(var_arr, index=trans_dates),
+        "estimated_cvar_arr": pd.Series(cvar_arr, index=trans_dates),
+        # float, comparable to the objective of the monolithic model
+        "estimated_cvar": cvar_arr.sum(),
+        "rolling_horizon": rolling_horizon,
+        "rolling_step": rolling_step,
+        "n_subproblem": n_subproblem,
+    }
+    return results
+
+
 class MinMSCVaRAvgSPPortfolio(SPTradingPortfolio):
     def __init__(self, symbols, risk_rois, risk_free_rois,
                  initial_risk_wealth, initial_risk_free_wealth,
@@ -241,17 +378,28 @@ class MinMSCVaRAvgSPPortfolio(SPTradingPortfolio):
                  bias=BIAS_ESTIMATOR,
                  alpha=0.9,
                  scenario_cnt=1,
-                 verbose=False):
+                 verbose=False,
+                 rolling_horizon=None,
+                 rolling_step=1,
+                 solver_io=None):
         """
         Multistage min cvar average scenario
+
+        rolling_horizon: integer or None, if it is given, the model is
+            solved by the rolling-horizon decomposition with sub-problems
+            of rolling_horizon periods.
+        rolling_step: integer, number of periods fixed in each sub-problem
+        solver_io: string or None, the interface of the solver
         """
         super(MinMSCVaRAvgSPPortfolio, self).__init__(
             symbols, risk_rois, risk_free_rois, initial_risk_wealth,
             initial_risk_free_wealth, buy_trans_fee, sell_trans_fee,
             start_date, end_date, window_length, n_scenario, bias,
-            verbose)
+            verbose, solver_io=solver_io)
 
         self.alpha = float(alpha)
+        self.rolling_horizon = rolling_horizon
+        self.rolling_step = rolling_step
 
         # try to load generated scenario panel
         scenario_name = "{}_{}_m{}_w{}_s{}_{}_{}.pkl".format(
@@ -272,10 +420,14 @@ class MinMSCVaRAvgSPPortfolio(SPTradingPortfolio):
 
 
     def get_trading_func_name(self, *args, **kwargs):
-        return "MS_MinCVaRAvgSP_m{}_w{}_s{}_{}_{}_a{:.2f}".format(
+        func_name = "MS_MinCVaRAvgSP_m{}_w{}_s{}_{}_{}_a{:.2f}".format(
             self.n_stock, self.window_length, self.n_scenario,
             "biased" if self.bias_estimator else "unbiased",
             self.scenario_cnt, self.alpha)
+        if self.rolling_horizon is not None:
+            func_name = "{}_rh{}_{}".format(func_name, self.rolling_horizon,
+                                            self.rolling_step)
+        return func_name
 
 
     def get_estimated_risk_free_rois(self, *arg, **kwargs):
@@ -304,6 +456,25 @@ class MinMSCVaRAvgSPPortfolio(SPTradingPortfolio):
           - key: alpha, str
           - value: results, dict
         """
+        if self.rolling_horizon is not None:
+            return min_ms_cvar_avgsp_rolling_portfolio(
+                self.symbols,
+                self.exp_risk_rois.index,
+                self.exp_risk_rois.as_matrix(),
+                self.risk_free_rois.as_matrix(),
+                kwargs['allocated_risk_wealth'].as_matrix(),
+                kwargs['allocated_risk_free_wealth'],
+                self.buy_trans_fee,
+                self.sell_trans_fee,
+                self.alpha,
+                kwargs['estimated_risk_rois'].as_matrix(),
+                kwargs['estimated_risk_free_roi'],
+                self.n_scenario,
+                rolling_horizon=self.rolling_horizon,
+                rolling_step=self.rolling_step,
+                solver_io=self.solver_io,
+            )
+
         results = min_ms_cvar_avgsp_portfolio(
             self.symbols,
             self.exp_risk_rois.index,
@@ -317,6 +488,7 @@ class MinMSCVaRAvgSPPortfolio(SPTradingPortfolio):
             kwargs['estimated_risk_rois'].as_matrix(),
             kwargs['estimated_risk_free_roi'],
             self.n_scenario,
+            solver_io=self.solver_io,
         )
         return results
 
@@ -383,6 +555,10 @@ class MinMSCVaRAvgSPPortfolio(SPTradingPortfolio):
         simulation_reports['scenario_cnt'] = self.scenario_cnt
         simulation_reports['buy_amounts_df'] = buy_amounts_df
         simulation_reports['sell_amounts_df'] =sell_amounts_df
+        simulation_reports['estimated_var_arr'] = estimated_var_arr
+        simulation_reports['estimated_cvar'] = estimated_cvar
+        simulation_reports['rolling_horizon'] = self.rolling_horizon
+        simulation_reports['rolling_step'] = self.rolling_step
 
         # add simulation time
         simulation_reports['simulation_time'] = time() - 0
@@ -426,12 +602,12 @@ class MinMSCVaRAvgSPPortfolio(SPTradingPortfolio):
                         real_risk_free_wealth[Tdx])
 
         real_feasible = np.all(real_risk_wealth_df>0)
-        print "real estimated risk_wealth: {}, feasible: {}".format(
-                real_estimated_final_wealth, real_feasible)
+        logger.info("real estimated risk_wealth: {}, feasible: {}".format(
+                real_estimated_final_wealth, real_feasible))
         simulation_reports['real_estimated_final_wealth'] = real_estimated_final_wealth
         simulation_reports['real_feasible'] = real_feasible
 
-        print ("{} {} OK [{}-{}], {:.4f}.secs".format(
+        logger.info("{} {} OK [{}-{}], {:.4f}.secs".format(
             func_name, self.alpha, self.exp_risk_rois.index[0],
             self.exp_risk_rois.index[Tdx], time() - t0))
 
@@ -14,6 +14,11 @@ from pyomo.environ import *
 from pyomo.opt import SolverStatus, TerminationCondition
 from PySPPortfolio.pysp_portfolio import *
 from base_model import (SPTradingPortfolio, )
+from log_utils import (get_logger,)
+from solvers import (solve_model,)
+
+logger = get_logger('min_ms_cvar_eventsp')
+
 
 def min_ms_cvar_eventsp_portfolio(symbols, trans_dates, risk_rois,
                                 risk_free_rois, allocated_risk_wealth,
@@ -21,7 +26,7 @@ def min_ms_cvar_eventsp_portfolio(symbols, trans_dates, risk_rois,
                                 sell_trans_fee, alpha, predict_risk_rois,
                                 predict_risk_free_roi, n_scenario=200,
                                 solver = DEFAULT_SOLVER, verbose=False,
-                                solver_io="lp", keepfiles=False):
+                                solver_io=None, keepfiles=False):
     """
     in each period, when the decision variables have branch, using the
     expected decisions
@@ -39,9 +44,10 @@ def min_ms_cvar_eventsp_portfolio(symbols, trans_dates, risk_rois,
     predict_risk_free_rois: numpy.array, shape: (n_exp_period,)
     n_scenario: integer
     solver: str, supported by Pyomo
-    solve_io: {"lp", "nl", "os", "python"}
+    solver_io: {"lp", "nl", "os", "python"} or None, None for the in-process
+        interface with the fallback to "lp", see solvers.create_solver
     """
-    print ("start time: {}".format(datetime.now()))
+    logger.debug("start time: {}".format(datetime.now()))
     t0 = time()
     n_exp_period = risk_rois.shape[0]
     n_stock = len(symbols)
@@ -109,10 +115,11 @@ def min_ms_cvar_eventsp_portfolio(symbols, trans_dates, risk_rois,
     instance.Ys = Var(instance.exp_periods, instance.scenarios,
                       within=NonNegativeReals)
 
-    print ("dimensions (exp_period, stock, scenarios)=({}, {}, {})".format(
+    logger.debug("dimensions (exp_period, stock, scenarios)="
+                 "({}, {}, {})".format(
         n_exp_period, n_stock, n_scenario))
-    print ("*"*50)
-    print ("constructing risk wealth constraints")
+    logger.debug("*"*50)
+    logger.debug("constructing risk wealth constraints")
 
     # constraint
     def risk_wealth_constraint_rule(model, tdx, mdx, sdx):
@@ -210,10 +217,10 @@ def min_ms_cvar_eventsp_portfolio(symbols, trans_dates, risk_rois,
         instance.exp_periods, instance.symbols,
         rule=sell_expected_decision_rule
     )
-    print ("min_ms_cvar_eventsp {} risk wealth decisions constraints OK, "
-           "{:.3f} secs".format(param, time() - t0))
-    print ("*" * 50)
-    print ("constructing risk free wealth constraints")
+    logger.info("min_ms_cvar_eventsp {} risk wealth decisions constraints OK, "
+                "{:.3f} secs".format(param, time() - t0))
+    logger.debug("*" * 50)
+    logger.debug("constructing risk free wealth constraints")
     t1 = time()
 
     # constraint
@@ -257,10 +264,10 @@ def min_ms_cvar_eventsp_portfolio(symbols, trans_dates, risk_rois,
     instance.risk_free_wealth_decision_constraint = Constraint(
         instance.exp_periods, rule=risk_free_wealth_decision_rule
     )
-    print ("min_ms_cvar_eventsp {} risk free wealth decisions constraints OK, "
-           "{:.3f} secs".format(param, time() - t1))
-    print ("*"*50)
-    print ("constructing CVaR constraints")
+    logger.info("min_ms_cvar_eventsp {} risk free wealth decisions "
+                "constraints OK, {:.3f} secs".format(param, time() - t1))
+    logger.debug("*"*50)
+    logger.debug("constructing CVaR constraints")
     t2 = time()
 
     # constraint
@@ -283,10 +290,10 @@ def min_ms_cvar_eventsp_portfolio(symbols, trans_dates, risk_rois,
         instance.exp_periods, instance.scenarios,
         rule=cvar_constraint_rule)
 
-    print ("min_ms_cvar_eventsp {} CVaR constraints OK, "
-           "{:.3f} secs".format(param, time() - t2))
-    print ("*"*50)
-    print ("constructing objective rule.")
+    logger.info("min_ms_cvar_eventsp {} CVaR constraints OK, "
+                "{:.3f} secs".format(param, time() - t2))
+    logger.debug("*"*50)
+    logger.debug("constructing objective rule.")
     t3 = time()
 
     # objective
@@ -303,22 +310,21 @@ def min_ms_cvar_eventsp_portfolio(symbols, trans_dates, risk_rois,
     instance.cvar_objective = Objective(rule=cvar_objective_rule,
                                         sense=maximize)
     # solve
-    print ("min_ms_cvar_eventsp {} objective OK {:.3f} secs, "
-           "start solving:".format(param, time()-t3))
+    logger.info("min_ms_cvar_eventsp {} objective OK {:.3f} secs, "
+                "start solving:".format(param, time()-t3))
 
     t4 = time()
-    opt = SolverFactory(solver, solver_io=solver_io)
-    results = opt.solve(instance, keepfiles=keepfiles)
-    instance.solutions.load_from(results)
+    results = solve_model(instance, solver, solver_io=solver_io,
+                          keepfiles=keepfiles)
     if verbose:
         display(instance)
 
-    print ("solve min_ms_cvar_eventsp {} OK {:.2f} secs".format(
+    logger.info("solve min_ms_cvar_eventsp {} OK {:.2f} secs".format(
         param, time() - t4))
-    print ("solver status: {}".format(results.solver.status))
-    print ("solver termination cond: {}".format(
+    logger.debug("solver status: {}".format(results.solver.status))
+    logger.debug("solver termination cond: {}".format(
         results.solver.termination_condition))
-    print (results.solver)
+    logger.debug(results.solver)
 
      # extract results
     proxy_buy_pnl = np.zeros((n_exp_period, n_stock, n_scenario))
@@ -382,7 +388,7 @@ def min_ms_cvar_eventsp_portfolio(symbols, trans_dates, risk_rois,
 
     Tdx = instance.n_exp_period - 1
     exp_final_wealth = risk_df[Tdx].sum() + risk_free_arr[Tdx]
-    print ("{} expected_final_total_wealth: {:.2f}".format(
+    logger.info("{} expected_final_total_wealth: {:.2f}".format(
         param, exp_final_wealth ))
 
     results = {
@@ -419,7 +425,7 @@ class MinMSCVaREventSPPortfolio(SPTradingPortfolio):
                  bias=BIAS_ESTIMATOR,
                  alpha=0.9,
                  scenario_cnt=1,
-                 verbose=False, solver_io="lp", keepfiles=False):
+                 verbose=False, solver_io=None, keepfiles=False):
         """
         Multistage min cvar event scenario
         """
@@ -427,10 +433,9 @@ class MinMSCVaREventSPPortfolio(SPTradingPortfolio):
             symbols, risk_rois, risk_free_rois, initial_risk_wealth,
             initial_risk_free_wealth, buy_trans_fee, sell_trans_fee,
             start_date, end_date, window_length, n_scenario, bias,
-            verbose)
+            verbose, solver_io=solver_io)
 
         self.alpha = float(alpha)
-        self.solver_io = solver_io
         self.keepfiles = keepfiles
 
         # try to load generated scenario panel
@@ -451,7 +456,7 @@ class MinMSCVaREventSPPortfolio(SPTradingPortfolio):
             if start_date != START_DATE or end_date != END_DATE:
                 self.scenario_panel = self.scenario_panel.loc[
                                       start_date:end_date]
-                print ("scenario panel dates:{}-{}".format(
+                logger.info("scenario panel dates:{}-{}".format(
                     self.scenario_panel.items[0],
                     self.scenario_panel.items[-1]))
             self.scenario_cnt = scenario_cnt
@@ -587,7 +592,7 @@ class MinMSCVaREventSPPortfolio(SPTradingPortfolio):
         # add simulation time
         simulation_reports['simulation_time'] = time() - t0
 
-        print ("{} {} OK [{}-{}], {:.4f}.secs".format(
+        logger.info("{} {} OK [{}-{}], {:.4f}.secs".format(
             func_name, self.alpha, self.exp_risk_rois.index[0],
             self.exp_risk_rois.index[Tdx], time() - t0))
 
@@ -13,7 +13,12 @@ from pyomo.environ import *
 from pyomo.opt import SolverStatus, TerminationCondition
 
 from PySPPortfolio.pysp_portfolio import *
+from data_store import (load_roi_df,)
 from base_model import (SPTradingPortfolio, )
+from log_utils import (get_logger,)
+from solvers import (solve_model,)
+
+logger = get_logger('min_ms_cvar_fullsp')
 
 
 def min_ms_cvar_fullsp_portfolio(symbols, trans_dates, risk_rois,
@@ -21,7 +26,8 @@ def min_ms_cvar_fullsp_portfolio(symbols, trans_dates, risk_rois,
                                  allocated_risk_free_wealth, buy_trans_fee,
                                  sell_trans_fee, alpha, predict_risk_rois,
                                  predict_risk_free_roi, n_scenario,
-                                 solver=DEFAULT_SOLVER, verbose=False):
+                                 solver=DEFAULT_SOLVER, verbose=False,
+                                 solver_io=None):
     """
     after generating all scenarios, solving the SP at once
 
@@ -37,19 +43,23 @@ def min_ms_cvar_fullsp_portfolio(symbols, trans_dates, risk_rois,
     predict_risk_free_rois: float
     n_scenario: integer
     solver: str, supported by Pyomo
+    solver_io: string or None, the interface of the solver, see
+        solvers.create_solver
 
     """
     t0 = time()
 
     n_exp_period = risk_rois.shape[0]
     if n_exp_period > 3:
-        raise ValueError("we can only solve 3-stage full sp.")
+        raise ValueError("we can only solve 3-stage full sp, using "
+                         "min_ms_cvar_sddp_portfolio for more stages.")
     n_stock = len(symbols)
 
     param = "{}_{}_m{}_p{}_s{}_a{:.2f}".format(
         START_DATE.strftime("%Y%m%d"), END_DATE.strftime("%Y%m%d"),
         n_stock, n_exp_period, n_scenario, alpha)
-    print ("min_ms_cvar_sp {} objective ready to construct.".format(param))
+    logger.info("min_ms_cvar_sp {} objective ready to construct.".format(
+        param))
 
     # concrete model
     instance = ConcreteModel(name="ms_min_cvar_fullsp_portfolio")
@@ -228,11 +238,12 @@ def min_ms_cvar_fullsp_portfolio(symbols, trans_dates, risk_rois,
                   float( n_scenario))
         cvar1 = (model.Z - s1_exp /(1. - model.alpha))
 
+        # the expected CVaR of the 2nd stage over the 1st stage scenarios
         exp_cvar2 = 0
         for sdx in xrange(n_scenario):
-            s2_exp = (sum(model.Ys2[sdx, sdx2] for sdx2 in xrange(n_scenario)))
-            cvar2 = (model.Z2[sdx] - s2_exp/(1. -
-                                             model.alpha))/n_scenario/n_scenario
+            s2_exp = (sum(model.Ys2[sdx, sdx2] for sdx2 in xrange(n_scenario))
+                      / float(n_scenario))
+            cvar2 = (model.Z2[sdx] - s2_exp / (1. - model.alpha)) / n_scenario
             exp_cvar2 += cvar2
 
         return cvar1 + exp_cvar2
@@ -240,29 +251,44 @@ def min_ms_cvar_fullsp_portfolio(symbols, trans_dates, risk_rois,
     instance.cvar_objective = Objective(rule=cvar_objective_rule,
                                             sense=maximize)
     # solve
-    print "start solving:"
+    logger.info("start solving:")
     t1 = time()
-    opt = SolverFactory(solver)
-    results = opt.solve(instance)
-    instance.solutions.load_from(results)
-    display(instance)
+    results = solve_model(instance, solver, solver_io=solver_io)
+    if verbose:
+        display(instance)
 
-    print ("solve min_ms_cvar_fullsp {} OK {:.2f} secs".format(
+    logger.info("solve min_ms_cvar_fullsp {} OK {:.2f} secs".format(
             param, time() - t1))
-    print ("solver status: {}".format(results.solver.status))
-    print ("solver termination cond: {}".format(
+    logger.debug("solver status: {}".format(results.solver.status))
+    logger.debug("solver termination cond: {}".format(
         results.solver.termination_condition))
-    print (results.solver)
+    logger.debug(results.solver)
 
-    print ("Objective: {}".format(instance.cvar_objective()))
-    print ("VaR[0]: {}".format(instance.Z.value))
+    logger.info("Objective: {}".format(instance.cvar_objective()))
+    logger.debug("VaR[0]: {}".format(instance.Z.value))
     for tdx in xrange(n_scenario):
-        print ("VaR[1, {}]: {}".format(tdx, instance.Z2[tdx].value))
+        logger.debug("VaR[1, {}]: {}".format(tdx, instance.Z2[tdx].value))
 
     for mdx in xrange(n_stock):
-        print ("buy amounts:{}".format(instance.buy_amounts[mdx].value))
-        print ("sell amounts:{}".format(instance.sell_amounts[mdx].value))
-        print ("risk_wealth:{}".format(instance.risk_wealth[mdx].value))
+        logger.debug("buy amounts:{}".format(instance.buy_amounts[mdx].value))
+        logger.debug("sell amounts:{}".format(
+            instance.sell_amounts[mdx].value))
+        logger.debug("risk_wealth:{}".format(instance.risk_wealth[mdx].value))
+
+    return {
+        # the first stage decisions
+        "buy_amounts": pd.Series([instance.buy_amounts[mdx].value
+                                  for mdx in xrange(n_stock)], index=symbols),
+        "sell_amounts": pd.Series([instance.sell_amounts[mdx].value
+                                   for mdx in xrange(n_stock)],
+                                  index=symbols),
+        "risk_wealth": pd.Series([instance.risk_wealth[mdx].value
+                                  for mdx in xrange(n_stock)], index=symbols),
+        "risk_free_wealth": instance.risk_free_wealth.value,
+        "estimated_var": instance.Z.value,
+        # the sum of the CVaR of all stages
+        "estimated_cvar": instance.cvar_objective(),
+    }
 
 
 def run_min_ms_cvar_fullsp_simulation(n_stock, win_length,
@@ -297,18 +323,8 @@ def run_min_ms_cvar_fullsp_simulation(n_stock, win_length,
         n_stock, win_length, n_scenario, "biased" if bias else "unbiased",
         scenario_cnt, alpha)
 
-    # read rois panel
-    roi_path = os.path.join(SYMBOLS_PKL_DIR,
-                            'TAIEX_2005_largest50cap_panel.pkl')
-    if not os.path.exists(roi_path):
-        raise ValueError("{} roi panel does not exist.".format(roi_path))
-
-    # shape: (n_period, n_stock, {'simple_roi', 'close_price'})
-    roi_panel = pd.read_pickle(roi_path)
-
-    # shape: (n_period, n_stock)
-    exp_risk_rois = roi_panel.loc[start_date:end_date, symbols,
-                    'simple_roi'].T
+    # read rois from the data store, shape: (n_period, n_stock)
+    exp_risk_rois = load_roi_df(symbols, start_date, end_date)
     n_period = exp_risk_rois.shape[0]
     initial_risk_wealth = pd.Series(np.zeros(n_stock), index=symbols)
     initial_risk_free_wealth = 100.
@@ -333,7 +349,8 @@ def run_min_ms_cvar_fullsp_simulation(n_stock, win_length,
                                  0,
                                  n_scenario
                                  )
-    print ("min_ms_cvar_fullsp_portfolio:{} {} secs".format(param, time()-t0))
+    logger.info("min_ms_cvar_fullsp_portfolio:{} {} secs".format(
+        param, time()-t0))
 
 if __name__ == '__main__':
     run_min_ms_cvar_fullsp_simulation(5, 70, date(2005,1,3), date(2005,1,5),
@@ -0,0 +1,434 @@
+# -*- coding: utf-8 -*-
+"""
+Authors: Hung-Hsin Chen <chenhh@par.cse.nsysu.edu.tw>
+License: GPL v2
+
+multi-stage min CVaR portfolio solved by progressive hedging (PH).
+
+The scenario of PH is a path of the realized rois, where the roi of the
+stage t >= 1 of the path s is predict_risk_rois[t-1, :, s]. Each path is a
+multi-stage CVaR subproblem as min_ms_cvar_sp_portfolio, and only the first
+stage buy_amounts and sell_amounts are non-anticipative. The subproblems
+are solved independently in a process pool, the non-anticipativity is
+enforced by the PH weights and the quadratic proximal terms.
+
+scenario subproblem s (maximization),
+max  sum_t CVaR_t(s) - w_s * x_s - rho/2 * ||x_s - x_bar||^2
+where x_s = (buy_amounts[0, :], sell_amounts[0, :]) of the path s.
+"""
+
+from __future__ import division
+from time import time
+from datetime import date
+import os
+import multiprocessing as mp
+from multiprocessing import Pool
+import numpy as np
+import pandas as pd
+from pyomo.environ import *
+from pyomo.opt import SolverStatus, TerminationCondition
+
+from PySPPortfolio.pysp_portfolio import *
+from data_store import (load_roi_df,)
+from log_utils import (get_logger,)
+from solvers import (solve_model,)
+
+logger = get_logger('min_ms_cvar_ph')
+
+# data shared by the subproblems in a worker process, set by _init_ph_worker
+_PH_DATA = {}
+
+
+def _init_ph_worker(data):
+    """
+    initializer of the worker processes, the data of the problem is sent
+    once to each process instead of in each task.
+    """
+    _PH_DATA.clear()
+    _PH_DATA.update(data)
+
+
+def _solve_ph_subproblem(path, weights, x_bar, rho):
+    """
+    solving the scenario subproblem of the path
+
+    Parameters:
+    ------------
+    path: integer, index of scenario path
+    weights: numpy.array, shape: (2 * n_stock,), PH weights of the path,
+        None in the first iteration
+    x_bar: numpy.array, shape: (2 * n_stock,), the average first stage
+        buy and sell amounts, None in the first iteration
+    rho: float, PH penalty
+
+    Returns:
+    ------------
+    (path, first stage decisions, sum of the CVaR of the path)
+    """
+    risk_rois = _PH_DATA['risk_rois']
+    risk_free_rois = _PH_DATA['risk_free_rois']
+    predict_risk_rois = _PH_DATA['predict_risk_rois']
+    n_exp_period, n_stock, n_scenario = predict_risk_rois.shape
+
+    # concrete model
+    instance = ConcreteModel(name="ms_min_cvar_ph_path_{}".format(path))
+
+    # data
+    instance.allocated_risk_wealth = _PH_DATA['allocated_risk_wealth']
+    instance.allocated_risk_free_wealth = _PH_DATA[
+        'allocated_risk_free_wealth']
+    instance.buy_trans_fee = _PH_DATA['buy_trans_fee']
+    instance.sell_trans_fee = _PH_DATA['sell_trans_fee']
+    instance.alpha = _PH_DATA['alpha']
+
+    # Set
+    instance.exp_periods = np.arange(n_exp_period)
+    instance.symbols = np.arange(n_stock)
+    instance.scenarios = np.arange(n_scenario)
+
+    # decision variables
+    instance.buy_amounts = Var(instance.exp_periods, instance.symbols,
+                               within=NonNegativeReals)
+    instance.sell_amounts = Var(instance.exp_periods, instance.symbols,
+                                within=NonNegativeReals)
+    instance.risk_wealth = Var(instance.exp_periods, instance.symbols,
+                               within=NonNegativeReals)
+    instance.risk_free_wealth = Var(instance.exp_periods,
+                                    within=NonNegativeReals)
+    instance.Z = Var(instance.exp_periods, within=Reals)
+    instance.Ys = Var(instance.exp_periods, instance.scenarios,
+                      within=NonNegativeReals)
+
+    # constraint
+    def risk_wealth_constraint_rule(model, tdx, mdx):
+        """
+        Parameters
+        ------------
+        tdx: integer, time index of period
+        mdx: integer, index of symbol
+        """
+        if tdx == 0:
+            prev_risk_wealth = model.allocated_risk_wealth[mdx]
+            risk_roi = risk_rois[tdx, mdx]
+        else:
+            prev_risk_wealth = model.risk_wealth[tdx - 1, mdx]
+            # the roi of the path
+            risk_roi = predict_risk_rois[tdx - 1, mdx, path]
+
+        return (model.risk_wealth[tdx, mdx] ==
+                (1. + risk_roi) * prev_risk_wealth +
+                model.buy_amounts[tdx, mdx] - model.sell_amounts[tdx, mdx])
+
+    instance.risk_wealth_constraint = Constraint(
+        instance.exp_periods, instance.symbols,
+        rule=risk_wealth_constraint_rule)
+
+    # constraint
+    def risk_free_wealth_constraint_rule(model, tdx):
+        """
+        Parameters:
+        ------------
+        tdx: integer, time index of period
+        """
+        total_sell = sum((1. - model.sell_trans_fee) *
+                         model.sell_amounts[tdx, mdx] for mdx in model.symbols)
+        total_buy = sum((1. + model.buy_trans_fee) *
+                        model.buy_amounts[tdx, mdx] for mdx in model.symbols)
+        if tdx == 0:
+            prev_risk_free_wealth = model.allocated_risk_free_wealth
+        else:
+            prev_risk_free_wealth = model.risk_free_wealth[tdx - 1]
+
+        return (model.risk_free_wealth[tdx] ==
+                (1. + risk_free_rois[tdx]) * prev_risk_free_wealth +
+                total_sell - total_buy)
+
+    instance.risk_free_wealth_constraint = Constraint(
+        instance.exp_periods, rule=risk_free_wealth_constraint_rule)
+
+    # constraint
+    def cvar_constraint_rule(model, tdx, sdx):
+        """
+        auxiliary variable Y depends on scenario. CVaR <= VaR
+        Parameters:
+        ------------
+        tdx: integer, time index of period
+        sdx: integer, scenario index
+        """
+        portfolio_wealth = sum((1. + predict_risk_rois[tdx, mdx, sdx]) *
+                               model.risk_wealth[tdx, mdx]
+                               for mdx in model.symbols)
+        return model.Ys[tdx, sdx] >= (model.Z[tdx] - portfolio_wealth)
+
+    instance.cvar_constraint = Constraint(
+        instance.exp_periods, instance.scenarios,
+        rule=cvar_constraint_rule)
+
+    def cvar_expr(model):
+        cvar_expr_sum = 0
+        for tdx in model.exp_periods:
+            scenario_expectation = (sum(model.Ys[tdx, sdx]
+                                        for sdx in model.scenarios) /
+                                    float(n_scenario))
+            cvar_expr_sum = cvar_expr_sum + (
+                model.Z[tdx] - scenario_expectation / (1. - model.alpha))
+        return cvar_expr_sum
+
+    # objective
+    def ph_objective_rule(model):
+        # first stage decisions
+        x = [model.buy_amounts[0, mdx] for mdx in model.symbols]
+        x.extend(model.sell_amounts[0, mdx] for mdx in model.symbols)
+
+        objective = cvar_expr(model)
+        if weights is not None:
+            objective = objective - sum(weights[idx] * x[idx]
+                                        for idx in xrange(2 * n_stock))
+            objective = objective - rho / 2. * sum(
+                (x[idx] - x_bar[idx]) * (x[idx] - x_bar[idx])
+                for idx in xrange(2 * n_stock))
+        return objective
+
+    instance.ph_objective = Objective(rule=ph_objective_rule, sense=maximize)
+
+    # the solver is reused by the subproblems of the worker
+    results = solve_model(instance, _PH_DATA['solver'],
+                          solver_io=_PH_DATA['solver_io'])
+    if (results.solver.termination_condition !=
+            TerminationCondition.optimal):
+        raise ValueError("solving {} failed: {}".format(
+            instance.name, results.solver.termination_condition))
+
+    x_path = np.zeros(2 * n_stock)
+    for mdx in xrange(n_stock):
+        x_path[mdx] = instance.buy_amounts[0, mdx].value
+        x_path[n_stock + mdx] = instance.sell_amounts[0, mdx].value
+
+    return path, x_path, value(cvar_expr(instance))
+
+
+def _solve_ph_subproblem_star(args):
+    return _solve_ph_subproblem(*args)
+
+
+def min_ms_cvar_ph_portfolio(symbols, trans_dates, risk_rois,
+                             risk_free_rois, allocated_risk_wealth,
+                             allocated_risk_free_wealth, buy_trans_fee,
+                             sell_trans_fee, alpha, predict_risk_rois,
+                             predict_risk_free_rois, n_scenario=200,
+                             n_path=None, rho=None, max_iteration=100,
+                             convergence_tolerance=1e-4, n_process=None,
+                             solver=DEFAULT_SOLVER, verbose=False,
+                             solver_io=None):
+    """
+    multi-stage min CVaR portfolio with progressive hedging
+
+    symbols: list of string
+    risk_rois: numpy.array, shape: (n_exp_period, n_stock)
+    risk_free_rois: numpy.array,, shape: (n_exp_period,)
+    allocated_risk_wealth: numpy.array, shape: (n_stock,)
+    allocated_risk_free_wealth: float
+    buy_trans_fee: float
+    sell_trans_fee: float
+    alpha: float
+    predict_risk_rois: numpy.array, shape: (n_exp_period, n_stock, n_scenario)
+    predict_risk_free_rois: numpy.array, shape: (n_exp_period,)
+    n_scenario: integer
+    n_path: integer or None, number of scenario paths, None for n_scenario
+    rho: float or None, PH penalty, None for 1/(initial wealth)
+    max_iteration: integer, maximum number of PH iterations
+    convergence_tolerance: float, the average distance of the first stage
+        decisions to their mean relative to the initial wealth for stopping
+    n_process: integer or None, size of process pool, None for cpu_count
+    solver: str, supported by Pyomo, the solver must support quadratic
+        objectives
+    solver_io: string or None, the interface of the solver, see
+        solvers.create_solver
+
+    Returns:
+    ------------
+    dict, the non-anticipative first stage decisions and the convergence
+    history
+    """
+    t0 = time()
+    n_exp_period = risk_rois.shape[0]
+    n_stock = len(symbols)
+    if n_path is None:
+        n_path = n_scenario
+    n_path = int(n_path)
+    if not 1 <= n_path <= n_scenario:
+        raise ValueError("wrong n_path: {}".format(n_path))
+    if n_process is None:
+        n_process = mp.cpu_count()
+
+    param = "{}_{}_m{}_p{}_s{}_a{:.2f}".format(
+        trans_dates[0].strftime("%Y%m%d"), trans_dates[-1].strftime("%Y%m%d"),
+        n_stock, n_exp_period, n_scenario, alpha)
+
+    allocated_risk_wealth = np.asarray(allocated_risk_wealth, dtype=np.float)
+    initial_wealth = allocated_risk_wealth.sum() + allocated_risk_free_wealth
+    if rho is None:
+        rho = 1. / initial_wealth
+
+    data = {
+        'risk_rois': np.asarray(risk_rois),
+        'risk_free_rois': np.asarray(risk_free_rois),
+        'predict_risk_rois': np.asarray(predict_risk_rois),
+        'allocated_risk_wealth': allocated_risk_wealth,
+        'allocated_risk_free_wealth': allocated_risk_free_wealth,
+        'buy_trans_fee': buy_trans_fee,
+        'sell_trans_fee': sell_trans_fee,
+        'alpha': alpha,
+        'solver': solver,
+        'solver_io': solver_io,
+    }
+
+    # shape: (n_path, 2 * n_stock)
+    x_paths = np.zeros((n_path, 2 * n_stock))
+    weights = np.zeros((n_path, 2 * n_stock))
+    path_values = np.zeros(n_path)
+    x_bar = None
+    convergences, objectives = [], []
+
+    pool = Pool(n_process, initializer=_init_ph_worker, initargs=(data,))
+    try:
+        for itx in xrange(max_iteration):
+            t1 = time()
+            if itx == 0:
+                tasks = [(path, None, None, rho) for path in xrange(n_path)]
+            else:
+                tasks = [(path, weights[path], x_bar, rho)
+                         for path in xrange(n_path)]
+            for path, x_path, path_value in pool.imap_unordered(
+                    _solve_ph_subproblem_star, tasks):
+                x_paths[path] = x_path
+                path_values[path] = path_value
+
+            x_bar = x_paths.mean(axis=0)
+            weights += rho * (x_paths - x_bar)
+            convergence = (np.abs(x_paths - x_bar).sum(axis=1).mean() /
+                           initial_wealth)
+            convergences.append(convergence)
+            objectives.append(path_values.mean())
+
+            logger.info("min_ms_cvar_ph {} iteration {}: convergence: {:.6f}, "
+                        "expected cvar: {:.6f}, {:.3f} secs".format(
+                    param, itx + 1, convergence, path_values.mean(),
+                    time() - t1))
+            if convergence < convergence_tolerance:
+                break
+    except BaseException:
+        # terminating the workers of a failed subproblem
+        pool.terminate()
+        raise
+    else:
+        pool.close()
+    finally:
+        pool.join()
+
+    if verbose:
+        logger.debug("first stage buy amounts: {}".format(x_bar[:n_stock]))
+        logger.debug("first stage sell amounts: {}".format(x_bar[n_stock:]))
+
+    logger.info("min_ms_cvar_ph {} OK, {} iterations, {:.3f} secs".format(
+        param, len(convergences), time() - t0))
+
+    results = {
+        # shape: (n_stock, )
+        "buy_amounts": pd.Series(x_bar[:n_stock], index=symbols),
+        "sell_amounts": pd.Series(x_bar[n_stock:], index=symbols),
+        # shape: (n_path, n_stock)
+        "path_buy_amounts_df": pd.DataFrame(x_paths[:, :n_stock],
+                                            columns=symbols),
+        "path_sell_amounts_df": pd.DataFrame(x_paths[:, n_stock:],
+                                             columns=symbols),
+        # float, the expected sum of the CVaR of all stages
+        "estimated_cvar": path_values.mean(),
+        # shape: (n_iteration, )
+        "convergences": np.array(convergences),
+        "objectives": np.array(objectives),
+        "n_path": n_path,
+        "rho": rho,
+        "ph_time": time() - t0,
+    }
+    return results
+
+
+def run_min_ms_cvar_ph_simulation(n_stock, win_length, start_date, end_date,
+                                  n_scenario=200, bias=False, scenario_cnt=1,
+                                  alpha=0.95, n_path=None, rho=None,
+                                  max_iteration=100, n_process=None,
+                                  verbose=False):
+    """
+    multi-stage SP simulation with progressive hedging
+
+    Parameters:
+    -------------------
+    n_stock: integer, number of stocks of the EXP_SYMBOLS to the portfolios
+    window_length: integer, number of periods for estimating scenarios
+    start_date, end_date: datetime.date, the stages of the problem
+    n_scenario, int, number of scenarios
+    bias: bool, biased moment estimators or not
+    scenario_cnt: count of generated scenarios, default = 1
+    alpha: float, for conditional risk
+    n_path: integer or None, number of scenario paths
+    rho: float or None, PH penalty
+    max_iteration: integer, maximum number of PH iterations
+    n_process: integer or None, size of process pool
+
+    Returns:
+    --------------------
+    reports
+    """
+    t0 = time()
+    n_stock, win_length, = int(n_stock), int(win_length)
+    n_scenario = int(n_scenario)
+
+    # getting experiment symbols
+    symbols = EXP_SYMBOLS[:n_stock]
+    param = "{}_{}_m{}_w{}_s{}_{}_{}_a{:.2f}".format(
+        start_date.strftime("%Y%m%d"), end_date.strftime("%Y%m%d"),
+        n_stock, win_length, n_scenario, "biased" if bias else "unbiased",
+        scenario_cnt, alpha)
+
+    # read rois from the data store, shape: (n_period, n_stock)
+    exp_risk_rois = load_roi_df(symbols, start_date, end_date)
+    n_period = exp_risk_rois.shape[0]
+    initial_risk_free_wealth = 1e6
+
+    scenario_name = "{}_{}_m{}_w{}_s{}_{}_{}.pkl".format(
+        START_DATE.strftime("%Y%m%d"), END_DATE.strftime("%Y%m%d"),
+        len(symbols), win_length, n_scenario,
+        "biased" if bias else "unbiased", scenario_cnt)
+
+    scenario_path = os.path.join(EXP_SP_PORTFOLIO_DIR, 'scenarios',
+                                 scenario_name)
+    if not os.path.exists(scenario_path):
+        raise ValueError("{} scenario does not exist.".format(scenario_path))
+
+    # shape: (n_period, n_stock, n_scenario)
+    scenario_panel = pd.read_pickle(scenario_path)
+    predict_risk_rois = scenario_panel.loc[start_date:end_date]
+
+    reports = min_ms_cvar_ph_portfolio(
+        symbols, exp_risk_rois.index, exp_risk_rois.as_matrix(),
+        np.zeros(n_period), np.zeros(n_stock), initial_risk_free_wealth,
+        BUY_TRANS_FEE, SELL_TRANS_FEE, alpha,
+        predict_risk_rois.as_matrix(), np.zeros(n_period), n_scenario,
+        n_path=n_path, rho=rho, max_iteration=max_iteration,
+        n_process=n_process, verbose=verbose)
+
+    prob_name = "min_ms_cvar_ph"
+    file_dir = os.path.join(EXP_SP_PORTFOLIO_DIR, prob_name)
+    if not os.path.exists(file_dir):
+        os.makedirs(file_dir)
+    file_name = '{}_{}.pkl'.format(prob_name, param)
+    pd.to_pickle(reports, os.path.join(file_dir, file_name))
+    logger.info("{} {} OK, {:.3f} secs".format(prob_name, param, time() - t0))
+
+    return reports
+
+
+if __name__ == '__main__':
+    run_min_ms_cvar_ph_simulation(5, 70, date(2005, 1, 3), date(2005, 1, 31),
+                                  alpha=0.9)
@@ -0,0 +1,509 @@
+# -*- coding: utf-8 -*-
+"""
+Authors: Hung-Hsin Chen <chenhh@par.cse.nsysu.edu.tw>
+License: GPL v2
+
+multi-stage min CVaR portfolio solved by stochastic dual dynamic programming
+(SDDP, nested Benders decomposition).
+
+The extensive form of min_ms_cvar_fullsp_portfolio has n_scenario^T nodes,
+and it can only be solved up to 3 stages. Assuming the scenarios of the
+periods are stagewise independent, the expected future CVaR of each stage
+is approximated by a set of cuts (outer approximation of the concave value
+function) which are shared by all nodes of the stage.
+
+stage t, t = 0, ..., T-1,
+state: risk_wealth[t-1, :], risk_free_wealth[t-1]
+realization: roi[t], risk_rois[0] at stage 0, and the scenarios of
+    predict_risk_rois[t-1] at the stage t >= 1.
+max  Z[t] - sum(Ys[t, s])/(n_scenario*(1-alpha)) + theta[t]
+s.t. risk_wealth[t, m] = (1+roi[t, m]) * risk_wealth[t-1, m] +
+                         buy[t, m] - sell[t, m]
+     risk_free_wealth[t] = (1+risk_free_roi[t]) * risk_free_wealth[t-1] +
+                           sum((1-sell_fee)*sell) - sum((1+buy_fee)*buy)
+     Ys[t, s] >= Z[t] - sum((1+predict_risk_rois[t, m, s])*risk_wealth[t, m])
+     theta[t] <= cut_k(risk_wealth[t, :], risk_free_wealth[t]), for all k
+"""
+
+from __future__ import division
+from time import time
+from datetime import date
+import os
+import numpy as np
+import pandas as pd
+from pyomo.environ import *
+from pyomo.opt import SolverStatus, TerminationCondition
+
+from PySPPortfolio.pysp_portfolio import *
+from data_store import (load_roi_df,)
+from log_utils import (get_logger,)
+from solvers import (create_solver,)
+
+logger = get_logger('min_ms_cvar_sddp')
+
+
+def _build_stage_model(stage, n_stock, n_scenario, buy_trans_fee,
+                       sell_trans_fee, alpha, stage_predict_risk_rois,
+                       theta_upper_bound, last_stage):
+    """
+    the stage model of the SDDP, the state and the realization are given by
+    the mutable parameters prev_risk_wealth and prev_risk_free_wealth,
+    which are the right hand sides of the wealth constraints. Therefore the
+    model is constructed only once and the cuts are appended to it.
+
+    Parameters:
+    ------------
+    stage: integer, index of stage
+    stage_predict_risk_rois: numpy.array, shape: (n_stock, n_scenario)
+    theta_upper_bound: float, the upper bound of the future value
+    last_stage: bool, there is no future value in the last stage
+    """
+    instance = ConcreteModel(name="ms_min_cvar_sddp_stage_{}".format(stage))
+
+    # data
+    instance.buy_trans_fee = buy_trans_fee
+    instance.sell_trans_fee = sell_trans_fee
+    instance.alpha = alpha
+    # shape: (n_stock, n_scenario)
+    instance.predict_risk_rois = stage_predict_risk_rois
+
+    # Set
+    instance.symbols = np.arange(n_stock)
+    instance.scenarios = np.arange(n_scenario)
+    instance.n_scenario = n_scenario
+
+    # state with the realized rois, (1+roi[t, m]) * risk_wealth[t-1, m]
+    instance.prev_risk_wealth = Param(instance.symbols, mutable=True,
+                                      initialize=0.)
+    # (1+risk_free_roi[t]) * risk_free_wealth[t-1]
+    instance.prev_risk_free_wealth = Param(mutable=True, initialize=0.)
+
+    # decision variables
+    instance.buy_amounts = Var(instance.symbols, within=NonNegativeReals)
+    instance.sell_amounts = Var(instance.symbols, within=NonNegativeReals)
+    instance.risk_wealth = Var(instance.symbols, within=NonNegativeReals)
+    instance.risk_free_wealth = Var(within=NonNegativeReals)
+    instance.Z = Var(within=Reals)
+    instance.Ys = Var(instance.scenarios, within=NonNegativeReals)
+
+    # future value of the stage
+    if last_stage:
+        instance.theta = Var(within=Reals, bounds=(0, 0))
+    else:
+        instance.theta = Var(within=Reals, bounds=(None, theta_upper_bound))
+
+    # constraint
+    def risk_wealth_constraint_rule(model, mdx):
+        """
+        Parameters
+        ------------
+        mdx: integer, index of symbol
+        """
+        return (model.risk_wealth[mdx] - model.buy_amounts[mdx] +
+                model.sell_amounts[mdx] == model.prev_risk_wealth[mdx])
+
+    instance.risk_wealth_constraint = Constraint(
+        instance.symbols, rule=risk_wealth_constraint_rule)
+
+    # constraint
+    def risk_free_wealth_constraint_rule(model):
+        total_sell = sum((1. - model.sell_trans_fee) *
+                         model.sell_amounts[mdx] for mdx in model.symbols)
+        total_buy = sum((1. + model.buy_trans_fee) *
+                        model.buy_amounts[mdx] for mdx in model.symbols)
+        return (model.risk_free_wealth - total_sell + total_buy ==
+                model.prev_risk_free_wealth)
+
+    instance.risk_free_wealth_constraint = Constraint(
+        rule=risk_free_wealth_constraint_rule)
+
+    # constraint
+    def cvar_constraint_rule(model, sdx):
+        """
+        auxiliary variable Y depends on scenario. CVaR <= VaR
+        Parameters:
+        ------------
+        sdx: integer, scenario index
+        """
+        portfolio_wealth = sum((1. + model.predict_risk_rois[mdx, sdx]) *
+                               model.risk_wealth[mdx]
+                               for mdx in model.symbols)
+        return model.Ys[sdx] >= (model.Z - portfolio_wealth)
+
+    instance.cvar_constraint = Constraint(
+        instance.scenarios, rule=cvar_constraint_rule)
+
+    # cuts of the future value, shared by all nodes of the stage
+    instance.cuts = ConstraintList()
+
+    # objective
+    def cvar_objective_rule(model):
+        scenario_expectation = (sum(model.Ys[sdx] for sdx in model.scenarios)
+                                / float(model.n_scenario))
+        return (model.Z - scenario_expectation / (1. - model.alpha) +
+                model.theta)
+
+    instance.cvar_objective = Objective(rule=cvar_objective_rule,
+                                        sense=maximize)
+
+    # import the duals of the wealth constraints for building cuts
+    instance.dual = Suffix(direction=Suffix.IMPORT)
+    return instance
+
+
+def _solve_stage_model(instance, opt, prev_risk_wealth, prev_risk_free_wealth):
+    """
+    setting the state of the stage model and solving it
+
+    Parameters:
+    ------------
+    prev_risk_wealth: numpy.array, shape: (n_stock,), the risk wealth
+        after the realized rois
+    prev_risk_free_wealth: float, the risk free wealth after the realized
+        risk free roi
+
+    Returns:
+    ------------
+    dict, stage objective, cvar, decisions and the duals of the wealth
+    constraints
+    """
+    n_stock = len(prev_risk_wealth)
+    for mdx in xrange(n_stock):
+        instance.prev_risk_wealth[mdx] = float(prev_risk_wealth[mdx])
+    instance.prev_risk_free_wealth = float(prev_risk_free_wealth)
+
+    results = opt.solve(instance)
+    instance.solutions.load_from(results)
+    if (results.solver.termination_condition !=
+            TerminationCondition.optimal):
+        raise ValueError("solving {} failed: {}".format(
+            instance.name, results.solver.termination_condition))
+
+    risk_duals = np.array([instance.dual[instance.risk_wealth_constraint[mdx]]
+                           for mdx in xrange(n_stock)])
+    risk_free_dual = instance.dual[instance.risk_free_wealth_constraint]
+    objective = instance.cvar_objective()
+    theta = instance.theta.value
+
+    return {
+        "objective": objective,
+        "cvar": objective - theta,
+        "VaR": instance.Z.value,
+        "buy_amounts": np.array([instance.buy_amounts[mdx].value
+                                 for mdx in xrange(n_stock)]),
+        "sell_amounts": np.array([instance.sell_amounts[mdx].value
+                                  for mdx in xrange(n_stock)]),
+        "risk_wealth": np.array([instance.risk_wealth[mdx].value
+                                 for mdx in xrange(n_stock)]),
+        "risk_free_wealth": instance.risk_free_wealth.value,
+        "risk_duals": risk_duals,
+        "risk_free_dual": risk_free_dual,
+    }
+
+
+def min_ms_cvar_sddp_portfolio(symbols, trans_dates, risk_rois,
+                               risk_free_rois, allocated_risk_wealth,
+                               allocated_risk_free_wealth, buy_trans_fee,
+                               sell_trans_fee, alpha, predict_risk_rois,
+                               predict_risk_free_rois, n_scenario=200,
+                               n_forward=5, n_backward_scenario=None,
+                               max_iteration=50, gap_tolerance=1e-3,
+                               theta_upper_bound=None, random_seed=None,
+                               solver=DEFAULT_SOLVER, verbose=False,
+                               solver_io=None):
+    """
+    multi-stage min CVaR portfolio with SDDP, the objective is the sum of
+    the CVaR of all stages as min_ms_cvar_fullsp_portfolio.
+
+    symbols: list of string
+    risk_rois: numpy.array, shape: (n_exp_period, n_stock)
+    risk_free_rois: numpy.array,, shape: (n_exp_period,)
+    allocated_risk_wealth: numpy.array, shape: (n_stock,)
+    allocated_risk_free_wealth: float
+    buy_trans_fee: float
+    sell_trans_fee: float
+    alpha: float
+    predict_risk_rois: numpy.array, shape: (n_exp_period, n_stock, n_scenario)
+    predict_risk_free_rois: numpy.array, shape: (n_exp_period,)
+    n_scenario: integer
+    n_forward: integer, number of sampled paths in each forward pass
+    n_backward_scenario: integer or None, number of scenarios solved for
+        building a cut in the backward pass, None for all scenarios
+    max_iteration: integer, maximum number of forward-backward iterations
+    gap_tolerance: float, relative gap between the upper bound and the
+        mean of the sampled policy values for stopping
+    theta_upper_bound: float or None, the initial bound of future value
+    random_seed: integer or None, seed of sampling the forward paths
+    solver: str, supported by Pyomo, the solver must provide duals
+    solver_io: string or None, the interface of the solver, see
+        solvers.create_solver
+
+    Returns:
+    ------------
+    dict, the first stage decisions, the bounds, and the decisions of the
+    policy on the realized path risk_rois
+    """
+    t0 = time()
+    n_exp_period = risk_rois.shape[0]
+    n_stock = len(symbols)
+    n_forward = int(n_forward)
+    if n_forward < 1:
+        raise ValueError("wrong n_forward: {}".format(n_forward))
+    if n_backward_scenario is None:
+        n_backward_scenario = n_scenario
+    n_backward_scenario = int(n_backward_scenario)
+    if not 1 <= n_backward_scenario <= n_scenario:
+        raise ValueError("wrong n_backward_scenario: {}".format(
+            n_backward_scenario))
+
+    param = "{}_{}_m{}_p{}_s{}_a{:.2f}".format(
+        trans_dates[0].strftime("%Y%m%d"), trans_dates[-1].strftime("%Y%m%d"),
+        n_stock, n_exp_period, n_scenario, alpha)
+
+    allocated_risk_wealth = np.asarray(allocated_risk_wealth, dtype=np.float)
+    initial_wealth = allocated_risk_wealth.sum() + allocated_risk_free_wealth
+
+    if theta_upper_bound is None:
+        # the wealth can not grow faster than the maximum roi in all periods
+        max_roi = max(risk_rois.max(), predict_risk_rois.max(), 0)
+        theta_upper_bound = (n_exp_period * initial_wealth *
+                             (1. + max_roi) ** (n_exp_period + 1))
+
+    # constructing the stage models
+    stage_models = [_build_stage_model(tdx, n_stock, n_scenario,
+                                       buy_trans_fee, sell_trans_fee, alpha,
+                                       predict_risk_rois[tdx],
+                                       theta_upper_bound,
+                                       tdx == n_exp_period - 1)
+                    for tdx in xrange(n_exp_period)]
+    opt, _ = create_solver(solver, solver_io)
+    logger.info("min_ms_cvar_sddp {} stage models OK, {:.3f} secs".format(
+        param, time() - t0))
+
+    def stage_state(tdx, risk_wealth, risk_free_wealth, roi):
+        # state after the realized rois of stage tdx
+        return ((1. + roi) * risk_wealth,
+                (1. + risk_free_rois[tdx]) * risk_free_wealth)
+
+    rng = np.random.RandomState(random_seed)
+    upper_bounds, lower_bounds, gaps = [], [], []
+    n_cut = 0
+    root = None
+
+    for itx in xrange(max_iteration):
+        t1 = time()
+        # forward pass, sampling n_forward paths of the realizations
+        # trial_states[tdx]: list of the (risk_wealth, risk_free_wealth)
+        # decided at stage tdx
+        trial_states = [[] for _ in xrange(n_exp_period)]
+        path_values = np.zeros(n_forward)
+        for pdx in xrange(n_forward):
+            risk_wealth = allocated_risk_wealth
+            risk_free_wealth = allocated_risk_free_wealth
+            for tdx in xrange(n_exp_period):
+                if tdx == 0:
+                    roi = risk_rois[0]
+                else:
+                    roi = predict_risk_rois[tdx - 1, :,
+                                            rng.randint(n_scenario)]
+                prev_risk, prev_risk_free = stage_state(
+                    tdx, risk_wealth, risk_free_wealth, roi)
+                sol = _solve_stage_model(stage_models[tdx], opt,
+                                         prev_risk, prev_risk_free)
+                path_values[pdx] += sol['cvar']
+                risk_wealth = sol['risk_wealth']
+                risk_free_wealth = sol['risk_free_wealth']
+                trial_states[tdx].append((risk_wealth, risk_free_wealth))
+
+        # backward pass, adding the cuts to the previous stage
+        for tdx in xrange(n_exp_period - 1, 0, -1):
+            if n_backward_scenario == n_scenario:
+                sample_indices = np.arange(n_scenario)
+            else:
+                sample_indices = rng.choice(n_scenario, n_backward_scenario,
+                                            replace=False)
+
+            for risk_wealth, risk_free_wealth in trial_states[tdx - 1]:
+                values = np.zeros(n_backward_scenario)
+                risk_grads = np.zeros((n_backward_scenario, n_stock))
+                risk_free_grads = np.zeros(n_backward_scenario)
+                for kdx, sdx in enumerate(sample_indices):
+                    roi = predict_risk_rois[tdx - 1, :, sdx]
+                    prev_risk, prev_risk_free = stage_state(
+                        tdx, risk_wealth, risk_free_wealth, roi)
+                    sol = _solve_stage_model(stage_models[tdx], opt,
+                                             prev_risk, prev_risk_free)
+                    values[kdx] = sol['objective']
+                    # chain rule, d prev_risk / d risk_wealth = 1 + roi
+                    risk_grads[kdx] = sol['risk_duals'] * (1. + roi)
+                    risk_free_grads[kdx] = (sol['risk_free_dual'] *
+                                            (1. + risk_free_rois[tdx]))
+
+                # the cut is valid for all nodes of the stage tdx-1
+                value = values.mean()
+                risk_grad = risk_grads.mean(axis=0)
+                risk_free_grad = risk_free_grads.mean()
+                prev_model = stage_models[tdx - 1]
+                prev_model.cuts.add(
+                    prev_model.theta <= value +
+                    sum(risk_grad[mdx] * (prev_model.risk_wealth[mdx] -
+                                          risk_wealth[mdx])
+                        for mdx in xrange(n_stock)) +
+                    risk_free_grad * (prev_model.risk_free_wealth -
+                                      risk_free_wealth))
+                n_cut += 1
+
+        # the root problem with the cuts is an upper bound of the max. problem
+        sol = _solve_stage_model(
+            stage_models[0], opt,
+            *stage_state(0, allocated_risk_wealth,
+                         allocated_risk_free_wealth, risk_rois[0]))
+        root = sol
+        upper_bound = sol['objective']
+        lower_bound = path_values.mean()
+        gap = abs(upper_bound - lower_bound) / max(abs(upper_bound), 1e-12)
+        upper_bounds.append(upper_bound)
+        lower_bounds.append(lower_bound)
+        gaps.append(gap)
+
+        logger.info("min_ms_cvar_sddp {} iteration {}: upper bound: {:.6f}, "
+                    "sampled value: {:.6f}, gap: {:.4%}, {} cuts, {:.3f} "
+                    "secs".format(param, itx + 1, upper_bound, lower_bound,
+                                  gap, n_cut, time() - t1))
+
+        if n_exp_period == 1 or gap < gap_tolerance:
+            break
+
+    # the policy on the realized path
+    buy_df = np.zeros((n_exp_period, n_stock))
+    sell_df = np.zeros((n_exp_period, n_stock))
+    risk_df = np.zeros((n_exp_period, n_stock))
+    risk_free_arr = np.zeros(n_exp_period)
+    var_arr = np.zeros(n_exp_period)
+    cvar_arr = np.zeros(n_exp_period)
+
+    risk_wealth = allocated_risk_wealth
+    risk_free_wealth = allocated_risk_free_wealth
+    for tdx in xrange(n_exp_period):
+        prev_risk, prev_risk_free = stage_state(
+            tdx, risk_wealth, risk_free_wealth, risk_rois[tdx])
+        sol = _solve_stage_model(stage_models[tdx], opt,
+                                 prev_risk, prev_risk_free)
+        buy_df[tdx] = sol['buy_amounts']
+        sell_df[tdx] = sol['sell_amounts']
+        risk_df[tdx] = risk_wealth = sol['risk_wealth']
+        risk_free_arr[tdx] = risk_free_wealth = sol['risk_free_wealth']
+        var_arr[tdx] = sol['VaR']
+        cvar_arr[tdx] = sol['cvar']
+
+    if verbose:
+        logger.debug("first stage buy amounts: {}".format(root['buy_amounts']))
+        logger.debug("first stage sell amounts: {}".format(
+            root['sell_amounts']))
+        logger.debug("first stage risk wealth: {}".format(root['risk_wealth']))
+
+    logger.info("min_ms_cvar_sddp {} OK, {} iterations, {} cuts, {:.3f} "
+                "secs".format(param, len(upper_bounds), n_cut, time() - t0))
+
+    results = {
+        # shape: (n_exp_period, n_stock)
+        "buy_amounts_df": pd.DataFrame(buy_df, index=trans_dates,
+                                       columns=symbols),
+        "sell_amounts_df": pd.DataFrame(sell_df, index=trans_dates,
+                                        columns=symbols),
+        "risk_wealth_df": pd.DataFrame(risk_df, index=trans_dates,
+                                       columns=symbols),
+        # shape: (n_exp_period, )
+        "risk_free_wealth_arr": pd.Series(risk_free_arr, index=trans_dates),
+        "estimated_var_arr": pd.Series(var_arr, index=trans_dates),
+        "estimated_cvar_arr": pd.Series(cvar_arr, index=trans_dates),
+        # float, upper bound of the sum of the CVaR of all stages
+        "estimated_cvar": upper_bounds[-1],
+        # shape: (n_iteration, )
+        "upper_bounds": np.array(upper_bounds),
+        "lower_bounds": np.array(lower_bounds),
+        "gaps": np.array(gaps),
+        "n_cut": n_cut,
+        "sddp_time": time() - t0,
+    }
+    return results
+
+
+def run_min_ms_cvar_sddp_simulation(n_stock, win_length, start_date,
+                                    end_date, n_scenario=200, bias=False,
+                                    scenario_cnt=1, alpha=0.95, n_forward=5,
+                                    n_backward_scenario=None,
+                                    max_iteration=50, verbose=False):
+    """
+    multi-stage SP simulation with SDDP
+
+    Parameters:
+    -------------------
+    n_stock: integer, number of stocks of the EXP_SYMBOLS to the portfolios
+    window_length: integer, number of periods for estimating scenarios
+    start_date, end_date: datetime.date, the stages of the problem
+    n_scenario, int, number of scenarios
+    bias: bool, biased moment estimators or not
+    scenario_cnt: count of generated scenarios, default = 1
+    alpha: float, for conditional risk
+    n_forward: integer, number of sampled paths in each forward pass
+    n_backward_scenario: integer or None, scenarios of each cut
+    max_iteration: integer, maximum number of iterations
+
+    Returns:
+    --------------------
+    reports
+    """
+    t0 = time()
+    n_stock, win_length, = int(n_stock), int(win_length)
+    n_scenario = int(n_scenario)
+
+    # getting experiment symbols
+    symbols = EXP_SYMBOLS[:n_stock]
+    param = "{}_{}_m{}_w{}_s{}_{}_{}_a{:.2f}".format(
+        start_date.strftime("%Y%m%d"), end_date.strftime("%Y%m%d"),
+        n_stock, win_length, n_scenario, "biased" if bias else "unbiased",
+        scenario_cnt, alpha)
+
+    # read rois from the data store, shape: (n_period, n_stock)
+    exp_risk_rois = load_roi_df(symbols, start_date, end_date)
+    n_period = exp_risk_rois.shape[0]
+    risk_free_rois = np.zeros(n_period)
+    initial_risk_free_wealth = 1e6
+
+    scenario_name = "{}_{}_m{}_w{}_s{}_{}_{}.pkl".format(
+        START_DATE.strftime("%Y%m%d"), END_DATE.strftime("%Y%m%d"),
+        len(symbols), win_length, n_scenario,
+        "biased" if bias else "unbiased", scenario_cnt)
+
+    scenario_path = os.path.join(EXP_SP_PORTFOLIO_DIR, 'scenarios',
+                                 scenario_name)
+    if not os.path.exists(scenario_path):
+        raise ValueError("{} scenario does not exist.".format(scenario_path))
+
+    # shape: (n_period, n_stock, n_scenario)
+    scenario_panel = pd.read_pickle(scenario_path)
+    predict_risk_rois = scenario_panel.loc[start_date:end_date]
+
+    reports = min_ms_cvar_sddp_portfolio(
+        symbols, exp_risk_rois.index, exp_risk_rois.as_matrix(),
+        risk_free_rois, np.zeros(n_stock), initial_risk_free_wealth,
+        BUY_TRANS_FEE, SELL_TRANS_FEE, alpha,
+        predict_risk_rois.as_matrix(), np.zeros(n_period), n_scenario,
+        n_forward=n_forward, n_backward_scenario=n_backward_scenario,
+        max_iteration=max_iteration, verbose=verbose)
+
+    prob_name = "min_ms_cvar_sddp"
+    file_dir = os.path.join(EXP_SP_PORTFOLIO_DIR, prob_name)
+    if not os.path.exists(file_dir):
+        os.makedirs(file_dir)
+    file_name = '{}_{}.pkl'.format(prob_name, param)
+    pd.to_pickle(reports, os.path.join(file_dir, file_name))
+    logger.info("{} {} OK, {:.3f} secs".format(prob_name, param, time() - t0))
+
+    return reports
+
+
+if __name__ == '__main__':
+    run_min_ms_cvar_sddp_simulation(5, 70, date(2005, 1, 3),
+                                    date(2005, 1, 31), alpha=0.9)
@@ -14,13 +14,18 @@ from pyomo.opt import SolverStatus, TerminationCondition
 
 from PySPPortfolio.pysp_portfolio import *
 from base_model import (SPTradingPortfolio, )
+from log_utils import (get_logger,)
+from solvers import (create_solver,)
+
+logger = get_logger('min_ms_cvar_sp')
+
 
 def min_ms_cvar_sp_portfolio(symbols, trans_dates, risk_rois, risk_free_rois,
                              allocated_risk_wealth, allocated_risk_free_wealth,
                              buy_trans_fee, sell_trans_fee, alphas,
                              predict_risk_rois, predict_risk_free_roi,
                              n_scenario, solver=DEFAULT_SOLVER,
-                             verbose=False):
+                             verbose=False, solver_io=None):
     """
     after generating all scenarios, solving the SP at once
 
@@ -36,6 +41,8 @@ def min_ms_cvar_sp_portfolio(symbols, trans_dates, risk_rois, risk_free_rois,
     predict_risk_free_rois: numpy.array, shape:(n_exp_period,)
     n_scenario: integer
     solver: str, supported by Pyomo
+    solver_io: string or None, the interface of the solver, see
+        solvers.create_solver
 
     """
     t0 = time()
@@ -172,8 +179,8 @@ def min_ms_cvar_sp_portfolio(symbols, trans_dates, risk_rois, risk_free_rois,
         instance.exp_periods, instance.scenarios,
         rule=cvar_constraint_rule)
 
-    print ("min_ms_cvar_sp constraints and objective rules OK, "
-           "{:.3f} secs".format(time() - t0))
+    logger.info("min_ms_cvar_sp constraints and objective rules OK, "
+                "{:.3f} secs".format(time() - t0))
 
     Tdx = n_exp_period - 1
     buy_df = np.zeros((n_exp_period, n_stock))
@@ -189,7 +196,8 @@ def min_ms_cvar_sp_portfolio(symbols, trans_dates, risk_rois, risk_free_rois,
         param = "{}_{}_m{}_p{}_s{}_a{:.2f}".format(
             START_DATE.strftime("%Y%m%d"), END_DATE.strftime("%Y%m%d"),
             n_stock, n_exp_period, n_scenario, alpha)
-        print ("min_ms_cvar_sp {} objectve ready to construct.".format(param))
+        logger.info("min_ms_cvar_sp {} objectve ready to construct.".format(
+            param))
 
         # objective
         def cvar_objective_rule(model):
@@ -207,8 +215,8 @@ def min_ms_cvar_sp_portfolio(symbols, trans_dates, risk_rois, risk_free_rois,
         instance.cvar_objective = Objective(rule=cvar_objective_rule,
                                             sense=maximize)
         # solve
-        print "start solving:"
-        opt = SolverFactory(solver)
+        logger.info("start solving:")
+        opt, _ = create_solver(solver, solver_io)
         # if solver == "cplex":
         #     opt.options["workmem"] = 4096
         # turnoff presolve
@@ -222,12 +230,12 @@ def min_ms_cvar_sp_portfolio(symbols, trans_dates, risk_rois, risk_free_rois,
         # if verbose:
         # display(instance)
 
-        print ("solve min_ms_cvar_sp {} OK {:.2f} secs".format(
+        logger.info("solve min_ms_cvar_sp {} OK {:.2f} secs".format(
             param, time() - t1))
-        print ("solver status: {}".format(results.solver.status))
-        print ("solver termination cond: {}".format(
+        logger.debug("solver status: {}".format(results.solver.status))
+        logger.debug("solver termination cond: {}".format(
             results.solver.termination_condition))
-        print (results.solver)
+        logger.debug(results.solver)
 
         # extract results
         for tdx in xrange(n_exp_period):
@@ -254,24 +262,24 @@ def min_ms_cvar_sp_portfolio(symbols, trans_dates, risk_rois, risk_free_rois,
                                       columns=symbols)
         predict_portfolio_wealth_df = pd.DataFrame(predict_portfolio_df,
                                                index=trans_dates)
-        print '-'*50
+        logger.debug('-'*50)
         for tdx in xrange(n_exp_period):
-            print "VaR[{}]={}".format(tdx, instance.Z[tdx].value)
+            logger.debug("VaR[{}]={}".format(tdx, instance.Z[tdx].value))
 
             exp = predict_risk_rois[tdx].mean(axis=1)
-            print "expected predicted ROI:{}, {}".format(
+            logger.debug("expected predicted ROI:{}, {}".format(
                 exp, max(exp)
-            )
+            ))
             # pseries = predict_portfolio_wealth_df.iloc[tdx]
             # pseries.sort_values(inplace=True)
             # print pseries.iloc[:20]
-        print '-'*50
+        logger.debug('-'*50)
 
         # shape: (n_exp_period, )
         risk_free_wealth_arr = pd.Series(risk_free_arr, index=trans_dates)
         estimated_var_arr = pd.Series(var_arr, index=trans_dates)
 
-        print ("{} final_total_wealth: {:.2f}".format(
+        logger.info("{} final_total_wealth: {:.2f}".format(
             param, risk_df[Tdx].sum() + risk_free_arr[Tdx]))
 
         alpha_str = "{:.2f}".format(alpha)
@@ -302,6 +310,145 @@ def min_ms_cvar_sp_portfolio(symbols, trans_dates, risk_rois, risk_free_rois,
     return results_dict
 
 
+def min_ms_cvar_sp_rolling_portfolio(symbols, trans_dates, risk_rois,
+                                     risk_free_rois, allocated_risk_wealth,
+                                     allocated_risk_free_wealth,
+                                     buy_trans_fee, sell_trans_fee, alphas,
+                                     predict_risk_rois, predict_risk_free_roi,
+                                     n_scenario, rolling_horizon=5,
+                                     rolling_step=1, solver=DEFAULT_SOLVER,
+                                     verbose=False, solver_io=None):
+    """
+    rolling-horizon decomposition of min_ms_cvar_sp_portfolio
+
+    the sub-problem of the next rolling_horizon periods is solved, the
+    decisions of its first rolling_step periods are fixed, and the next
+    sub-problem starts from the wealth of the last fixed period.
+    if rolling_horizon >= n_exp_period and rolling_step == n_exp_period,
+    it is the same as the monolithic model.
+
+    symbols: list of string
+    risk_rois: numpy.array, shape: (n_exp_period, n_stock)
+    risk_free_rois: numpy.array,, shape: (n_exp_period,)
+    allocated_risk_wealth: numpy.array,, shape: (n_stock,)
+    allocated_risk_free_wealth: float
+    buy_trans_fee: float
+    sell_trans_fee: float
+    alphas: list of float
+    predict_risk_ret: numpy.array, shape: (n_exp_period, n_stock, n_scenario)
+    predict_risk_free_rois: numpy.array, shape:(n_exp_period,)
+    n_scenario: integer
+    rolling_horizon: integer, number of periods of each sub-problem
+    rolling_step: integer, 1 <= rolling_step <= rolling_horizon,
+        number of periods fixed after solving each sub-problem
+    solver: str, supported by Pyomo
+    solver_io: string or None, the interface of the solver, see
+        solvers.create_solver
+
+    """
+    t0 = time()
+    n_exp_period = risk_rois.shape[0]
+    n_stock = len(symbols)
+    rolling_horizon, rolling_step = int(rolling_horizon), int(rolling_step)
+
+    if rolling_horizon < 1:
+        raise ValueError("wrong rolling_horizon: {}".format(rolling_horizon))
+    if not 1 <= rolling_step <= rolling_horizon:
+        raise ValueError("wrong rolling_step: {}".format(rolling_step))
+
+    results_dict = {}
+    for alpha in alphas:
+        t1 = time()
+        alpha_str = "{:.2f}".format(alpha)
+        param = "{}_{}_m{}_p{}_s{}_a{:.2f}_rh{}_{}".format(
+            trans_dates[0].strftime("%Y%m%d"),
+            trans_dates[-1].strftime("%Y%m%d"),
+            n_stock, n_exp_period, n_scenario, alpha,
+            rolling_horizon, rolling_step)
+
+        buy_df = np.zeros((n_exp_period, n_stock))
+        sell_df = np.zeros((n_exp_period, n_stock))
+        risk_df = np.zeros((n_exp_period, n_stock))
+        risk_free_arr = np.zeros(n_exp_period)
+        var_arr = np.zeros(n_exp_period)
+        cvar_arr = np.zeros(n_exp_period)
+        n_subproblem = 0
+
+        # wealth at the beginning of the current sub-problem
+        cur_risk_wealth = np.asarray(allocated_risk_wealth, dtype=np.float)
+        cur_risk_free_wealth = float(allocated_risk_free_wealth)
+
+        for sdx in xrange(0, n_exp_period, rolling_step):
+            # sub-problem interval [sdx, edx), fixed interval [sdx, fdx)
+            edx = min(sdx + rolling_horizon, n_exp_period)
+            fdx = min(sdx + rolling_step, n_exp_period)
+            n_fixed = fdx - sdx
+
+            sub_results = min_ms_cvar_sp_portfolio(
+                symbols, trans_dates[sdx:edx], risk_rois[sdx:edx],
+                risk_free_rois[sdx:edx], cur_risk_wealth,
+                cur_risk_free_wealth, buy_trans_fee, sell_trans_fee,
+                [alpha, ], predict_risk_rois[sdx:edx],
+                predict_risk_free_roi[sdx:edx], n_scenario, solver,
+                verbose, solver_io)[alpha_str]
+
+            # fixing the first decisions
+            buy_df[sdx:fdx] = sub_results['buy_amounts_df'].values[:n_fixed]
+            sell_df[sdx:fdx] = sub_results['sell_amounts_df'].values[:n_fixed]
+            risk_df[sdx:fdx] = sub_results['risk_wealth_df'].values[:n_fixed]
+            risk_free_arr[sdx:fdx] = \
+                sub_results['risk_free_wealth_arr'].values[:n_fixed]
+            var_arr[sdx:fdx] = \
+                sub_results['estimated_var_arr'].values[:n_fixed]
+
+            # CVaR of each fixed period, the same term in the objective of
+            # the monolithic model, shape: (n_scenario,)
+            for tdx in xrange(sdx, fdx):
+                portfolio_wealth = np.dot(risk_df[tdx],
+                                          1. + predict_risk_rois[tdx])
+                cvar_arr[tdx] = (var_arr[tdx] - np.maximum(
+                    var_arr[tdx] - portfolio_wealth, 0).mean() / (1. - alpha))
+
+            # rolling forward
+            cur_risk_wealth = risk_df[fdx - 1].copy()
+            cur_risk_free_wealth = risk_free_arr[fdx - 1]
+            n_subproblem += 1
+
+            logger.info("min_ms_cvar_sp_rolling {} [{}/{}] OK, {:.3f} "
+                        "secs".format(
+                param, fdx, n_exp_period, time() - t1))
+
+        Tdx = n_exp_period - 1
+        logger.info("{} final_total_wealth: {:.2f}, {} sub-problems, "
+                    "{:.3f} secs".format(param, risk_df[Tdx].sum() +
+                                    risk_free_arr[Tdx], n_subproblem,
+                                    time() - t1))
+
+        results_dict[alpha_str] = {
+            # shape: (n_exp_period, n_stock)
+            "buy_amounts_df": pd.DataFrame(buy_df, index=trans_dates,
+                                           columns=symbols),
+            "sell_amounts_df": pd.DataFrame(sell_df, index=trans_dates,
+                                            columns=symbols),
+            "risk_wealth_df": pd.DataFrame(risk_df, index=trans_dates,
+                                           columns=symbols),
+            # shape: (n_exp_period, )
+            "risk_free_wealth_arr": pd.Series(risk_free_arr,
+                                              index=trans_dates),
+            "estimated_var_arr": pd.Series(var_arr, index=trans_dates),
+            "estimated_cvar_arr": pd.Series(cvar_arr, index=trans_dates),
+            # float, comparable to the objective of the monolithic model
+            "estimated_cvar": cvar_arr.mean(),
+            "rolling_horizon": rolling_horizon,
+            "rolling_step": rolling_step,
+            "n_subproblem": n_subproblem,
+        }
+
+    logger.info("min_ms_cvar_sp_rolling {} OK, {:.3f} secs".format(
+        alphas, time() - t0))
+    return results_dict
+
+
 class MinMSCVaRSPPortfolio(SPTradingPortfolio):
     def __init__(self, symbols, risk_rois, risk_free_rois,
                  initial_risk_wealth, initial_risk_free_wealth,
@@ -310,20 +457,29 @@ class MinMSCVaRSPPortfolio(SPTradingPortfolio):
                  window_length=WINDOW_LENGTH, n_scenario=N_SCENARIO,
                  bias=BIAS_ESTIMATOR,
                  alphas=[0.5, 0.55, 0.6, 0.65, 0.7, 0.75, 0.8, 0.85, 0.9, 0.95],
-                 scenario_cnt=1, verbose=False):
+                 scenario_cnt=1, verbose=False,
+                 rolling_horizon=None, rolling_step=1, solver_io=None):
         """
         because the multi-stage model will cost many time in constructing
         scenarios constraints, we solve all alphas of the same
         parameters at once.
+
+        rolling_horizon: integer or None, if it is given, the model is
+            solved by the rolling-horizon decomposition with sub-problems
+            of rolling_horizon periods.
+        rolling_step: integer, number of periods fixed in each sub-problem
+        solver_io: string or None, the interface of the solver
         """
 
         super(MinMSCVaRSPPortfolio, self).__init__(
             symbols, risk_rois, risk_free_rois, initial_risk_wealth,
             initial_risk_free_wealth, buy_trans_fee, sell_trans_fee,
             start_date, end_date, window_length, n_scenario, bias,
-            verbose)
+            verbose, solver_io=solver_io)
 
         self.alphas = alphas
+        self.rolling_horizon = rolling_horizon
+        self.rolling_step = rolling_step
 
         # try to load generated scenario panel
         scenario_name = "{}_{}_m{}_w{}_s{}_{}_{}.pkl".format(
@@ -343,10 +499,14 @@ class MinMSCVaRSPPortfolio(SPTradingPortfolio):
             self.scenario_cnt = scenario_cnt
 
     def get_trading_func_name(self, *args, **kwargs):
-        return "MS_MinCVaRSP_m{}_w{}_s{}_{}_{}_a{:.2f}".format(
+        func_name = "MS_MinCVaRSP_m{}_w{}_s{}_{}_{}_a{:.2f}".format(
             self.n_stock, self.window_length, self.n_scenario,
             "biased" if self.bias_estimator else "unbiased",
             self.scenario_cnt, kwargs['alpha'])
+        if self.rolling_horizon is not None:
+            func_name = "{}_rh{}_{}".format(func_name, self.rolling_horizon,
+                                            self.rolling_step)
+        return func_name
 
     def get_estimated_risk_free_rois(self, *arg, **kwargs):
         """ the risk free roi is set all zeros """
@@ -374,6 +534,25 @@ class MinMSCVaRSPPortfolio(SPTradingPortfolio):
           - key: alpha, str
           - value: results, dict
         """
+        if self.rolling_horizon is not None:
+            return min_ms_cvar_sp_rolling_portfolio(
+                self.symbols,
+                self.exp_risk_rois.index,
+                self.exp_risk_rois.as_matrix(),
+                self.risk_free_rois.as_matrix(),
+                kwargs['allocated_risk_wealth'].as_matrix(),
+                kwargs['allocated_risk_free_wealth'],
+                self.buy_trans_fee,
+                self.sell_trans_fee,
+                self.alphas,  # all alphas
+                kwargs['estimated_risk_rois'].as_matrix(),
+                kwargs['estimated_risk_free_roi'],
+                self.n_scenario,
+                rolling_horizon=self.rolling_horizon,
+                rolling_step=self.rolling_step,
+                solver_io=self.solver_io,
+            )
+
         results_dict = min_ms_cvar_sp_portfolio(
             self.symbols,
             self.exp_risk_rois.index,
@@ -387,6 +566,7 @@ class MinMSCVaRSPPortfolio(SPTradingPortfolio):
             kwargs['estimated_risk_rois'].as_matrix(),
             kwargs['estimated_risk_free_roi'],
             self.n_scenario,
+            solver_io=self.solver_io,
         )
         return results_dict
 
@@ -414,7 +594,7 @@ class MinMSCVaRSPPortfolio(SPTradingPortfolio):
         reports_dict = {}
         for alpha_value in self.alphas:
             func_name = self.get_trading_func_name(alpha=alpha_value)
-            print (func_name)
+            logger.debug(func_name)
             t1 = time()
             alpha_str = "{:.2f}".format(alpha_value)
 
@@ -461,16 +641,20 @@ class MinMSCVaRSPPortfolio(SPTradingPortfolio):
             reports['scenario_cnt'] = self.scenario_cnt
             reports['buy_amounts_df'] = buy_amounts_df
             reports['sell_amounts_df'] = sell_amounts_df
+            reports['estimated_var_arr'] = estimated_var_arr
+            reports['estimated_cvar'] = estimated_cvar
+            reports['rolling_horizon'] = self.rolling_horizon
+            reports['rolling_step'] = self.rolling_step
 
             # add simulation time
             reports['simulation_time'] = time() - t1
 
             reports_dict[alpha_str] = reports
-            print ("{} {} OK [{}-{}], {:.4f}.secs".format(
+            logger.info("{} {} OK [{}-{}], {:.4f}.secs".format(
                 func_name, alpha_str, self.exp_risk_rois.index[0],
                 self.exp_risk_rois.index[Tdx], time() - t1))
 
-        print ("{} {} OK [{}-{}], {:.4f}.secs".format(
+        logger.info("{} {} OK [{}-{}], {:.4f}.secs".format(
             func_name, self.alphas, self.exp_risk_rois.index[0],
             self.exp_risk_rois.index[Tdx], time() - t0))
         return reports_dict
@@ -0,0 +1,399 @@
+# -*- coding: utf-8 -*-
+#!python
+#cython: boundscheck=False
+#cython: wraparound=False
+#cython: infer_types=True
+#cython: nonecheck=False
+
+"""
+Authors: Hung-Hsin Chen <chenhh@par.cse.nsysu.edu.tw>
+License: GPL v2
+
+worst-case CVaR over the scenarios estimated by different window lengths
+"""
+
+from __future__ import division
+from time import time
+import os
+import numpy as np
+import pandas as pd
+from pyomo.environ import *
+
+from PySPPortfolio.pysp_portfolio import *
+from base_model import (SPTradingPortfolio, )
+from data_store import (atomic_save,)
+from stage_timer import (NULL_TIMER,)
+from solvers import (solve_model,)
+from log_utils import (get_logger,)
+
+cimport numpy as cnp
+ctypedef cnp.float64_t FLOAT_t
+ctypedef cnp.intp_t INTP_t
+
+logger = get_logger('min_wcvar_sp')
+
+
+def load_scenario_mmap(int n_stock, int win_length, int n_scenario=N_SCENARIO,
+                       bias=BIAS_ESTIMATOR, int scenario_cnt=1):
+    """
+    memory-mapped scenarios of the generated scenario panel. The panel is
+    converted to a numpy file at the first time, and then the scenarios of
+    a transaction date are read from the disk only when they are used.
+
+    Parameters:
+    ------------
+    n_stock: integer, number of stocks of the EXP_SYMBOLS
+    win_length: integer, window length of the scenarios
+    n_scenario: integer, number of scenarios
+    bias: boolean, biased moment estimators or not
+    scenario_cnt: integer, count of the generated scenarios
+
+    Returns:
+    ------------
+    trans_dates: pandas.DatetimeIndex, shape: (n_exp_period,)
+    symbols: list of string, shape: (n_stock,)
+    scenarios: numpy.memmap, shape: (n_exp_period, n_stock, n_scenario)
+    """
+    scenario_name = "{}_{}_m{}_w{}_s{}_{}_{}".format(
+        START_DATE.strftime("%Y%m%d"), END_DATE.strftime("%Y%m%d"),
+        n_stock, win_length, n_scenario,
+        "biased" if bias else "unbiased", scenario_cnt)
+    scenario_dir = os.path.join(EXP_SP_PORTFOLIO_DIR, 'scenarios')
+    scenario_path = os.path.join(scenario_dir, "{}.pkl".format(scenario_name))
+    mmap_path = os.path.join(scenario_dir, "{}.npy".format(scenario_name))
+    axes_path = os.path.join(scenario_dir,
+                             "{}_axes.pkl".format(scenario_name))
+
+    if not os.path.exists(mmap_path):
+        if not os.path.exists(scenario_path):
+            raise ValueError("{} not exists.".format(scenario_name))
+        # shape: (n_exp_period, n_stock, n_scenario)
+        scenario_panel = pd.read_pickle(scenario_path)
+        # the concurrent callers may convert the same panel, the axes are
+        # renamed before the array, so the array implies the axes
+        atomic_save(axes_path, lambda path, axes: pd.to_pickle(axes, path),
+                    {"trans_dates": scenario_panel.items,
+                     "symbols": scenario_panel.major_axis.tolist()})
+        atomic_save(mmap_path, np.save,
+                    scenario_panel.as_matrix().astype(np.float64))
+        logger.info("convert {} to memory-mapped file.".format(
+            scenario_name))
+
+    axes = pd.read_pickle(axes_path)
+    scenarios = np.load(mmap_path, mmap_mode='r')
+    return axes['trans_dates'], axes['symbols'], scenarios
+
+
+def min_wcvar_sp_portfolio(symbols,
+                           cnp.ndarray[FLOAT_t, ndim=1] risk_rois,
+                           double risk_free_roi,
+                           cnp.ndarray[FLOAT_t, ndim=1] allocated_risk_wealth,
+                           double allocated_risk_free_wealth,
+                           double buy_trans_fee,
+                           double sell_trans_fee,
+                           double alpha,
+                           cnp.ndarray[FLOAT_t, ndim=3] predict_risk_rois,
+                           double predict_risk_free_roi,
+                           int n_scenario,
+                           str solver=DEFAULT_SOLVER,
+                           int verbose=False,
+                           timer=None,
+                           solver_io=None):
+    """
+    2nd-stage worst-case CVaR stochastic programming portfolio.
+    maximizing the minimum CVaR of the L scenario distributions.
+
+    symbols: list of string
+    risk_rois: numpy.array, shape: (n_stock, )
+    risk_free_roi: float,
+    allocated_risk_wealth: numpy.array, shape: (n_stock,)
+    allocated_risk_free_wealth: float
+    buy_trans_fee: float
+    sell_trans_fee: float
+    alpha: float, 1-alpha is the significant level
+    predict_risk_ret: numpy.array, shape: (n_dist, n_stock, n_scenario)
+    predict_risk_free_roi: float
+    n_scenario: integer
+    solver: str, supported by Pyomo
+    timer: stage_timer.StageTimer or None, timing the stages of the model
+    solver_io: string or None, the interface of the solver, None for the
+        in-process interface with the fallback to the file interface
+    """
+    t0 = time()
+    cdef Py_ssize_t n_dist = predict_risk_rois.shape[0]
+    cdef Py_ssize_t n_stock = len(symbols)
+
+    if timer is None:
+        timer = NULL_TIMER
+    timer.mark()
+
+    # Model
+    instance = ConcreteModel()
+
+    instance.risk_rois = risk_rois
+    instance.risk_free_roi = risk_free_roi
+    instance.allocated_risk_wealth = allocated_risk_wealth
+    instance.allocated_risk_free_wealth = allocated_risk_free_wealth
+    instance.buy_trans_fee = buy_trans_fee
+    instance.sell_trans_fee = sell_trans_fee
+    instance.alpha = alpha
+    instance.predict_risk_rois = predict_risk_rois
+    instance.predict_risk_free_roi = predict_risk_free_roi
+
+    # Set
+    instance.symbols = np.arange(n_stock)
+    instance.scenarios = np.arange(n_scenario)
+    instance.distributions = np.arange(n_dist)
+
+    # decision variables
+    # first stage
+    instance.buy_amounts = Var(instance.symbols, within=NonNegativeReals)
+    instance.sell_amounts = Var(instance.symbols, within=NonNegativeReals)
+    instance.risk_wealth = Var(instance.symbols, within=NonNegativeReals)
+    instance.risk_free_wealth = Var(within=NonNegativeReals)
+
+    # aux variable, variable in definition of CVaR of each distribution,
+    # equals to VaR at opt. sol.
+    instance.Z = Var(instance.distributions)
+
+    # aux variable, portfolio wealth less than than VaR (Z)
+    instance.Ys = Var(instance.distributions, instance.scenarios,
+                      within=NonNegativeReals)
+
+    # worst-case CVaR
+    instance.WCVaR = Var()
+
+    # constraint
+    def risk_wealth_constraint_rule(model, int mdx):
+        """
+        risk_wealth is a decision variable which depends on both buy_amount
+        and sell_amount.
+        i.e. the risk_wealth depends on scenario.
+
+        buy_amount and sell_amount are first stage variable,
+        risk_wealth is second stage variable.
+        """
+        return (model.risk_wealth[mdx] == (1. + model.risk_rois[mdx]) *
+                model.allocated_risk_wealth[mdx] +
+                model.buy_amounts[mdx] - model.sell_amounts[mdx])
+
+    instance.risk_wealth_constraint = Constraint(
+        instance.symbols, rule=risk_wealth_constraint_rule)
+
+    # constraint
+    def risk_free_wealth_constraint_rule(model):
+        total_sell = sum((1. - model.sell_trans_fee) * model.sell_amounts[mdx]
+                         for mdx in model.symbols)
+        total_buy = sum((1. + model.buy_trans_fee) * model.buy_amounts[mdx]
+                        for mdx in model.symbols)
+
+        return (model.risk_free_wealth ==
+                (1. + risk_free_roi) * allocated_risk_free_wealth +
+                total_sell - total_buy)
+
+    instance.risk_free_wealth_constraint = Constraint(
+        rule=risk_free_wealth_constraint_rule)
+
+    # constraint
+    def cvar_constraint_rule(model, int ddx, int sdx):
+        """ auxiliary variable Y depends on scenario. CVaR <= VaR """
+        wealth = sum((1. + model.predict_risk_rois[ddx, mdx, sdx]) *
+                     model.risk_wealth[mdx]
+                     for mdx in model.symbols)
+        return model.Ys[ddx, sdx] >= (model.Z[ddx] - wealth)
+
+    instance.cvar_constraint = Constraint(instance.distributions,
+                                          instance.scenarios,
+                                          rule=cvar_constraint_rule)
+
+    # constraint
+    def wcvar_constraint_rule(model, int ddx):
+        """ the worst-case CVaR is less than the CVaR of each distribution """
+        scenario_expectation = sum(model.Ys[ddx, sdx]
+                                   for sdx in xrange(n_scenario)) / n_scenario
+        return model.WCVaR <= (model.Z[ddx] - 1. / (1. - model.alpha) *
+                               scenario_expectation)
+
+    instance.wcvar_constraint = Constraint(instance.distributions,
+                                           rule=wcvar_constraint_rule)
+
+    # objective
+    def wcvar_objective_rule(model):
+        return model.WCVaR
+
+    instance.wcvar_objective = Objective(rule=wcvar_objective_rule,
+                                         sense=maximize)
+
+    # solve
+    timer.lap('build')
+    results = solve_model(instance, solver, timer, solver_io)
+
+    if verbose:
+        display(instance)
+
+    # buy and sell amounts
+    buy_amounts = pd.Series([instance.buy_amounts[mdx].value
+                             for mdx in xrange(n_stock)], index=symbols)
+    sell_amounts = pd.Series([instance.sell_amounts[mdx].value
+                              for mdx in xrange(n_stock)], index=symbols)
+
+    # CVaR of each distribution, shape: (n_dist,)
+    estimated_cvars = np.array([value(
+        instance.Z[ddx] - 1. / (1. - alpha) *
+        sum(instance.Ys[ddx, sdx] for sdx in xrange(n_scenario)) / n_scenario)
+        for ddx in xrange(n_dist)])
+    cdef Py_ssize_t worst_dist = np.argmin(estimated_cvars)
+
+    if verbose:
+        logger.info("min_wcvar_sp_portfolio OK, {:.3f} secs".format(
+            time() - t0))
+
+    return {
+        "buy_amounts": buy_amounts,
+        "sell_amounts": sell_amounts,
+        "estimated_var": instance.Z[worst_dist].value,
+        "estimated_wcvar": instance.wcvar_objective(),
+        "estimated_cvars": estimated_cvars,
+        "worst_dist": worst_dist,
+    }
+
+
+class MinWCVaRSPPortfolio(SPTradingPortfolio):
+    checkpoint_attrs = ('var_arr', 'wcvar_arr', 'worst_win_length_arr')
+
+    def __init__(self, symbols, risk_rois, risk_free_rois,
+                 initial_risk_wealth,
+                 double initial_risk_free_wealth,
+                 double buy_trans_fee=BUY_TRANS_FEE,
+                 double sell_trans_fee=SELL_TRANS_FEE,
+                 start_date=START_DATE, end_date=END_DATE,
+                 win_lengths=(50, 100, 150, 200),
+                 int n_scenario=N_SCENARIO,
+                 bias=BIAS_ESTIMATOR,
+                 double alpha=0.05,
+                 int scenario_cnt=1,
+                 verbose=False,
+                 solver_io=None):
+        """
+        2nd-stage worst-case CVaR SP, the distributions are the generated
+        scenarios of the window lengths.
+
+        Parameters:
+         -----------------------
+        win_lengths: list of integer, the window lengths of the scenarios
+        alpha: float, 0<=value<0.5, 1-alpha is the confidence level of risk
+
+        Data:
+        -------------
+        var_arr: pandas.Series, Value at risk of the worst distribution
+        wcvar_arr: pandas.Series, worst-case CVaR of each period
+        worst_win_length_arr: pandas.Series, window length of the worst
+            distribution of each period
+        """
+        self.win_lengths = sorted(int(w) for w in win_lengths)
+
+        super(MinWCVaRSPPortfolio, self).__init__(
+           symbols, risk_rois, risk_free_rois, initial_risk_wealth,
+           initial_risk_free_wealth, buy_trans_fee, sell_trans_fee,
+            start_date, end_date, max(self.win_lengths), n_scenario, bias,
+            verbose, solver_io=solver_io)
+
+        self.alpha = float(alpha)
+        self.scenario_cnt = scenario_cnt
+
+        # memory-mapped scenarios of all window lengths
+        self.scenario_dates = None
+        self.scenario_mmaps = []
+        for win_length in self.win_lengths:
+            trans_dates, scenario_symbols, scenarios = load_scenario_mmap(
+                len(symbols), win_length, n_scenario, bias, scenario_cnt)
+            if scenario_symbols != list(self.symbols):
+                raise ValueError("the symbols of scenarios w{} are "
+                                 "different.".format(win_length))
+            # the scenarios of all window lengths are indexed by the same
+            # date index
+            if self.scenario_dates is None:
+                self.scenario_dates = trans_dates
+            elif not trans_dates.equals(self.scenario_dates):
+                raise ValueError("the dates of scenarios w{} are "
+                                 "different.".format(win_length))
+            self.scenario_mmaps.append(scenarios)
+
+        # additional results
+        self.var_arr = pd.Series(np.zeros(self.n_exp_period),
+                                 index=self.exp_risk_rois.index)
+        self.wcvar_arr = pd.Series(np.zeros(self.n_exp_period),
+                                   index=self.exp_risk_rois.index)
+        self.worst_win_length_arr = pd.Series(
+            np.zeros(self.n_exp_period, dtype=np.int),
+            index=self.exp_risk_rois.index)
+
+    def valid_specific_parameters(self, *args, **kwargs):
+        if len(self.win_lengths) < 1:
+            raise ValueError("empty win_lengths.")
+
+    def get_trading_func_name(self, *args, **kwargs):
+        return "MinWCVaRSP_m{}_w{}_s{}_{}_{}_a{:.2f}".format(
+            self.n_stock, "_".join(str(w) for w in self.win_lengths),
+            self.n_scenario, "biased" if self.bias_estimator else "unbiased",
+            self.scenario_cnt, self.alpha)
+
+    def add_results_to_reports(self, reports, *args, **kwargs):
+        """ add additional items to reports """
+        reports['alpha'] = self.alpha
+        reports['scenario_cnt'] = self.scenario_cnt
+        reports['win_lengths'] = self.win_lengths
+        reports['var_arr'] = self.var_arr
+        reports['wcvar_arr'] = self.wcvar_arr
+        reports['worst_win_length_arr'] = self.worst_win_length_arr
+        return reports
+
+    def get_estimated_risk_free_rois(self, *arg, **kwargs):
+        """ the risk free roi is set all zeros """
+        return 0.
+
+    def get_estimated_risk_rois(self, *args, **kwargs):
+        """
+        stacking the scenarios of all window lengths of the date
+
+        Returns:
+        -----------
+        estimated_risk_rois, numpy.array, shape: (n_dist, n_stock, n_scenario)
+        """
+        trans_date = kwargs['trans_date']
+        ddx = self.scenario_dates.get_loc(trans_date)
+        return np.array([scenarios[ddx] for scenarios in self.scenario_mmaps],
+                        dtype=np.float64)
+
+    def set_specific_period_action(self, *args, **kwargs):
+        """
+        user specified action after getting results
+        """
+        tdx = kwargs['tdx']
+        results = kwargs['results']
+        self.var_arr.iloc[tdx] = results["estimated_var"]
+        self.wcvar_arr.iloc[tdx] = results['estimated_wcvar']
+        self.worst_win_length_arr.iloc[tdx] = self.win_lengths[
+            results['worst_dist']]
+
+    def get_current_buy_sell_amounts(self, *args, **kwargs):
+        """ min_wcvar function """
+
+        # current exp_period index
+        tdx = kwargs['tdx']
+        results = min_wcvar_sp_portfolio(
+            self.symbols,
+            self.exp_risk_rois.iloc[tdx, :].as_matrix(),
+            self.risk_free_rois.iloc[tdx],
+            kwargs['allocated_risk_wealth'].as_matrix(),
+            kwargs['allocated_risk_free_wealth'],
+            self.buy_trans_fee,
+            self.sell_trans_fee,
+            self.alpha,
+            kwargs['estimated_risk_rois'],
+            kwargs['estimated_risk_free_roi'],
+            self.n_scenario,
+            timer=self.timer,
+            solver_io=self.solver_io,
+        )
+        return results
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+Authors: Hung-Hsin Chen <chenhh@par.cse.nsysu.edu.tw>
+License: GPL v2
+
+time-to-tolerance of the moment matching backends, the HKW backend is
+optional (scenario/setup.py builds it only if libHKW.so exists).
+"""
+
+from __future__ import division
+from time import time
+import numpy as np
+import pandas as pd
+from PySPPortfolio.pysp_portfolio.scenario.c_moment_matching import (
+    heuristic_moment_matching as c_HMM,)
+from PySPPortfolio.pysp_portfolio.scenario.rolling_moments import (
+    RollingMoments,)
+
+
+def moment_matching_backends():
+    """ [(name, heuristic_moment_matching)] of the built backends """
+    backends = [('c_HMM', c_HMM)]
+    try:
+        from PySPPortfolio.pysp_portfolio.scenario.hkw_moment_matching import (
+            heuristic_moment_matching as hkw_HMM,)
+    except ImportError:
+        pass
+    else:
+        backends.append(('hkw', hkw_HMM))
+    return backends
+
+
+def benchmark_HMM(n_stocks=xrange(5, 50 + 5, 5), win_length=100,
+                  n_scenario=200, n_run=5, bias=False):
+    """
+    time-to-tolerance of the Cython HMM and the HKW library
+
+    Returns:
+    ----------
+    pandas.DataFrame, index: n_stock, columns: mean seconds and
+        failure counts of each backend
+    """
+    backends = moment_matching_backends()
+    columns = ["{}_{}".format(name, item) for name, _ in backends
+               for item in ('secs', 'fails')]
+    stats = pd.DataFrame(np.zeros((len(n_stocks), len(columns))),
+                         index=n_stocks, columns=columns)
+
+    for n_stock in n_stocks:
+        for _ in xrange(n_run):
+            data = np.random.randn(win_length, n_stock)
+            tgt_moments, tgt_corrs = RollingMoments(data, bias).moments()
+            for name, func in backends:
+                t0 = time()
+                try:
+                    func(tgt_moments, tgt_corrs, n_scenario, bias)
+                except ValueError:
+                    stats.loc[n_stock, "{}_fails".format(name)] += 1
+                stats.loc[n_stock, "{}_secs".format(name)] += (
+                    (time() - t0) / n_run)
+        print ("m{}: {}".format(n_stock, stats.loc[n_stock].to_dict()))
+    return stats
+
+
+if __name__ == '__main__':
+    print (benchmark_HMM())
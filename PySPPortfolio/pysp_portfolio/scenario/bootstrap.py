@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+Authors: Hung-Hsin Chen <chenhh@par.cse.nsysu.edu.tw>
+License: GPL v2
+
+bootstrap scenarios from the historical rois, the scenarios are the
+historical rois, therefore the cost of generation is negligible compared
+to the moment matching.
+
+Politis, Dimitris N., and Joseph P. Romano. "The stationary bootstrap."
+Journal of the American Statistical association 89.428 (1994): 1303-1313.
+"""
+
+from __future__ import division
+import numpy as np
+
+
+def historical_bootstrap(hist_rois, n_scenario=200, random_seed=None):
+    """
+    sampling the historical rois with replacement
+
+    Parameters:
+    --------------
+    hist_rois: numpy.array, shape: (win_length, n_rv), historical rois
+    n_scenario: positive integer, number of scenario to generate
+    random_seed: integer or None
+
+    Returns:
+    -------------
+    out_mtx: numpy.array, shape:(n_rv, n_scenario)
+    """
+    hist_rois = np.asarray(hist_rois)
+    rng = np.random.RandomState(random_seed)
+    indices = rng.randint(0, hist_rois.shape[0], n_scenario)
+    return hist_rois[indices].T
+
+
+def stationary_bootstrap_indices(win_length, n_scenario, block_length=5.,
+                                 random_seed=None):
+    """
+    indices of the stationary bootstrap, the blocks of consecutive
+    periods have geometric distributed lengths with mean block_length,
+    and wrap around the window.
+
+    Parameters:
+    --------------
+    win_length: positive integer, number of historical periods
+    n_scenario: positive integer, number of scenario to generate
+    block_length: float, >= 1, expected length of the blocks
+
+    Returns:
+    -------------
+    indices: numpy.array, shape: (n_scenario,)
+    """
+    if block_length < 1:
+        raise ValueError("the block length must >= 1: {}".format(
+            block_length))
+    rng = np.random.RandomState(random_seed)
+
+    # a new block starts with probability 1/block_length
+    new_block = rng.rand(n_scenario) < 1. / block_length
+    new_block[0] = True
+    block_ids = np.cumsum(new_block) - 1
+    n_block = block_ids[-1] + 1
+
+    # position in the block
+    block_starts = np.flatnonzero(new_block)
+    offsets = np.arange(n_scenario) - block_starts[block_ids]
+
+    start_indices = rng.randint(0, win_length, n_block)
+    return (start_indices[block_ids] + offsets) % win_length
+
+
+def stationary_bootstrap(hist_rois, n_scenario=200, block_length=5.,
+                         random_seed=None):
+    """
+    sampling the stationary blocks of historical rois
+
+    Parameters:
+    --------------
+    hist_rois: numpy.array, shape: (win_length, n_rv), historical rois
+    n_scenario: positive integer, number of scenario to generate
+    block_length: float, >= 1, expected length of the blocks
+    random_seed: integer or None
+
+    Returns:
+    -------------
+    out_mtx: numpy.array, shape:(n_rv, n_scenario)
+    """
+    hist_rois = np.asarray(hist_rois)
+    indices = stationary_bootstrap_indices(hist_rois.shape[0], n_scenario,
+                                           block_length, random_seed)
+    return hist_rois[indices].T
@@ -20,6 +20,7 @@ note: correlation, skewness, and kurtosis do not affected by scaling and
 from __future__ import division
 import numpy as np
 import numpy.linalg as la
+import scipy.linalg as spla
 import scipy.optimize as spopt
 import scipy.stats as spstats
 from time import time
@@ -37,7 +38,8 @@ cpdef heuristic_moment_matching(
                               double max_moment_err=1e-3,
                               double max_corr_err=1e-3,
                               double max_cubic_err=1e-5,
-                              int verbose=False):
+                              int verbose=False,
+                              fit_stats=None):
     """
     Parameters:
     --------------
@@ -51,6 +53,9 @@ cpdef heuristic_moment_matching(
         sample moments
     max_err_corr: float, max moment of error between tgt_corrs and
         sample correlation matrix
+    fit_stats: dict or None, if a dict is given, the number of cubic fits
+        ('n_fit'), residual and Jacobian evaluations ('nfev', 'njev') and
+        the final cubic error ('cubic_err') are accumulated in it
 
     Returns:
     -------------
@@ -86,7 +91,7 @@ cpdef heuristic_moment_matching(
         cnp.ndarray[FLOAT_t, ndim=1] ey = np.empty(12)
         cnp.ndarray[FLOAT_t, ndim=1] tmp_out = np.zeros(n_scenario)
         cnp.ndarray[FLOAT_t, ndim=1] x_init
-        cnp.ndarray[FLOAT_t, ndim=2] c_lower, out_corrs, co_inv, l_vec
+        cnp.ndarray[FLOAT_t, ndim=2] c_lower, out_corrs, co_lower
 
         double ns = float(n_scenario)
         double ns_m1 = ns - 1.
@@ -95,6 +100,9 @@ cpdef heuristic_moment_matching(
         double ns_m3 = ns - 3.
         double ns2 = ns * ns
 
+    # the rank-deficient target is repaired before the decomposition
+    tgt_corrs = repair_correlation_matrix(tgt_corrs)
+
     # moments
     if bias:
         y_moments[:, 1] = 1.
@@ -123,16 +131,10 @@ cpdef heuristic_moment_matching(
             for cub_iter in xrange(max_cubic_iter):
 
                 # 1~12th moments of the random samples
-                ex = np.asarray([(tmp_out ** (idx + 1)).mean()
-                                  for idx in xrange(12)])
+                ex = sample_moments(tmp_out)
 
                 # find corresponding cubic parameters
-                x_init = np.array([0., 1., 0., 0.])
-                out = spopt.leastsq(cubic_function, x_init, args=(ex, ey),
-                                    full_output=True, ftol=1E-12,
-                                    xtol=1E-12)
-                cubic_params = out[0]
-                cubic_err = np.sum(out[2]['fvec'] ** 2)
+                cubic_params, cubic_err = cubic_fit(ex, ey, fit_stats)
 
                 # update random samples
                 tmp_out = (cubic_params[0] +
@@ -171,9 +173,10 @@ cpdef heuristic_moment_matching(
 
         # transfer mtx
         out_corrs = np.corrcoef(out_mtx)
-        co_inv = la.inv(la.cholesky(out_corrs))
-        l_vec = np.dot(c_lower, co_inv)
-        out_mtx = np.dot(l_vec, out_mtx)
+        # out_mtx = c_lower * inv(co_lower) * out_mtx, without the inverse
+        co_lower = la.cholesky(repair_correlation_matrix(out_corrs))
+        out_mtx = np.dot(c_lower, spla.solve_triangular(co_lower, out_mtx,
+                                                        lower=True))
 
         # wrong moment, correct correlation
         moments_err, corrs_err = error_statistics(out_mtx, y_moments,
@@ -192,13 +195,8 @@ cpdef heuristic_moment_matching(
 
             # loop until cubic transform erro converge
             for cub_iter in xrange(max_cubic_iter):
-                ex = np.asarray([(tmp_out ** (idx + 1)).mean()
-                                  for idx in xrange(12)])
-                X_init = np.array([0., 1., 0., 0.])
-                out = spopt.leastsq(cubic_function, X_init, args=(ex, ey),
-                                    full_output=True, ftol=1E-12, xtol=1E-12)
-                cubic_params = out[0]
-                cubic_err = np.sum(out[2]['fvec'] ** 2)
+                ex = sample_moments(tmp_out)
+                cubic_params, cubic_err = cubic_fit(ex, ey, fit_stats)
 
                 tmp_out = (cubic_params[0] +
                            cubic_params[1] * tmp_out +
@@ -272,6 +270,39 @@ cpdef heuristic_moment_matching(
     return out_mtx
 
 
+def repair_correlation_matrix(corrs, eig_floor=1e-8):
+    """
+    nearest positive definite correlation matrix by the eigenvalue floor.
+    the correlation matrix of a short window (e.g. win_length=50, n_rv=50)
+    is rank-deficient, and the Cholesky decomposition fails.
+
+    Parameters:
+    ----------------
+    corrs: numpy.array, shape: (n_rv, n_rv), correlation matrix
+    eig_floor: float, the minimum eigenvalue of the repaired matrix
+
+    Returns:
+    ----------------
+    numpy.array, shape: (n_rv, n_rv), the same object if corrs is
+        positive definite
+    """
+    if not np.all(np.isfinite(corrs)):
+        # the correlation of a constant series is nan
+        corrs = np.where(np.isfinite(corrs), corrs, 0.)
+        np.fill_diagonal(corrs, 1.)
+
+    eig_vals, eig_vecs = la.eigh(corrs)
+    if eig_vals.min() >= eig_floor:
+        return corrs
+
+    # clipping the eigenvalues, and rescaling to the unit diagonal
+    eig_vals = np.maximum(eig_vals, eig_floor)
+    repaired = np.dot(eig_vecs * eig_vals, eig_vecs.T)
+    scale = 1. / np.sqrt(np.diag(repaired))
+    repaired = repaired * scale[:, np.newaxis] * scale[np.newaxis, :]
+    return (repaired + repaired.T) / 2.
+
+
 cpdef cubic_function(cnp.ndarray[FLOAT_t, ndim=1] cubic_params,
                      cnp.ndarray[FLOAT_t, ndim=1] sample_moments,
                      cnp.ndarray[FLOAT_t, ndim=1] tgt_moments):
@@ -360,6 +391,125 @@ cpdef cubic_function(cnp.ndarray[FLOAT_t, ndim=1] cubic_params,
     return v1, v2, v3, v4
 
 
+cpdef sample_moments(cnp.ndarray[FLOAT_t, ndim=1] samples):
+    """
+    1~12th raw moments of the samples in one pass
+
+    Parameters:
+    ----------------
+    samples: numpy.array, shape: (n_scenario,)
+
+    Returns:
+    ----------------
+    numpy.array, shape:(12,)
+    """
+    cdef:
+        INTP_t n_sample = samples.shape[0]
+        INTP_t sdx, idx
+        double val, power
+        cnp.ndarray[FLOAT_t, ndim=1] moments = np.zeros(12)
+
+    for sdx in xrange(n_sample):
+        val = samples[sdx]
+        power = 1.
+        for idx in xrange(12):
+            power *= val
+            moments[idx] += power
+
+    for idx in xrange(12):
+        moments[idx] /= n_sample
+    return moments
+
+
+cpdef cubic_jacobian(cnp.ndarray[FLOAT_t, ndim=1] cubic_params,
+                     cnp.ndarray[FLOAT_t, ndim=1] sample_moments,
+                     cnp.ndarray[FLOAT_t, ndim=1] tgt_moments):
+    """
+    analytic Jacobian of cubic_function
+
+    let p(x) = a + b*x + c*x^2 + d*x^3, the k-th residual is
+    E[p(x)^k] - ey_k, and its derivative of the j-th parameter is
+    k * E[p(x)^(k-1) * x^j].
+
+    Parameters:
+    ----------------
+    cubic_params: (a,b,c,d), four floats
+    sample_moments: numpy.array, shape:(12,), 1~12 moments of samples
+    tgt_moments: numpy.array, shape:(4,), 1~4th moments of target
+
+    Returns:
+    ----------------
+    jac: numpy.array, shape: (4, 4), jac[k, j] = d v_(k+1) / d param_j
+    """
+    cdef:
+        # 0~12th moments of samples
+        double ex[13]
+        # coefficients of p(x)^(k-1) in ascending order, degree <= 9
+        double poly[10]
+        double tmp[10]
+        double val
+        int kdx, jdx, ndx, ldx, deg = 1
+        cnp.ndarray[FLOAT_t, ndim=2] jac = np.empty((4, 4))
+
+    ex[0] = 1.
+    for ndx in xrange(12):
+        ex[ndx + 1] = sample_moments[ndx]
+    poly[0] = 1.
+
+    for kdx in xrange(4):
+        for jdx in xrange(4):
+            val = 0
+            for ndx in xrange(deg):
+                val += poly[ndx] * ex[ndx + jdx]
+            jac[kdx, jdx] = (kdx + 1) * val
+
+        if kdx < 3:
+            # poly = poly * p(x)
+            for ndx in xrange(deg + 3):
+                tmp[ndx] = 0
+            for ndx in xrange(deg):
+                for ldx in xrange(4):
+                    tmp[ndx + ldx] += poly[ndx] * cubic_params[ldx]
+            deg += 3
+            for ndx in xrange(deg):
+                poly[ndx] = tmp[ndx]
+    return jac
+
+
+cpdef cubic_fit(cnp.ndarray[FLOAT_t, ndim=1] sample_moments,
+                cnp.ndarray[FLOAT_t, ndim=1] tgt_moments,
+                fit_stats=None):
+    """
+    least square fit of the cubic transform with the analytic Jacobian
+
+    Parameters:
+    ----------------
+    sample_moments: numpy.array, shape:(12,), 1~12 moments of samples
+    tgt_moments: numpy.array, shape:(4,), 1~4th moments of target
+    fit_stats: dict or None, accumulating the fit statistics
+
+    Returns:
+    ----------------
+    cubic_params: numpy.array, shape: (4,)
+    cubic_err: float, sum of squared residuals
+    """
+    cdef double cubic_err
+    x_init = np.array([0., 1., 0., 0.])
+    out = spopt.leastsq(cubic_function, x_init,
+                        args=(sample_moments, tgt_moments),
+                        Dfun=cubic_jacobian, full_output=True,
+                        ftol=1E-12, xtol=1E-12)
+    cubic_params, info = out[0], out[2]
+    cubic_err = np.sum(info['fvec'] ** 2)
+
+    if fit_stats is not None:
+        fit_stats['n_fit'] = fit_stats.get('n_fit', 0) + 1
+        fit_stats['nfev'] = fit_stats.get('nfev', 0) + info['nfev']
+        fit_stats['njev'] = fit_stats.get('njev', 0) + info.get('njev', 0)
+        fit_stats['cubic_err'] = cubic_err
+    return cubic_params, cubic_err
+
+
 cdef error_statistics( cnp.ndarray[FLOAT_t, ndim=2] out_mtx,
                         cnp.ndarray[FLOAT_t, ndim=2] tgt_moments,
                         cnp.ndarray[FLOAT_t, ndim=2] tgt_corrs):
@@ -0,0 +1,353 @@
+# -*- coding: utf-8 -*-
+"""
+Authors: Hung-Hsin Chen <chenhh@par.cse.nsysu.edu.tw>
+License: GPL v2
+
+registry of scenario generators.
+
+all generators have the same signature:
+    generator(hist_data, n_scenario, bias=False, **kwargs)
+
+    hist_data: numpy.array, shape: (win_length, n_stock), historical rois
+    n_scenario: integer, number of scenarios to generating
+    bias: boolean, biased or unbiased estimator of moments
+
+    return: numpy.array, shape: (n_stock, n_scenario)
+"""
+
+from __future__ import division
+import os
+from time import time
+import numpy as np
+import pandas as pd
+import scipy.stats as spstats
+from PySPPortfolio.pysp_portfolio.scenario.bootstrap import (
+    historical_bootstrap, stationary_bootstrap)
+from PySPPortfolio.pysp_portfolio.log_utils import (get_logger,)
+
+logger = get_logger('scenario.generators')
+
+SCENARIO_GENERATORS = {}
+
+# the scenario mode of ScenarioSource and the portfolios
+DEFAULT_SCENARIO_MODE = 'precompute'
+
+
+def register_scenario_generator(name):
+    """
+    decorator of registering a scenario generator
+
+    Parameters:
+    ------------------
+    name: string, name of the generator
+    """
+    def decorator(func):
+        if name in SCENARIO_GENERATORS:
+            raise ValueError("scenario generator {} has been "
+                             "registered.".format(name))
+        SCENARIO_GENERATORS[name] = func
+        return func
+    return decorator
+
+
+def get_scenario_generator(name):
+    """ get the registered scenario generator by name """
+    try:
+        return SCENARIO_GENERATORS[name]
+    except KeyError:
+        raise ValueError("unknown scenario generator: {}, registered: "
+                         "{}".format(name, sorted(SCENARIO_GENERATORS)))
+
+
+def estimating_moments(hist_data, bias=False):
+    """
+    1-4 th moments and correlation matrix of historical data
+
+    Parameters:
+    ------------------
+    hist_data: numpy.array, shape: (win_length, n_stock)
+    bias: boolean, biased or unbiased estimator of moments
+
+    Returns:
+    ------------------
+    tgt_moments: numpy.array, shape: (n_stock, 4)
+    tgt_corrs: numpy.array, shape: (n_stock, n_stock)
+    """
+    n_stock = hist_data.shape[1]
+    tgt_moments = np.zeros((n_stock, 4))
+    tgt_moments[:, 0] = hist_data.mean(axis=0)
+    if bias:
+        # the 2nd moment must be standard deviation, not the variance
+        tgt_moments[:, 1] = hist_data.std(axis=0)
+        tgt_moments[:, 2] = spstats.skew(hist_data, axis=0)
+        tgt_moments[:, 3] = spstats.kurtosis(hist_data, axis=0)
+    else:
+        tgt_moments[:, 1] = hist_data.std(axis=0, ddof=1)
+        tgt_moments[:, 2] = spstats.skew(hist_data, axis=0, bias=False)
+        tgt_moments[:, 3] = spstats.kurtosis(hist_data, axis=0, bias=False)
+    tgt_corrs = np.corrcoef(hist_data.T)
+    return tgt_moments, tgt_corrs
+
+
+def relaxing_moment_matching(hmm_func, tgt_moments, tgt_corrs, n_scenario,
+                             bias, error_orders=(-3, -2, -1), **kwargs):
+    """
+    moment matching of the target statistics with relaxing tolerance
+    errors if not converge
+
+    Parameters:
+    ------------------
+    hmm_func: function, heuristic_moment_matching of a backend
+    tgt_moments: numpy.array, shape: (n_stock, 4)
+    tgt_corrs: numpy.array, shape: (n_stock, n_stock)
+    error_orders: list of integer, exponents of the tolerance errors
+    """
+    for idx, error_order in enumerate(error_orders):
+        try:
+            max_moment_err = 10 ** error_order
+            max_corr_err = 10 ** error_order
+            return hmm_func(tgt_moments, tgt_corrs, n_scenario, bias,
+                            max_moment_err, max_corr_err, **kwargs)
+        except ValueError as e:
+            logger.debug(e)
+            if idx == len(error_orders) - 1:
+                raise ValueError('moment matching not converge: {}'.format(e))
+
+
+def _relaxing_moment_matching(hmm_func, hist_data, n_scenario, bias,
+                              error_orders=(-3, -2, -1), **kwargs):
+    """
+    moment matching of the historical data with relaxing tolerance errors
+    if not converge
+    """
+    tgt_moments, tgt_corrs = estimating_moments(hist_data, bias)
+    return relaxing_moment_matching(hmm_func, tgt_moments, tgt_corrs,
+                                    n_scenario, bias, error_orders, **kwargs)
+
+
+@register_scenario_generator('hmm')
+def hmm_generator(hist_data, n_scenario, bias=False, **kwargs):
+    """ heuristic moment matching, Cython implementation """
+    from PySPPortfolio.pysp_portfolio.scenario.c_moment_matching import (
+        heuristic_moment_matching,)
+    return _relaxing_moment_matching(heuristic_moment_matching, hist_data,
+                                     n_scenario, bias, **kwargs)
+
+
+@register_scenario_generator('hkw')
+def hkw_generator(hist_data, n_scenario, bias=False, **kwargs):
+    """ heuristic moment matching, Kaut's HKW C library """
+    try:
+        from PySPPortfolio.pysp_portfolio.scenario.hkw_moment_matching import (
+            heuristic_moment_matching,)
+    except ImportError as e:
+        raise ValueError("the HKW backend is not available: {}".format(e))
+    return _relaxing_moment_matching(heuristic_moment_matching, hist_data,
+                                     n_scenario, bias, **kwargs)
+
+
+@register_scenario_generator('kaut')
+def kaut_copula_generator(hist_data, n_scenario, bias=False,
+                          solver="cplex", **kwargs):
+    """
+    Kaut's optimal copula sampling, only the bivariate case is supported
+    """
+    from PySPPortfolio.scenario.KautCopula import optimal2DCopulaSampling
+    from PySPPortfolio.scenario.StrlenCopula import empiricalInverseCDF
+    if hist_data.shape[1] != 2:
+        raise ValueError("Kaut copula generator only supports 2 stocks, "
+                         "get {}.".format(hist_data.shape[1]))
+    results = optimal2DCopulaSampling(hist_data, n_scenario, solver)
+    return empiricalInverseCDF(hist_data, results['parsed']).T
+
+
+@register_scenario_generator('strelen')
+def strelen_copula_generator(hist_data, n_scenario, bias=False, K=2,
+                             random_seed=None, **kwargs):
+    """ Strelen's copula sampling with K partitions of [0, 1] """
+    from PySPPortfolio.scenario.StrlenCopula import StrlenCopulaSampling
+    return StrlenCopulaSampling(hist_data, n_scenario, K, marginal=True,
+                                random_seed=random_seed).T
+
+
+@register_scenario_generator('bootstrap')
+def bootstrap_generator(hist_data, n_scenario, bias=False,
+                        random_seed=None, **kwargs):
+    """ sampling the historical rois with replacement """
+    return historical_bootstrap(hist_data, n_scenario, random_seed)
+
+
+@register_scenario_generator('stationary_bootstrap')
+def stationary_bootstrap_generator(hist_data, n_scenario, bias=False,
+                                   block_length=5., random_seed=None,
+                                   **kwargs):
+    """ sampling the stationary blocks of historical rois """
+    return stationary_bootstrap(hist_data, n_scenario, block_length,
+                                random_seed)
+
+
+@register_scenario_generator('gaussian')
+def gaussian_generator(hist_data, n_scenario, bias=False,
+                       random_seed=None, **kwargs):
+    """ multivariate normal distribution of the historical mean and cov """
+    rng = np.random.RandomState(random_seed)
+    mean = hist_data.mean(axis=0)
+    cov = np.atleast_2d(np.cov(hist_data.T, bias=bias))
+    return rng.multivariate_normal(mean, cov, n_scenario).T
+
+
+def scenario_stream(generator, risk_rois, exp_trans_dates, win_length,
+                    n_scenario, bias=False, **kwargs):
+    """
+    generating the scenarios of each date lazily
+
+    Parameters:
+    ------------------
+    generator: string or function, the scenario generator
+    risk_rois: pandas.DataFrame, shape: (n_period, n_stock), it must contain
+        the historical rois before the first experiment date
+    exp_trans_dates: list of datetime, the dates of generating scenarios
+    win_length: integer, number of historical periods
+
+    Yields:
+    ------------------
+    (trans_date, scenario_df), scenario_df: pandas.DataFrame,
+        shape: (n_stock, n_scenario)
+    """
+    if not callable(generator):
+        generator = get_scenario_generator(generator)
+
+    symbols = risk_rois.columns
+    rois = risk_rois.values
+    for trans_date in exp_trans_dates:
+        # because we trade stock on the after-hour market, the historical
+        # interval contains current day
+        end_idx = risk_rois.index.get_loc(trans_date) + 1
+        start_idx = end_idx - win_length
+        if start_idx < 0:
+            raise ValueError("{}: insufficient historical data of window "
+                             "length {}.".format(trans_date, win_length))
+        scenarios = generator(rois[start_idx:end_idx], n_scenario, bias,
+                              **kwargs)
+        yield trans_date, pd.DataFrame(scenarios, index=symbols)
+
+
+class ScenarioSource(object):
+    """
+    scenarios of the experiment period from a registered generator
+
+    mode:
+        - 'precompute': generating all scenarios at once and storing them
+            to a Panel file, the file is reused in the later runs
+        - 'online': generating the scenarios of a date when it is requested
+    """
+
+    def __init__(self, generator, risk_rois, start_date, end_date,
+                 win_length, n_scenario, bias=False,
+                 mode=DEFAULT_SCENARIO_MODE,
+                 scenario_cnt=1, scenario_dir=None, **kwargs):
+        """
+        Parameters:
+        ------------------
+        generator: string, name of the registered generator
+        risk_rois: pandas.DataFrame, shape: (n_period, n_stock)
+        start_date, end_date: datetime, the experiment period
+        win_length: integer, number of historical periods
+        n_scenario: integer, number of scenarios to generating
+        bias: boolean, biased or unbiased estimator of moments
+        mode: string, {'precompute', 'online'}, default is
+            DEFAULT_SCENARIO_MODE
+        scenario_cnt: integer, the count of the stored scenario file
+        scenario_dir: string, directory of the stored scenario files
+        kwargs: additional parameters of the generator
+        """
+        if mode not in ('precompute', 'online'):
+            raise ValueError("unknown scenario mode: {}".format(mode))
+
+        self.generator_name = generator
+        self.generator = get_scenario_generator(generator)
+        self.risk_rois = risk_rois
+        self.exp_trans_dates = risk_rois.loc[start_date:end_date].index
+        self.win_length = int(win_length)
+        self.n_scenario = int(n_scenario)
+        self.bias = bias
+        self.mode = mode
+        self.scenario_cnt = scenario_cnt
+        self.kwargs = kwargs
+        self.scenario_panel = None
+
+        if scenario_dir is None:
+            from PySPPortfolio.pysp_portfolio import EXP_SCENARIO_DIR
+            scenario_dir = os.path.join(EXP_SCENARIO_DIR, generator)
+        self.scenario_dir = scenario_dir
+
+        if mode == 'precompute':
+            self.scenario_panel = self.precompute()
+
+    def scenario_path(self):
+        """ path of the stored scenario file """
+        file_name = "{}_{}_m{}_w{}_s{}_{}_{}.pkl".format(
+            self.exp_trans_dates[0].strftime("%Y%m%d"),
+            self.exp_trans_dates[-1].strftime("%Y%m%d"),
+            self.risk_rois.shape[1], self.win_length, self.n_scenario,
+            "biased" if self.bias else "unbiased", self.scenario_cnt)
+        return os.path.join(self.scenario_dir, file_name)
+
+    def precompute(self):
+        """
+        loading the stored scenario panel, or generating and storing it
+        if not exists.
+
+        Returns:
+        ------------------
+        scenario_panel: pandas.Panel, shape: (n_exp_period, n_stock,
+            n_scenario)
+        """
+        file_path = self.scenario_path()
+        if os.path.exists(file_path):
+            return pd.read_pickle(file_path)
+
+        t0 = time()
+        panel = pd.Panel(np.zeros((len(self.exp_trans_dates),
+                                   self.risk_rois.shape[1], self.n_scenario)),
+                         items=self.exp_trans_dates,
+                         major_axis=self.risk_rois.columns)
+        for trans_date, scenario_df in self.stream():
+            panel.loc[trans_date] = scenario_df
+
+        if not os.path.exists(self.scenario_dir):
+            os.makedirs(self.scenario_dir)
+        panel.to_pickle(file_path)
+        logger.info("{} {} scenarios OK, {:.4f} secs".format(
+            self.generator_name, os.path.basename(file_path), time() - t0))
+        return panel
+
+    def stream(self, trans_dates=None):
+        """ generating the scenarios lazily """
+        if trans_dates is None:
+            trans_dates = self.exp_trans_dates
+        return scenario_stream(self.generator, self.risk_rois, trans_dates,
+                               self.win_length, self.n_scenario, self.bias,
+                               **self.kwargs)
+
+    def get(self, trans_date):
+        """
+        scenarios of the trans_date
+
+        Returns:
+        ------------------
+        scenario_df: pandas.DataFrame, shape: (n_stock, n_scenario)
+        """
+        if self.scenario_panel is not None:
+            return self.scenario_panel.loc[trans_date]
+        _, scenario_df = next(self.stream([trans_date, ]))
+        return scenario_df
+
+    def __iter__(self):
+        """ yielding (trans_date, scenario_df) """
+        if self.scenario_panel is not None:
+            for trans_date in self.exp_trans_dates:
+                yield trans_date, self.scenario_panel.loc[trans_date]
+        else:
+            for item in self.stream():
+                yield item
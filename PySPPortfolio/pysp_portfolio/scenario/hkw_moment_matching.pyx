@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+#!python
+#cython: boundscheck=False
+#cython: wraparound=False
+#cython: infer_types=True
+#cython: nonecheck=False
+
+"""
+Authors: Hung-Hsin Chen <chenhh@par.cse.nsysu.edu.tw>
+License: GPL v2
+
+wrapper of Kaut's HKW C library (libHKW.so), it has the same signature as
+c_moment_matching.heuristic_moment_matching.
+
+Høyland, K.; Kaut, M. & Wallace, S. W., "A heuristic for
+moment-matching scenario generation," Computational optimization
+and applications, vol. 24, pp 169-185, 2003.
+"""
+
+from __future__ import division
+import numpy as np
+from time import time
+
+cimport numpy as cnp
+ctypedef cnp.float64_t FLOAT_t
+
+
+cdef extern from "matrix.h":
+    ctypedef struct TVector:
+        int size
+        double *val
+
+    ctypedef struct TMatrix:
+        int nrow, ncol
+        double ** val
+
+    int Mat_Init(TMatrix* p_mat, int mb_rows, int nmb_cols)
+    int Vec_Init(TVector* p_vec, int size)
+    void Vec_Kill(TVector* p_A)
+    void Mat_Kill(TMatrix* p_A)
+
+
+cdef extern from "HKW_sg.h":
+    int HKW_ScenGen(int FormatOfMoms,
+                    TMatrix* p_TarMoms,
+                    TMatrix* p_TgCorrs,
+                    TVector* p_Probs,
+                    TMatrix* p_OutMat,
+                    double MaxErrMom, double MaxErrCorr,
+                    int TestLevel, int MaxTrial,
+                    int MaxIter, int UseStartValues,
+                    double * p_errMom, double * p_errCorr,
+                    int * p_nmbTrial, int * p_nmbIter)
+
+# bits of the format of the target moments (HKW_sg.h):
+#   - 1: population estimators, otherwise the sample estimators
+#   - 2: the 2nd moment is the variance instead of the standard deviation
+#   - 4: the 4th moment is the excess kurtosis (kurtosis - 3)
+# the targets are the standard deviation and the excess kurtosis, the same
+# as scipy.stats.kurtosis, and the estimators are given by bias
+cdef int HKW_POPULATION_ESTIMATORS = 1
+cdef int HKW_EXCESS_KURTOSIS = 4
+
+
+def heuristic_moment_matching(cnp.ndarray[FLOAT_t, ndim=2] tgt_moments,
+                              cnp.ndarray[FLOAT_t, ndim=2] tgt_corrs,
+                              int n_scenario=200,
+                              int bias=False,
+                              double max_moment_err=1e-3,
+                              double max_corr_err=1e-3,
+                              int max_trial=20,
+                              int max_iteration=20,
+                              int verbose=False,
+                              stats=None):
+    """
+    Parameters:
+    --------------
+    tgt_moments:, numpy.array,shape: (n_rv * 4), 1~4 central moments
+    tgt_corrs:, numpy.array, size: shape: (n_rv * n_rv), correlation matrix
+    n_scenario:, positive integer, number of scenario to generate
+    bias: boolean,
+        - True means biased estimators,
+        - False means unbiased estimators
+    max_moment_err: float, max moment of error between tgt_moments and
+        sample moments
+    max_corr_err: float, max moment of error between tgt_corrs and
+        sample correlation matrix
+    max_trial: integer, maximum number of restarts of the HKW library
+    max_iteration: integer, maximum number of iterations of each trial
+    stats: dict or None, if a dict is given, the moment error, correlation
+        error, number of trials and iterations are recorded in it
+
+    Returns:
+    -------------
+    out_mtx: numpy.array, shape:(n_rv, n_scenario)
+    """
+    t0 = time()
+    cdef:
+        int rdx, cdx, code
+        int n_rv = tgt_moments.shape[0]
+        int n_trial = 0, n_iteration = 0
+        double moment_err = 0, corr_err = 0
+        int format_of_moms = HKW_EXCESS_KURTOSIS
+        TMatrix tar_moms, tg_corrs, out_mat
+        TVector probs
+
+    if bias:
+        format_of_moms |= HKW_POPULATION_ESTIMATORS
+
+    # the matrices must be empty before initializing
+    tar_moms.nrow, tar_moms.ncol = 0, 0
+    tg_corrs.nrow, tg_corrs.ncol = 0, 0
+    out_mat.nrow, out_mat.ncol = 0, 0
+    tar_moms.val = NULL
+    tg_corrs.val = NULL
+    out_mat.val = NULL
+    probs.size = 0
+    probs.val = NULL
+
+    if (Mat_Init(&tar_moms, 4, n_rv) or Mat_Init(&tg_corrs, n_rv, n_rv) or
+            Mat_Init(&out_mat, n_rv, n_scenario) or
+            Vec_Init(&probs, n_scenario)):
+        raise MemoryError('HKW matrices allocation failed.')
+
+    try:
+        for rdx in xrange(n_rv):
+            for cdx in xrange(4):
+                tar_moms.val[cdx][rdx] = tgt_moments[rdx, cdx]
+            for cdx in xrange(n_rv):
+                tg_corrs.val[rdx][cdx] = tgt_corrs[rdx, cdx]
+
+        for cdx in xrange(n_scenario):
+            probs.val[cdx] = 1. / n_scenario
+
+        code = HKW_ScenGen(format_of_moms, &tar_moms, &tg_corrs, &probs,
+                           &out_mat, max_moment_err, max_corr_err,
+                           0, max_trial, max_iteration, 0,
+                           &moment_err, &corr_err, &n_trial, &n_iteration)
+
+        out_mtx = np.empty((n_rv, n_scenario))
+        for rdx in xrange(n_rv):
+            for cdx in xrange(n_scenario):
+                out_mtx[rdx, cdx] = out_mat.val[rdx][cdx]
+    finally:
+        Mat_Kill(&tar_moms)
+        Mat_Kill(&tg_corrs)
+        Mat_Kill(&out_mat)
+        Vec_Kill(&probs)
+
+    if stats is not None:
+        stats['moment_err'] = moment_err
+        stats['corr_err'] = corr_err
+        stats['n_trial'] = n_trial
+        stats['n_iteration'] = n_iteration
+
+    if code != 0:
+        raise ValueError("HKW not converge, moment error:{:.6f}, "
+                         "corr error:{:.6f}, trials:{}".format(
+                          moment_err, corr_err, n_trial))
+
+    if verbose:
+        print ("HKW (n_rv, n_scenario):({}, {}), trials:{}, iterations:{}, "
+               "{:.4f} secs".format(n_rv, n_scenario, n_trial, n_iteration,
+                                    time() - t0))
+    return out_mtx
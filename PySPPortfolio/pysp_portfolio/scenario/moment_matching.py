@@ -12,6 +12,7 @@ and applications, vol. 24, pp 169-185, 2003.
 from __future__ import division
 import numpy as np
 import numpy.linalg as la
+import scipy.linalg as spla
 import scipy.optimize as spopt
 import scipy.stats as spstats
 from time import time
@@ -20,7 +21,8 @@ from time import time
 def heuristic_moment_matching(tgt_moments, tgt_corrs,
                               n_scenario=200, bias=False,
                               max_moment_err=1e-3, max_corr_err=1e-3,
-                              max_cubic_err=1e-5, verbose=False):
+                              max_cubic_err=1e-5, verbose=False,
+                              fit_stats=None):
     """
     Parameters:
     --------------
@@ -34,6 +36,9 @@ def heuristic_moment_matching(tgt_moments, tgt_corrs,
         sample moments
     max_err_corr: float, max moment of error between tgt_corrs and
         sample correlation matrix
+    fit_stats: dict or None, if a dict is given, the number of cubic fits
+        ('n_fit'), residual and Jacobian evaluations ('nfev', 'njev') and
+        the final cubic error ('cubic_err') are accumulated in it
 
     Returns:
     -------------
@@ -45,6 +50,9 @@ def heuristic_moment_matching(tgt_moments, tgt_corrs,
     assert tgt_moments.shape[0] == tgt_corrs.shape[0] == tgt_corrs.shape[1]
     t0 = time()
 
+    # the rank-deficient target is repaired before the decomposition
+    tgt_corrs = repair_correlation_matrix(tgt_corrs)
+
     # parameters
     n_rv = tgt_moments.shape[0]
 
@@ -100,16 +108,10 @@ def heuristic_moment_matching(tgt_moments, tgt_corrs,
             for cub_iter in xrange(max_cubic_iter):
 
                 # 1~12th moments of the random samples
-                ex = np.array([(tmp_out ** (idx + 1)).mean()
-                               for idx in xrange(12)])
+                ex = sample_moments(tmp_out)
 
                 # find corresponding cubic parameters
-                x_init = np.array([0., 1., 0., 0.])
-                out = spopt.leastsq(cubic_function, x_init, args=(ex, ey),
-                                    full_output=True, ftol=1E-12,
-                                    xtol=1E-12)
-                cubic_params = out[0]
-                cubic_err = np.sum(out[2]['fvec'] ** 2)
+                cubic_params, cubic_err = cubic_fit(ex, ey, fit_stats)
 
                 # update random samples
                 tmp_out = (cubic_params[0] +
@@ -149,9 +151,10 @@ def heuristic_moment_matching(tgt_moments, tgt_corrs,
 
         # transform matrix
         out_corrs = np.corrcoef(out_mtx)
-        co_inv = la.inv(la.cholesky(out_corrs))
-        l_vec = np.dot(c_lower, co_inv)
-        out_mtx = np.dot(l_vec, out_mtx)
+        # out_mtx = c_lower * inv(co_lower) * out_mtx, without the inverse
+        co_lower = la.cholesky(repair_correlation_matrix(out_corrs))
+        out_mtx = np.dot(c_lower, spla.solve_triangular(co_lower, out_mtx,
+                                                        lower=True))
 
         # wrong moment, but correct correlation
         moments_err, corrs_err = error_statistics(out_mtx, y_moments,
@@ -170,13 +173,8 @@ def heuristic_moment_matching(tgt_moments, tgt_corrs,
 
             # loop until cubic transform error converge
             for cub_iter in xrange(max_cubic_iter):
-                ex = np.array([(tmp_out ** (idx + 1)).mean()
-                               for idx in xrange(12)])
-                X_init = np.array([0., 1., 0., 0.])
-                out = spopt.leastsq(cubic_function, X_init, args=(ex, ey),
-                                    full_output=True, ftol=1E-12, xtol=1E-12)
-                cubic_params = out[0]
-                cubic_err = np.sum(out[2]['fvec'] ** 2)
+                ex = sample_moments(tmp_out)
+                cubic_params, cubic_err = cubic_fit(ex, ey, fit_stats)
 
                 tmp_out = (cubic_params[0] +
                            cubic_params[1] * tmp_out +
@@ -247,6 +245,39 @@ def heuristic_moment_matching(tgt_moments, tgt_corrs,
     return out_mtx
 
 
+def repair_correlation_matrix(corrs, eig_floor=1e-8):
+    """
+    nearest positive definite correlation matrix by the eigenvalue floor.
+    the correlation matrix of a short window (e.g. win_length=50, n_rv=50)
+    is rank-deficient, and the Cholesky decomposition fails.
+
+    Parameters:
+    ----------------
+    corrs: numpy.array, shape: (n_rv, n_rv), correlation matrix
+    eig_floor: float, the minimum eigenvalue of the repaired matrix
+
+    Returns:
+    ----------------
+    numpy.array, shape: (n_rv, n_rv), the same object if corrs is
+        positive definite
+    """
+    if not np.all(np.isfinite(corrs)):
+        # the correlation of a constant series is nan
+        corrs = np.where(np.isfinite(corrs), corrs, 0.)
+        np.fill_diagonal(corrs, 1.)
+
+    eig_vals, eig_vecs = la.eigh(corrs)
+    if eig_vals.min() >= eig_floor:
+        return corrs
+
+    # clipping the eigenvalues, and rescaling to the unit diagonal
+    eig_vals = np.maximum(eig_vals, eig_floor)
+    repaired = np.dot(eig_vecs * eig_vals, eig_vecs.T)
+    scale = 1. / np.sqrt(np.diag(repaired))
+    repaired = repaired * scale[:, np.newaxis] * scale[np.newaxis, :]
+    return (repaired + repaired.T) / 2.
+
+
 def cubic_function(cubic_params, sample_moments, tgt_moments):
     """
     Parameters:
@@ -323,6 +354,90 @@ def cubic_function(cubic_params, sample_moments, tgt_moments):
     return v1, v2, v3, v4
 
 
+def sample_moments(samples):
+    """
+    1~12th raw moments of the samples in one pass
+
+    Parameters:
+    ----------------
+    samples: numpy.array, shape: (n_scenario,)
+
+    Returns:
+    ----------------
+    numpy.array, shape:(12,)
+    """
+    powers = np.empty((12, samples.shape[0]))
+    powers[0] = samples
+    for idx in xrange(1, 12):
+        powers[idx] = powers[idx - 1] * samples
+    return powers.mean(axis=1)
+
+
+def cubic_jacobian(cubic_params, sample_moments, tgt_moments):
+    """
+    analytic Jacobian of cubic_function
+
+    let p(x) = a + b*x + c*x^2 + d*x^3, the k-th residual is
+    E[p(x)^k] - ey_k, and its derivative of the j-th parameter is
+    k * E[p(x)^(k-1) * x^j].
+
+    Parameters:
+    ----------------
+    cubic_params: (a,b,c,d), four floats
+    sample_moments: numpy.array, shape:(12,), 1~12 moments of samples
+    tgt_moments: numpy.array, shape:(4,), 1~4th moments of target
+
+    Returns:
+    ----------------
+    jac: numpy.array, shape: (4, 4), jac[k, j] = d v_(k+1) / d param_j
+    """
+    # 0~12th moments of samples
+    ex = np.empty(13)
+    ex[0] = 1.
+    ex[1:] = sample_moments
+
+    jac = np.empty((4, 4))
+    # coefficients of p(x)^(k-1) in ascending order
+    poly = np.ones(1)
+    for kdx in xrange(4):
+        deg = poly.shape[0]
+        for jdx in xrange(4):
+            jac[kdx, jdx] = (kdx + 1) * np.dot(poly, ex[jdx: jdx + deg])
+        poly = np.convolve(poly, cubic_params)
+    return jac
+
+
+def cubic_fit(sample_moments, tgt_moments, fit_stats=None):
+    """
+    least square fit of the cubic transform with the analytic Jacobian
+
+    Parameters:
+    ----------------
+    sample_moments: numpy.array, shape:(12,), 1~12 moments of samples
+    tgt_moments: numpy.array, shape:(4,), 1~4th moments of target
+    fit_stats: dict or None, accumulating the fit statistics
+
+    Returns:
+    ----------------
+    cubic_params: numpy.array, shape: (4,)
+    cubic_err: float, sum of squared residuals
+    """
+    x_init = np.array([0., 1., 0., 0.])
+    out = spopt.leastsq(cubic_function, x_init,
+                        args=(sample_moments, tgt_moments),
+                        Dfun=cubic_jacobian, full_output=True,
+                        ftol=1E-12, xtol=1E-12)
+    cubic_params, info = out[0], out[2]
+    cubic_err = np.sum(info['fvec'] ** 2)
+
+    if fit_stats is not None:
+        fit_stats['n_fit'] = fit_stats.get('n_fit', 0) + 1
+        fit_stats['nfev'] = fit_stats.get('nfev', 0) + info['nfev']
+        fit_stats['njev'] = fit_stats.get('njev', 0) + info.get('njev', 0)
+        fit_stats['cubic_err'] = cubic_err
+    return cubic_params, cubic_err
+
+
 def error_statistics(out_mtx, tgt_moments, tgt_corrs=None):
     """
     Parameters:
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+Authors: Hung-Hsin Chen <chenhh@par.cse.nsysu.edu.tw>
+License: GPL v2
+
+moments and correlation matrix of a rolling window, updated by the power
+sums of the window, so appending a period costs O(n_stock^2) instead of
+re-estimating the whole window.
+"""
+
+from __future__ import division
+import numpy as np
+
+
+class RollingMoments(object):
+    """
+    1-4 th moments and correlation matrix of the latest win_length
+    periods, the same estimators as generators.estimating_moments
+    """
+
+    def __init__(self, hist_data, bias=False):
+        """
+        Parameters:
+        ------------------
+        hist_data: numpy.array, shape: (win_length, n_stock), the initial
+            window
+        bias: boolean, biased or unbiased estimator of moments
+        """
+        self.window = np.array(hist_data, dtype=np.float64)
+        if self.window.ndim != 2 or self.window.shape[0] < 4:
+            raise ValueError("the window must be a 2D array with at least "
+                             "4 periods: {}".format(self.window.shape))
+        self.win_length, self.n_stock = self.window.shape
+        self.bias = bias
+        # position of the oldest period in the circular window
+        self.head = 0
+        self.n_update = 0
+        self.recompute()
+
+    def recompute(self):
+        """ computing the power sums from the window """
+        window = self.window
+        self.sums = np.array([(window ** power).sum(axis=0)
+                              for power in xrange(1, 5)])
+        self.cross_sums = np.dot(window.T, window)
+
+    def update(self, rois):
+        """
+        appending the rois of a new period and dropping the oldest one
+
+        Parameters:
+        ------------------
+        rois: numpy.array, shape: (n_stock,)
+        """
+        rois = np.asarray(rois, dtype=np.float64)
+        if rois.shape != (self.n_stock,):
+            raise ValueError("mismatch n_stock: {}, {}".format(
+                self.n_stock, rois.shape))
+        oldest = self.window[self.head]
+        for pdx in xrange(4):
+            self.sums[pdx] += rois ** (pdx + 1) - oldest ** (pdx + 1)
+        self.cross_sums += np.outer(rois, rois) - np.outer(oldest, oldest)
+
+        self.window[self.head] = rois
+        self.head = (self.head + 1) % self.win_length
+        self.n_update += 1
+
+        # removing the accumulated rounding errors
+        if self.head == 0:
+            self.recompute()
+
+    def ordered_window(self):
+        """ the window in time order, shape: (win_length, n_stock) """
+        return np.roll(self.window, -self.head, axis=0)
+
+    def moments(self):
+        """
+        Returns:
+        ------------------
+        tgt_moments: numpy.array, shape: (n_stock, 4), mean, std, skewness
+            and excess kurtosis
+        tgt_corrs: numpy.array, shape: (n_stock, n_stock)
+        """
+        n = self.win_length
+        s1, s2, s3, s4 = self.sums / n
+        mean = s1
+
+        # central moments
+        m2 = s2 - mean ** 2
+        m3 = s3 - 3 * mean * s2 + 2 * mean ** 3
+        m4 = s4 - 4 * mean * s3 + 6 * mean ** 2 * s2 - 3 * mean ** 4
+
+        tgt_moments = np.zeros((self.n_stock, 4))
+        tgt_moments[:, 0] = mean
+        with np.errstate(divide='ignore', invalid='ignore'):
+            skew = m3 / m2 ** 1.5
+            kurt = m4 / m2 ** 2 - 3
+        if self.bias:
+            tgt_moments[:, 1] = np.sqrt(m2)
+            tgt_moments[:, 2] = skew
+            tgt_moments[:, 3] = kurt
+        else:
+            tgt_moments[:, 1] = np.sqrt(m2 * n / (n - 1))
+            tgt_moments[:, 2] = skew * np.sqrt(n * (n - 1)) / (n - 2)
+            tgt_moments[:, 3] = ((n + 1) * kurt + 6) * (n - 1) / (
+                (n - 2) * (n - 3))
+
+        covs = self.cross_sums / n - np.outer(mean, mean)
+        stds = np.sqrt(np.diag(covs))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            tgt_corrs = covs / np.outer(stds, stds)
+        return tgt_moments, tgt_corrs
@@ -31,6 +31,7 @@ except ImportError:
     from distutils.extension import Extension
 
 
+import os
 from Cython.Build import cythonize
 import numpy as np
 
@@ -42,6 +43,29 @@ extensions = [
     ),
 ]
 
+# optional backend of Kaut's HKW C library, the headers and libHKW.so
+# are in the archive directory by default
+ARCHIVE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           os.pardir, os.pardir, os.pardir, 'archive')
+HKW_INCLUDE_DIR = os.environ.get('HKW_INCLUDE_DIR',
+                                 os.path.join(ARCHIVE_DIR, 'HKW_wrapper'))
+HKW_LIB_DIR = os.environ.get('HKW_LIB_DIR', os.path.join(ARCHIVE_DIR, 'HKW'))
+
+if os.path.exists(os.path.join(HKW_LIB_DIR, 'libHKW.so')):
+    extensions.append(
+        Extension(
+              "hkw_moment_matching",
+              ["hkw_moment_matching.pyx"],
+              include_dirs = [np.get_include(), HKW_INCLUDE_DIR],
+              libraries = ['HKW'],
+              library_dirs = [HKW_LIB_DIR],
+              runtime_library_dirs = [HKW_LIB_DIR],
+        )
+    )
+else:
+    print ("libHKW.so not found in {}, skipping the HKW backend.".format(
+        HKW_LIB_DIR))
+
 setup(
       name = 'Scenario generation',
       author = 'Hung-Hsin Chen',
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""
+Authors: Hung-Hsin Chen <chenhh@par.cse.nsysu.edu.tw>
+License: GPL v2
+"""
+
+from __future__ import division
+from time import time
+import numpy as np
+from PySPPortfolio.pysp_portfolio.scenario.bootstrap import (
+    historical_bootstrap, stationary_bootstrap, stationary_bootstrap_indices)
+
+
+def test_historical_bootstrap():
+    win_length, n_rv, n_scenario = 100, 10, 200
+    hist_rois = np.random.randn(win_length, n_rv)
+
+    t0 = time()
+    scenarios = historical_bootstrap(hist_rois, n_scenario, random_seed=0)
+    print ("historical bootstrap (n_rv, n_scenario):({}, {}) {:.6f} "
+           "secs".format(n_rv, n_scenario, time() - t0))
+    assert scenarios.shape == (n_rv, n_scenario)
+
+    # each scenario is a historical roi vector
+    for sdx in xrange(n_scenario):
+        assert np.any(np.all(hist_rois == scenarios[:, sdx], axis=1))
+
+
+def test_stationary_bootstrap(block_length=10.):
+    win_length, n_rv, n_scenario = 100, 10, 20000
+    hist_rois = np.random.randn(win_length, n_rv)
+
+    indices = stationary_bootstrap_indices(win_length, n_scenario,
+                                           block_length, random_seed=0)
+    assert indices.min() >= 0 and indices.max() < win_length
+
+    # the probability of continuing a block is 1 - 1/block_length
+    continued = np.mean(np.diff(indices) % win_length == 1)
+    np.testing.assert_allclose(continued, 1 - 1. / block_length, atol=0.02)
+
+    scenarios = stationary_bootstrap(hist_rois, n_scenario, block_length,
+                                     random_seed=0)
+    np.testing.assert_array_equal(scenarios, hist_rois[indices].T)
+
+
+if __name__ == '__main__':
+    test_historical_bootstrap()
+    test_stationary_bootstrap()
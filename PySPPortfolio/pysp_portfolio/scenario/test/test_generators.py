@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+Authors: Hung-Hsin Chen <chenhh@par.cse.nsysu.edu.tw>
+License: GPL v2
+"""
+
+from __future__ import division
+from time import time
+import numpy as np
+import pandas as pd
+from PySPPortfolio.pysp_portfolio.scenario.generators import (
+    SCENARIO_GENERATORS, get_scenario_generator, scenario_stream,
+    ScenarioSource)
+
+
+def test_generators_shape():
+    win_length, n_stock, n_scenario = 100, 5, 200
+    hist_data = np.random.randn(win_length, n_stock) * 0.01
+
+    for name in ('hmm', 'strelen', 'bootstrap', 'gaussian'):
+        generator = get_scenario_generator(name)
+        t0 = time()
+        scenarios = generator(hist_data, n_scenario)
+        print ("{} (n_stock, n_scenario):({}, {}) {:.4f} secs".format(
+            name, n_stock, n_scenario, time() - t0))
+        assert scenarios.shape == (n_stock, n_scenario)
+
+    try:
+        get_scenario_generator('unknown')
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('unknown generator is accepted')
+
+
+def test_scenario_stream():
+    n_period, n_stock, n_scenario, win_length = 30, 3, 50, 10
+    dates = pd.date_range('2000/1/1', periods=n_period)
+    risk_rois = pd.DataFrame(np.random.randn(n_period, n_stock) * 0.01,
+                             index=dates)
+    exp_dates = dates[win_length:]
+
+    stream = scenario_stream('bootstrap', risk_rois, exp_dates, win_length,
+                             n_scenario, random_seed=0)
+    for trans_date, scenario_df in stream:
+        # the bootstrap scenarios are the historical rois of the window
+        hist = risk_rois.loc[:trans_date].iloc[-win_length:]
+        assert scenario_df.shape == (n_stock, n_scenario)
+        assert np.all(np.in1d(scenario_df.values[0], hist.values[:, 0]))
+
+    # online mode
+    source = ScenarioSource('gaussian', risk_rois, exp_dates[0],
+                            exp_dates[-1], win_length, n_scenario,
+                            mode='online', random_seed=0)
+    trans_dates = [trans_date for trans_date, _ in source]
+    assert list(trans_dates) == list(exp_dates)
+    np.testing.assert_array_equal(source.get(exp_dates[0]).values,
+                                  source.get(exp_dates[0]).values)
+
+
+if __name__ == '__main__':
+    print (sorted(SCENARIO_GENERATORS))
+    test_generators_shape()
+    test_scenario_stream()
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+Authors: Hung-Hsin Chen <chenhh@par.cse.nsysu.edu.tw>
+License: GPL v2
+"""
+
+from __future__ import division
+from time import time
+import numpy as np
+import scipy.stats as spstats
+import pytest
+
+# the optional extension is not built without libHKW.so
+hkw_moment_matching = pytest.importorskip(
+    "PySPPortfolio.pysp_portfolio.scenario.hkw_moment_matching")
+hkw_HMM = hkw_moment_matching.heuristic_moment_matching
+
+
+def _target_statistics(data, bias):
+    """ data, shape: (n_rv, n_sample) """
+    n_rv = data.shape[0]
+    tgt_moments = np.zeros((n_rv, 4))
+    tgt_moments[:, 0] = data.mean(axis=1)
+    if bias:
+        tgt_moments[:, 1] = data.std(axis=1)
+        tgt_moments[:, 2] = spstats.skew(data, axis=1)
+        tgt_moments[:, 3] = spstats.kurtosis(data, axis=1)
+    else:
+        tgt_moments[:, 1] = data.std(axis=1, ddof=1)
+        tgt_moments[:, 2] = spstats.skew(data, axis=1, bias=False)
+        tgt_moments[:, 3] = spstats.kurtosis(data, axis=1, bias=False)
+    tgt_corrs = np.corrcoef(data)
+    return tgt_moments, tgt_corrs
+
+
+def test_hkw_HMM(precision=2):
+    n_rv, n_sample, n_scenario = 10, 100, 200
+
+    for bias in (True, False):
+        data = np.random.randn(n_rv, n_sample)
+        tgt_moments, tgt_corrs = _target_statistics(data, bias)
+
+        stats = {}
+        t0 = time()
+        scenarios = hkw_HMM(tgt_moments, tgt_corrs, n_scenario, bias,
+                            stats=stats)
+        print ("HKW (n_rv, n_scenario):({}, {}) {}, {:.4f} secs".format(
+            n_rv, n_scenario, stats, time() - t0))
+        assert scenarios.shape == (n_rv, n_scenario)
+
+        res_moments, res_corrs = _target_statistics(scenarios, bias)
+        np.testing.assert_array_almost_equal(tgt_moments, res_moments,
+                                             decimal=precision)
+        np.testing.assert_array_almost_equal(tgt_corrs, res_corrs,
+                                             decimal=precision)
+
+
+def test_hkw_moment_format(n_rv=5, n_sample=100, n_scenario=200):
+    """
+    each target moment of the skewed rois is matched, the standard
+    deviation is far from the variance and the excess kurtosis is far from
+    the kurtosis, so a wrong format of the moments fails the test.
+    """
+    for bias in (True, False):
+        data = (np.random.exponential(size=(n_rv, n_sample)) - 1.) * 0.02
+        tgt_moments, tgt_corrs = _target_statistics(data, bias)
+        scenarios = hkw_HMM(tgt_moments, tgt_corrs, n_scenario, bias)
+        res_moments, _ = _target_statistics(scenarios, bias)
+
+        # mean and standard deviation
+        np.testing.assert_allclose(res_moments[:, :2], tgt_moments[:, :2],
+                                   rtol=1e-2, atol=1e-4)
+        # skewness and excess kurtosis
+        np.testing.assert_allclose(res_moments[:, 2:], tgt_moments[:, 2:],
+                                   rtol=5e-2, atol=1e-2)
+
+
+if __name__ == '__main__':
+    test_hkw_HMM()
+    test_hkw_moment_format()
@@ -14,6 +14,8 @@ from PySPPortfolio.pysp_portfolio.scenario.moment_matching import (
 
 from PySPPortfolio.pysp_portfolio.scenario.c_moment_matching import (
     heuristic_moment_matching as c_HMM,)
+from PySPPortfolio.pysp_portfolio.scenario import moment_matching
+from PySPPortfolio.pysp_portfolio.scenario import c_moment_matching
 
 def test_biased_HMM(precision=2):
     n_rv, n_sample = 50, 100
@@ -177,6 +179,76 @@ def test_kurtosis():
     np.testing.assert_allclose(ub_kurt, ub_kurt2)
     np.testing.assert_allclose(ub_kurt, ub_kurt3)
 
+def test_rank_deficient_HMM(precision=2):
+    """ the window length is the same as the number of random variables """
+    n_rv, n_sample, n_scenario = 50, 50, 200
+    data = np.random.rand(n_rv, n_sample)
+    tgt_moments = np.zeros((n_rv, 4))
+    tgt_moments[:, 0] = data.mean(axis=1)
+    tgt_moments[:, 1] = data.std(axis=1)
+    tgt_moments[:, 2] = spstats.skew(data, axis=1)
+    tgt_moments[:, 3] = spstats.kurtosis(data, axis=1)
+    tgt_corrs = np.corrcoef(data)
+    assert np.linalg.eigvalsh(tgt_corrs).min() < 1e-8
+
+    repaired = moment_matching.repair_correlation_matrix(tgt_corrs)
+    np.linalg.cholesky(repaired)
+    np.testing.assert_array_almost_equal(np.diag(repaired), np.ones(n_rv))
+    np.testing.assert_array_almost_equal(repaired, tgt_corrs, decimal=6)
+
+    for func in (HMM, c_HMM):
+        t0 = time()
+        scenarios = func(tgt_moments, tgt_corrs, n_scenario, True)
+        print ("{} rank-deficient (n_rv, n_scenario):({}, {}) {:.4f} "
+               "secs".format(func.__name__, n_rv, n_scenario, time() - t0))
+        np.testing.assert_array_almost_equal(tgt_corrs,
+                                             np.corrcoef(scenarios),
+                                             precision)
+
+
+def test_cubic_jacobian(eps=1e-6):
+    """ analytic Jacobian versus central finite differences """
+    samples = np.random.rand(200)
+    ey = np.array([0., 1., 0.5, 4.])
+    cubic_params = np.random.randn(4) * 0.5
+
+    for module in (moment_matching, c_moment_matching):
+        ex = module.sample_moments(samples)
+        np.testing.assert_allclose(ex, [(samples ** (idx + 1)).mean()
+                                        for idx in xrange(12)])
+
+        jac = module.cubic_jacobian(cubic_params, ex, ey)
+        num_jac = np.empty((4, 4))
+        for jdx in xrange(4):
+            step = np.zeros(4)
+            step[jdx] = eps
+            num_jac[:, jdx] = (
+                np.asarray(module.cubic_function(cubic_params + step, ex, ey)) -
+                np.asarray(module.cubic_function(cubic_params - step, ex, ey))
+            ) / (2 * eps)
+        np.testing.assert_allclose(jac, num_jac, rtol=1e-5, atol=1e-8)
+
+
+def test_HMM_fit_stats():
+    n_rv, n_sample, n_scenario = 10, 100, 200
+    data = np.random.rand(n_rv, n_sample)
+    tgt_moments = np.zeros((n_rv, 4))
+    tgt_moments[:, 0] = data.mean(axis=1)
+    tgt_moments[:, 1] = data.std(axis=1)
+    tgt_moments[:, 2] = spstats.skew(data, axis=1)
+    tgt_moments[:, 3] = spstats.kurtosis(data, axis=1)
+    tgt_corrs = np.corrcoef(data)
+
+    for func in (HMM, c_HMM):
+        fit_stats = {}
+        func(tgt_moments, tgt_corrs, n_scenario, True, fit_stats=fit_stats)
+        print ("{} fit_stats: {}, nfev per fit: {:.2f}".format(
+            func.__name__, fit_stats,
+            fit_stats['nfev'] / fit_stats['n_fit']))
+        assert fit_stats['n_fit'] >= n_rv
+        assert fit_stats['cubic_err'] < 1e-5
+
+
 if __name__ == '__main__':
     pass
     # test_biased_HMM()
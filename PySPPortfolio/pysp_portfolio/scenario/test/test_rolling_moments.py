@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+"""
+Authors: Hung-Hsin Chen <chenhh@par.cse.nsysu.edu.tw>
+License: GPL v2
+"""
+
+from __future__ import division
+from time import time
+import numpy as np
+from PySPPortfolio.pysp_portfolio.scenario.rolling_moments import (
+    RollingMoments,)
+from PySPPortfolio.pysp_portfolio.scenario.generators import (
+    estimating_moments,)
+
+
+def test_rolling_moments(win_length=100, n_stock=10, n_period=500):
+    data = np.random.randn(n_period, n_stock) * 0.02
+
+    for bias in (True, False):
+        rolling = RollingMoments(data[:win_length], bias)
+        t0 = time()
+        for tdx in xrange(win_length, n_period):
+            rolling.update(data[tdx])
+            window = data[tdx - win_length + 1: tdx + 1]
+            np.testing.assert_array_almost_equal(rolling.ordered_window(),
+                                                 window)
+            moments, corrs = rolling.moments()
+            tgt_moments, tgt_corrs = estimating_moments(window, bias)
+            np.testing.assert_array_almost_equal(moments, tgt_moments)
+            np.testing.assert_array_almost_equal(corrs, tgt_corrs)
+        print ("rolling moments bias:{}, {} updates, {:.4f} secs".format(
+            bias, n_period - win_length, time() - t0))
+
+
+if __name__ == '__main__':
+    test_rolling_moments()
@@ -65,6 +65,12 @@ extensions = [
               include_dirs = [np.get_include()],
     ),
 
+    Extension(
+              "min_wcvar_sp",
+              ["min_wcvar_sp.pyx",],
+              include_dirs = [np.get_include()],
+    ),
+
 ]
 
 setup(
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+Authors: Hung-Hsin Chen <chenhh@par.cse.nsysu.edu.tw>
+License: GPL v2
+
+the Pyomo solvers of the models.
+
+the models are solved by solve_model, the solver of each (solver,
+solver_io) is created once per thread and reused. the default interface is
+the in-process one ('python', e.g. cplexdirect or gurobi_direct), which
+passes the model to the solver library without the problem and solution
+files; the file interface ('lp') is the fallback if the library of the
+solver is not installed.
+
+the options of the in-process interface are the parameters of the solver
+library, e.g. the CPLEX shell options such as
+preprocessing_presolve='n' are rejected by cplexdirect, so a model setting
+shell options creates its solver with SHELL_SOLVER_IO.
+"""
+
+from __future__ import division
+import threading
+from stage_timer import (NULL_TIMER, time_solver_stages)
+from log_utils import (get_logger,)
+
+logger = get_logger('solvers')
+
+# interfaces of the solvers in the order of preference, 'python' is the
+# in-process interface, 'lp' writes the problem file and executes the solver
+SOLVER_IOS = ('python', 'lp')
+
+# the interface of the solvers with the options of the solver shell
+SHELL_SOLVER_IO = 'lp'
+
+# {(solver, solver_io): the used solver_io} of the process
+_solver_ios = {}
+# {(solver, solver_io): (pyomo solver, the used solver_io)} of each thread
+_thread_solvers = threading.local()
+
+
+def _available_solver(solver, solver_io):
+    """ the pyomo solver, None if the interface is not available """
+    from pyomo.environ import SolverFactory
+    try:
+        opt = SolverFactory(solver, solver_io=solver_io)
+    except Exception:
+        return None
+    if opt is None or opt.__class__.__name__ == 'UnknownSolver':
+        return None
+    try:
+        if not opt.available(exception_flag=False):
+            return None
+    except Exception:
+        return None
+    return opt
+
+
+def create_solver(solver, solver_io=None):
+    """
+    a new pyomo solver of the first available interface, the probed
+    interface of the (solver, solver_io) is reused by the next calls.
+
+    Parameters:
+    ------------------
+    solver: string, supported by Pyomo
+    solver_io: string or None, the interface of the solver, {'python',
+        'lp', 'nl', ...}, None for the first available interface of
+        SOLVER_IOS. the file interface is the fallback of an unavailable
+        interface.
+
+    Returns:
+    ------------------
+    opt: pyomo solver
+    used_io: string, the interface of the solver
+    """
+    from pyomo.environ import SolverFactory
+    key = (solver, solver_io)
+    if key in _solver_ios:
+        used_io = _solver_ios[key]
+        return SolverFactory(solver, solver_io=used_io), used_io
+
+    if solver_io is None:
+        solver_ios = SOLVER_IOS
+    else:
+        solver_ios = (solver_io,) + tuple(io for io in ('lp',)
+                                          if io != solver_io)
+    opt, used_io = None, None
+    for used_io in solver_ios:
+        opt = _available_solver(solver, used_io)
+        if opt is not None:
+            break
+    if opt is None:
+        # the error of the unavailable solver is raised by solve
+        opt, used_io = SolverFactory(solver), None
+
+    if solver_io is not None and used_io != solver_io:
+        logger.warning("{} solver_io {} is not available, using {}.".format(
+            solver, solver_io, used_io))
+    else:
+        logger.debug("{} solver_io: {}".format(solver, used_io))
+    _solver_ios[key] = used_io
+    return opt, used_io
+
+
+def get_solver(solver, solver_io=None):
+    """
+    the cached pyomo solver of the current thread, its options must not be
+    modified, the write, solve and read methods are timed by the current
+    timer of solve_model.
+
+    Returns:
+    ------------------
+    opt: pyomo solver
+    used_io: string, the interface of the solver
+    """
+    cache = getattr(_thread_solvers, 'solvers', None)
+    if cache is None:
+        cache = _thread_solvers.solvers = {}
+
+    key = (solver, solver_io)
+    if key not in cache:
+        opt, used_io = create_solver(solver, solver_io)
+        cache[key] = (time_solver_stages(opt), used_io)
+    return cache[key]
+
+
+def solve_model(instance, solver, timer=None, solver_io=None,
+                **solve_kwargs):
+    """
+    solving the Pyomo model and loading the solution, the write, solve
+    and read stages are timed by wrapping the methods of the solver.
+
+    Parameters:
+    ------------------
+    instance: pyomo.ConcreteModel
+    solver: string, supported by Pyomo
+    timer: stage_timer.StageTimer or None
+    solver_io: string or None, the interface of the solver, see
+        create_solver
+    solve_kwargs: the keyword arguments of the solve method, e.g. keepfiles
+
+    Returns:
+    ------------------
+    pyomo results
+    """
+    if timer is None:
+        timer = NULL_TIMER
+
+    opt, _ = get_solver(solver, solver_io)
+    opt._stage_timer = timer
+    try:
+        results = opt.solve(instance, **solve_kwargs)
+    finally:
+        opt._stage_timer = NULL_TIMER
+
+    timer.mark()
+    instance.solutions.load_from(results)
+    timer.lap('load')
+    return results
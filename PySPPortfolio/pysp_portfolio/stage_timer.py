@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+Authors: Hung-Hsin Chen <chenhh@par.cse.nsysu.edu.tw>
+License: GPL v2
+
+accumulated timings of the stages of a simulation period.
+
+the stages of SPTradingPortfolio.run_period:
+    - scenario: getting the scenarios of the period
+    - optimize: get_current_buy_sell_amounts, it contains the stages of
+      the Pyomo model:
+        - build: constructing the model
+        - write: writing the problem file (the presolve of the solver)
+        - solve: executing the solver
+        - read: reading the solution file (the postsolve of the solver)
+        - load: loading the solution to the model
+    - bookkeeping: recording the results and the capital allocation
+
+the timer is disabled by NULL_TIMER, whose methods do nothing.
+
+the write, solve and read stages are timed by time_solver_stages, which
+wraps the methods of a solver of solvers.get_solver.
+"""
+
+from __future__ import division
+from collections import (defaultdict, OrderedDict)
+from time import time
+
+STAGES = ('scenario', 'optimize', 'build', 'write', 'solve', 'read', 'load',
+          'bookkeeping')
+
+# (method of the Pyomo solver, stage)
+SOLVER_STAGES = (('_presolve', 'write'), ('_apply_solver', 'solve'),
+                 ('_postsolve', 'read'))
+
+
+class StageTimer(object):
+    """
+    seconds and counts of each stage, the time of a stage is the interval
+    from the last mark (or lap) to the lap of the stage.
+    """
+    enabled = True
+
+    def __init__(self, record_periods=False):
+        """
+        Parameters:
+        ------------------
+        record_periods: boolean, recording the seconds of the stages of
+            each period
+        """
+        self.record_periods = record_periods
+        self.secs = defaultdict(float)
+        self.counts = defaultdict(int)
+        self.period_labels = []
+        self.period_secs = []
+        self._period = None
+        self._last = time()
+
+    def mark(self):
+        """ starting a stage """
+        self._last = time()
+
+    def lap(self, stage):
+        """ the stage is finished, and the next stage starts """
+        now = time()
+        self.add(stage, now - self._last)
+        self._last = now
+
+    def add(self, stage, secs):
+        self.secs[stage] += secs
+        self.counts[stage] += 1
+        if self._period is not None:
+            self._period[stage] += secs
+
+    def begin_period(self, label):
+        if self.record_periods:
+            self._period = defaultdict(float)
+            self.period_labels.append(label)
+        self.mark()
+
+    def end_period(self):
+        if self._period is not None:
+            self.period_secs.append(self._period)
+            self._period = None
+
+    def summary(self):
+        """
+        Returns:
+        ------------------
+        OrderedDict, {stage: (total secs, count)}, the known stages are
+            in the order of STAGES
+        """
+        stages = [stage for stage in STAGES if stage in self.secs]
+        stages.extend(sorted(set(self.secs) - set(STAGES)))
+        return OrderedDict((stage, (self.secs[stage], self.counts[stage]))
+                           for stage in stages)
+
+    def period_frame(self):
+        """
+        Returns:
+        ------------------
+        pandas.DataFrame, shape: (n_period, n_stage), None if the periods
+            are not recorded
+        """
+        if not self.record_periods:
+            return None
+        import pandas as pd
+        return pd.DataFrame(self.period_secs, index=self.period_labels,
+                            columns=list(self.summary().keys())).fillna(0.)
+
+    def __repr__(self):
+        return "StageTimer({})".format(", ".join(
+            "{}:{:.3f}s/{}".format(stage, secs, count)
+            for stage, (secs, count) in self.summary().items()))
+
+
+class NullTimer(StageTimer):
+    """ a disabled timer """
+    enabled = False
+
+    def __init__(self):
+        super(NullTimer, self).__init__(False)
+
+    def mark(self):
+        pass
+
+    def lap(self, stage):
+        pass
+
+    def add(self, stage, secs):
+        pass
+
+    def begin_period(self, label):
+        pass
+
+    def end_period(self):
+        pass
+
+
+NULL_TIMER = NullTimer()
+
+
+def _timed_method(opt, method, stage):
+    """ the timer of the method is the current timer of the solver """
+    def wrapper(*args, **kwargs):
+        timer = opt._stage_timer
+        timer.mark()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            timer.lap(stage)
+    return wrapper
+
+
+def time_solver_stages(opt):
+    """
+    wrapping the write, solve and read methods of the pyomo solver, the
+    stages are timed by the timer in opt._stage_timer, which is NULL_TIMER
+    out of solvers.solve_model.
+    """
+    opt._stage_timer = NULL_TIMER
+    for method_name, stage in SOLVER_STAGES:
+        method = getattr(opt, method_name, None)
+        if method is not None:
+            setattr(opt, method_name, _timed_method(opt, method, stage))
+    return opt
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""
+Authors: Hung-Hsin Chen <chenhh@par.cse.nsysu.edu.tw>
+License: GPL v2
+
+the shared fixtures of the portfolio tests.
+"""
+
+from __future__ import division
+import numpy as np
+import pandas as pd
+from PySPPortfolio.pysp_portfolio import *
+from PySPPortfolio.pysp_portfolio.data_store import (load_roi_df,
+                                                     store_dates)
+
+
+def exp_dates(n_period):
+    """ the first n_period transaction dates of the experiment """
+    return store_dates(START_DATE, END_DATE)[:n_period]
+
+
+def random_cvar_problem(n_stock, n_scenario, alpha=0.95, rng=None):
+    """
+    the keyword arguments of min_cvar_sp_portfolio
+
+    Parameters:
+    ------------------
+    rng: numpy.random.RandomState or None, None for the seed 0
+    """
+    if rng is None:
+        rng = np.random.RandomState(0)
+    return {
+        'symbols': EXP_SYMBOLS[:n_stock],
+        'risk_rois': rng.randn(n_stock) * 0.01,
+        'risk_free_roi': 0.,
+        'allocated_risk_wealth': rng.rand(n_stock) * 1e5,
+        'allocated_risk_free_wealth': 1e6,
+        'buy_trans_fee': BUY_TRANS_FEE,
+        'sell_trans_fee': SELL_TRANS_FEE,
+        'alpha': alpha,
+        'predict_risk_rois': rng.randn(n_stock, n_scenario) * 0.02,
+        'predict_risk_free_roi': 0.,
+        'n_scenario': n_scenario,
+    }
+
+
+def exp_portfolio(portfolio_cls, n_stock, start_date, end_date, **kwargs):
+    """
+    a portfolio of the first n_stock symbols of EXP_SYMBOLS, the initial
+    wealth is 1e6 risk-free wealth, and the risk-free rois are zero.
+
+    Parameters:
+    ------------------
+    portfolio_cls: subclass of SPTradingPortfolio
+    kwargs: the other keyword arguments of portfolio_cls, e.g.
+        window_length, n_scenario, alpha
+    """
+    symbols = EXP_SYMBOLS[:n_stock]
+    risk_rois = load_roi_df(symbols)
+    dates = risk_rois.loc[start_date:end_date].index
+    risk_free_rois = pd.Series(np.zeros(len(dates)), index=dates)
+    initial_risk_wealth = pd.Series(np.zeros(n_stock), index=symbols)
+    return portfolio_cls(symbols, risk_rois, risk_free_rois,
+                         initial_risk_wealth, 1e6, start_date=start_date,
+                         end_date=end_date, **kwargs)
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+Authors: Hung-Hsin Chen <chenhh@par.cse.nsysu.edu.tw>
+License: GPL v2
+"""
+
+from __future__ import division
+import os
+import shutil
+import tempfile
+import numpy as np
+from PySPPortfolio.pysp_portfolio.min_cvar_sp import (MinCVaRSPPortfolio,)
+from portfolio_fixtures import (exp_dates, exp_portfolio)
+
+
+class CrashError(Exception):
+    pass
+
+
+class CrashingPortfolio(MinCVaRSPPortfolio):
+    """ the simulation crashes at the crash_tdx-th period """
+    crash_tdx = None
+
+    def run_period(self, tdx, *args, **kwargs):
+        if tdx == self.crash_tdx:
+            raise CrashError(tdx)
+        return super(CrashingPortfolio, self).run_period(tdx, *args,
+                                                         **kwargs)
+
+
+def _portfolio(portfolio_cls, n_stock, n_period, win_length, scenario_dir):
+    dates = exp_dates(n_period)
+    # the precomputed scenarios in the temporary directory are shared by
+    # all runs of the test
+    return exp_portfolio(portfolio_cls, n_stock, dates[0], dates[-1],
+                         window_length=win_length, n_scenario=200,
+                         alpha=0.95, scenario_generator='bootstrap',
+                         scenario_mode='precompute',
+                         scenario_dir=scenario_dir)
+
+
+def test_checkpoint_resume(n_stock=5, n_period=12, win_length=50,
+                           interval=4, crash_tdx=9):
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        checkpoint_path = os.path.join(tmp_dir, 'min_cvar_sp.ckpt.npz')
+        expected = _portfolio(MinCVaRSPPortfolio, n_stock, n_period,
+                              win_length, tmp_dir).run()
+
+        instance = _portfolio(CrashingPortfolio, n_stock, n_period,
+                              win_length, tmp_dir)
+        instance.crash_tdx = crash_tdx
+        try:
+            instance.run(checkpoint_path, interval)
+        except CrashError:
+            pass
+        # the last checkpoint is after the 8-th period
+        with np.load(checkpoint_path) as ckpt:
+            assert int(ckpt['tdx']) == (crash_tdx // interval) * interval - 1
+            assert ckpt['attr_cvar_arr'].shape == (int(ckpt['tdx']) + 1,)
+
+        reports = _portfolio(MinCVaRSPPortfolio, n_stock, n_period,
+                             win_length, tmp_dir).run(checkpoint_path,
+                                                      interval)
+        for key in ('wealth_df', 'risk_free_wealth', 'buy_amounts_df',
+                    'sell_amounts_df', 'cvar_arr'):
+            np.testing.assert_array_almost_equal(
+                np.asarray(reports[key]), np.asarray(expected[key]))
+        np.testing.assert_almost_equal(reports['trans_fee_loss'],
+                                       expected['trans_fee_loss'])
+        # the finished simulation removes the checkpoint
+        assert not os.path.exists(checkpoint_path)
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    test_checkpoint_resume()
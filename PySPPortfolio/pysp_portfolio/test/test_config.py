@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+Authors: Hung-Hsin Chen <chenhh@par.cse.nsysu.edu.tw>
+License: GPL v2
+"""
+
+from __future__ import division
+import os
+import sys
+import json
+import shutil
+import subprocess
+import tempfile
+from time import time
+from PySPPortfolio.pysp_portfolio.config import (PortfolioConfig, ensure_dir)
+
+# the modules must not be imported by the package
+HEAVY_MODULES = ('matplotlib', 'statsmodels', 'arch', 'pyomo', 'scipy',
+                 'pandas')
+
+# the modules imported by a simulation worker, and the analysis modules
+# they must not import (the simulation engine needs pyomo, scipy and pandas)
+WORKER_MODULES = ('PySPPortfolio.pysp_portfolio.min_cvar_sp',
+                  'PySPPortfolio.pysp_portfolio.exp_cvar')
+ANALYSIS_MODULES = ('matplotlib', 'statsmodels', 'arch')
+
+# script of a fresh interpreter, printing the import time and the
+# imported heavy modules
+IMPORT_SCRIPT = """
+import json, sys
+from time import time
+t0 = time()
+import {module}
+secs = time() - t0
+print (json.dumps({{'secs': secs, 'heavy': sorted(set(
+    name.split('.')[0] for name in sys.modules) & set({heavy!r}))}}))
+"""
+
+
+def _import_in_subprocess(module, environ=None):
+    """ import time and heavy modules of a module in a new interpreter """
+    script = IMPORT_SCRIPT.format(module=module, heavy=list(HEAVY_MODULES))
+    output = subprocess.check_output([sys.executable, '-c', script],
+                                     env=environ)
+    return json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+
+def test_config_priority():
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        config_file = os.path.join(tmp_dir, 'pysp.cfg')
+        with open(config_file, 'w') as fout:
+            fout.write("[pysp_portfolio]\n"
+                       "exp_data_dir = {0}/cfg_exp\n"
+                       "dropbox_dir = {0}/cfg_dropbox\n".format(tmp_dir))
+
+        environ = {'PYSP_CONFIG': config_file,
+                   'PYSP_DROPBOX_DIR': os.path.join(tmp_dir, 'env_dropbox')}
+        config = PortfolioConfig.load(environ=environ)
+        # config file
+        assert config.exp_data_dir == os.path.join(tmp_dir, 'cfg_exp')
+        # environment variable overrides the config file
+        assert config.dropbox_dir == os.path.join(tmp_dir, 'env_dropbox')
+        # the default depends on the resolved option
+        assert config.report_dir.startswith(config.dropbox_dir)
+        # nothing is created
+        assert not os.path.exists(config.exp_data_dir)
+
+        assert ensure_dir(config.exp_data_dir) == config.exp_data_dir
+        assert os.path.isdir(config.exp_data_dir)
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+def test_package_import(max_secs=1.):
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        environ = dict(os.environ)
+        environ['PYSP_EXP_DATA_DIR'] = os.path.join(tmp_dir, 'exp')
+        stats = _import_in_subprocess('PySPPortfolio.pysp_portfolio',
+                                      environ)
+        print ("import PySPPortfolio.pysp_portfolio: {}".format(stats))
+        assert stats['heavy'] == []
+        assert stats['secs'] < max_secs
+        # importing the package does not create directories
+        assert not os.path.exists(environ['PYSP_EXP_DATA_DIR'])
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+def test_worker_import(max_secs=1., n_run=2):
+    """ a pool worker of the simulations starts within max_secs """
+    for module in WORKER_MODULES:
+        runs = [_import_in_subprocess(module) for _ in xrange(n_run)]
+        # the first run may read the files from the disk
+        secs = min(run['secs'] for run in runs)
+        print ("import {}: {:.4f} secs, heavy modules: {}".format(
+            module, secs, runs[-1]['heavy']))
+        assert not set(runs[-1]['heavy']) & set(ANALYSIS_MODULES)
+        assert secs < max_secs
+
+
+def benchmark_import_time(modules=(
+        'PySPPortfolio.pysp_portfolio',
+        'PySPPortfolio.pysp_portfolio.data_store',
+        'PySPPortfolio.pysp_portfolio.etl',
+        'PySPPortfolio.pysp_portfolio.exp_cvar',
+), n_run=3):
+    """
+    mean import time of the modules, each run is a fresh interpreter
+
+    Returns:
+    ----------
+    dict, {module: (mean secs, imported heavy modules)}
+    """
+    results = {}
+    for module in modules:
+        t0 = time()
+        runs = [_import_in_subprocess(module) for _ in xrange(n_run)]
+        secs = sum(run['secs'] for run in runs) / n_run
+        results[module] = (secs, runs[-1]['heavy'])
+        print ("{}: {:.4f} secs, heavy modules: {}, {:.3f} secs".format(
+            module, secs, runs[-1]['heavy'], time() - t0))
+    return results
+
+
+if __name__ == '__main__':
+    test_config_priority()
+    test_package_import()
+    test_worker_import()
+    benchmark_import_time()
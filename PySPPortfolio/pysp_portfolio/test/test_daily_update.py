@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+Authors: Hung-Hsin Chen <chenhh@par.cse.nsysu.edu.tw>
+License: GPL v2
+"""
+
+from __future__ import division
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+from PySPPortfolio.pysp_portfolio import *
+from PySPPortfolio.pysp_portfolio.data_store import (store_dates,
+                                                     store_values)
+from PySPPortfolio.pysp_portfolio.daily_update import (
+    init_daily_state, load_daily_state, run_daily_update,
+    daily_decision_path)
+
+
+def test_daily_update(n_stock=5, win_length=50, n_day=3):
+    symbols = EXP_SYMBOLS[:n_stock]
+    dates = store_dates(START_DATE, END_DATE)
+    state_date, end_date = dates[-n_day - 1], dates[-1]
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        state_path = os.path.join(tmp_dir, 'state.pkl')
+        state = init_daily_state(symbols, state_date,
+                                 pd.Series(np.zeros(n_stock), index=symbols),
+                                 1e6, window_length=win_length,
+                                 n_scenario=200, bias=False, alpha=0.95)
+        pd.to_pickle(state, state_path)
+        init_state = state
+
+        decisions = run_daily_update(state_path, end_date,
+                                     update_store=False,
+                                     save_scenarios=False)
+        assert sorted(decisions.keys()) == dates[-n_day:].tolist()
+
+        # the wealth of each date is allocated from the previous state
+        risk_wealth, risk_free_wealth = state['risk_wealth'], 1e6
+        for trans_date in dates[-n_day:]:
+            decision = decisions[trans_date]
+            rois = store_values(n_stock, trans_date, trans_date)[0]
+            buys, sells = decision['buy_amounts'], decision['sell_amounts']
+            np.testing.assert_array_almost_equal(
+                decision['risk_wealth'].values,
+                (1 + rois) * risk_wealth.values + buys.values - sells.values)
+            np.testing.assert_almost_equal(
+                decision['risk_free_wealth'],
+                risk_free_wealth - buys.sum() * (1 + BUY_TRANS_FEE) +
+                sells.sum() * (1 - SELL_TRANS_FEE))
+            risk_wealth = decision['risk_wealth']
+            risk_free_wealth = decision['risk_free_wealth']
+
+        # the persisted state is at the last date, and a second update
+        # has nothing to do
+        state = load_daily_state(state_path)
+        assert state['trans_date'] == end_date
+        assert state['n_update'] == n_day
+        assert run_daily_update(state_path, end_date, update_store=False,
+                                save_scenarios=False) == {}
+        assert len(pd.read_csv(daily_decision_path(state_path))) == n_day
+
+        # the rows were written but the states were not saved, the dates
+        # are processed again and their rows are replaced
+        pd.to_pickle(init_state, state_path)
+        assert len(run_daily_update(state_path, end_date, update_store=False,
+                                    save_scenarios=False)) == n_day
+        decision_df = pd.read_csv(daily_decision_path(state_path),
+                                  index_col=0, parse_dates=True)
+        assert decision_df.index.tolist() == dates[-n_day:].tolist()
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    test_daily_update()
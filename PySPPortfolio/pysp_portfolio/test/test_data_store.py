@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+Authors: Hung-Hsin Chen <chenhh@par.cse.nsysu.edu.tw>
+License: GPL v2
+"""
+
+from __future__ import division
+from datetime import date
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+from PySPPortfolio.pysp_portfolio import *
+from PySPPortfolio.pysp_portfolio.data_store import (
+    parse_symbol_csv, build_data_store, load_store_index, open_data_store,
+    load_roi_df, store_dates, store_values, clear_data_store_cache,
+    update_data_store)
+
+
+def test_data_store():
+    symbols = EXP_SYMBOLS[:3]
+    store_dir = tempfile.mkdtemp()
+    try:
+        build_data_store(symbols, store_dir=store_dir,
+                         start_date=date(2004, 1, 1), end_date=END_DATE,
+                         n_process=2)
+        trans_dates, store_symbols = load_store_index(store_dir)
+        assert store_symbols == symbols
+
+        for symbol in symbols:
+            df = parse_symbol_csv(os.path.join(SYMBOLS_CSV_DIR,
+                                               "{}.csv".format(symbol)))
+            df = df.reindex(trans_dates)
+            for field in ('simple_roi', 'close_price', 'volume'):
+                data = open_data_store(field, store_dir=store_dir)
+                np.testing.assert_array_almost_equal(data[symbol].values,
+                                                     df[field].values)
+
+        # the experiment period and a prefix of symbols are views of the
+        # mmap array
+        rois = load_roi_df(symbols[:2], START_DATE, END_DATE, store_dir)
+        assert rois.index[0] == pd.Timestamp(START_DATE)
+        assert rois.index[-1] <= pd.Timestamp(END_DATE)
+        assert not rois.values.flags.writeable
+        assert rois.columns.tolist() == symbols[:2]
+
+        # non-consecutive symbols
+        rois = load_roi_df(symbols[::2], store_dir=store_dir)
+        assert rois.columns.tolist() == symbols[::2]
+    finally:
+        clear_data_store_cache()
+        shutil.rmtree(store_dir)
+
+
+def test_store_values():
+    store_dir = tempfile.mkdtemp()
+    try:
+        build_data_store(EXP_SYMBOLS[:5], store_dir=store_dir, n_process=2)
+        values = store_values(3, START_DATE, END_DATE, store_dir=store_dir)
+        dates = store_dates(START_DATE, END_DATE, store_dir=store_dir)
+        assert values.shape == (len(dates), 3)
+        assert not values.flags.writeable
+
+        # the store is opened once, all views share the same mmap array
+        all_values = store_values(store_dir=store_dir)
+        assert np.may_share_memory(values, all_values)
+
+        rois = load_roi_df(EXP_SYMBOLS[:3], START_DATE, END_DATE, store_dir)
+        np.testing.assert_array_equal(rois.values, values)
+        assert rois.index.equals(dates)
+    finally:
+        clear_data_store_cache()
+        shutil.rmtree(store_dir)
+
+
+def test_update_data_store():
+    symbols = EXP_SYMBOLS[:3]
+    full_dir, store_dir = tempfile.mkdtemp(), tempfile.mkdtemp()
+    try:
+        build_data_store(symbols, store_dir=full_dir, end_date=None,
+                         n_process=2)
+        build_data_store(symbols, store_dir=store_dir,
+                         end_date=date(2014, 12, 1), n_process=2)
+        old_dates = store_dates(store_dir=store_dir)
+        # opened before the update
+        old_values = store_values(store_dir=store_dir)
+
+        new_dates = update_data_store(store_dir=store_dir)
+        assert len(new_dates) > 0 and new_dates[0] > old_dates[-1]
+        assert store_dates(store_dir=store_dir).equals(
+            store_dates(store_dir=full_dir))
+        for field in ('simple_roi', 'close_price', 'volume'):
+            np.testing.assert_array_equal(
+                store_values(field=field, store_dir=store_dir),
+                store_values(field=field, store_dir=full_dir))
+
+        # the opened array is still valid
+        np.testing.assert_array_equal(
+            old_values, store_values(store_dir=store_dir)[:len(old_dates)])
+
+        # nothing to append
+        assert len(update_data_store(store_dir=store_dir)) == 0
+    finally:
+        clear_data_store_cache()
+        shutil.rmtree(full_dir)
+        shutil.rmtree(store_dir)
+
+
+if __name__ == '__main__':
+    test_data_store()
+    test_store_values()
+    test_update_data_store()
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+Authors: Hung-Hsin Chen <chenhh@par.cse.nsysu.edu.tw>
+License: GPL v2
+"""
+
+from __future__ import division
+import os
+import sys
+import shutil
+import subprocess
+import tempfile
+import numpy as np
+from PySPPortfolio.pysp_portfolio import *
+from PySPPortfolio.pysp_portfolio.min_cvar_sp import (MinCVaRSPPortfolio2,)
+from PySPPortfolio.pysp_portfolio.min_wcvar_sp import (load_scenario_mmap,)
+from PySPPortfolio.pysp_portfolio.gen_results_year import (get_year_pairs,)
+from portfolio_fixtures import (exp_portfolio,)
+
+# script of a new interpreter, comparing the pickled reports of the pool
+# with the reports of run_min_cvar_sp2_yearly_simulation
+YEARLY_POOL_SCRIPT = """
+import os
+import numpy as np
+import pandas as pd
+from PySPPortfolio.pysp_portfolio import *
+from PySPPortfolio.pysp_portfolio.exp_cvar import (
+    run_min_cvar_sp2_yearly_simulation,)
+from PySPPortfolio.pysp_portfolio.gen_results_year import (
+    get_year_pairs, run_min_cvar_sp2_yearly_simulations)
+
+n_stock, win_length, alphas = {n_stock}, {win_length}, {alphas!r}
+start_date, end_date = get_year_pairs()[0]
+failed = run_min_cvar_sp2_yearly_simulations(
+    n_stock, win_length, alphas=alphas,
+    year_pairs=[(start_date, end_date)], n_process=2)
+assert failed == [], failed
+
+for alpha in alphas:
+    param = "{{}}_{{}}_m{{}}_w{{}}_s{{}}_{{}}_{{}}_a{{:.2f}}".format(
+        start_date.strftime("%Y%m%d"), end_date.strftime("%Y%m%d"),
+        n_stock, win_length, 200, "unbiased", 1, alpha)
+    reports = pd.read_pickle(os.path.join(
+        EXP_SP_PORTFOLIO_DIR, 'min_cvar_sp2_yearly',
+        'min_cvar_sp2_yearly_{{}}.pkl'.format(param)))
+    expected = run_min_cvar_sp2_yearly_simulation(
+        n_stock, win_length, alpha=alpha, start_date=start_date,
+        end_date=end_date)
+
+    assert reports['func_name'] == expected['func_name']
+    for key in ('wealth_df', 'cvar_arr'):
+        np.testing.assert_array_almost_equal(
+            np.asarray(reports[key]), np.asarray(expected[key]))
+    np.testing.assert_almost_equal(reports['final_wealth'],
+                                   expected['final_wealth'])
+"""
+
+
+def _portfolio(n_stock, win_length, start_date, end_date, scenarios=None):
+    return exp_portfolio(MinCVaRSPPortfolio2, n_stock, start_date, end_date,
+                         window_length=win_length, n_scenario=200,
+                         scenarios=scenarios)
+
+
+def test_yearly_scenario_views(n_stock=5, win_length=50):
+    """ the views of the store are the scenarios of the panel """
+    scenarios = load_scenario_mmap(n_stock, win_length, 200, False, 1)
+    for start_date, end_date in get_year_pairs():
+        panel_portfolio = _portfolio(n_stock, win_length, start_date,
+                                     end_date)
+        view_portfolio = _portfolio(n_stock, win_length, start_date,
+                                    end_date, scenarios)
+        assert view_portfolio.scenario_mmap.shape[0] == \
+            view_portfolio.n_exp_period
+        for tdx in (0, view_portfolio.n_exp_period - 1):
+            trans_date = view_portfolio.exp_risk_rois.index[tdx]
+            expected = panel_portfolio.get_estimated_risk_rois(
+                tdx=tdx, trans_date=trans_date)
+            df = view_portfolio.get_estimated_risk_rois(
+                tdx=tdx, trans_date=trans_date)
+            assert df.index.tolist() == expected.index.tolist()
+            np.testing.assert_array_equal(df.values, expected.values)
+
+
+def test_yearly_simulations_pool(n_stock=5, win_length=50,
+                                 alphas=(0.9, 0.95)):
+    """
+    the reports of the pool are those of run_min_cvar_sp2_yearly_simulation,
+    two alphas of a year are the tasks of the two processes.
+
+    the simulations run in a new interpreter with PYSP_EXP_DATA_DIR in a
+    temporary directory, the stored scenarios are linked into it.
+    """
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        exp_dir = os.path.join(tmp_dir, 'exp')
+        os.makedirs(os.path.join(exp_dir, 'pysp_portfolio'))
+        os.symlink(os.path.join(EXP_SP_PORTFOLIO_DIR, 'scenarios'),
+                   os.path.join(exp_dir, 'pysp_portfolio', 'scenarios'))
+        environ = dict(os.environ)
+        environ['PYSP_EXP_DATA_DIR'] = exp_dir
+        script = YEARLY_POOL_SCRIPT.format(n_stock=n_stock,
+                                           win_length=win_length,
+                                           alphas=tuple(alphas))
+        subprocess.check_call([sys.executable, '-c', script], env=environ)
+
+        result_dir = os.path.join(exp_dir, 'pysp_portfolio',
+                                  'min_cvar_sp2_yearly')
+        assert len([name for name in os.listdir(result_dir)
+                    if name.endswith('.pkl')]) == len(alphas)
+    finally:
+        shutil.rmtree(tmp_dir)
+
+if __name__ == '__main__':
+    test_yearly_scenario_views()
+    test_yearly_simulations_pool()
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+Authors: Hung-Hsin Chen <chenhh@par.cse.nsysu.edu.tw>
+License: GPL v2
+"""
+
+from __future__ import division
+import json
+import logging
+import os
+import tempfile
+from StringIO import StringIO
+from PySPPortfolio.pysp_portfolio.log_utils import (
+    get_logger, configure_logging, ProgressLogger)
+
+
+def test_json_lines():
+    fd, json_path = tempfile.mkstemp(suffix='.jsonl')
+    os.close(fd)
+    stream = StringIO()
+    try:
+        configure_logging('INFO', json_path=json_path, stream=stream)
+        logger = get_logger('test')
+        logger.debug("not written")
+        logger.info("run {}".format(1), extra={'data': {'wealth': 2.5}})
+        logger.warning("warn")
+
+        with open(json_path) as fin:
+            records = [json.loads(line) for line in fin]
+        assert [rec['level'] for rec in records] == ['INFO', 'WARNING']
+        assert records[0]['logger'] == 'pysp_portfolio.test'
+        assert records[0]['message'] == "run 1"
+        assert records[0]['data'] == {'wealth': 2.5}
+        assert 'data' not in records[1]
+        assert "run 1" in stream.getvalue()
+    finally:
+        # removing the handlers of the file
+        configure_logging('INFO', stream=StringIO())
+        os.remove(json_path)
+
+
+def test_quiet():
+    stream = StringIO()
+    configure_logging('DEBUG', quiet=True, stream=stream)
+    logger = get_logger('test')
+    logger.info("info")
+    logger.error("error")
+    assert "info" not in stream.getvalue()
+    assert "error" in stream.getvalue()
+
+
+def test_progress_logger():
+    stream = StringIO()
+    configure_logging('INFO', stream=stream)
+    logger = get_logger('test')
+
+    # the first and the last steps are emitted within the interval
+    progress = ProgressLogger(logger, 100, interval=3600)
+    for done in xrange(1, 101):
+        progress.update(done, "wealth: {:.1f}", done * 1.)
+    lines = stream.getvalue().splitlines()
+    assert len(lines) == 2
+    assert lines[0].endswith("[1/100] wealth: 1.0")
+    assert lines[1].endswith("[100/100] wealth: 100.0")
+
+    # all steps are emitted without the interval
+    stream.truncate(0)
+    progress = ProgressLogger(logger, 5, interval=0)
+    for done in xrange(1, 6):
+        progress.update(done, "step")
+    assert len(stream.getvalue().splitlines()) == 5
+
+    # the skipped steps are in DEBUG level
+    stream.truncate(0)
+    configure_logging(logging.DEBUG, stream=stream)
+    progress = ProgressLogger(logger, 10, interval=3600)
+    for done in xrange(1, 11):
+        progress.update(done, "step")
+    lines = stream.getvalue().splitlines()
+    assert len(lines) == 10
+    assert sum(" DEBUG " in line for line in lines) == 8
+
+
+if __name__ == '__main__':
+    test_json_lines()
+    test_quiet()
+    test_progress_logger()
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+Authors: Hung-Hsin Chen <chenhh@par.cse.nsysu.edu.tw>
+License: GPL v2
+"""
+
+from __future__ import division
+import shutil
+import tempfile
+from time import time
+import numpy as np
+from PySPPortfolio.pysp_portfolio.min_cvar_sp import (
+    MinCVaRSPPortfolio, min_cvar_sp_portfolio, min_cvar_sp_batch_portfolio,
+    run_min_cvar_sp_batch)
+from portfolio_fixtures import (random_cvar_problem, exp_dates,
+                                exp_portfolio)
+
+
+def test_min_cvar_sp_batch_portfolio(n_scenario=100):
+    rng = np.random.RandomState(0)
+    # the problems of different sizes
+    problems = [random_cvar_problem(n_stock, n_scenario, alpha, rng)
+                for n_stock in (5, 10) for alpha in (0.9, 0.95)]
+
+    batch_results = min_cvar_sp_batch_portfolio(problems)
+    assert len(batch_results) == len(problems)
+    for problem, results in zip(problems, batch_results):
+        expected = min_cvar_sp_portfolio(**problem)
+        np.testing.assert_almost_equal(results['estimated_cvar'],
+                                       expected['estimated_cvar'], 4)
+        assert results['buy_amounts'].index.tolist() == problem['symbols']
+
+    assert min_cvar_sp_batch_portfolio([]) == []
+
+
+def _portfolios(alphas, n_stock, n_period, win_length, scenario_dir):
+    dates = exp_dates(n_period)
+    # the precomputed scenarios in the temporary directory are shared by
+    # all portfolios
+    return [exp_portfolio(MinCVaRSPPortfolio, n_stock, dates[0], dates[-1],
+                          window_length=win_length, n_scenario=200,
+                          alpha=alpha, scenario_generator='bootstrap',
+                          scenario_mode='precompute',
+                          scenario_dir=scenario_dir)
+            for alpha in alphas]
+
+
+def test_run_min_cvar_sp_batch(alphas=(0.8, 0.9, 0.95), n_stock=5,
+                               n_period=10, win_length=50):
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        t0 = time()
+        expected = [portfolio.run() for portfolio in
+                    _portfolios(alphas, n_stock, n_period, win_length,
+                                tmp_dir)]
+        t1 = time()
+        # two batch LPs in a period
+        reports_list = run_min_cvar_sp_batch(
+            _portfolios(alphas, n_stock, n_period, win_length, tmp_dir),
+            batch_size=2)
+        t2 = time()
+    finally:
+        shutil.rmtree(tmp_dir)
+    print ("separate: {:.3f} secs, batch: {:.3f} secs".format(t1 - t0,
+                                                              t2 - t1))
+
+    for reports, expected_reports in zip(reports_list, expected):
+        assert reports['func_name'] == expected_reports['func_name']
+        np.testing.assert_allclose(reports['cvar_arr'].values,
+                                   expected_reports['cvar_arr'].values,
+                                   rtol=1e-4)
+        np.testing.assert_allclose(reports['final_wealth'],
+                                   expected_reports['final_wealth'],
+                                   rtol=1e-4)
+
+
+if __name__ == '__main__':
+    test_min_cvar_sp_batch_portfolio()
+    test_run_min_cvar_sp_batch()
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+Authors: Hung-Hsin Chen <chenhh@par.cse.nsysu.edu.tw>
+License: GPL v2
+"""
+from time import time
+import numpy as np
+import pandas as pd
+from PySPPortfolio.pysp_portfolio import *
+from PySPPortfolio.pysp_portfolio.min_ms_cvar_sp import (
+    min_ms_cvar_sp_portfolio,
+)
+from PySPPortfolio.pysp_portfolio.min_ms_cvar_ph import (
+    min_ms_cvar_ph_portfolio,
+)
+
+
+def test_min_ms_cvar_ph_single_path():
+    """
+    the PH with a single path is the multi-stage SP along the path
+    """
+    n_period, n_stock, n_scenario = 3, 5, 50
+    symbols = EXP_SYMBOLS[:n_stock]
+    trans_dates = pd.date_range('2000/1/1', periods=n_period)
+    predict_risk_rois = np.random.randn(n_period, n_stock, n_scenario) * 0.01
+    risk_rois = np.random.randn(n_period, n_stock) * 0.01
+    # the realized rois are the first path
+    risk_rois[1:] = predict_risk_rois[:-1, :, 0]
+
+    sp = min_ms_cvar_sp_portfolio(symbols, trans_dates, risk_rois,
+                                  np.zeros(n_period), np.zeros(n_stock), 1e6,
+                                  BUY_TRANS_FEE, SELL_TRANS_FEE, [0.9, ],
+                                  predict_risk_rois, np.zeros(n_period),
+                                  n_scenario)['0.90']
+    ph = min_ms_cvar_ph_portfolio(symbols, trans_dates, risk_rois,
+                                  np.zeros(n_period), np.zeros(n_stock), 1e6,
+                                  BUY_TRANS_FEE, SELL_TRANS_FEE, 0.9,
+                                  predict_risk_rois, np.zeros(n_period),
+                                  n_scenario, n_path=1, n_process=1)
+
+    assert len(ph['convergences']) == 1
+    # the objective of min_ms_cvar_sp is the mean of the stage CVaR
+    np.testing.assert_allclose(ph['estimated_cvar'],
+                               sp['estimated_cvar'] * n_period, rtol=1e-6)
+
+
+def test_min_ms_cvar_ph(convergence_tolerance=1e-4):
+    n_period, n_stock, n_scenario = 3, 5, 20
+    symbols = EXP_SYMBOLS[:n_stock]
+    trans_dates = pd.date_range('2000/1/1', periods=n_period)
+    rng = np.random.RandomState(0)
+    risk_rois = rng.randn(n_period, n_stock) * 0.01
+    predict_risk_rois = rng.randn(n_period, n_stock, n_scenario) * 0.01
+    initial_wealth = 1e6
+
+    t0 = time()
+    res = min_ms_cvar_ph_portfolio(symbols, trans_dates, risk_rois,
+                                   np.zeros(n_period), np.zeros(n_stock),
+                                   initial_wealth, BUY_TRANS_FEE,
+                                   SELL_TRANS_FEE, 0.9, predict_risk_rois,
+                                   np.zeros(n_period), n_scenario,
+                                   max_iteration=100,
+                                   convergence_tolerance=convergence_tolerance)
+    assert res['buy_amounts'].shape == (n_stock,)
+    assert res['path_buy_amounts_df'].shape == (n_scenario, n_stock)
+
+    # the first stage decisions of the paths converge to their mean
+    convergences = res['convergences']
+    assert convergences[-1] < convergence_tolerance
+    assert convergences[-1] < convergences[0]
+    assert res['buy_amounts'].sum() > 0
+    for path_df, x_bar in ((res['path_buy_amounts_df'], res['buy_amounts']),
+                           (res['path_sell_amounts_df'],
+                            res['sell_amounts'])):
+        np.testing.assert_allclose(
+            path_df.values, np.tile(x_bar.values, (n_scenario, 1)),
+            atol=1e-3 * initial_wealth)
+    print ("min_ms_cvar_ph (n_period, n_stock, n_scenarios):({}, {}, {}): "
+           "{} iterations, {:.4f} secs".format(
+            n_period, n_stock, n_scenario, len(res['convergences']),
+            time() - t0))
+
+
+if __name__ == '__main__':
+    test_min_ms_cvar_ph_single_path()
+    test_min_ms_cvar_ph()
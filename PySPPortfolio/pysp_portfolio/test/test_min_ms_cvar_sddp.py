@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+Authors: Hung-Hsin Chen <chenhh@par.cse.nsysu.edu.tw>
+License: GPL v2
+"""
+from time import time
+import numpy as np
+import pandas as pd
+from PySPPortfolio.pysp_portfolio import *
+from PySPPortfolio.pysp_portfolio.min_ms_cvar_sp import (
+    min_ms_cvar_sp_portfolio,
+)
+from PySPPortfolio.pysp_portfolio.min_ms_cvar_fullsp import (
+    min_ms_cvar_fullsp_portfolio,
+)
+from PySPPortfolio.pysp_portfolio.min_ms_cvar_sddp import (
+    min_ms_cvar_sddp_portfolio,
+)
+
+
+def _random_data(n_period, n_stock, n_scenario):
+    symbols = EXP_SYMBOLS[:n_stock]
+    trans_dates = pd.date_range('2000/1/1', periods=n_period)
+    risk_rois = np.random.randn(n_period, n_stock) * 0.01
+    predict_risk_rois = np.random.randn(n_period, n_stock, n_scenario) * 0.01
+    return symbols, trans_dates, risk_rois, predict_risk_rois
+
+
+def test_min_ms_cvar_sddp_single_stage():
+    """
+    the single stage SDDP is the same as the single period SP
+    """
+    n_period, n_stock, n_scenario = 1, 5, 100
+    symbols, trans_dates, risk_rois, predict_risk_rois = _random_data(
+        n_period, n_stock, n_scenario)
+
+    sp = min_ms_cvar_sp_portfolio(symbols, trans_dates, risk_rois,
+                                  np.zeros(n_period), np.zeros(n_stock), 1e6,
+                                  BUY_TRANS_FEE, SELL_TRANS_FEE, [0.9, ],
+                                  predict_risk_rois, np.zeros(n_period),
+                                  n_scenario)['0.90']
+    sddp = min_ms_cvar_sddp_portfolio(symbols, trans_dates, risk_rois,
+                                      np.zeros(n_period), np.zeros(n_stock),
+                                      1e6, BUY_TRANS_FEE, SELL_TRANS_FEE, 0.9,
+                                      predict_risk_rois, np.zeros(n_period),
+                                      n_scenario)
+    np.testing.assert_allclose(sddp['estimated_cvar'], sp['estimated_cvar'],
+                               rtol=1e-6)
+
+
+def test_min_ms_cvar_sddp():
+    n_period, n_stock, n_scenario = 5, 5, 50
+    symbols, trans_dates, risk_rois, predict_risk_rois = _random_data(
+        n_period, n_stock, n_scenario)
+
+    t0 = time()
+    res = min_ms_cvar_sddp_portfolio(symbols, trans_dates, risk_rois,
+                                     np.zeros(n_period), np.zeros(n_stock),
+                                     1e6, BUY_TRANS_FEE, SELL_TRANS_FEE, 0.9,
+                                     predict_risk_rois, np.zeros(n_period),
+                                     n_scenario, n_forward=3,
+                                     max_iteration=10, random_seed=0)
+
+    # the cuts only tighten the upper bound
+    assert np.all(np.diff(res['upper_bounds']) <= 1e-6 *
+                  np.abs(res['upper_bounds'][:-1]))
+    assert res['risk_wealth_df'].shape == (n_period, n_stock)
+    print ("min_ms_cvar_sddp (n_period, n_stock, n_scenarios):({}, {}, {}): "
+           "{:.4f} secs".format(n_period, n_stock, n_scenario, time() - t0))
+
+
+def test_min_ms_cvar_sddp_extensive_form(n_stock=3, n_scenario=10):
+    """
+    the converged 2-stage SDDP is the extensive form of
+    min_ms_cvar_fullsp_portfolio on the same scenarios, a wrong sign of the
+    duals or of the gradients of the cuts changes the bound and the first
+    stage decisions.
+    """
+    n_period = 2
+    np.random.seed(0)
+    symbols, trans_dates, risk_rois, predict_risk_rois = _random_data(
+        n_period, n_stock, n_scenario)
+    # the positive expected rois make the first stage buy the stocks
+    predict_risk_rois += 0.01
+    alpha, initial_wealth = 0.5, 1e6
+
+    full = min_ms_cvar_fullsp_portfolio(symbols, trans_dates, risk_rois, 0.,
+                                        np.zeros(n_stock), initial_wealth,
+                                        BUY_TRANS_FEE, SELL_TRANS_FEE, alpha,
+                                        predict_risk_rois, 0., n_scenario)
+    sddp = min_ms_cvar_sddp_portfolio(symbols, trans_dates, risk_rois,
+                                      np.zeros(n_period), np.zeros(n_stock),
+                                      initial_wealth, BUY_TRANS_FEE,
+                                      SELL_TRANS_FEE, alpha,
+                                      predict_risk_rois, np.zeros(n_period),
+                                      n_scenario, n_forward=5,
+                                      max_iteration=30, gap_tolerance=1e-8,
+                                      random_seed=0)
+
+    np.testing.assert_allclose(sddp['estimated_cvar'],
+                               full['estimated_cvar'], rtol=1e-6)
+    assert full['buy_amounts'].sum() > 0
+    np.testing.assert_allclose(sddp['buy_amounts_df'].iloc[0].values,
+                               full['buy_amounts'].values,
+                               atol=1e-4 * initial_wealth)
+    np.testing.assert_allclose(sddp['sell_amounts_df'].iloc[0].values,
+                               full['sell_amounts'].values,
+                               atol=1e-4 * initial_wealth)
+
+
+if __name__ == '__main__':
+    test_min_ms_cvar_sddp_single_stage()
+    test_min_ms_cvar_sddp()
+    test_min_ms_cvar_sddp_extensive_form()
@@ -13,7 +13,7 @@ from PySPPortfolio.pysp_portfolio.min_ms_cvar_sp import (
     min_ms_cvar_sp_portfolio,)
 
 from PySPPortfolio.pysp_portfolio.min_ms_cvar_sp import (
-    min_ms_cvar_sp_portfolio,
+    min_ms_cvar_sp_portfolio, min_ms_cvar_sp_rolling_portfolio,
 )
 
 def test_min_ms_cvar_sp():
@@ -49,6 +49,55 @@ def test_min_ms_cvar_sp():
     )
 
 
+def test_min_ms_cvar_sp_rolling():
+    """
+    the rolling model with a horizon covering all periods is the same
+    as the full multi-stage model
+    """
+    n_period, n_stock, n_scenario = 5, 3, 50
+    initial_money = 1e6
+
+    symbols = EXP_SYMBOLS[:n_stock]
+    trans_dates = pd.date_range('2000/1/1', periods=n_period)
+
+    risk_rois = np.random.randn(n_period, n_stock) * 0.01
+    risk_free_roi = np.zeros(n_period, dtype=np.float)
+    allocated_risk_wealth = np.zeros(n_stock, dtype=np.float)
+    allocated_risk_free_wealth = initial_money
+    buy_trans_fee =  0.001425
+    sell_trans_fee = 0.004425
+    alphas = [0.9, ]
+    predict_risk_rois = np.random.randn(n_period, n_stock, n_scenario) * 0.01
+    predict_risk_free_rois = np.zeros(n_period)
+
+    full = min_ms_cvar_sp_portfolio(symbols, trans_dates, risk_rois,
+                                    risk_free_roi, allocated_risk_wealth,
+                                    allocated_risk_free_wealth, buy_trans_fee,
+                                    sell_trans_fee, alphas, predict_risk_rois,
+                                    predict_risk_free_rois, n_scenario)['0.90']
+
+    t0 = time()
+    rolling = min_ms_cvar_sp_rolling_portfolio(
+        symbols, trans_dates, risk_rois, risk_free_roi,
+        allocated_risk_wealth, allocated_risk_free_wealth, buy_trans_fee,
+        sell_trans_fee, alphas, predict_risk_rois, predict_risk_free_rois,
+        n_scenario, rolling_horizon=n_period, rolling_step=n_period)['0.90']
+
+    assert rolling['n_subproblem'] == 1
+    np.testing.assert_allclose(rolling['estimated_cvar'],
+                               full['estimated_cvar'], rtol=1e-4)
+
+    # rolling one period per sub-problem
+    rolling = min_ms_cvar_sp_rolling_portfolio(
+        symbols, trans_dates, risk_rois, risk_free_roi,
+        allocated_risk_wealth, allocated_risk_free_wealth, buy_trans_fee,
+        sell_trans_fee, alphas, predict_risk_rois, predict_risk_free_rois,
+        n_scenario, rolling_horizon=3, rolling_step=1)['0.90']
+    assert rolling['n_subproblem'] == n_period
+    assert rolling['risk_wealth_df'].shape == (n_period, n_stock)
+    print "min_ms_cvar_sp_rolling: {:.4f} secs".format(time() - t0)
+
+
 def test_min_ms_cvar_sp2(n_stock, win_length, alphas, scenario_cnt=1,
                          t_start_date=date(2005,1,3),
                          t_end_date=date(2014,12,31)):
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""
+Authors: Hung-Hsin Chen <chenhh@par.cse.nsysu.edu.tw>
+License: GPL v2
+"""
+from time import time
+import numpy as np
+from PySPPortfolio.pysp_portfolio import *
+from PySPPortfolio.pysp_portfolio.min_cvar_sp import (min_cvar_sp_portfolio,)
+from PySPPortfolio.pysp_portfolio.min_wcvar_sp import (
+    min_wcvar_sp_portfolio,)
+
+
+def test_min_wcvar_sp():
+    n_dist, n_stock, n_scenario = 3, 5, 200
+    symbols = EXP_SYMBOLS[:n_stock]
+    risk_rois = np.random.randn(n_stock) * 0.01
+    allocated_risk_wealth = np.zeros(n_stock)
+    predict_risk_rois = np.random.randn(n_dist, n_stock, n_scenario) * 0.01
+
+    t0 = time()
+    res = min_wcvar_sp_portfolio(symbols, risk_rois, 0., allocated_risk_wealth,
+                                 1e6, BUY_TRANS_FEE, SELL_TRANS_FEE, 0.95,
+                                 predict_risk_rois, 0., n_scenario)
+    print ("min_wcvar_sp_portfolio: {:.4f} secs".format(time() - t0))
+
+    # the worst-case CVaR is the minimum CVaR of the distributions
+    np.testing.assert_allclose(res['estimated_wcvar'],
+                               res['estimated_cvars'].min(), rtol=1e-6)
+
+    # the same as min_cvar_sp if all distributions are identical
+    same_rois = np.array([predict_risk_rois[0]] * n_dist)
+    res = min_wcvar_sp_portfolio(symbols, risk_rois, 0., allocated_risk_wealth,
+                                 1e6, BUY_TRANS_FEE, SELL_TRANS_FEE, 0.95,
+                                 same_rois, 0., n_scenario)
+    sp = min_cvar_sp_portfolio(symbols, risk_rois, 0., allocated_risk_wealth,
+                               1e6, BUY_TRANS_FEE, SELL_TRANS_FEE, 0.95,
+                               predict_risk_rois[0], 0., n_scenario)
+    np.testing.assert_allclose(res['estimated_wcvar'], sp['estimated_cvar'],
+                               rtol=1e-6)
+
+
+if __name__ == '__main__':
+    test_min_wcvar_sp()
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+Authors: Hung-Hsin Chen <chenhh@par.cse.nsysu.edu.tw>
+License: GPL v2
+"""
+
+from __future__ import division
+from time import time
+import numpy as np
+from PySPPortfolio.pysp_portfolio import *
+from PySPPortfolio.pysp_portfolio.stage_timer import (StageTimer,)
+from PySPPortfolio.pysp_portfolio.solvers import (get_solver, create_solver,
+                                                  SHELL_SOLVER_IO)
+from PySPPortfolio.pysp_portfolio.min_cvar_sp import (min_cvar_sp_portfolio,)
+from portfolio_fixtures import (random_cvar_problem,)
+
+
+def test_solver_io(n_stock=5, n_scenario=100):
+    problem = random_cvar_problem(n_stock, n_scenario)
+    opt, used_io = get_solver(DEFAULT_SOLVER)
+    # the solver is reused by the thread
+    assert get_solver(DEFAULT_SOLVER)[0] is opt
+
+    file_results = min_cvar_sp_portfolio(solver_io='lp', **problem)
+    results = min_cvar_sp_portfolio(**problem)
+    print ("default solver_io: {}".format(used_io))
+    np.testing.assert_almost_equal(results['estimated_cvar'],
+                                   file_results['estimated_cvar'], 4)
+    np.testing.assert_array_almost_equal(
+        results['buy_amounts'].values, file_results['buy_amounts'].values, 2)
+
+
+def benchmark_solver_io(n_solve=50, n_stock=10, n_scenario=200):
+    """ seconds per solve of the interfaces of the solver """
+    problem = random_cvar_problem(n_stock, n_scenario)
+    for solver_io in ('lp', 'python'):
+        used_io = get_solver(DEFAULT_SOLVER, solver_io)[1]
+        if used_io != solver_io:
+            print ("{} solver_io {} is not available.".format(
+                DEFAULT_SOLVER, solver_io))
+            continue
+        timer = StageTimer()
+        t0 = time()
+        for _ in xrange(n_solve):
+            min_cvar_sp_portfolio(timer=timer, solver_io=solver_io,
+                                  **problem)
+        print ("{} {}: {:.2f} ms per solve, {}".format(
+            DEFAULT_SOLVER, solver_io, (time() - t0) / n_solve * 1e3,
+            ", ".join("{}:{:.2f}ms".format(stage, secs / n_solve * 1e3)
+                      for stage, (secs, _) in timer.summary().items())))
+
+
+def test_shell_solver_io():
+    """ the shell options are set on the solver of the file interface """
+    opt, used_io = create_solver(DEFAULT_SOLVER, SHELL_SOLVER_IO)
+    assert used_io == SHELL_SOLVER_IO
+    if DEFAULT_SOLVER == "cplex":
+        opt.options['preprocessing_presolve'] = 'n'
+    # the cached solver of the thread is not modified
+    assert get_solver(DEFAULT_SOLVER, SHELL_SOLVER_IO)[0] is not opt
+
+
+if __name__ == '__main__':
+    test_solver_io()
+    test_shell_solver_io()
+    benchmark_solver_io()
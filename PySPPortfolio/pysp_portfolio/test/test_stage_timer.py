@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+Authors: Hung-Hsin Chen <chenhh@par.cse.nsysu.edu.tw>
+License: GPL v2
+"""
+
+from __future__ import division
+from time import (time, sleep)
+import numpy as np
+from PySPPortfolio.pysp_portfolio import *
+from PySPPortfolio.pysp_portfolio.stage_timer import (
+    StageTimer, NULL_TIMER, STAGES)
+from PySPPortfolio.pysp_portfolio.min_cvar_sp import (MinCVaRSPPortfolio,)
+from portfolio_fixtures import (exp_dates, exp_portfolio)
+
+
+def test_stage_timer():
+    timer = StageTimer(record_periods=True)
+    for label in ('d1', 'd2'):
+        timer.begin_period(label)
+        sleep(0.01)
+        timer.lap('scenario')
+        timer.add('optimize', 0.5)
+        timer.mark()
+        sleep(0.02)
+        timer.lap('bookkeeping')
+        timer.end_period()
+
+    summary = timer.summary()
+    assert list(summary.keys()) == ['scenario', 'optimize', 'bookkeeping']
+    assert summary['optimize'] == (1., 2)
+    assert summary['scenario'][0] >= 0.02
+    assert summary['bookkeeping'][0] >= 0.04
+
+    df = timer.period_frame()
+    assert df.index.tolist() == ['d1', 'd2']
+    np.testing.assert_array_almost_equal(df.sum().values,
+                                         [secs for secs, _ in
+                                          summary.values()])
+
+    # the disabled timer records nothing
+    NULL_TIMER.begin_period('d1')
+    NULL_TIMER.lap('scenario')
+    NULL_TIMER.add('optimize', 1.)
+    NULL_TIMER.end_period()
+    assert len(NULL_TIMER.summary()) == 0
+
+
+def test_run_stage_timing(n_stock=5, n_period=5, win_length=50):
+    dates = exp_dates(n_period)
+    instance = exp_portfolio(
+        MinCVaRSPPortfolio, n_stock, dates[0], dates[-1],
+        window_length=win_length, n_scenario=200, alpha=0.95,
+        scenario_generator='bootstrap', scenario_mode='online')
+
+    reports = instance.run(stage_timer=StageTimer(record_periods=True))
+    timing = reports['stage_timing']
+    for stage in STAGES:
+        assert timing[stage][1] == n_period
+    # the stages of the model are parts of the optimization
+    model_secs = sum(timing[stage][0] for stage in
+                     ('build', 'write', 'solve', 'read', 'load'))
+    assert model_secs <= timing['optimize'][0]
+
+    df = reports['stage_timing_df']
+    assert df.shape == (n_period, len(STAGES))
+    assert df.index.equals(dates)
+    print (df)
+
+
+def benchmark_timer_overhead(n_period=100000):
+    """ overhead of the timer calls of a period """
+    for timer in (NULL_TIMER, StageTimer(), StageTimer(True)):
+        t0 = time()
+        for tdx in xrange(n_period):
+            timer.begin_period(tdx)
+            timer.lap('scenario')
+            timer.add('optimize', 0.)
+            timer.mark()
+            timer.lap('bookkeeping')
+            timer.end_period()
+        print ("{}: {:.3f} micro secs per period".format(
+            timer.__class__.__name__, (time() - t0) / n_period * 1e6))
+
+
+if __name__ == '__main__':
+    test_stage_timer()
+    test_run_stage_timing()
+    benchmark_timer_overhead()
@@ -6,6 +6,8 @@ License: GPL v2
 
 import numpy as np
 import pandas as pd
+from PySPPortfolio.pysp_portfolio.utils import (evaluate_cvar,
+                                                evaluate_cvars)
 
 def fun1(v1=1, *args, **kwargs):
     print "fun 1 v1:", v1
@@ -36,6 +38,37 @@ def product():
     print "80 CVaR", res[:20].mean()
 
 
+def test_evaluate_cvar():
+    n_stock, n_scenario = 5, 200
+    weights = np.random.rand(n_stock)
+    scenarios = np.random.randn(n_stock, n_scenario) * 0.01
+    values = np.dot(weights, 1 + scenarios)
+
+    for alpha in (0., 0.5, 0.9, 0.95, 0.99, 0.997):
+        var, cvar = evaluate_cvar(weights, scenarios, alpha)
+        # the optimal Z of the CVaR LP is one of the scenario values
+        lp_cvars = [z - np.maximum(z - values, 0).mean() / (1. - alpha)
+                    for z in values]
+        np.testing.assert_allclose(cvar, max(lp_cvars))
+        np.testing.assert_allclose(
+            cvar, var - np.maximum(var - values, 0).mean() / (1. - alpha))
+
+
+def test_evaluate_cvars():
+    n_runs, n_stock, n_scenario = 10, 5, 200
+    alphas = [0.5, 0.9, 0.95, 0.99]
+    holdings = np.random.rand(n_runs, n_stock)
+    scenarios = np.random.randn(n_stock, n_scenario) * 0.01
+
+    VaRs, CVaRs = evaluate_cvars(holdings, scenarios, alphas)
+    assert VaRs.shape == CVaRs.shape == (n_runs, len(alphas))
+    for rdx in xrange(n_runs):
+        for adx, alpha in enumerate(alphas):
+            var, cvar = evaluate_cvar(holdings[rdx], scenarios, alpha)
+            np.testing.assert_allclose(VaRs[rdx, adx], var)
+            np.testing.assert_allclose(CVaRs[rdx, adx], cvar)
+
+
 if __name__ == '__main__':
     # fun1(2, alpha=0.5)
     product()
\ No newline at end of file
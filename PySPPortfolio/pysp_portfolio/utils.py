@@ -88,3 +88,67 @@ def maximum_drawdown(series):
     mad = np.max(ad)
 
     return mad
+
+
+def evaluate_cvars(holdings, scenarios, alphas):
+    """
+    VaR and CVaR of many fixed portfolios for many alphas at once under
+    equally likely scenarios. The wealth of all portfolios is computed by a
+    matrix product, and only the positions of the VaRs are partially sorted.
+    The values are the same as the optimal solution of the LP
+    max_Z Z - E[(Z - W)^+]/(1-alpha).
+
+    Parameters:
+    ---------------
+    holdings: numpy.array, shape: (n_runs, n_stock), the risk wealth
+    scenarios: numpy.array, shape: (n_stock, n_scenario), scenario rois
+    alphas: list of float, 1-alpha is the significant level
+
+    Returns:
+    ---------------
+    VaRs, CVaRs: numpy.array, shape: (n_runs, n_alpha)
+    """
+    holdings = np.atleast_2d(np.asarray(holdings, dtype=np.float))
+    alphas = np.atleast_1d(np.asarray(alphas, dtype=np.float))
+
+    # shape: (n_runs, n_scenario)
+    values = np.dot(holdings, 1. + np.asarray(scenarios, dtype=np.float))
+    n_scenario = values.shape[1]
+
+    # the size of the lower tail, and the index of VaR in sorted values
+    tails = n_scenario * (1. - alphas)
+    ks = np.minimum(np.floor(tails).astype(np.int), n_scenario)
+    var_idx = np.minimum(ks, n_scenario - 1)
+
+    # the values before each index are the smallest values
+    partitioned = np.partition(values, np.unique(var_idx), axis=1)
+    prefix_sums = np.zeros((values.shape[0], n_scenario + 1))
+    np.cumsum(partitioned, axis=1, out=prefix_sums[:, 1:])
+
+    # shape: (n_runs, n_alpha)
+    VaRs = partitioned[:, var_idx]
+    safe_tails = np.where(tails > 0, tails, 1.)
+    CVaRs = np.where(tails > 0,
+                     (prefix_sums[:, ks] + (tails - ks) * VaRs) / safe_tails,
+                     VaRs)
+    return VaRs, CVaRs
+
+
+def evaluate_cvar(weights, scenarios, alpha):
+    """
+    VaR and CVaR of a fixed portfolio under equally likely scenarios,
+    the VaR is the floor(n_scenario*(1-alpha))-th smallest wealth and the
+    CVaR is the mean of the lower (1-alpha) tail of the sorted wealth.
+
+    Parameters:
+    ---------------
+    weights: numpy.array, shape: (n_stock,), the risk wealth of the portfolio
+    scenarios: numpy.array, shape: (n_stock, n_scenario), scenario rois
+    alpha: float, 1-alpha is the significant level
+
+    Returns:
+    ---------------
+    (VaR, CVaR) of the portfolio wealth, float
+    """
+    VaRs, CVaRs = evaluate_cvars(weights, scenarios, [alpha, ])
+    return VaRs[0, 0], CVaRs[0, 0]
@@ -2,17 +2,228 @@
 """
 Authors: Hung-Hsin Chen <chenhh@par.cse.nsysu.edu.tw>
 License: GPL v2
+
+validating the generated scenario files against the rolling historical
+moments and correlations.
 """
-import pandas as pd
+from __future__ import division
+from glob import glob
+from time import time
+from multiprocessing import Pool
+import multiprocessing as mp
 import os
+import re
 import numpy as np
+import pandas as pd
+import scipy.stats as spstats
+from numpy.lib.stride_tricks import as_strided
 from PySPPortfolio.pysp_portfolio import *
+from data_store import (store_dates, store_values, preload_data_store)
+from log_utils import (get_logger,)
 
+logger = get_logger('verify_scenarios')
 
-def roi_stats(n_stock, win_length, n_scenario=200, bias="unbiased"):
+# {start}_{end}_m{n_stock}_w{win_length}_s{n_scenario}_{bias}_{cnt}.pkl
+SCENARIO_FILE_PATTERN = re.compile(
+    r"^\d{8}_\d{8}_m\d+_w\d+_s\d+_(biased|unbiased)_\d+\.pkl$")
+
+
+def batch_moments(data, bias=False):
+    """
+    1-4 th moments and correlation matrices of a batch of samples
+
+    Parameters:
+    ------------------
+    data: numpy.array, shape: (n_batch, n_stock, n_sample)
+    bias: boolean, biased or unbiased estimator of moments
+
+    Returns:
+    ------------------
+    moments: numpy.array, shape: (n_batch, n_stock, 4)
+    corrs: numpy.array, shape: (n_batch, n_stock, n_stock)
+    """
+    moments = np.empty(data.shape[:2] + (4,))
+    moments[:, :, 0] = data.mean(axis=2)
+    moments[:, :, 1] = data.std(axis=2, ddof=0 if bias else 1)
+    moments[:, :, 2] = spstats.skew(data, axis=2, bias=bias)
+    moments[:, :, 3] = spstats.kurtosis(data, axis=2, bias=bias)
+
+    centered = data - data.mean(axis=2)[:, :, np.newaxis]
+    covs = np.einsum('bis,bjs->bij', centered, centered)
+    stds = np.sqrt(np.einsum('bii->bi', covs))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        corrs = covs / stds[:, :, np.newaxis] / stds[:, np.newaxis, :]
+    return moments, corrs
+
+
+def rolling_windows(rois, end_indices, win_length):
+    """
+    historical windows (containing the end date) without copy
+
+    Parameters:
+    ------------------
+    rois: numpy.array, shape: (n_period, n_stock)
+    end_indices: numpy.array, the indices of the last day of the windows
+
+    Returns:
+    ------------------
+    numpy.array, shape: (len(end_indices), n_stock, win_length)
+    """
+    rois = np.ascontiguousarray(rois)
+    n_period, n_stock = rois.shape
+    row_stride, col_stride = rois.strides
+    windows = as_strided(rois, shape=(n_period - win_length + 1, n_stock,
+                                      win_length),
+                         strides=(row_stride, col_stride, row_stride))
+    return windows[np.asarray(end_indices) - win_length + 1]
+
+
+def verify_scenario_file(scenario_file, chunk_size=250):
+    """
+    moment and correlation errors of all dates in a scenario file
+
+    Parameters:
+    ------------------
+    scenario_file: string, path of the scenario panel, the file name is
+        {start}_{end}_m{n_stock}_w{win_length}_s{n_scenario}_{bias}_{cnt}.pkl
+    chunk_size: integer, number of dates processed in one vectorized pass
+
+    Returns:
+    ------------------
+    summary: dict, statistics of the file
+    per_date: pandas.DataFrame, errors and flags of each date
+    """
+    t0 = time()
+    file_name = os.path.basename(scenario_file)
+    param = file_name[:file_name.rfind('.')]
+    _, _, stock, win, scenario, biased, cnt = param.split('_')
+    n_stock = int(stock[stock.rfind('m') + 1:])
+    win_length = int(win[win.rfind('w') + 1:])
+    bias = True if biased == "biased" else False
+
+    symbols = EXP_SYMBOLS[:n_stock]
+    # shape: (n_period, n_stock), a view of the data store
+    rois = store_values(n_stock)
 
+    panel = pd.read_pickle(scenario_file)
+    trans_dates = panel.items
+    # shape: (n_exp_period, n_stock, n_scenario)
+    scenarios = panel.loc[:, symbols].values
+    end_indices = store_dates().get_indexer(trans_dates)
+    if np.any(end_indices < win_length - 1):
+        raise ValueError("{}: dates without the historical data.".format(
+            file_name))
 
-    for cnt in xrange(1, 4):
+    n_period = len(trans_dates)
+    moment_errs = np.empty(n_period)
+    corr_errs = np.empty(n_period)
+    for start in xrange(0, n_period, chunk_size):
+        end = min(start + chunk_size, n_period)
+        hist = rolling_windows(rois, end_indices[start:end], win_length)
+        tgt_moments, tgt_corrs = batch_moments(hist, bias)
+        scen_moments, scen_corrs = batch_moments(scenarios[start:end], bias)
+        moment_errs[start:end] = np.sqrt(
+            ((scen_moments - tgt_moments) ** 2).sum(axis=(1, 2)))
+        corr_errs[start:end] = np.sqrt(
+            ((scen_corrs - tgt_corrs) ** 2).sum(axis=(1, 2)))
+
+    per_date = pd.DataFrame({
+        'moment_err': moment_errs,
+        'corr_err': corr_errs,
+        'all_zero': np.all(scenarios == 0, axis=(1, 2)),
+        'has_nan': np.any(np.isnan(scenarios), axis=(1, 2)),
+    }, index=trans_dates)
+
+    summary = {
+        'file': file_name,
+        'n_stock': n_stock,
+        'win_length': win_length,
+        'bias': biased,
+        'cnt': int(cnt),
+        'n_period': n_period,
+        'n_all_zero': int(per_date['all_zero'].sum()),
+        'n_nan': int(per_date['has_nan'].sum()),
+        'mean_moment_err': np.nanmean(moment_errs),
+        'max_moment_err': np.nanmax(moment_errs),
+        'max_moment_err_date': per_date['moment_err'].idxmax(),
+        'mean_corr_err': np.nanmean(corr_errs),
+        'max_corr_err': np.nanmax(corr_errs),
+        'max_corr_err_date': per_date['corr_err'].idxmax(),
+        'secs': time() - t0,
+    }
+    return summary, per_date
+
+
+def _verify_summary(scenario_file):
+    """ pool worker, only the summary is sent back """
+    try:
+        summary, _ = verify_scenario_file(scenario_file)
+    except Exception as e:
+        summary = {'file': os.path.basename(scenario_file),
+                   'error': str(e)}
+    logger.info("verify {} OK".format(summary['file']))
+    return summary
+
+
+def verify_all_scenarios(scenario_path=None, summary_file=None,
+                         n_process=None):
+    """
+    validating all scenario files of a directory in parallel
+
+    Parameters:
+    ------------------
+    scenario_path: string, directory of scenario files, default is
+        EXP_SCENARIO_DIR
+    summary_file: string, path of the summary csv, default is
+        scenario_path/scenario_verification.csv
+    n_process: integer, number of worker processes, default is the
+        number of cpus
+
+    Returns:
+    ------------------
+    pandas.DataFrame, one row per scenario file
+    """
+    t0 = time()
+    if scenario_path is None:
+        scenario_path = EXP_SCENARIO_DIR
+    if summary_file is None:
+        summary_file = os.path.join(scenario_path,
+                                    'scenario_verification.csv')
+    if n_process is None:
+        n_process = mp.cpu_count()
+
+    # only scenario panels, e.g. excluding working.pkl, the axes of the
+    # memory-mapped scenarios and the temporary files
+    scenario_files = sorted(
+        path for path in glob(os.path.join(scenario_path, "*_m*_w*_s*.pkl"))
+        if SCENARIO_FILE_PATTERN.match(os.path.basename(path)))
+
+    # the workers inherit the opened data store
+    preload_data_store(['simple_roi'])
+    pool = Pool(n_process)
+    try:
+        results = [pool.apply_async(_verify_summary, (scenario_file,))
+                   for scenario_file in scenario_files]
+        summaries = [result.get() for result in results]
+    except BaseException:
+        pool.terminate()
+        raise
+    else:
+        pool.close()
+    finally:
+        pool.join()
+
+    summary_df = pd.DataFrame(summaries).set_index('file')
+    summary_df.to_csv(summary_file)
+    logger.info("verify {} scenario files OK, {:.3f} secs".format(
+        len(scenario_files), time() - t0))
+    return summary_df
+
+
+def roi_stats(n_stock, win_length, n_scenario=200, bias="unbiased"):
+    """ verifying the scenario files of the parameters """
+
+    for cnt in xrange(1, MAX_SCENARIO_FILE_CNT + 1):
         scenario_name = "{}_{}_m{}_w{}_s{}_{}_{}.pkl".format(
         START_DATE.strftime("%Y%m%d"), END_DATE.strftime("%Y%m%d"),
             n_stock, win_length, n_scenario, bias, cnt)
@@ -20,17 +231,13 @@ def roi_stats(n_stock, win_length, n_scenario=200, bias="unbiased"):
                                  scenario_name)
 
         if not os.path.exists(scenario_path):
-            print ("{} not exists.".format(scenario_name))
+            logger.warning("{} not exists.".format(scenario_name))
             continue
 
-        panel = pd.read_pickle(scenario_path)
-
-        # verify all zeros at a specific period
-
-
+        summary, _ = verify_scenario_file(scenario_path)
+        logger.info(summary)
 
-    # df = pd.read_pickle(scenario_path)
-    # print df
 
 if __name__ == '__main__':
-    roi_stats(5, 50)
\ No newline at end of file
+    roi_stats(5, 50)
+    # verify_all_scenarios()
@@ -30,7 +30,16 @@ def optimal2DCopulaSampling(data, n_scenario = 20, solver="cplex"):
     assert data.shape[1] == 2
     n_rv = data.shape[0]
     
-    tgt_copula = buildEmpiricalCopula(data)
+    #cumulative-count grid of the data, size: (n_rv+1) * (n_rv+1)
+    tgt_grid = build2DCopulaGrid(data)
+    
+    #target copula values of all grid points of the scenarios
+    #tgt_copula[i, j] = C((i+1)/n_scenario, (j+1)/n_scenario)
+    ticks = (np.arange(n_scenario) + 1.)/n_scenario
+    uu, vv = np.meshgrid(ticks, ticks, indexing='ij')
+    tgt_copula = get2DCopulaGrid(tgt_grid, np.column_stack((uu.ravel(), 
+                                                            vv.ravel())))
+    tgt_copula = tgt_copula.reshape((n_scenario, n_scenario))
     
     # Model
     model = ConcreteModel()
@@ -41,6 +50,8 @@ def optimal2DCopulaSampling(data, n_scenario = 20, solver="cplex"):
     
     #decision variables
     model.X = Var(model.x, model.y, within=Binary)
+    #P[i, j] = sum_{k<=i, l<=j} X[k, l], number of samples dominated by (i,j)
+    model.P = Var(model.x, model.y, within=NonNegativeReals)
     model.yp = Var(model.x, model.y, within=NonNegativeReals)
     model.yn = Var(model.x, model.y, within=NonNegativeReals)
     
@@ -61,18 +72,28 @@ def optimal2DCopulaSampling(data, n_scenario = 20, solver="cplex"):
     model.columnConstraint = Constraint(model.y)
     
     
+    def prefixConstraint_rule(model, i, j):
+        '''
+        2D prefix sums of X, 
+        P[i, j] = X[i, j] + P[i-1, j] + P[i, j-1] - P[i-1, j-1]
+        each constraint has at most 4 terms instead of O(S**2) terms.
+        '''
+        val = model.X[i, j]
+        if i > 0:
+            val += model.P[i-1, j]
+        if j > 0:
+            val += model.P[i, j-1]
+        if i > 0 and j > 0:
+            val -= model.P[i-1, j-1]
+        return model.P[i, j] == val
+    
+    model.prefixConstraint = Constraint(model.x, model.y)
+    
+    
     def copulaConstraint_rule(model, i, j):
         '''bias constraint '''
-        val = 0
-        for kdx in xrange(i):
-            for ldx in xrange(j):
-                val += model.X[kdx, ldx]
-        val = val - model.yp[i, j] + model.yn[i, j]
-        
-        point = [(i+1.)/n_scenario, (j+1.)/n_scenario]
-        copula_val = getCopula(tgt_copula,  point)
-        print "point %s copula:%s, S*copula:%s"%(point, copula_val, n_scenario * copula_val )
-        return val == n_scenario * copula_val 
+        val = model.P[i, j] - model.yp[i, j] + model.yn[i, j]
+        return val == n_scenario * tgt_copula[i, j] 
     
             
     model.copulaConstraint = Constraint(model.x, model.y)
@@ -145,23 +166,66 @@ def buildEmpiricalCopula(data):
     #computing copula indices 
     #[:, :n_dim]為rank index, [:, n_dim]為dominating values 
     copula = np.ones((n_rv, n_dim +1))
-    rankIdx = np.empty(n_rv)
-    for col in xrange(n_dim):
-        rankIdx[data[:, col].argsort()] = np.arange(n_rv)
-        copula[:, col] = rankIdx + 1
+    copula[:, :n_dim] = getRanks(data)
    
-    #computing empirical copula
-    for idx in xrange(n_rv):
-        for jdx in xrange(idx+1 ,n_rv):
-            #idx dominating jdx 
-            if np.all(copula[idx, :n_dim] >= copula[jdx, :n_dim]): 
-                copula[idx, n_dim] += 1
-            #jdx dominating idx
-            if np.all(copula[idx, :n_dim] <= copula[jdx, :n_dim]):
-                copula[jdx, n_dim] += 1
+    #computing empirical copula, the record itself is included
+    #dominated[idx, jdx]: record idx dominating record jdx
+    ranks = copula[:, :n_dim]
+    dominated = np.all(ranks[:, np.newaxis, :] >= ranks[np.newaxis, :, :], 
+                       axis=2)
+    copula[:, n_dim] = dominated.sum(axis=1)
                 
     copula = copula.astype(np.float)/n_rv
     return copula
+
+
+def getRanks(data):
+    '''
+    @data, numpy.array, size: n_rv * n_dim
+    @return ranks (1 to n_rv, ascending) of each column, size: n_rv * n_dim
+    '''
+    n_rv, n_dim = data.shape
+    ranks = np.empty((n_rv, n_dim))
+    for col in xrange(n_dim):
+        ranks[data[:, col].argsort(), col] = np.arange(1, n_rv + 1)
+    return ranks
+
+
+def build2DCopulaGrid(data):
+    '''
+    cumulative-count grid of the bivariate empirical copula
+    @data, numpy.array, size: n_rv * 2
+    time complexity: O(N**2), built once
+    
+    grid[a, b] = number of records with rank_1 <= a and rank_2 <= b,
+    size: (n_rv+1) * (n_rv+1), grid[0, :] = grid[:, 0] = 0
+    '''
+    assert data.shape[1] == 2
+    n_rv = data.shape[0]
+    ranks = getRanks(data).astype(np.int)
+    
+    #histogram of the ranks, each rank is used only once in each column
+    hist = np.zeros((n_rv + 1, n_rv + 1), dtype=np.int)
+    hist[ranks[:, 0], ranks[:, 1]] = 1
+    grid = np.cumsum(np.cumsum(hist, axis=0), axis=1)
+    return grid
+
+
+def get2DCopulaGrid(grid, points):
+    '''
+    O(1) lookup of the empirical copula value of each point
+    @grid, numpy.array, size: (n_rv+1) * (n_rv+1), from build2DCopulaGrid
+    @points, numpy.array, size: n_point * 2, or size: 2
+    @return copula values, numpy.array, size: n_point, or float
+    '''
+    n_rv = grid.shape[0] - 1
+    points = np.asarray(points, dtype=np.float)
+    assert np.all(0<= points) and np.all(points <= 1)
+    
+    #the largest rank a with a/n_rv <= point, tolerating the rounding error
+    idx = np.floor(points * n_rv + 1e-9).astype(np.int)
+    idx = np.clip(idx, 0, n_rv)
+    return grid[idx[..., 0], idx[..., 1]].astype(np.float)/n_rv
   
 
 def getCopula(copula, point):
@@ -178,8 +242,7 @@ def getCopula(copula, point):
     assert np.all( 0<=point) and np.all(point <=1)    
 
     n_rv, n_dim =copula.shape[0],  copula.shape[1] - 1
-    dominating = sum(1. for row in xrange(n_rv) 
-                     if np.all(point >= copula[row, :n_dim]))   
+    dominating = np.all(point >= copula[:, :n_dim], axis=1).sum()
        
     return dominating/n_rv 
 
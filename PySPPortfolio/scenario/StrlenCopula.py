@@ -103,6 +103,76 @@ def StrlenHeuristicCopulaSampling(data, alpha=0.95, n_scenario=200, K=2):
                     alpha, n_scenario, time.time()-t0)
     
 
+def StrlenCopulaSampling(data, n_scenario=200, K=2, marginal=True, 
+                         random_seed=None):
+    '''
+    Strelen algorithm, numpy version
+    
+    the copula density is constant in each of the K**D subcubes, 
+    the subcube (i_1, ..., i_D) is encoded as the flat integer 
+    sum_d (i_d-1) * K**(D-1-d), and the lexicographic order of the flat
+    integers is the order of the conditional distributions 
+    i_1, i_2|i_1, ..., i_D|i_1...i_{D-1}. Therefore the conditional 
+    inverse-CDF lookups of all dimensions are a single binary search 
+    in the prefix sums of the sorted subcube counts.
+    
+    @data, numpy.array, size: N*D, N is number of data, D is the dimensions
+    @n_scenario, integer
+    @K, integer, num. of partitions of [0,1]
+    @marginal, boolean, if True, the copula samples are translated to
+        the empirical marginal distributions of data
+    @random_seed, integer, seed of the random generator
+    
+    @return samples, numpy.array, size: n_scenario * D
+    '''
+    N, D = data.shape
+    if K < 1:
+        raise ValueError('the number of partitions K must >= 1: %s'%(K))
+    rng = np.random.RandomState(random_seed)
+    
+    #empirical marginal distribution of each dimension, rank in 1 to N
+    rank = np.empty(data.shape)
+    for col in xrange(D):
+        rank[data[:, col].argsort(), col] = np.arange(1, N+1)
+    empData = rank/N
+    
+    #translate U to subcube index (0 to K-1), and to flat integer
+    empIdx = np.ceil(empData*K).astype(np.int) - 1
+    weights = K ** np.arange(D-1, -1, -1)
+    codes = empIdx.dot(weights)
+    
+    #sorted counts of the non-empty subcubes with prefix sums
+    cube_codes, cube_counts = np.unique(codes, return_counts=True)
+    cum_counts = np.cumsum(cube_counts)
+    
+    #conditional inverse-CDF lookups of all samples
+    u = rng.rand(n_scenario) * N
+    pos = np.searchsorted(cum_counts, u, side='right')
+    pos = np.minimum(pos, len(cube_codes) - 1)
+    
+    #decoding the subcube indices of the samples
+    sample_idx = (cube_codes[pos][:, np.newaxis] // weights) % K
+    
+    #the density is uniform in the subcube
+    samples = (sample_idx + rng.rand(n_scenario, D)) / K
+    
+    if marginal:
+        samples = empiricalInverseCDF(data, samples)
+    return samples
+
+
+def empiricalInverseCDF(data, samples):
+    '''
+    translate the copula samples to the empirical marginal distributions
+    @data, numpy.array, size: N*D
+    @samples, numpy.array, size: n_scenario*D, values in [0, 1]
+    '''
+    N, D = data.shape
+    sorted_data = np.sort(data, axis=0)
+    idx = np.clip(np.ceil(samples*N).astype(np.int) - 1, 0, N-1)
+    return sorted_data[idx, np.arange(D)]
+
+
 def get_down_ud(ud_arr, f, u, K):
     lowerBound = u * getSparseArrayValue(ud_arr, f)
     sum_f, down_ud, upper_ud = -1, -1, -1
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+'''
+@author: Hung-Hsin Chen
+@mail: chenhh@par.cse.nsysu.edu.tw
+
+the vectorized empirical copula of KautCopula against brute-force counts
+'''
+from __future__ import division
+import numpy as np
+import pytest
+
+#the module imports coopr for the sampling model
+KautCopula = pytest.importorskip("PySPPortfolio.scenario.KautCopula")
+
+
+def bruteForceRanks(data):
+    '''rank (1 to n_rv) of each record in each column'''
+    n_rv, n_dim = data.shape
+    ranks = np.empty((n_rv, n_dim))
+    for rdx in xrange(n_rv):
+        for col in xrange(n_dim):
+            ranks[rdx, col] = sum(1 for kdx in xrange(n_rv)
+                                  if data[kdx, col] <= data[rdx, col])
+    return ranks
+
+
+def bruteForceCopula(data, point):
+    '''
+    fraction of the records whose ranks are <= point * n_rv in each
+    dimension
+    '''
+    n_rv, n_dim = data.shape
+    ranks = bruteForceRanks(data)
+    count = 0
+    for rdx in xrange(n_rv):
+        if all(ranks[rdx, col] <= point[col] * n_rv + 1e-9
+               for col in xrange(n_dim)):
+            count += 1
+    return count / n_rv
+
+
+def testBuildEmpiricalCopula():
+    np.random.seed(0)
+    n_rv, n_dim = 12, 3
+    data = np.random.randn(n_rv, n_dim)
+    copula = KautCopula.buildEmpiricalCopula(data)
+    ranks = bruteForceRanks(data)
+
+    np.testing.assert_array_equal(copula[:, :n_dim] * n_rv, ranks)
+    for rdx in xrange(n_rv):
+        #the record itself is included
+        assert copula[rdx, n_dim] == bruteForceCopula(data, ranks[rdx]/n_rv)
+
+
+def testGet2DCopulaGrid():
+    np.random.seed(1)
+    n_rv = 10
+    data = np.random.randn(n_rv, 2)
+    grid = KautCopula.build2DCopulaGrid(data)
+    assert grid.shape == (n_rv + 1, n_rv + 1)
+
+    #the grid points and the points between them
+    ticks = np.arange(n_rv + 1.) / n_rv
+    points = [(u, v) for u in ticks for v in ticks]
+    points.extend(np.random.rand(50, 2))
+    points = np.asarray(points)
+
+    values = KautCopula.get2DCopulaGrid(grid, points)
+    expected = [bruteForceCopula(data, point) for point in points]
+    np.testing.assert_allclose(values, expected)
+
+    #a single point
+    assert (KautCopula.get2DCopulaGrid(grid, points[13]) ==
+            bruteForceCopula(data, points[13]))
+
+
+def testPrefixSumCopulaTarget():
+    '''
+    the samples at the ranks of the data have no bias, i.e. the prefix
+    sums P[i, j] of the sampling model (k <= i, l <= j) are the target
+    copula values of the grid
+    '''
+    np.random.seed(2)
+    n_scenario = 8
+    data = np.random.randn(n_scenario, 2)
+    ranks = KautCopula.getRanks(data).astype(np.int)
+    X = np.zeros((n_scenario, n_scenario))
+    X[ranks[:, 0] - 1, ranks[:, 1] - 1] = 1
+
+    #the recursion of prefixConstraint_rule
+    P = np.zeros((n_scenario, n_scenario))
+    for idx in xrange(n_scenario):
+        for jdx in xrange(n_scenario):
+            val = X[idx, jdx]
+            if idx > 0:
+                val += P[idx-1, jdx]
+            if jdx > 0:
+                val += P[idx, jdx-1]
+            if idx > 0 and jdx > 0:
+                val -= P[idx-1, jdx-1]
+            P[idx, jdx] = val
+
+    grid = KautCopula.build2DCopulaGrid(data)
+    for idx in xrange(n_scenario):
+        for jdx in xrange(n_scenario):
+            count = X[:idx+1, :jdx+1].sum()
+            point = ((idx+1.)/n_scenario, (jdx+1.)/n_scenario)
+            assert P[idx, jdx] == count
+            assert count == n_scenario * bruteForceCopula(data, point)
+            assert count == n_scenario * KautCopula.get2DCopulaGrid(grid,
+                                                                    point)
+
+
+if __name__ == '__main__':
+    testBuildEmpiricalCopula()
+    testGet2DCopulaGrid()
+    testPrefixSumCopulaTarget()
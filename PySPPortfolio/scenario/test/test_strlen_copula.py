@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+'''
+@author: Hung-Hsin Chen
+@mail: chenhh@par.cse.nsysu.edu.tw
+
+the array-backed Strelen copula sampler
+'''
+from __future__ import division
+import time
+import numpy as np
+from PySPPortfolio.scenario.StrlenCopula import (StrlenCopulaSampling,
+                                                 empiricalInverseCDF)
+
+
+def testStrlenCopulaSampling():
+    n_rv, n_dim, n_scenario = 100, 10, 200
+    data = np.random.randn(n_rv, n_dim)
+
+    t0 = time.time()
+    samples = StrlenCopulaSampling(data, n_scenario, K=2, random_seed=0)
+    print "StrlenCopulaSampling_scen-%s %s, %.3f secs"%(
+        n_scenario, samples.shape, time.time()-t0)
+    assert samples.shape == (n_scenario, n_dim)
+
+    #seeded reproducibility
+    np.testing.assert_array_equal(
+        samples, StrlenCopulaSampling(data, n_scenario, K=2, random_seed=0))
+    assert not np.array_equal(
+        samples, StrlenCopulaSampling(data, n_scenario, K=2, random_seed=1))
+
+    #the values of each dimension are the data of the dimension
+    for col in xrange(n_dim):
+        assert np.all(np.in1d(samples[:, col], data[:, col]))
+
+
+def testCopulaSamples():
+    n_rv, n_dim, n_scenario, K = 40, 3, 500, 4
+    data = np.random.randn(n_rv, n_dim)
+
+    copula = StrlenCopulaSampling(data, n_scenario, K=K, marginal=False,
+                                  random_seed=0)
+    assert copula.shape == (n_scenario, n_dim)
+    assert np.all(copula >= 0) and np.all(copula <= 1)
+
+    #the marginal samples are the empirical inverse CDF of the copula
+    samples = StrlenCopulaSampling(data, n_scenario, K=K, random_seed=0)
+    np.testing.assert_array_equal(samples, empiricalInverseCDF(data, copula))
+
+
+def testMarginalDistribution():
+    '''
+    each subcube slab of a dimension has N/K records, so the marginals of
+    the samples follow the empirical distributions of the data
+    '''
+    n_rv, n_dim, n_scenario = 50, 2, 20000
+    data = np.random.randn(n_rv, n_dim)
+    samples = StrlenCopulaSampling(data, n_scenario, K=5, random_seed=0)
+
+    sorted_data = np.sort(data, axis=0)
+    for col in xrange(n_dim):
+        cdf = (samples[:, col][:, np.newaxis] <=
+               sorted_data[:, col]).mean(axis=0)
+        np.testing.assert_allclose(cdf, np.arange(1., n_rv + 1) / n_rv,
+                                   atol=0.02)
+
+
+if __name__ == '__main__':
+    testStrlenCopulaSampling()
+    testCopulaSamples()
+    testMarginalDistribution()